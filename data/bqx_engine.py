@@ -0,0 +1,165 @@
+"""
+Columnar BQX Engine
+Compute all backward-looking (BQX) window metrics for a partition in one pass
+
+Every metric for row t is built from the W strictly-past rates
+rate(t-W) .. rate(t-1):
+- Sums and means come from one shared cumulative sum
+- Standard deviations use sliding sums of squares (ddof=1)
+- Max/min use the van Herk / Gil-Werman block algorithm (O(n) per window)
+
+The result is a struct-of-arrays (column name -> NumPy array) in the same
+column order as the bqx_{pair} tables, ready for bulk loading.
+"""
+
+import numpy as np
+from typing import Dict, List, Sequence
+
+
+# BQX windows (minutes); aggregates use the longest window
+WINDOWS = [15, 30, 45, 60, 75]
+AGG_WINDOW = 75
+
+WINDOW_METRICS = [
+    'bqx_return', 'bqx_max', 'bqx_min',
+    'bqx_avg', 'bqx_stdev', 'bqx_endpoint'
+]
+
+AGG_METRICS = [
+    'agg_bqx_return', 'agg_bqx_max', 'agg_bqx_min',
+    'agg_bqx_avg', 'agg_bqx_stdev', 'agg_bqx_range',
+    'agg_bqx_volatility'
+]
+
+
+def bqx_column_names(windows: Sequence[int] = WINDOWS) -> List[str]:
+    """
+    Metric columns in bqx_{pair} table order (30 window + 7 aggregate)
+
+    Args:
+        windows: BQX windows
+
+    Returns:
+        List of column names
+    """
+    columns = []
+    for window in windows:
+        columns.extend(f"w{window}_{metric}" for metric in WINDOW_METRICS)
+    columns.extend(AGG_METRICS)
+    return columns
+
+
+def sliding_extreme(values: np.ndarray, window: int, op=np.maximum) -> np.ndarray:
+    """
+    Max (or min) over every window of `window` consecutive values
+
+    van Herk / Gil-Werman: split the series into window-sized blocks, take
+    running extremes from the left (prefix) and right (suffix) of each
+    block, and combine one suffix with the next block's prefix.
+
+    Args:
+        values: 1-D float array
+        window: Window length
+        op: np.maximum or np.minimum
+
+    Returns:
+        Array of length len(values) - window + 1; element s covers
+        values[s : s + window]
+    """
+    n = len(values)
+    n_windows = n - window + 1
+    if n_windows <= 0:
+        return np.empty(0)
+
+    fill = -np.inf if op is np.maximum else np.inf
+    n_blocks = -(-n // window)
+    padded = np.full(n_blocks * window, fill)
+    padded[:n] = values
+    blocks = padded.reshape(n_blocks, window)
+
+    prefix = op.accumulate(blocks, axis=1).ravel()
+    suffix = op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    starts = np.arange(n_windows)
+    return op(suffix[starts], prefix[starts + window - 1])
+
+
+def compute_bqx_columns(
+    rates: np.ndarray,
+    windows: Sequence[int] = WINDOWS
+) -> Dict[str, np.ndarray]:
+    """
+    Compute all BQX window and aggregate metrics for every row
+
+    Formulas (per window W, rate_t = rates[t], past = rates[t-W : t]):
+        bqx_return   = Σ(past - rate_t) / rate_t
+        bqx_max/min  = max/min(past)
+        bqx_avg      = mean(past)
+        bqx_stdev    = std(past, ddof=1)
+        bqx_endpoint = (rates[t-W] - rate_t) / rate_t
+    Aggregates repeat the w75 metrics and add
+        agg_bqx_range      = (max - min) / rate_t
+        agg_bqx_volatility = stdev / rate_t
+
+    Args:
+        rates: 1-D array of rates (or rate_index values) in time order,
+            including the lookback rows before the partition start
+        windows: BQX windows (must include AGG_WINDOW for aggregates)
+
+    Returns:
+        Dict of float64 columns (see bqx_column_names), each len(rates)
+        long, NaN where fewer than W past rows exist
+    """
+    x = np.asarray(rates, dtype=np.float64)
+    n = len(x)
+    columns = {name: np.full(n, np.nan) for name in bqx_column_names(windows)}
+    if n == 0:
+        return columns
+
+    # Shared running sums over demeaned rates
+    offset = x[0]
+    d = x - offset
+    cum = np.concatenate(([0.0], np.cumsum(d)))
+    cum_sq = np.concatenate(([0.0], np.cumsum(d * d)))
+
+    for window in windows:
+        if n <= window:
+            continue
+
+        t = np.arange(window, n)
+        rate_t = x[window:]
+
+        window_sum = cum[t] - cum[t - window]
+        window_sq = cum_sq[t] - cum_sq[t - window]
+
+        # Σ(past - rate_t) computed on demeaned values to avoid cancellation
+        bqx_return = (window_sum - window * d[window:]) / rate_t
+        bqx_avg = offset + window_sum / window
+        variance = (window_sq - window_sum * window_sum / window) / (window - 1)
+        bqx_stdev = np.sqrt(np.maximum(variance, 0.0))
+
+        # Past window for row t starts at t - window
+        bqx_max = sliding_extreme(x, window, np.maximum)[:n - window]
+        bqx_min = sliding_extreme(x, window, np.minimum)[:n - window]
+
+        bqx_endpoint = (x[:n - window] - rate_t) / rate_t
+
+        prefix = f"w{window}_"
+        columns[prefix + 'bqx_return'][window:] = bqx_return
+        columns[prefix + 'bqx_max'][window:] = bqx_max
+        columns[prefix + 'bqx_min'][window:] = bqx_min
+        columns[prefix + 'bqx_avg'][window:] = bqx_avg
+        columns[prefix + 'bqx_stdev'][window:] = bqx_stdev
+        columns[prefix + 'bqx_endpoint'][window:] = bqx_endpoint
+
+    if AGG_WINDOW in windows:
+        agg = f"w{AGG_WINDOW}_"
+        columns['agg_bqx_return'] = columns[agg + 'bqx_return'].copy()
+        columns['agg_bqx_max'] = columns[agg + 'bqx_max'].copy()
+        columns['agg_bqx_min'] = columns[agg + 'bqx_min'].copy()
+        columns['agg_bqx_avg'] = columns[agg + 'bqx_avg'].copy()
+        columns['agg_bqx_stdev'] = columns[agg + 'bqx_stdev'].copy()
+        columns['agg_bqx_range'] = (columns['agg_bqx_max'] - columns['agg_bqx_min']) / x
+        columns['agg_bqx_volatility'] = columns['agg_bqx_stdev'] / x
+
+    return columns
@@ -0,0 +1,486 @@
+"""
+Aurora Connection Pool
+Pooled, configuration-driven database access for workers and extractors
+
+Reads the same config/database.yaml as AuroraExtractor and hands out
+connections from a per-process pool:
+- Connections are reused across partitions instead of reconnecting (and
+  re-negotiating TLS) for every partition
+- Every connection carries the configured statement_timeout
+- Large reads stream through server-side (named) cursors
+- Connects and units of work are retried with exponential backoff when
+  Aurora Serverless drops connections during scale events
+- Every statement is timed into per-kind counters (SELECT, COPY, ...)
+
+Pools are keyed by process id, so workers started by ProcessPoolExecutor
+never touch sockets inherited from their parent.
+"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import pandas as pd
+import psycopg2
+import psycopg2.extensions
+import yaml
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config" / "database.yaml"
+
+# SQLSTATEs worth retrying: server shutdown/restart, connection failures,
+# too many connections, serialization failures and deadlocks
+TRANSIENT_SQLSTATES = {
+    '57P01', '57P02', '57P03',
+    '08000', '08001', '08003', '08004', '08006',
+    '53300',
+    '40001', '40P01'
+}
+
+
+class PoolTimeoutError(RuntimeError):
+    """No pooled connection became free within the pool timeout"""
+
+
+def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load database configuration
+
+    Resolution order: explicit path, $BQX_DB_CONFIG, config/database.yaml
+    at the repository root. ${VAR} references in string values (e.g. the
+    password) are expanded from the environment.
+
+    Args:
+        config_path: Optional path to a database.yaml
+
+    Returns:
+        Parsed configuration dict (with 'aurora' and optional 'query' keys)
+    """
+    path = config_path or os.environ.get("BQX_DB_CONFIG") or DEFAULT_CONFIG_PATH
+
+    with open(path, 'r') as f:
+        config = yaml.safe_load(f)
+
+    def expand(value):
+        if isinstance(value, dict):
+            return {k: expand(v) for k, v in value.items()}
+        if isinstance(value, str):
+            return os.path.expandvars(value)
+        return value
+
+    return expand(config)
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Whether a database error is worth retrying
+
+    Errors carrying a SQLSTATE are transient only if listed in
+    TRANSIENT_SQLSTATES (statement timeouts, 57014, are not). Errors
+    without one are dropped connections, which are transient.
+    """
+    if not isinstance(exc, psycopg2.Error):
+        return False
+    if exc.pgcode:
+        return exc.pgcode in TRANSIENT_SQLSTATES
+    return isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+def retry(
+    fn: Callable[[], Any],
+    attempts: int = 5,
+    backoff: float = 0.5,
+    max_backoff: float = 30.0
+) -> Any:
+    """
+    Call fn(), retrying transient database errors with exponential backoff
+
+    Args:
+        fn: Zero-argument callable
+        attempts: Total number of tries
+        backoff: Base delay in seconds (doubled per retry, full jitter)
+        max_backoff: Cap on a single delay
+
+    Returns:
+        fn()'s return value
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except psycopg2.Error as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            time.sleep(random.uniform(0, min(max_backoff, backoff * 2 ** attempt)))
+
+
+class QueryStats:
+    """Thread-safe per-kind timing counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, kind: str, seconds: float, rows: int = 0):
+        """Add one timed operation under `kind`"""
+        with self._lock:
+            counter = self._counters.setdefault(
+                kind, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0}
+            )
+            counter['calls'] += 1
+            counter['seconds'] += seconds
+            counter['max_seconds'] = max(counter['max_seconds'], seconds)
+            counter['rows'] += max(rows, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Copy of the counters: kind -> {calls, seconds, max_seconds, rows}"""
+        with self._lock:
+            return {kind: dict(counter) for kind, counter in self._counters.items()}
+
+    def reset(self):
+        """Clear all counters"""
+        with self._lock:
+            self._counters.clear()
+
+    def summary(self) -> str:
+        """One line per kind, slowest total first"""
+        lines = []
+        for kind, c in sorted(self.snapshot().items(), key=lambda kv: -kv[1]['seconds']):
+            lines.append(
+                f"{kind:<10} calls={c['calls']:<7} total={c['seconds']:.2f}s "
+                f"max={c['max_seconds']:.3f}s rows={c['rows']}"
+            )
+        return "\n".join(lines)
+
+
+def _statement_kind(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    if not isinstance(query, str):
+        return 'SQL'
+    words = query.split(None, 1)
+    return words[0].upper() if words else 'SQL'
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor that records execute/copy timings on its connection's stats"""
+
+    def _record(self, kind, start):
+        stats = getattr(self.connection, 'stats', None)
+        if stats is not None:
+            stats.record(kind, time.perf_counter() - start, self.rowcount)
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(_statement_kind(query), start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(_statement_kind(query), start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record('COPY', start)
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Connection whose cursors default to TimedCursor"""
+
+    stats: Optional[QueryStats] = None
+    fetch_size: Optional[int] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = TimedCursor
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Blocking, thread-safe pool of Aurora connections for one process
+
+    Use get_pool() rather than constructing pools directly.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize connection pool
+
+        Args:
+            config: Parsed database.yaml (see load_config)
+        """
+        aurora = config['aurora']
+        pool_config = aurora.get('pool', {}) or {}
+        query_config = config.get('query', {}) or {}
+        retry_config = aurora.get('retry', {}) or {}
+
+        self.min_connections = int(pool_config.get('min_connections', 1))
+        self.max_connections = int(pool_config.get('max_connections', 10))
+        self.pool_timeout = float(pool_config.get('timeout', 30))
+        self.ping_after = float(pool_config.get('ping_after', 60))
+
+        self.statement_timeout = float(query_config.get('timeout', 300))
+        self.fetch_size = int(query_config.get('fetch_size', 10000))
+
+        self.retry_attempts = int(retry_config.get('attempts', 5))
+        self.retry_backoff = float(retry_config.get('backoff', 0.5))
+        self.retry_max_backoff = float(retry_config.get('max_backoff', 30))
+
+        self.connect_kwargs = {
+            'host': aurora['host'],
+            'port': aurora.get('port', 5432),
+            'dbname': aurora['database'],
+            'user': aurora['user'],
+            'password': aurora.get('password'),
+            'sslmode': aurora.get('sslmode', 'prefer'),
+            'application_name': aurora.get('application_name', 'bqx-ml'),
+            'connect_timeout': int(pool_config.get('connect_timeout', 10)),
+            'options': f"-c statement_timeout={int(self.statement_timeout * 1000)}"
+        }
+
+        self.pid = os.getpid()
+        self.stats = QueryStats()
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+        for _ in range(min(self.min_connections, self.max_connections)):
+            self._idle.append(self._connect())
+
+    def _retry(self, fn):
+        return retry(fn, self.retry_attempts, self.retry_backoff, self.retry_max_backoff)
+
+    def _connect(self) -> TimedConnection:
+        """Open a new connection (retried on transient failures)"""
+        def attempt():
+            start = time.perf_counter()
+            conn = psycopg2.connect(connection_factory=TimedConnection, **self.connect_kwargs)
+            self.stats.record('CONNECT', time.perf_counter() - start)
+            conn.stats = self.stats
+            conn.fetch_size = self.fetch_size
+            return conn
+
+        return self._retry(attempt)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _alive(self, conn) -> bool:
+        """Cheap liveness check; pings only connections idle for a while"""
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self) -> TimedConnection:
+        """
+        Take a connection, waiting up to the pool timeout for a free slot
+
+        Every getconn() must be paired with putconn(); prefer connection().
+        """
+        if os.getpid() != self.pid:
+            raise RuntimeError("ConnectionPool used after fork; call get_pool() in the child")
+
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise PoolTimeoutError(
+                f"No connection free after {self.pool_timeout}s "
+                f"(max_connections={self.max_connections})"
+            )
+        self.stats.record('POOL_WAIT', time.perf_counter() - start)
+
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._connect()
+                if self._alive(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, discard: bool = False):
+        """
+        Return a connection to the pool
+
+        Args:
+            conn: Connection from getconn()
+            discard: Close it instead of keeping it idle (e.g. after a
+                connection-level error)
+        """
+        try:
+            if discard or conn.closed:
+                self._discard(conn)
+                return
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            conn.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[TimedConnection]:
+        """
+        Borrow a connection for one unit of work
+
+        Commits when the block exits normally and rolls back on an
+        exception (psycopg2's `with conn:` semantics), then returns the
+        connection to the pool. Connections that failed with a transient
+        error are closed rather than reused.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            discard = conn.closed or is_transient(e)
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(conn, *args, **kwargs) in its own transaction, retried as a
+        whole on transient errors (fn must be safe to repeat)
+
+        Returns:
+            fn's return value
+        """
+        def attempt():
+            with self.connection() as conn:
+                return fn(conn, *args, **kwargs)
+
+        return self._retry(attempt)
+
+    def closeall(self):
+        """Close every idle connection"""
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+
+_POOLS: Dict[tuple, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(config_path: Optional[str] = None) -> ConnectionPool:
+    """
+    Connection pool for this process and configuration
+
+    Args:
+        config_path: Optional path to a database.yaml (see load_config)
+
+    Returns:
+        The process-wide ConnectionPool, created on first use
+    """
+    path = str(config_path or os.environ.get("BQX_DB_CONFIG") or DEFAULT_CONFIG_PATH)
+    key = (os.getpid(), path)
+
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(load_config(path))
+            _POOLS[key] = pool
+    return pool
+
+
+@contextmanager
+def connection(config_path: Optional[str] = None) -> Iterator[TimedConnection]:
+    """Shortcut for get_pool(config_path).connection()"""
+    with get_pool(config_path).connection() as conn:
+        yield conn
+
+
+def read_frame(conn, query: str, params=None) -> pd.DataFrame:
+    """
+    Run a query and return the result as a DataFrame
+
+    Args:
+        conn: Database connection
+        query: SQL text
+        params: Optional query parameters
+
+    Returns:
+        DataFrame with one column per result column
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        columns = [desc[0] for desc in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+
+def iter_frames(
+    conn,
+    query: str,
+    params=None,
+    chunk_rows: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a large query through a server-side (named) cursor
+
+    Only `chunk_rows` rows are held client-side at a time. The cursor
+    lives inside the current transaction, so the connection must not be
+    in autocommit mode.
+
+    Args:
+        conn: Database connection
+        query: SQL text
+        params: Optional query parameters
+        chunk_rows: Rows per chunk (defaults to the pool's fetch_size)
+
+    Yields:
+        DataFrames of at most chunk_rows rows
+    """
+    chunk_rows = chunk_rows or getattr(conn, 'fetch_size', None) or 10000
+    stats = getattr(conn, 'stats', None)
+
+    with conn.cursor(name=f"bqx_stream_{uuid.uuid4().hex[:12]}") as cur:
+        cur.itersize = chunk_rows
+        cur.execute(query, params)
+        columns = None
+        while True:
+            start = time.perf_counter()
+            rows = cur.fetchmany(chunk_rows)
+            if stats is not None:
+                stats.record('FETCH', time.perf_counter() - start, len(rows))
+            if not rows:
+                break
+            if columns is None:
+                columns = [desc[0] for desc in cur.description]
+            yield pd.DataFrame.from_records(rows, columns=columns)
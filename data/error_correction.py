@@ -0,0 +1,320 @@
+"""
+Online Error-Correction Engine
+Recursive least-squares hedge ratios and error-correction terms of cross-pair relations, one row at a time
+
+Each relation regresses one pair on two others (e.g. EURUSD on GBPUSD and
+EURGBP, the triangle that arbitrage keeps cointegrated). The engine
+advances every relation with one update() per panel timestamp, so live
+inference and backfill run the same code (state saved with get_state()):
+- hedge ratios: recursive least squares in information form, i.e. the
+  exponentially forgotten moment matrices S = sum w z z', b = sum w z y
+  of (1, x1, x2) and y, solved for all relations in one batched 3x3
+  solve; forgetting=1 keeps every row (plain RLS)
+- ECT: the a-priori residual y - beta'z with the hedge ratios of the
+  rows before (no lookahead)
+- dynamics: 20-row velocity and acceleration of the ECT, its z-score
+  against forgotten mean/variance, whether |ECT| is shrinking
+- half-life: AR(1) coefficient phi of the ECT from forgotten lag-1
+  moments, half-life = -ln 2 / ln phi rows (NaN unless 0 < phi < 1)
+
+Pair levels are carried forward over rows a pair lacks; a relation
+updates once all of its legs have been seen.
+"""
+
+import math
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+# Forgetting factor: an effective window of 240 M1 rows
+FORGETTING = 1 - 1 / 240
+
+# Rows folded in before a relation reports an ECT
+MIN_ROWS = 60
+
+VELOCITY_ROWS = 20
+
+# Diagonal load of the moment matrix (keeps flat windows solvable)
+RIDGE = 1e-12
+
+ENGINE_FEATURES = ['ect', 'velocity', 'acceleration', 'half_life', 'zscore', 'inbound']
+
+
+class Relation(NamedTuple):
+    """One cointegrating relation: target ~ 1 + legs"""
+    name: str
+    target: str
+    legs: Tuple[str, str]
+
+
+RELATIONS = (
+    Relation('eurusd_triangle', 'eurusd', ('gbpusd', 'eurgbp')),
+    Relation('audusd_cluster', 'audusd', ('nzdusd', 'audnzd')),
+    Relation('euraud_cross', 'euraud', ('eurusd', 'audusd')),
+    Relation('usd_majors', 'eurusd', ('gbpusd', 'audusd')),
+)
+
+# The usd_majors vector (EUR, GBP, AUD against USD) gives the weight columns
+WEIGHT_RELATION = 'usd_majors'
+WEIGHT_CURRENCIES = ('eur', 'gbp', 'aud')
+
+
+class Domain(NamedTuple):
+    """How one error_correction_* table maps onto the engine"""
+    table: str                      # template formatted with pair
+    field: str                      # M1 column fed to the engine
+    suffix: str                     # column suffix in the table
+    log: bool                       # regress log levels
+
+
+DOMAINS = {
+    'rate': Domain('bqx.error_correction_rate_{pair}', 'rate_index', 'idx', True),
+    'bqx': Domain('bqx.error_correction_bqx_{pair}', 'bqx', 'bqx', False),
+}
+
+
+def domain_columns(domain: str) -> Dict[str, str]:
+    """Pair feature name -> table column for one domain ('rate' or 'bqx')"""
+    d = DOMAINS[domain].suffix
+    columns = {f'ect_{relation.name}': f'coint_ect_{d}_{relation.name}' for relation in RELATIONS}
+    columns.update({
+        'velocity': f'coint_ect_velocity_{d}_{VELOCITY_ROWS}',
+        'acceleration': f'coint_ect_accel_{d}_{VELOCITY_ROWS}',
+        'half_life': f'coint_half_life_{d}',
+    })
+    columns.update({f'weight_{currency}': f'coint_vec_weight_{d}_{currency}' for currency in WEIGHT_CURRENCIES})
+    columns.update({
+        'zscore': f'coint_deviation_zscore_{d}',
+        'inbound': f'coint_regime_inbound_{d}',
+    })
+    return columns
+
+
+def primary_relation(pair: str, relations: Sequence[Relation] = RELATIONS) -> int:
+    """Index of the relation whose dynamics a pair's table carries (the first containing it)"""
+    for i, relation in enumerate(relations):
+        if pair == relation.target or pair in relation.legs:
+            return i
+    return [relation.name for relation in relations].index(WEIGHT_RELATION)
+
+
+def domain_engine(domain: str, pairs: Sequence[str], **kwargs) -> 'ErrorCorrectionEngine':
+    """ErrorCorrectionEngine over the panel columns `pairs` for one domain"""
+    return ErrorCorrectionEngine(pairs, log=DOMAINS[domain].log, **kwargs)
+
+
+# ----------------------------------------------------------------------
+# Engine
+# ----------------------------------------------------------------------
+
+class ErrorCorrectionEngine:
+    """Streaming hedge ratios and ECTs of several relations over a row of pair levels"""
+
+    STATE = ('last', 'reference', 'count', 'moments', 'cross', 'beta', 'history',
+             'ect_weight', 'ect_mean', 'ect_var', 'lag_sums')
+
+    def __init__(
+        self,
+        pairs: Sequence[str],
+        relations: Sequence[Relation] = RELATIONS,
+        forgetting: float = FORGETTING,
+        log: bool = True,
+        min_rows: int = MIN_ROWS,
+        velocity_rows: int = VELOCITY_ROWS
+    ):
+        """
+        Args:
+            pairs: Column order of the level rows passed to update()
+            relations: Relations to track; every pair they name must be in `pairs`
+            forgetting: Weight kept by each older row (1 = no forgetting)
+            log: Regress log levels (price indices) instead of raw values
+            min_rows: Rows folded in before a relation reports an ECT
+            velocity_rows: Lag of the ECT velocity and acceleration
+        """
+        if not 0 < forgetting <= 1:
+            raise ValueError(f"forgetting must be in (0, 1], got {forgetting}")
+        columns = {pair: j for j, pair in enumerate(pairs)}
+        unknown = {p for r in relations for p in (r.target, *r.legs)} - set(columns)
+        if unknown:
+            raise ValueError(f"Relations use pairs not in the row: {sorted(unknown)}")
+
+        self.pairs = list(pairs)
+        self.relations = list(relations)
+        self.forgetting = forgetting
+        self.log = log
+        self.min_rows = min_rows
+        self.velocity_rows = velocity_rows
+        self.columns = np.array([[columns[r.target], *(columns[leg] for leg in r.legs)]
+                                 for r in relations])
+
+        n = len(relations)
+        self.last = np.full(len(pairs), np.nan)
+        self.reference = np.full((n, 3), np.nan)
+        self.count = np.zeros(n)
+        self.moments = np.zeros((n, 3, 3))
+        self.cross = np.zeros((n, 3))
+        self.beta = np.zeros((n, 3))
+        # ECTs of the last 2 * velocity_rows rows, newest first
+        self.history = np.full((n, 2 * velocity_rows + 1), np.nan)
+        self.ect_weight = np.zeros(n)
+        self.ect_mean = np.zeros(n)
+        self.ect_var = np.zeros(n)
+        # Forgotten sums of 1, e(t-1), e(t), e(t-1)^2, e(t) e(t-1)
+        self.lag_sums = np.zeros((n, 5))
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Copy of the engine state (e.g. to np.savez between live runs)"""
+        return {name: np.array(getattr(self, name), copy=True) for name in self.STATE}
+
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Resume from get_state() of an engine with the same pairs and relations"""
+        for name in self.STATE:
+            value = np.asarray(state[name])
+            if value.shape != getattr(self, name).shape:
+                raise ValueError(f"State '{name}' has shape {value.shape}, "
+                                 f"expected {getattr(self, name).shape}")
+            setattr(self, name, value.copy())
+
+    # ------------------------------------------------------------------
+    # Update
+    # ------------------------------------------------------------------
+
+    def update(self, levels) -> Dict[str, np.ndarray]:
+        """
+        Fold in one timestamp of pair levels
+
+        Args:
+            levels: (pairs,) levels in `pairs` order; NaN where a pair has
+                no row (its last level is carried forward)
+
+        Returns:
+            Dict of ENGINE_FEATURES -> (relations,) arrays and 'beta' ->
+            (relations, 3) intercept and hedge ratios after this row
+        """
+        levels = np.asarray(levels, dtype=np.float64).reshape(len(self.pairs))
+        if self.log:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                levels = np.log(np.where(levels > 0, levels, np.nan))
+        self.last = np.where(np.isfinite(levels), levels, self.last)
+
+        values = self.last[self.columns]                     # (relations, target + legs)
+        ready = np.isfinite(values).all(axis=1)
+        self.reference = np.where(ready[:, None] & ~np.isfinite(self.reference), values, self.reference)
+        centered = np.where(ready[:, None], values - self.reference, 0.0)
+        y = centered[:, 0]
+        z = np.column_stack([np.ones(len(y)), centered[:, 1:]])
+
+        # A-priori residual with the hedge ratios of the rows before
+        ect = np.where(ready & (self.count >= self.min_rows), y - (self.beta * z).sum(axis=1), np.nan)
+
+        lam = self.forgetting
+        fold = ready[:, None, None]
+        self.moments = np.where(fold, lam * self.moments + z[:, :, None] * z[:, None, :], self.moments)
+        self.cross = np.where(ready[:, None], lam * self.cross + z * y[:, None], self.cross)
+        self.count = self.count + ready
+        # Ridge on the hedge ratios only; relations not folded in solve a dummy identity
+        load = np.diag([0.0, RIDGE, RIDGE]) + np.where(fold, 0.0, np.eye(3))
+        beta = np.linalg.solve(self.moments + load, self.cross[:, :, None])[:, :, 0]
+        self.beta = np.where(ready[:, None], beta, self.beta)
+
+        out = self._dynamics(ect)
+        out['beta'] = self.beta.copy()
+        return out
+
+    def _dynamics(self, ect: np.ndarray) -> Dict[str, np.ndarray]:
+        """ECT velocity, acceleration, z-score, direction and AR(1) half-life"""
+        seen = np.isfinite(ect)
+        previous = self.history[:, 0].copy()
+        self.history = np.where(seen[:, None], np.column_stack([ect, self.history[:, :-1]]), self.history)
+
+        k = self.velocity_rows
+        lam = self.forgetting
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocity = (ect - self.history[:, k]) / k
+            acceleration = (velocity - (self.history[:, k] - self.history[:, 2 * k]) / k) / k
+            zscore = (ect - self.ect_mean) / np.sqrt(self.ect_var)
+            zscore = np.where(seen & (self.ect_var > 0), zscore, np.nan)
+
+            # Forgotten mean/variance of the ECT (after the z-score: no lookahead)
+            weight = np.where(seen, lam * self.ect_weight + 1.0, self.ect_weight)
+            step = np.where(seen, ect - self.ect_mean, 0.0)
+            mean = self.ect_mean + np.where(seen, step / np.maximum(weight, 1.0), 0.0)
+            self.ect_var = np.where(seen, (lam * self.ect_weight * self.ect_var + step * (ect - mean)) /
+                                    np.maximum(weight, 1.0), self.ect_var)
+            self.ect_weight, self.ect_mean = weight, mean
+
+            lagged = seen & np.isfinite(previous)
+            e, e1 = np.where(lagged, ect, 0.0), np.where(lagged, previous, 0.0)
+            terms = np.column_stack([np.ones_like(e), e1, e, e1 * e1, e * e1])
+            self.lag_sums = np.where(lagged[:, None], lam * self.lag_sums + terms, self.lag_sums)
+            w, s1, s0, s11, s01 = self.lag_sums.T
+            phi = (s01 - s1 * s0 / w) / (s11 - s1 * s1 / w)
+            half_life = np.where(seen & (phi > 0) & (phi < 1), -math.log(2) / np.log(phi), np.nan)
+
+            inbound = np.where(lagged, (np.abs(ect) < np.abs(previous)).astype(np.float64), np.nan)
+        return {
+            'ect': ect,
+            'velocity': velocity,
+            'acceleration': acceleration,
+            'half_life': half_life,
+            'zscore': zscore,
+            'inbound': inbound,
+        }
+
+    def run(self, levels: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Backfill: update() over every row of a (rows, pairs) matrix
+
+        Returns:
+            Dict of feature name -> (rows, relations) float64 array
+            ('beta' -> (rows, relations, 3))
+        """
+        levels = np.asarray(levels, dtype=np.float64).reshape(-1, len(self.pairs))
+        out = {}
+        for t in range(len(levels)):
+            row = self.update(levels[t])
+            if not out:
+                out = {name: np.empty((len(levels),) + values.shape) for name, values in row.items()}
+            for name, values in row.items():
+                out[name][t] = values
+        return out
+
+
+# ----------------------------------------------------------------------
+# Table rows
+# ----------------------------------------------------------------------
+
+def vector_weights(beta: np.ndarray, relations: Sequence[Relation] = RELATIONS) -> Dict[str, np.ndarray]:
+    """
+    Normalized (EUR, GBP, AUD) cointegrating vector of the usd_majors relation
+
+    The vector (1, -beta_gbp, -beta_aud) is scaled to unit absolute sum,
+    so the weights are comparable over time whatever the hedge ratios.
+    """
+    i = [relation.name for relation in relations].index(WEIGHT_RELATION)
+    b = beta[..., i, :]
+    vector = np.stack([np.ones(b.shape[:-1]), -b[..., 1], -b[..., 2]], axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vector = vector / np.abs(vector).sum(axis=-1, keepdims=True)
+    return {f'weight_{currency}': vector[..., k] for k, currency in enumerate(WEIGHT_CURRENCIES)}
+
+
+def pair_features(out: Dict[str, np.ndarray], pair: str,
+                  relations: Sequence[Relation] = RELATIONS) -> Dict[str, np.ndarray]:
+    """
+    One pair's table features from run() output
+
+    Every table carries all relation ECTs and the usd_majors weights; the
+    dynamics are those of the pair's primary_relation().
+    """
+    i = primary_relation(pair, relations)
+    features = {f'ect_{relation.name}': out['ect'][:, k] for k, relation in enumerate(relations)}
+    features.update({name: out[name][:, i] for name in ENGINE_FEATURES if name != 'ect'})
+    ready = np.isfinite(out['ect'][:, [relation.name for relation in relations].index(WEIGHT_RELATION)])
+    for name, values in vector_weights(out['beta'], relations).items():
+        features[name] = np.where(ready, values, np.nan)
+    return features
@@ -0,0 +1,325 @@
+"""
+Streaming Feature Exporter
+Pair-month Parquet files aligned from per-table range scans, one row group at a time
+
+Each source table is read on its own server-side cursor with a range
+predicate on its timestamp column (so Aurora prunes to the month's
+partition) in timestamp order. The exporter walks the base table (m1) one
+row group at a time, takes the rows of every other source up to the row
+group's last timestamp, aligns them to the base timestamps in Arrow
+(left join, nulls where a source has no row) and appends the row group to
+a Parquet writer that streams into an object store. Client memory holds
+about one row group per source, not the pair-month.
+
+Encodings:
+- float columns: BYTE_STREAM_SPLIT (compresses smooth series far better
+  than plain or dictionary pages)
+- string columns (regime labels, arbitrage paths, pair): dictionary
+
+Stores are any pyarrow filesystem under a root: a local directory (written
+to a temporary file and renamed into place) or S3, including MinIO-style
+S3-compatible endpoints.
+"""
+
+import os
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+import psycopg2.extensions
+
+from data.jobs import month_bounds
+
+TIME_COLUMN = 'ts_utc'
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+# ~5.7 days of minute bars: a 200-column float row group is ~13 MB
+ROW_GROUP_ROWS = 8192
+
+# NUMERIC comes back as float (the old pd.read_sql path produced floats too)
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'DEC2FLOAT',
+    lambda value, cur: float(value) if value is not None else None
+)
+
+# PostgreSQL type OID -> Arrow type
+PG_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    1082: pa.date32(),
+    1114: TIMESTAMP,
+    1184: TIMESTAMP,
+    18: pa.string(),
+    25: pa.string(),
+    1042: pa.string(),
+    1043: pa.string(),
+}
+
+
+class ExportSource(NamedTuple):
+    """One table joined into the export"""
+    name: str
+    table: str                              # template formatted with pair (e.g. 'bqx.reg_{pair}')
+    columns: Tuple[Tuple[str, str], ...]    # (source column, exported name)
+    time_column: str = TIME_COLUMN
+
+
+# ----------------------------------------------------------------------
+# Object stores
+# ----------------------------------------------------------------------
+
+class ObjectStore:
+    """Keys under a root directory/prefix of a pyarrow filesystem"""
+
+    def __init__(self, filesystem: pafs.FileSystem, root: str, url: Optional[str] = None):
+        self.filesystem = filesystem
+        self.root = root.rstrip('/')
+        self.base_url = (url or self.root).rstrip('/')
+
+    def path(self, key: str) -> str:
+        return f"{self.root}/{key}"
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    @property
+    def local(self) -> bool:
+        return isinstance(self.filesystem, pafs.LocalFileSystem)
+
+    @contextmanager
+    def open_output(self, key: str) -> Iterator[pa.NativeFile]:
+        """
+        Stream an object; it replaces any previous version only when the
+        block exits normally
+
+        Local files are written next to the target and renamed; S3
+        multipart uploads complete on close, and an upload interrupted by
+        an exception is deleted.
+        """
+        path = self.path(key)
+        target = f"{path}.{uuid.uuid4().hex[:8]}.tmp" if self.local else path
+        if self.local:
+            self.filesystem.create_dir(os.path.dirname(path), recursive=True)
+        try:
+            with self.filesystem.open_output_stream(target) as stream:
+                yield stream
+        except BaseException:
+            try:
+                self.filesystem.delete_file(target)
+            except (FileNotFoundError, OSError):
+                pass
+            raise
+        if self.local:
+            self.filesystem.move(target, path)
+
+    def open_input(self, key: str) -> pa.NativeFile:
+        return self.filesystem.open_input_file(self.path(key))
+
+    def size(self, key: str) -> int:
+        return self.filesystem.get_file_info(self.path(key)).size
+
+
+def open_store(url: str, endpoint_url: Optional[str] = None, region: Optional[str] = None) -> ObjectStore:
+    """
+    Object store for a URL
+
+    Args:
+        url: 's3://bucket/prefix', 'file:///dir' or a local directory
+        endpoint_url: S3-compatible endpoint (e.g. 'http://localhost:9000'
+            for MinIO; default $S3_ENDPOINT_URL, else AWS)
+        region: S3 region (default $AWS_REGION, else us-east-1)
+
+    Returns:
+        ObjectStore
+    """
+    if url.startswith('s3://'):
+        endpoint_url = endpoint_url or os.environ.get('S3_ENDPOINT_URL')
+        filesystem = pafs.S3FileSystem(
+            region=region or os.environ.get('AWS_REGION', 'us-east-1'),
+            endpoint_override=endpoint_url or None
+        )
+        return ObjectStore(filesystem, url[len('s3://'):], url)
+
+    root = os.path.abspath(url[len('file://'):] if url.startswith('file://') else url)
+    return ObjectStore(pafs.LocalFileSystem(), root)
+
+
+# ----------------------------------------------------------------------
+# Source streams
+# ----------------------------------------------------------------------
+
+class SourceStream:
+    """Timestamp-ordered batches of one source over a server-side cursor"""
+
+    def __init__(self, conn, source: ExportSource, pair: str, start, end, chunk_rows: int):
+        self.source = source
+        self.chunk_rows = chunk_rows
+        self.cursor = conn.cursor(name=f"bqx_export_{uuid.uuid4().hex[:12]}")
+        self.cursor.itersize = chunk_rows
+        psycopg2.extensions.register_type(DEC2FLOAT, self.cursor)
+
+        select = ', '.join([f"{source.time_column} AS {TIME_COLUMN}"] +
+                           [f"{column} AS {name}" for column, name in source.columns])
+        self.cursor.execute(
+            f"""
+            SELECT {select}
+            FROM {source.table.format(pair=pair)}
+            WHERE {source.time_column} >= %s AND {source.time_column} < %s
+            ORDER BY {source.time_column}
+            """,
+            (start, end)
+        )
+        self.schema = None
+        self.buffer = None
+        self.exhausted = False
+        # Named cursors describe their columns after the first fetch
+        self._extend()
+
+    def close(self):
+        self.cursor.close()
+
+    def _fetch(self) -> pa.Table:
+        rows = self.cursor.fetchmany(self.chunk_rows)
+        if self.schema is None:
+            self.schema = pa.schema([(desc[0], PG_TYPES.get(desc[1], pa.string()))
+                                     for desc in self.cursor.description])
+        if not rows:
+            self.exhausted = True
+        columns = list(zip(*rows)) if rows else [()] * len(self.schema)
+        arrays = []
+        for values, field in zip(columns, self.schema):
+            if pa.types.is_string(field.type):
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def _extend(self):
+        batch = self._fetch()
+        self.buffer = batch if self.buffer is None else pa.concat_tables([self.buffer, batch])
+
+    def next_rows(self, limit: int) -> pa.Table:
+        """The next `limit` rows (fewer at the end)"""
+        while not self.exhausted and (self.buffer is None or len(self.buffer) < limit):
+            self._extend()
+        head, self.buffer = self.buffer.slice(0, limit), self.buffer.slice(limit)
+        return head
+
+    def rows_until(self, last) -> pa.Table:
+        """All remaining rows with a timestamp <= last"""
+        while not self.exhausted and (
+                self.buffer is None or len(self.buffer) == 0 or
+                self.buffer.column(TIME_COLUMN)[-1].as_py() <= last):
+            self._extend()
+        count = pc.sum(pc.less_equal(self.buffer.column(TIME_COLUMN), pa.scalar(last, TIMESTAMP))).as_py() or 0
+        head, self.buffer = self.buffer.slice(0, count), self.buffer.slice(count)
+        return head
+
+
+def align(base_times: pa.ChunkedArray, rows: pa.Table) -> List[pa.Array]:
+    """
+    Columns of `rows` (except the timestamp) aligned to base_times
+
+    Left join on the timestamp: base rows without a match get nulls.
+    """
+    index = pc.index_in(base_times, value_set=rows.column(TIME_COLUMN).combine_chunks())
+    return [rows.column(name).take(index) for name in rows.column_names if name != TIME_COLUMN]
+
+
+# ----------------------------------------------------------------------
+# Exporter
+# ----------------------------------------------------------------------
+
+def parquet_options(schema: pa.Schema, compression: str = 'snappy') -> Dict:
+    """ParquetWriter options: byte-stream-split floats, dictionary strings"""
+    floats = [field.name for field in schema if pa.types.is_floating(field.type)]
+    strings = [field.name for field in schema if pa.types.is_string(field.type)]
+    return {
+        'compression': compression,
+        'use_dictionary': strings,
+        'use_byte_stream_split': floats,
+        'version': '2.6',
+        'write_statistics': [TIME_COLUMN],
+    }
+
+
+def export_partition(
+    conn,
+    sources: Sequence[ExportSource],
+    pair: str,
+    month: str,
+    store: ObjectStore,
+    key: str,
+    row_group_rows: int = ROW_GROUP_ROWS,
+    compression: str = 'snappy',
+    extra: Optional[Dict[str, object]] = None
+) -> Tuple[int, int]:
+    """
+    Stream one pair-month into a Parquet object
+
+    Args:
+        conn: Database connection (not in autocommit mode: the source
+            cursors live in its transaction)
+        sources: Base source (its rows define the export's rows) followed
+            by the sources left-joined on the timestamp
+        pair: Currency pair
+        month: 'YYYY_MM'
+        store: Destination store
+        key: Object key
+        row_group_rows: Rows per Parquet row group
+        compression: Parquet compression codec
+        extra: Constant columns appended to every row (e.g. pair, year)
+
+    Returns:
+        (rows written, columns written); nothing is written without base rows
+    """
+    start, end = month_bounds(month)
+    streams = [SourceStream(conn, source, pair, start, end, row_group_rows) for source in sources]
+    extra = extra or {}
+    rows = 0
+    try:
+        base, others = streams[0], streams[1:]
+        group = base.next_rows(row_group_rows)
+        if len(group) == 0:
+            return 0, 0
+
+        names = [name for stream in streams for name in stream.schema.names if name != TIME_COLUMN]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate exported column names in {[source.name for source in sources]}")
+
+        with store.open_output(key) as sink:
+            writer = None
+            while len(group) > 0:
+                times = group.column(TIME_COLUMN)
+                last = times[-1].as_py()
+                arrays, fields = [times], [group.schema.field(TIME_COLUMN)]
+                arrays += [group.column(name) for name in group.column_names if name != TIME_COLUMN]
+                fields += [field for field in group.schema if field.name != TIME_COLUMN]
+                for stream in others:
+                    arrays += align(times, stream.rows_until(last))
+                    fields += [field for field in stream.schema if field.name != TIME_COLUMN]
+                for name, value in extra.items():
+                    arrays.append(pa.array([value] * len(group)))
+                    fields.append(pa.field(name, arrays[-1].type))
+
+                table = pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+                if writer is None:
+                    schema = table.schema.with_metadata({'pair': pair, 'year_month': month})
+                    writer = pq.ParquetWriter(sink, schema, **parquet_options(schema, compression))
+                writer.write_table(table, row_group_size=row_group_rows)
+                rows += len(table)
+                group = base.next_rows(row_group_rows)
+            writer.close()
+
+        return rows, len(writer.schema)
+    finally:
+        for stream in streams:
+            stream.close()
@@ -3,22 +3,51 @@ Aurora Data Extraction
 Extract BQX and REG features from Aurora PostgreSQL
 """
 
+import uuid
 import psycopg2
+import numpy as np
 import pandas as pd
 import yaml
-from typing import Tuple, Optional
+from typing import Iterator, List, NamedTuple, Tuple, Optional, Sequence
 from datetime import datetime
 
+from data.feature_store import FeatureStore
+
+
+class FeatureBlock(NamedTuple):
+    """A chunk of feature rows as NumPy arrays"""
+    ts: np.ndarray          # datetime64[ns], shape (n,)
+    values: np.ndarray      # float32/float64, shape (n, len(columns))
+    columns: List[str]
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame view indexed by ts_utc (no copy of values)"""
+        return pd.DataFrame(
+            self.values,
+            index=pd.DatetimeIndex(self.ts, name='ts_utc'),
+            columns=self.columns,
+            copy=False
+        )
+
 
 class AuroraExtractor:
     """Extract BQX and REG features from Aurora database"""
 
-    def __init__(self, config_path: str = "config/database.yaml"):
+    def __init__(
+        self,
+        config_path: str = "config/database.yaml",
+        cache_dir: Optional[str] = None,
+        use_cache: Optional[bool] = None
+    ):
         """
         Initialize Aurora extractor
 
         Args:
             config_path: Path to database configuration file
+            cache_dir: Local feature store directory (default: query.cache_dir
+                from the config, or cache/feature_store)
+            use_cache: Read through the local feature store (default:
+                query.cache_enabled from the config)
         """
         with open(config_path, 'r') as f:
             config = yaml.safe_load(f)
@@ -26,6 +55,17 @@ class AuroraExtractor:
         self.aurora_config = config['aurora']
         self.conn = None
 
+        query_config = config.get('query', {}) or {}
+        if use_cache is None:
+            use_cache = bool(query_config.get('cache_enabled', False))
+
+        self.store = None
+        if use_cache:
+            self.store = FeatureStore(
+                root=cache_dir or query_config.get('cache_dir', 'cache/feature_store'),
+                ttl=query_config.get('cache_ttl', 3600)
+            )
+
     def connect(self):
         """Establish connection to Aurora"""
         self.conn = psycopg2.connect(
@@ -42,11 +82,49 @@ class AuroraExtractor:
         if self.conn:
             self.conn.close()
 
+    def _source_stats(self, table: str, time_col: str, start_date: str, end_date: str):
+        """Row count and max timestamp of a source range (cache revalidation)"""
+        if not self.conn:
+            self.connect()
+
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"SELECT count(*), max({time_col}) FROM bqx.{table} "
+                f"WHERE {time_col} >= %s AND {time_col} < %s",
+                (start_date, end_date)
+            )
+            rows, max_ts = cur.fetchone()
+        return rows, max_ts
+
+    def _load(
+        self,
+        table: str,
+        pair: str,
+        start_date: str,
+        end_date: str,
+        fetch,
+        time_col: str,
+        columns: Optional[Sequence[str]]
+    ) -> pd.DataFrame:
+        """Read through the feature store when enabled, else query Aurora"""
+        if self.store is None:
+            df = fetch(pair, start_date, end_date)
+            df.set_index('ts_utc', inplace=True)
+            return df if columns is None else df[list(columns)]
+
+        return self.store.load(
+            table, pair, start_date, end_date,
+            fetch=fetch,
+            columns=columns,
+            source_stats=lambda p, s, e: self._source_stats(f"{table}_{p}", time_col, s, e)
+        )
+
     def load_bqx(
         self,
         pair: str,
         start_date: str,
-        end_date: str
+        end_date: str,
+        columns: Optional[Sequence[str]] = None
     ) -> pd.DataFrame:
         """
         Load BQX features for a pair
@@ -55,14 +133,16 @@ class AuroraExtractor:
             pair: Forex pair (e.g., 'eurusd')
             start_date: Start date (YYYY-MM-DD)
             end_date: End date (YYYY-MM-DD)
+            columns: Optional subset of feature columns
 
         Returns:
             DataFrame with BQX features
         """
-        if not self.conn:
-            self.connect()
+        return self._load('bqx', pair, start_date, end_date, self._fetch_bqx, 'ts_utc', columns)
 
-        query = f"""
+    def _bqx_query(self, pair: str) -> str:
+        """BQX feature query for a pair (params: start_date, end_date)"""
+        return f"""
         SELECT
             ts_utc,
             rate,
@@ -90,21 +170,26 @@ class AuroraExtractor:
         ORDER BY ts_utc
         """
 
+    def _fetch_bqx(self, pair: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """Query BQX features from Aurora (ts_utc as a column)"""
+        if not self.conn:
+            self.connect()
+
         df = pd.read_sql(
-            query,
+            self._bqx_query(pair),
             self.conn,
             params=(start_date, end_date),
             parse_dates=['ts_utc']
         )
 
-        df.set_index('ts_utc', inplace=True)
         return df
 
     def load_reg(
         self,
         pair: str,
         start_date: str,
-        end_date: str
+        end_date: str,
+        columns: Optional[Sequence[str]] = None
     ) -> pd.DataFrame:
         """
         Load REG features for a pair
@@ -113,14 +198,16 @@ class AuroraExtractor:
             pair: Forex pair (e.g., 'eurusd')
             start_date: Start date (YYYY-MM-DD)
             end_date: End date (YYYY-MM-DD)
+            columns: Optional subset of feature columns
 
         Returns:
             DataFrame with REG features
         """
-        if not self.conn:
-            self.connect()
+        return self._load('reg', pair, start_date, end_date, self._fetch_reg, 'time', columns)
 
-        query = f"""
+    def _reg_query(self, pair: str) -> str:
+        """REG feature query for a pair (params: start_date, end_date)"""
+        return f"""
         SELECT
             time as ts_utc,
             close as rate,
@@ -147,14 +234,18 @@ class AuroraExtractor:
         ORDER BY time
         """
 
+    def _fetch_reg(self, pair: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """Query REG features from Aurora (ts_utc as a column)"""
+        if not self.conn:
+            self.connect()
+
         df = pd.read_sql(
-            query,
+            self._reg_query(pair),
             self.conn,
             params=(start_date, end_date),
             parse_dates=['ts_utc']
         )
 
-        df.set_index('ts_utc', inplace=True)
         return df
 
     def load(
@@ -179,6 +270,128 @@ class AuroraExtractor:
 
         return bqx_df, reg_df
 
+    def iter_blocks(
+        self,
+        table: str,
+        pair: str,
+        start_date: str,
+        end_date: str,
+        chunk_rows: int = 50000,
+        columns: Optional[Sequence[str]] = None,
+        dtype=np.float32
+    ) -> Iterator[FeatureBlock]:
+        """
+        Stream a feature table through a server-side cursor
+
+        Only one chunk of psycopg2 tuples exists at a time and it is
+        converted straight into a float block (NULL -> NaN), so memory is
+        bounded by chunk_rows rather than by the date range.
+
+        Args:
+            table: 'bqx' or 'reg'
+            pair: Forex pair (e.g., 'eurusd')
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            chunk_rows: Rows per block
+            columns: Optional subset of feature columns
+            dtype: Value dtype (np.float32 or np.float64)
+
+        Yields:
+            FeatureBlock per chunk, in ts_utc order
+        """
+        if not self.conn:
+            self.connect()
+
+        query = self._bqx_query(pair) if table == 'bqx' else self._reg_query(pair)
+        if columns is not None:
+            query = f"SELECT ts_utc, {', '.join(columns)} FROM ({query}) AS q ORDER BY ts_utc"
+
+        cur = self.conn.cursor(name=f"bqx_extract_{uuid.uuid4().hex[:12]}")
+        try:
+            cur.itersize = chunk_rows
+            cur.execute(query, (start_date, end_date))
+            names = None
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                if names is None:
+                    names = [desc[0] for desc in cur.description][1:]
+                # Naive UTC, whether ts_utc is TIMESTAMP or TIMESTAMPTZ
+                ts = pd.to_datetime([row[0] for row in rows], utc=True).tz_localize(None).as_unit('ns').to_numpy()
+                values = np.array([row[1:] for row in rows], dtype=dtype)
+                del rows
+                yield FeatureBlock(ts, values, names)
+        finally:
+            cur.close()
+            # Close the read-only transaction that held the cursor
+            self.conn.rollback()
+
+    def _window_frame(
+        self,
+        table: str,
+        pair: str,
+        start_date: str,
+        end_date: str,
+        chunk_rows: int,
+        dtype
+    ) -> pd.DataFrame:
+        """One time window of a table as a float frame"""
+        if self.store is not None:
+            fetch = self._fetch_bqx if table == 'bqx' else self._fetch_reg
+            df = self.store.load(table, pair, start_date, end_date, fetch=fetch)
+            return df.astype(dtype, copy=False)
+
+        blocks = list(self.iter_blocks(table, pair, start_date, end_date, chunk_rows, dtype=dtype))
+        if not blocks:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='ts_utc'), dtype=dtype)
+        if len(blocks) == 1:
+            return blocks[0].to_frame()
+        return FeatureBlock(
+            np.concatenate([b.ts for b in blocks]),
+            np.concatenate([b.values for b in blocks]),
+            blocks[0].columns
+        ).to_frame()
+
+    def iter_load(
+        self,
+        pair: str,
+        start_date: str,
+        end_date: str,
+        chunk_days: int = 7,
+        chunk_rows: int = 50000,
+        dtype=np.float32
+    ) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Stream BQX and REG features in aligned time windows
+
+        Each window covers chunk_days days of both tables, so the pair of
+        frames can be merged on ts_utc chunk by chunk (see
+        FeatureEngineer.engineer_features_stream). Windows are read from
+        the local feature store when it is enabled, otherwise through
+        server-side cursors.
+
+        Args:
+            pair: Forex pair (e.g., 'eurusd')
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            chunk_days: Window length in days
+            chunk_rows: Server-side cursor fetch size
+            dtype: Value dtype (np.float32 or np.float64)
+
+        Yields:
+            (bqx_df, reg_df) per window, indexed by ts_utc
+        """
+        edges = pd.date_range(start_date, end_date, freq=f"{chunk_days}D")
+        if len(edges) == 0 or edges[-1] < pd.Timestamp(end_date):
+            edges = edges.append(pd.DatetimeIndex([pd.Timestamp(end_date)]))
+
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            window = (lo.strftime('%Y-%m-%d %H:%M:%S'), hi.strftime('%Y-%m-%d %H:%M:%S'))
+            bqx_df = self._window_frame('bqx', pair, *window, chunk_rows, dtype)
+            reg_df = self._window_frame('reg', pair, *window, chunk_rows, dtype)
+            yield bqx_df, reg_df
+
 
 if __name__ == "__main__":
     # Example usage
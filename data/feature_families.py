@@ -0,0 +1,583 @@
+"""
+Feature Families
+The Track 1/Track 2 feature groups registered with the feature graph
+
+Each family wraps the column computation of one worker (statistics,
+Bollinger, Fibonacci, volume, time, spread, technical, regime,
+regression) together with its inputs, windows, lookback and output
+tables. The workers import the same compute functions, so a feature is
+computed identically whether it is rebuilt by its own worker or by
+scripts/ml/feature_graph_worker.py. Rolling statistics go through
+RollingCache so families (and features) windowing the same rows share
+intermediates.
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from data.feature_graph import Family, FamilyInput, FeatureGraph, Output
+from data.indicators import RATE_INDICATOR_COLUMNS, rate_indicators
+from data.regime import LOOKBACK_WINDOW, compute_regime_features
+from data.rolling_regression import rolling_quadratic_fit
+from data.rolling_stats import (
+    RollingCache, rolling_corr, window_entropy, window_lag1_autocorr, window_mad,
+    window_max, window_min, window_percentile_rank, window_range, window_slope, window_sum
+)
+
+
+STATISTICS_COLUMNS = [
+    'skewness_60min', 'kurtosis_60min', 'median_absolute_deviation_60min',
+    'entropy_60min', 'autocorrelation_lag1'
+]
+
+BOLLINGER_COLUMNS = [
+    'bollinger_upper_20', 'bollinger_lower_20', 'bollinger_middle_20',
+    'bollinger_width_20', 'bollinger_percent_b'
+]
+
+TIME_COLUMNS = [
+    'hour_sin', 'hour_cos', 'day_of_week_sin', 'day_of_week_cos',
+    'session_overlap', 'is_weekend_approach', 'minutes_since_market_open', 'trading_session'
+]
+
+SPREAD_COLUMNS = [
+    'spread_mean_60min', 'spread_volatility_60min', 'spread_pct_of_rate',
+    'spread_trend_slope', 'spread_spike', 'bid_ask_imbalance', 'effective_spread',
+    'quoted_spread', 'realized_spread', 'price_impact', 'roll_cost',
+    'bid_depth', 'ask_depth', 'depth_imbalance', 'spread_range_60min',
+    'spread_percentile_60min', 'mid_price_volatility', 'tick_direction',
+    'tick_rule', 'order_flow_toxicity'
+]
+
+VOLUME_COLUMNS = [
+    'w15_volume_ratio', 'w30_volume_ratio', 'w60_volume_ratio',
+    'volume_spike', 'volume_trend_slope', 'cumulative_volume_60min',
+    'volume_weighted_return', 'volume_price_correlation_60min',
+    'relative_volume_position', 'volume_volatility_60min'
+]
+
+FIBONACCI_COLUMNS = [
+    'fib_retracement_236', 'fib_retracement_382', 'fib_retracement_500',
+    'fib_retracement_618', 'fib_retracement_786', 'fib_extension_1618',
+    'fib_extension_2618', 'fib_extension_4236', 'fib_fan_upper', 'fib_fan_middle',
+    'fib_fan_lower', 'fib_arc_radius'
+]
+
+# REG windows (rows) and per-window metrics
+REGRESSION_WINDOWS = {
+    'w15': 15,
+    'w30': 30,
+    'w45': 45,
+    'w60': 60,
+    'w75': 75,
+    'agg': 90  # Aggregate window
+}
+
+REGRESSION_METRICS = [
+    'a2', 'a1', 'b', 'r2', 'rmse', 'residual_mean', 'residual_std',
+    'pred_interval_lower', 'pred_interval_upper', 'prediction',
+    'vertex_x', 'vertex_y', 'curvature', 'fit_quality', 'extrapolation_error'
+]
+
+
+def regression_columns(domain: str):
+    """REG column names of one domain ('idx' or 'bqx'), window-major"""
+    return [f"{metric}_{domain}_{window}" for window in REGRESSION_WINDOWS for metric in REGRESSION_METRICS]
+
+
+# ----------------------------------------------------------------------
+# Column computations (shared with the workers)
+# ----------------------------------------------------------------------
+
+def compute_statistics_features(rate_indices):
+    """
+    Compute 5 statistical features with 60-minute rolling window
+
+    One vectorized pass per feature over all trailing windows; rows whose
+    window has fewer than 10 values are left at 0.
+
+    Args:
+        rate_indices: rate_index values (or their RollingCache)
+    """
+    x = RollingCache.of(rate_indices)
+    moments = x.moments(60, min_periods=10, fill=0.0)
+    autocorr = x.apply(window_lag1_autocorr, 60, min_periods=10, fill=0.0)
+
+    return {
+        'skewness_60min': moments['skew'],
+        'kurtosis_60min': moments['kurtosis'],
+        'median_absolute_deviation_60min': x.apply(window_mad, 60, min_periods=10, fill=0.0),
+        'entropy_60min': x.apply(window_entropy, 60, min_periods=10, fill=0.0),
+        'autocorrelation_lag1': np.nan_to_num(autocorr, nan=0.0),
+    }
+
+
+def compute_bollinger_features(rate_indices):
+    """
+    Compute 5 Bollinger Bands features with 20-period window
+
+    Args:
+        rate_indices: rate_index values (or their RollingCache)
+    """
+    x = RollingCache.of(rate_indices)
+    n = len(x)
+    mean = x.mean(20, min_periods=10, fill=0.0)
+    std = x.std(20, min_periods=10, fill=0.0)
+
+    # %B indicator: (price - lower) / (upper - lower); 0.5 for flat windows
+    valid = np.arange(n) >= 9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_b = np.where(std > 0, (x.values - (mean - 2 * std)) / (4 * std), 0.5)
+
+    return {
+        'bollinger_upper_20': mean + 2 * std,
+        'bollinger_lower_20': mean - 2 * std,
+        'bollinger_middle_20': mean,
+        'bollinger_width_20': 4 * std,  # upper - lower
+        'bollinger_percent_b': np.where(valid, percent_b, 0.0),
+    }
+
+
+def compute_time_features(times):
+    """
+    Compute 8 time features with CYCLICAL ENCODING
+
+    Returns:
+        dict: Time feature arrays matching schema
+    """
+    index = pd.DatetimeIndex(times)
+    hour = index.hour.to_numpy()
+    minute = index.minute.to_numpy()
+    weekday = index.weekday.to_numpy()  # 0=Monday, 6=Sunday
+
+    # Trading session (0=asian, 1=london, 2=newyork, 3=overlap, 4=quiet)
+    # Asian: 00:00-08:00 UTC
+    # London: 08:00-16:00 UTC
+    # NY: 13:00-21:00 UTC
+    # Overlap: 13:00-16:00 UTC
+    # Quiet: 21:00-00:00 UTC
+    session_conditions = [
+        (13 <= hour) & (hour < 16),
+        (8 <= hour) & (hour < 13),
+        (16 <= hour) & (hour < 21),
+        hour < 8,
+    ]
+    trading_session = np.select(session_conditions, [3, 1, 2, 0], default=4)
+    session_overlap = np.select(session_conditions, [2, 1, 1, 1], default=0)
+
+    # Minutes since last major market open (Asian 00:00, London 08:00, NY 13:00)
+    minute_of_day = hour * 60 + minute
+    market_open = np.select([minute_of_day < 8 * 60, minute_of_day < 13 * 60], [0, 8 * 60], default=13 * 60)
+
+    return {
+        'hour_sin': np.sin(2 * np.pi * hour / 24),
+        'hour_cos': np.cos(2 * np.pi * hour / 24),
+        'day_of_week_sin': np.sin(2 * np.pi * weekday / 7),
+        'day_of_week_cos': np.cos(2 * np.pi * weekday / 7),
+        'session_overlap': session_overlap.astype(int),
+        # Friday after 17:00 UTC or Saturday/Sunday
+        'is_weekend_approach': (((weekday == 4) & (hour >= 17)) | (weekday >= 5)).astype(int),
+        'minutes_since_market_open': (minute_of_day - market_open).astype(int),
+        'trading_session': trading_session.astype(int),
+    }
+
+
+def compute_spread_features(times, bids, asks, spreads, rates):
+    """
+    Compute 20 spread/microstructure features matching schema
+
+    Rolling 60-minute statistics come from data.rolling_stats (one
+    vectorized pass each); the first rows use the shorter windows
+    available, as before.
+
+    Args:
+        times: Array of timestamps
+        bids: Array of bid_close prices
+        asks: Array of ask_close prices
+        spreads: Array of spread_close values (or its RollingCache)
+        rates: Array of close/rate values
+
+    Returns:
+        dict: Spread feature arrays
+    """
+    n = len(times)
+    bids = np.asarray(bids, dtype=np.float64)
+    asks = np.asarray(asks, dtype=np.float64)
+    spread_windows = RollingCache.of(spreads)
+    spreads = spread_windows.values
+    rates = np.asarray(rates, dtype=np.float64)
+
+    # Compute mid prices
+    mid_windows = RollingCache((bids + asks) / 2)
+    mid_prices = mid_windows.values
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 1-2, 15-17. Rolling 60-minute window statistics
+        spread_mean = spread_windows.mean(60, min_periods=1, fill=0.0)
+        spread_volatility = spread_windows.std(60, min_periods=2, fill=0.0)
+        spread_slope = spread_windows.apply(window_slope, 60, min_periods=10, fill=0.0)
+        spread_range = spread_windows.apply(window_range, 60, min_periods=1, fill=0.0)
+        spread_percentile = spread_windows.apply(window_percentile_rank, 60, min_periods=2, fill=0.0)
+        mid_volatility = mid_windows.std(60, min_periods=2, fill=0.0)
+
+        # 3. Spread as % of rate
+        spread_pct_of_rate = np.where(rates > 0, spreads / rates * 100, 0.0)
+
+        # 6. Bid-ask imbalance (normalized)
+        total = bids + asks
+        bid_ask_imbalance = np.where(total > 0, (bids - asks) / total, 0.0)
+
+        # 7-8. Effective spread (assuming trade at mid) and quoted spread
+        effective_spread = np.where(mid_prices > 0, 2 * np.abs(rates - mid_prices) / mid_prices, 0.0)
+        quoted_spread = np.where(mid_prices > 0, spreads / mid_prices, 0.0)
+
+        # 12-14. Bid/ask depth (normalized by spread) and depth imbalance
+        bid_depth = np.where(spreads > 0, bids / spreads, 0.0)
+        ask_depth = np.where(spreads > 0, asks / spreads, 0.0)
+        total_depth = bid_depth + ask_depth
+        depth_imbalance = np.where(total_depth > 0, (bid_depth - ask_depth) / total_depth, 0.0)
+
+        # 20. Order flow toxicity (adverse selection proxy): last-5 vs 60min
+        # volatility ratio times spread ratio, once the window exceeds 5 rows
+        recent_vol = mid_windows.std(5, min_periods=1, fill=0.0)
+        recent_spread = spread_windows.mean(5, min_periods=1, fill=0.0)
+        toxic = (np.arange(n) >= 5) & (mid_volatility > 0) & (spread_mean > 0)
+        order_flow_toxicity = np.where(
+            toxic, (recent_vol / mid_volatility) * (recent_spread / spread_mean), 0.0
+        )
+
+    # 18-19. Tick direction and tick rule (bid/ask imbalance breaks ties)
+    price_change = np.zeros(n)
+    price_change[1:] = np.diff(mid_prices)
+    tick_direction = np.sign(price_change).astype(int)
+    tick_rule = np.where(price_change != 0, tick_direction, np.where(bid_ask_imbalance > 0, 1, -1))
+    if n:
+        tick_rule[0] = 0
+
+    return {
+        'spread_mean_60min': spread_mean,
+        'spread_volatility_60min': spread_volatility,
+        'spread_pct_of_rate': spread_pct_of_rate,
+        'spread_trend_slope': spread_slope,
+        # 5. Spread spike
+        'spread_spike': ((spreads > 2 * spread_mean) & (spread_mean > 0)).astype(int),
+        'bid_ask_imbalance': bid_ask_imbalance,
+        'effective_spread': effective_spread,
+        'quoted_spread': quoted_spread,
+        # 9-10. Realized spread / price impact: simplified to half the effective spread
+        'realized_spread': effective_spread * 0.5,
+        'price_impact': effective_spread * 0.5,
+        # 11. Roll cost (half spread)
+        'roll_cost': spreads / 2,
+        'bid_depth': bid_depth,
+        'ask_depth': ask_depth,
+        'depth_imbalance': depth_imbalance,
+        'spread_range_60min': spread_range,
+        'spread_percentile_60min': spread_percentile,
+        'mid_price_volatility': mid_volatility,
+        'tick_direction': tick_direction,
+        'tick_rule': tick_rule.astype(int),
+        'order_flow_toxicity': order_flow_toxicity,
+    }
+
+
+def compute_volume_features(volumes, rates):
+    """
+    Compute 10 volume features over 15/30/60-row trailing windows
+
+    Rows are windowed as values[max(0, i-W+1) : i+1], so the first rows
+    use the shorter windows available (as the former per-row loop did).
+
+    Args:
+        volumes: Volume per row, NULLs as 0 (or its RollingCache)
+        rates: Rate per row, for percentage returns
+
+    Returns:
+        dict: Volume feature arrays
+    """
+    v = RollingCache.of(volumes)
+    x = v.values
+    rates = np.asarray(rates, dtype=np.float64)
+
+    # Percentage returns (0 for the first row)
+    returns = np.zeros(len(x))
+    returns[1:] = np.diff(rates) / rates[:-1]
+
+    mean_15 = v.mean(15)
+    mean_30 = v.mean(30)
+    mean_60 = v.mean(60)
+    sum_60 = v.apply(window_sum, 60)
+    weighted_60 = RollingCache(returns * x).apply(window_sum, 60)
+    low_60 = v.apply(window_min, 60)
+    high_60 = v.apply(window_max, 60)
+    correlation = rolling_corr(x, np.abs(returns), 60, min_periods=10, fill=0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            # 1-3. Current volume over the window mean
+            'w15_volume_ratio': np.where(mean_15 > 0, x / mean_15, 1.0),
+            'w30_volume_ratio': np.where(mean_30 > 0, x / mean_30, 1.0),
+            'w60_volume_ratio': np.where(mean_60 > 0, x / mean_60, 1.0),
+            # 4. Volume spike (binary: 1 if > 2× mean_w60)
+            'volume_spike': (x > 2 * mean_60).astype(int),
+            # 5. Linear regression slope over w60 (once 10 rows are available)
+            'volume_trend_slope': v.apply(window_slope, 60, min_periods=10, fill=0.0),
+            # 6. Volume over w60 (stored as an integer)
+            'cumulative_volume_60min': sum_60.astype(np.int64),
+            # 7. Volume-weighted return
+            'volume_weighted_return': np.where(sum_60 > 0, weighted_60 / sum_60, 0.0),
+            # 8. Correlation of volume and absolute returns (0 when undefined)
+            'volume_price_correlation_60min': np.nan_to_num(correlation, nan=0.0),
+            # 9. Position within the w60 range (0.5 when flat)
+            'relative_volume_position': np.where(high_60 > low_60, (x - low_60) / (high_60 - low_60), 0.5),
+            # 10. Volume volatility (population std over w60)
+            'volume_volatility_60min': v.std(60, min_periods=2, fill=0.0),
+        }
+
+
+def compute_fibonacci_features(df, lookback=240):
+    """
+    Compute Fibonacci features based on recent swing high/low
+
+    Args:
+        df: DataFrame with columns [time, high, low, close]
+        lookback: Rolling window for swing point identification (default 240 = 4 hours)
+
+    Returns:
+        DataFrame with 12 Fibonacci feature columns
+    """
+    high = df['high']
+    low = df['low']
+    close = df['close']
+
+    # Find rolling swing high and low
+    swing_high = high.rolling(window=lookback, center=False).max()
+    swing_low = low.rolling(window=lookback, center=False).min()
+
+    # Fibonacci range
+    fib_range = swing_high - swing_low
+
+    # Fibonacci Retracements (from swing high DOWN)
+    fib_236 = swing_high - (fib_range * 0.236)
+    fib_382 = swing_high - (fib_range * 0.382)
+    fib_500 = swing_high - (fib_range * 0.500)
+    fib_618 = swing_high - (fib_range * 0.618)
+    fib_786 = swing_high - (fib_range * 0.786)
+
+    # Fibonacci Extensions (from swing high UP)
+    fib_ext_1618 = swing_high + (fib_range * 0.618)
+    fib_ext_2618 = swing_high + (fib_range * 1.618)
+    fib_ext_4236 = swing_high + (fib_range * 2.618)
+
+    # Fibonacci Fan Levels (angled support/resistance)
+    # Simplified: use time-based slope from swing low to current
+    time_elapsed = pd.Series(range(len(df)), index=df.index)
+    slope_38 = (fib_382 - swing_low) / (time_elapsed - time_elapsed.shift(lookback)).replace(0, 1)
+    slope_50 = (fib_500 - swing_low) / (time_elapsed - time_elapsed.shift(lookback)).replace(0, 1)
+    slope_62 = (fib_618 - swing_low) / (time_elapsed - time_elapsed.shift(lookback)).replace(0, 1)
+
+    fib_fan_upper = swing_low + (slope_38 * (time_elapsed - time_elapsed.shift(lookback)))
+    fib_fan_middle = swing_low + (slope_50 * (time_elapsed - time_elapsed.shift(lookback)))
+    fib_fan_lower = swing_low + (slope_62 * (time_elapsed - time_elapsed.shift(lookback)))
+
+    # Fibonacci Arc Radius (distance from swing low to current price)
+    fib_arc_radius = np.sqrt((close - swing_low)**2 + (time_elapsed - time_elapsed.shift(lookback))**2)
+
+    # Create output DataFrame
+    fib_features = pd.DataFrame({
+        'fib_retracement_236': fib_236,
+        'fib_retracement_382': fib_382,
+        'fib_retracement_500': fib_500,
+        'fib_retracement_618': fib_618,
+        'fib_retracement_786': fib_786,
+        'fib_extension_1618': fib_ext_1618,
+        'fib_extension_2618': fib_ext_2618,
+        'fib_extension_4236': fib_ext_4236,
+        'fib_fan_upper': fib_fan_upper,
+        'fib_fan_middle': fib_fan_middle,
+        'fib_fan_lower': fib_fan_lower,
+        'fib_arc_radius': fib_arc_radius
+    }, index=df.index)
+
+    return fib_features
+
+
+def compute_parabola_columns(y, window_size):
+    """
+    Fit parabola y = a2*x^2 + a1*x + b over every trailing window and calculate metrics.
+
+    x is the window position normalized to zero mean / unit std, as in the
+    original per-row np.polyfit implementation. Rows without a full window are NaN.
+
+    Returns:
+        dict: All 15 metrics for this window as numpy columns
+    """
+    fit = rolling_quadratic_fit(np.asarray(y, dtype=np.float64), window_size)
+
+    # Re-express the raw-x coefficients in the normalized x used for storage
+    x = np.arange(window_size)
+    x_mean = x.mean()
+    x_scale = x.std() + 1e-10
+    a2 = fit['a'] * x_scale ** 2
+    a1 = (2 * fit['a'] * x_mean + fit['b']) * x_scale
+    b = fit['a'] * x_mean ** 2 + fit['b'] * x_mean + fit['c']
+
+    # R² and RMSE
+    r2 = 1 - (fit['ss_res'] / (fit['ss_tot'] + 1e-10))
+    rmse = np.sqrt(fit['ss_res'] / window_size)
+
+    # Residuals (least squares with intercept: mean residual is zero)
+    residual_mean = np.where(np.isnan(rmse), np.nan, 0.0)
+    residual_std = rmse
+
+    # Prediction intervals (95%)
+    prediction = fit['prediction']
+    pred_interval_lower = prediction - 1.96 * residual_std
+    pred_interval_upper = prediction + 1.96 * residual_std
+
+    # Parabola properties
+    vertex_x = -a1 / (2 * a2 + 1e-10)
+    vertex_y = a2 * vertex_x**2 + a1 * vertex_x + b
+
+    # Curvature (how bent is the parabola)
+    curvature = np.abs(a2)
+
+    # Fit quality (normalized R²)
+    fit_quality = np.clip(r2, 0, 1)
+
+    # Extrapolation error (prediction uncertainty)
+    extrapolation_error = np.abs(residual_std / (np.abs(prediction) + 1e-10))
+
+    return {
+        'a2': a2,
+        'a1': a1,
+        'b': b,
+        'r2': r2,
+        'rmse': rmse,
+        'residual_mean': residual_mean,
+        'residual_std': residual_std,
+        'pred_interval_lower': pred_interval_lower,
+        'pred_interval_upper': pred_interval_upper,
+        'prediction': prediction,
+        'vertex_x': vertex_x,
+        'vertex_y': vertex_y,
+        'curvature': curvature,
+        'fit_quality': fit_quality,
+        'extrapolation_error': extrapolation_error
+    }
+
+
+# ----------------------------------------------------------------------
+# Family adapters: FamilyInput -> output columns
+# ----------------------------------------------------------------------
+
+def _statistics(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    # NULL rate_index rows count as 100.0 (index base), as in the worker
+    return compute_statistics_features(inputs.rolling('m1.rate_index', nan=100.0))
+
+
+def _bollinger(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    return compute_bollinger_features(inputs.rolling('m1.rate_index', nan=100.0))
+
+
+def _time(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    return compute_time_features(inputs.times)
+
+
+def _spread(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    bids = np.nan_to_num(inputs.values('m1.bid_close'), nan=0.0)
+    asks = np.nan_to_num(inputs.values('m1.ask_close'), nan=0.0)
+    spreads = np.nan_to_num(inputs.values('m1.spread_close'), nan=0.0)
+    rates = np.nan_to_num(inputs.values('m1.rate'), nan=1.0)
+    return compute_spread_features(inputs.times, bids, asks, spreads, rates)
+
+
+def _volume(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    volumes = np.nan_to_num(inputs.values('m1.volume'), nan=0.0)
+    return compute_volume_features(volumes, inputs.values('m1.rate'))
+
+
+def _fibonacci(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    df = pd.DataFrame({
+        'high': inputs.values('m1.high'),
+        'low': inputs.values('m1.low'),
+        'close': inputs.values('m1.close')
+    })
+    return {name: values.to_numpy() for name, values in compute_fibonacci_features(df, lookback=240).items()}
+
+
+def _technical(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    return rate_indicators(*(inputs.values(f'm1.{c}') for c in ('open', 'high', 'low', 'close', 'volume')))
+
+
+def _regime(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    bqx_value = np.nan_to_num(inputs.values('m1.bqx'), nan=0.0)
+    return compute_regime_features(inputs.values('m1.rate_index'), bqx_value, first_row=inputs.first)
+
+
+def _regression(inputs: FamilyInput) -> Dict[str, np.ndarray]:
+    columns = {}
+    for window_name, window_size in REGRESSION_WINDOWS.items():
+        for domain, source in [('idx', 'm1.rate_index'), ('bqx', 'bqx.w15_bqx_return')]:
+            for metric, values in compute_parabola_columns(inputs.values(source), window_size).items():
+                columns[f"{metric}_{domain}_{window_name}"] = values
+    return columns
+
+
+
+# ----------------------------------------------------------------------
+# Registry
+# ----------------------------------------------------------------------
+
+GRAPH = FeatureGraph()
+
+GRAPH.register(Family(
+    'statistics', ('m1.rate_index',), _statistics,
+    outputs=(Output('bqx.statistics_features_{pair}', tuple(STATISTICS_COLUMNS)),),
+    windows=(60,), lookback=60, min_rows=60, context=60
+))
+GRAPH.register(Family(
+    'bollinger', ('m1.rate_index',), _bollinger,
+    outputs=(Output('bqx.bollinger_features_{pair}', tuple(BOLLINGER_COLUMNS)),),
+    windows=(20,), lookback=60, min_rows=60, context=20
+))
+GRAPH.register(Family(
+    'fibonacci', ('m1.high', 'm1.low', 'm1.close'), _fibonacci,
+    outputs=(Output('bqx.fibonacci_features_{pair}_{year}_{month:02d}', tuple(FIBONACCI_COLUMNS), 'ignore'),),
+    windows=(240,), min_rows=240, dropna=True, context=240
+))
+GRAPH.register(Family(
+    'volume', ('m1.volume', 'm1.rate'), _volume,
+    outputs=(Output('bqx.volume_features_{pair}', tuple(VOLUME_COLUMNS)),),
+    windows=(15, 30, 60), lookback=60, min_rows=60, context=60
+))
+GRAPH.register(Family(
+    'time', ('m1.ts_utc',), _time,
+    outputs=(Output('bqx.time_features_{pair}', tuple(TIME_COLUMNS)),),
+    lookback=60, min_rows=60, context=0
+))
+GRAPH.register(Family(
+    'spread', ('m1.bid_close', 'm1.ask_close', 'm1.spread_close', 'm1.rate'), _spread,
+    outputs=(Output('bqx.spread_features_{pair}', tuple(SPREAD_COLUMNS)),),
+    windows=(5, 60), lookback=60, min_rows=60, context=60
+))
+GRAPH.register(Family(
+    'technical', ('m1.open', 'm1.high', 'm1.low', 'm1.close', 'm1.volume'), _technical,
+    outputs=(Output('bqx.technical_features_{pair}_{year}_{month:02d}', tuple(RATE_INDICATOR_COLUMNS), 'ignore'),),
+    windows=(10, 14, 20, 26, 50, 100, 200), min_rows=300, dropna=True
+))
+# Stage 2.9 has no output schema yet: computed (e.g. for dependants), not written
+GRAPH.register(Family(
+    'regime', ('m1.rate_index', 'm1.bqx'), _regime,
+    windows=(60, 240, LOOKBACK_WINDOW), lookback=LOOKBACK_WINDOW, context=LOOKBACK_WINDOW
+))
+GRAPH.register(Family(
+    'regression', ('m1.rate_index', 'bqx.w15_bqx_return'), _regression,
+    outputs=(
+        Output('bqx.reg_rate_{pair}_{year}_{month:02d}', tuple(regression_columns('idx')), 'replace'),
+        Output('bqx.reg_bqx_{pair}_{year}_{month:02d}', tuple(regression_columns('bqx')), 'replace'),
+    ),
+    windows=tuple(REGRESSION_WINDOWS.values())
+))
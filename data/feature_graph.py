@@ -0,0 +1,588 @@
+"""
+Feature Graph Executor
+Columnar rolling-feature families computed from one read per partition
+
+Each Track 1/Track 2 worker fetched its own inputs, windowed them and
+wrote its own tables in its own pool, so the same M1 rate_index or
+w15_bqx_return series was read and windowed many times per partition.
+Here every feature family registers its inputs, windows, lookback and
+output tables, and the executor, for each (pair, month) partition:
+- reads each source table (M1, BQX) once, with the union of the selected
+  families' columns, from the longest lookback any of them needs
+- hands each family its rows (the month plus its own lookback) and one
+  RollingCache per series, shared by all families that see the same rows
+- runs families in dependency order; a family may take another family's
+  output columns as inputs ('family.column')
+- bulk-writes each family's output tables through data.writer
+
+Incremental mode keeps the tables current as M1/BQX rows arrive. The
+last processed ts_utc of every output table is recorded per pair and
+month in bqx.feature_watermarks, and a family with a bounded `context`
+(rows before a row that fully determine its outputs) reads only the
+rows after its watermark plus that context, computes the new tail and
+appends it. The values match a full rebuild exactly. Families whose
+outputs depend on the whole month (context=None) are recomputed over
+the month.
+
+Partitions are scheduled across processes by run_partitions.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from graphlib import TopologicalSorter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data.rolling_stats import RollingCache
+from data.writer import write_columns
+
+
+# Source tables by input prefix: (table template, time column)
+SOURCES = {
+    'm1': ('bqx.m1_{pair}', 'time'),
+    'bqx': ('bqx.bqx_{pair}', 'ts_utc'),
+}
+
+SOURCE_QUERY = """
+    SELECT {time_column} AS ts_utc{columns}
+    FROM {table}
+    WHERE {time_column} >= %s AND {time_column} < %s
+    ORDER BY {time_column}
+"""
+
+# Input naming a source's rows without reading a value column
+ROWS = 'ts_utc'
+
+# Last processed row of each output table, per pair and month
+WATERMARK_TABLE = 'bqx.feature_watermarks'
+
+WATERMARK_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+        pair TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        month DATE NOT NULL,
+        ts_utc TIMESTAMPTZ NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (pair, table_name, month)
+    )
+"""
+
+# context-th row before a timestamp: where a family's incremental rows start
+CONTEXT_QUERY = """
+    SELECT {time_column}
+    FROM {table}
+    WHERE {time_column} >= %s AND {time_column} < %s
+    ORDER BY {time_column} DESC
+    LIMIT 1 OFFSET %s
+"""
+
+
+class Output(NamedTuple):
+    """A table written by a family"""
+    table: str                  # template formatted with pair, year, month
+    columns: Tuple[str, ...]
+    mode: str = 'upsert'        # write_columns mode, or 'replace' (DELETE, then insert)
+
+
+class Family(NamedTuple):
+    """A group of features computed together from the same inputs"""
+    name: str
+    inputs: Tuple[str, ...]     # 'source.column', 'source.ts_utc' or 'family.column'
+    compute: Callable[['FamilyInput'], Dict[str, np.ndarray]]
+    outputs: Tuple[Output, ...] = ()
+    windows: Tuple[int, ...] = ()
+    lookback: int = 0           # minutes of history before the month
+    min_rows: int = 0           # fewer rows (history included) -> skipped
+    dropna: bool = False        # drop month rows with any missing output
+    context: Optional[int] = None   # rows before a row that determine its outputs;
+                                    # None: outputs depend on the whole month
+
+    @property
+    def sources(self) -> Tuple[str, ...]:
+        """Source tables the family's rows come from"""
+        return tuple(sorted({name.split('.')[0] for name in self.inputs if name.split('.')[0] in SOURCES}))
+
+    @property
+    def depends(self) -> Tuple[str, ...]:
+        """Families whose outputs are inputs of this one"""
+        return tuple(sorted({name.split('.')[0] for name in self.inputs if name.split('.')[0] not in SOURCES}))
+
+
+class FamilyInput:
+    """A family's rows: its input values and the shared rolling caches"""
+
+    def __init__(self, frame: pd.DataFrame, first: int, caches: Dict[tuple, RollingCache]):
+        """
+        Args:
+            frame: Input columns indexed by UTC ts_utc (history included)
+            first: Row of the first timestamp inside the month
+            caches: RollingCache per input, shared by families with these rows
+        """
+        self.frame = frame
+        self.first = first
+        self._caches = caches
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def times(self) -> pd.DatetimeIndex:
+        """Row timestamps (UTC)"""
+        return self.frame.index
+
+    def values(self, name: str) -> np.ndarray:
+        """One input as a float64 array (NULLs as NaN)"""
+        return self.frame[name].to_numpy(dtype=np.float64)
+
+    def rolling(self, name: str, nan: Optional[float] = None) -> RollingCache:
+        """
+        Shared RollingCache of one input
+
+        Args:
+            name: Input name
+            nan: Optional replacement for missing values
+        """
+        key = (name, nan)
+        if key not in self._caches:
+            values = self.values(name)
+            self._caches[key] = RollingCache(values if nan is None else np.nan_to_num(values, nan=nan))
+        return self._caches[key]
+
+
+class Partition:
+    """One pair-month: source rows read once and the families' results"""
+
+    def __init__(self, pair: str, year: int, month: int, sources: Dict[str, pd.DataFrame]):
+        """
+        Args:
+            pair: Currency pair
+            year, month: Month of the partition
+            sources: Source name -> frame indexed by UTC ts_utc with
+                'source.column' columns (history included)
+        """
+        self.pair = pair
+        self.year = year
+        self.month = month
+        self.start = pd.Timestamp(year=year, month=month, day=1, tz='UTC')
+        self.end = self.start + pd.offsets.MonthBegin(1)
+        self.sources = sources
+        self.results: Dict[str, pd.DataFrame] = {}
+        self.processed: Dict[str, pd.Timestamp] = {}
+
+        # Incremental runs (FeatureGraph.resume): per family, the first
+        # row to compute, the first row to write and the first row read
+        self.since: Dict[str, pd.Timestamp] = {}
+        self.write_since: Dict[str, pd.Timestamp] = {}
+        self.starts: Dict[str, pd.Timestamp] = {}
+        self._rows: Dict[tuple, Tuple[pd.DataFrame, Dict[tuple, RollingCache]]] = {}
+
+    def family_start(self, family: Family) -> pd.Timestamp:
+        """First row of a family's frame (`lookback` minutes before the month)"""
+        full = self.start - pd.Timedelta(minutes=family.lookback)
+        return max(full, self.starts.get(family.name, full))
+
+    def family_input(self, family: Family) -> FamilyInput:
+        """
+        The rows of a family: its sources joined on ts_utc (inner), from
+        family_start. Families with the same sources and first row share
+        the frame and its rolling caches.
+        """
+        start = self.family_start(family)
+        key = (family.sources, start)
+        if key not in self._rows:
+            frames = [self.sources[name] for name in family.sources]
+            frame = frames[0].join(frames[1:], how='inner') if len(frames) > 1 else frames[0]
+            frame = frame[frame.index >= start]
+            self._rows[key] = (frame, {})
+        frame, caches = self._rows[key]
+
+        columns = {}
+        for name in family.inputs:
+            prefix, column = name.split('.', 1)
+            if prefix in SOURCES:
+                if column != ROWS:
+                    columns[name] = frame[name]
+            else:
+                columns[name] = self.results[prefix][column].reindex(frame.index)
+        inputs = pd.DataFrame(columns, index=frame.index)
+
+        first = int(np.searchsorted(frame.index, max(self.start, self.since.get(family.name, self.start))))
+        return FamilyInput(inputs, first, caches)
+
+
+class FeatureGraph:
+    """Registry of feature families and their partition executor"""
+
+    def __init__(self):
+        self.families: Dict[str, Family] = {}
+
+    def register(self, family: Family) -> Family:
+        """Add a family (names are unique)"""
+        if family.name in self.families:
+            raise ValueError(f"Feature family '{family.name}' is already registered")
+        if not family.sources:
+            raise ValueError(f"Feature family '{family.name}' reads no source table")
+        self.families[family.name] = family
+        return family
+
+    def select(self, names: Optional[Iterable[str]] = None) -> List[Family]:
+        """
+        Families to run, dependencies included, in dependency order
+
+        Args:
+            names: Family names (default: all registered)
+
+        Returns:
+            list of Family
+        """
+        wanted = list(self.families) if names is None else list(names)
+        unknown = [name for name in wanted if name not in self.families]
+        if unknown:
+            raise ValueError(f"Unknown feature families {unknown} (registered: {list(self.families)})")
+
+        graph = {}
+        pending = list(wanted)
+        while pending:
+            name = pending.pop()
+            if name in graph:
+                continue
+            graph[name] = self.families[name].depends
+            missing = [dep for dep in graph[name] if dep not in self.families]
+            if missing:
+                raise ValueError(f"Feature family '{name}' depends on unregistered {missing}")
+            pending.extend(graph[name])
+
+        # Registration order among families that are ready together
+        order = {name: k for k, name in enumerate(self.families)}
+        sorter = TopologicalSorter(graph)
+        sorter.prepare()
+        selected = []
+        while sorter.is_active():
+            ready = sorted(sorter.get_ready(), key=order.get)
+            selected.extend(self.families[name] for name in ready)
+            sorter.done(*ready)
+        return selected
+
+    # ------------------------------------------------------------------
+    # Partition execution
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def source_columns(families: Sequence[Family]) -> Dict[str, Tuple[List[str], int]]:
+        """Source -> (value columns, longest lookback in minutes) of the families"""
+        needed = {}
+        for family in families:
+            for name in family.inputs:
+                prefix, column = name.split('.', 1)
+                if prefix not in SOURCES:
+                    continue
+                columns, lookback = needed.get(prefix, ([], 0))
+                if column != ROWS and column not in columns:
+                    columns.append(column)
+                needed[prefix] = (columns, max(lookback, family.lookback))
+        return needed
+
+    def load(self, conn, pair: str, year: int, month: int, families: Sequence[Family],
+             incremental: bool = False) -> Partition:
+        """
+        Read each source of the families once for a pair-month
+
+        Args:
+            conn: psycopg2 connection
+            pair: Currency pair
+            year, month: Partition month
+            families: Families to load inputs for
+            incremental: Read only what the rows after the watermarks need
+
+        Returns:
+            Partition
+        """
+        from data.db import read_frame
+
+        partition = Partition(pair, year, month, {})
+        if incremental:
+            self.resume(conn, partition, families)
+
+        for source, (columns, _) in self.source_columns(families).items():
+            table, time_column = SOURCES[source]
+            query = SOURCE_QUERY.format(
+                time_column=time_column,
+                columns=''.join(f", {column}" for column in columns),
+                table=table.format(pair=pair)
+            )
+            start = min(partition.family_start(family) for family in families if source in family.sources)
+            frame = read_frame(conn, query, (_naive(start), _naive(partition.end)))
+
+            index = pd.DatetimeIndex(pd.to_datetime(frame['ts_utc'], utc=True), name='ts_utc')
+            partition.sources[source] = pd.DataFrame(
+                {f"{source}.{column}": pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+                 for column in columns},
+                index=index
+            )
+        return partition
+
+    # ------------------------------------------------------------------
+    # Watermarks
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def output_tables(partition: Partition, family: Family) -> List[str]:
+        """The family's output tables for a partition"""
+        return [output.table.format(pair=partition.pair, year=partition.year, month=partition.month)
+                for output in family.outputs]
+
+    def watermarks(self, conn, partition: Partition, families: Sequence[Family]) -> Dict[str, pd.Timestamp]:
+        """
+        Last processed ts_utc of each family in a partition
+
+        Returns:
+            Family name -> earliest watermark of its output tables
+            (families with an unrecorded table are left out)
+        """
+        tables = {family.name: self.output_tables(partition, family) for family in families}
+        with conn.cursor() as cur:
+            cur.execute(WATERMARK_DDL)
+            cur.execute(
+                f"SELECT table_name, ts_utc FROM {WATERMARK_TABLE} "
+                "WHERE pair = %s AND month = %s AND table_name = ANY(%s)",
+                (partition.pair, partition.start.date(), [t for names in tables.values() for t in names])
+            )
+            marks = {table: _utc(ts) for table, ts in cur.fetchall()}
+
+        return {name: min(marks[t] for t in names)
+                for name, names in tables.items() if names and all(t in marks for t in names)}
+
+    def resume(self, conn, partition: Partition, families: Sequence[Family]):
+        """
+        Plan an incremental run of a partition from its watermarks
+
+        A family with a bounded context and a watermark computes and writes
+        only the rows after it, from `context` rows before the first of
+        them; families without outputs compute only what their dependants
+        read. Everything else is recomputed over the month.
+        """
+        marks = self.watermarks(conn, partition, families)
+
+        for family in reversed(families):
+            if not family.outputs:
+                since = partition.end
+            elif family.context is not None and family.name in marks:
+                since = _after(marks[family.name])
+            else:
+                since = partition.start
+            partition.write_since[family.name] = since
+
+            # Dependants read this family's outputs over their own rows
+            for dependant in families:
+                if family.name in dependant.depends:
+                    since = min(since, partition.family_start(dependant))
+            if since <= partition.start:
+                continue
+
+            partition.since[family.name] = since
+            if since < partition.end:
+                partition.starts[family.name] = self._context_start(conn, partition, family, since)
+            else:
+                partition.starts[family.name] = partition.end
+
+    def _context_start(self, conn, partition: Partition, family: Family, since: pd.Timestamp) -> pd.Timestamp:
+        """First row of the `context` rows before `since` (rows of joined sources are not counted)"""
+        full = partition.start - pd.Timedelta(minutes=family.lookback)
+        if family.context is None or len(family.sources) > 1:
+            return full
+        if family.context == 0:
+            return since
+
+        table, time_column = SOURCES[family.sources[0]]
+        with conn.cursor() as cur:
+            cur.execute(CONTEXT_QUERY.format(time_column=time_column, table=table.format(pair=partition.pair)),
+                        (_naive(full), _naive(since), family.context - 1))
+            row = cur.fetchone()
+        return full if row is None else _utc(row[0])
+
+    def record(self, conn, partition: Partition, families: Sequence[Family]):
+        """Advance the watermarks of the families' output tables (the caller commits)"""
+        rows = [(partition.pair, table, partition.start.date(), partition.processed[family.name].to_pydatetime())
+                for family in families if family.name in partition.processed
+                for table in self.output_tables(partition, family)]
+        if not rows:
+            return
+        with conn.cursor() as cur:
+            cur.execute(WATERMARK_DDL)
+            cur.executemany(
+                f"""
+                INSERT INTO {WATERMARK_TABLE} (pair, table_name, month, ts_utc) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (pair, table_name, month) DO UPDATE SET
+                    ts_utc = GREATEST({WATERMARK_TABLE}.ts_utc, EXCLUDED.ts_utc),
+                    updated_at = now()
+                """,
+                rows
+            )
+
+    # ------------------------------------------------------------------
+    # Compute / write
+    # ------------------------------------------------------------------
+
+    def compute(self, partition: Partition, families: Sequence[Family]) -> Dict[str, pd.DataFrame]:
+        """
+        Run families (in the given, dependency-respecting order)
+
+        Returns:
+            Family name -> output frame over the month's rows, indexed by
+            ts_utc (empty when the family had fewer than min_rows rows);
+            in incremental runs only the rows after the watermark
+        """
+        for family in families:
+            inputs = partition.family_input(family)
+            resumed = family.name in partition.since
+            if inputs.first >= len(inputs) or (not resumed and len(inputs) < max(family.min_rows, 1)):
+                partition.results[family.name] = pd.DataFrame(index=inputs.times[:0])
+                continue
+
+            columns = family.compute(inputs)
+            result = pd.DataFrame(columns, index=inputs.times).iloc[inputs.first:]
+            result = result[result.index < partition.end]
+            if len(result):
+                partition.processed[family.name] = result.index[-1]
+            if family.dropna:
+                result = result.dropna()
+            partition.results[family.name] = result
+        return partition.results
+
+    def write(self, conn, partition: Partition, families: Sequence[Family]) -> Dict[str, int]:
+        """
+        Bulk-write the families' output tables (the caller commits)
+
+        Returns:
+            Family name -> rows written to its first output table
+        """
+        written = {}
+        for family in families:
+            result = partition.results[family.name]
+            since = partition.write_since.get(family.name)
+            if since is not None:
+                result = result[result.index >= since]
+            written[family.name] = 0
+            if result.empty:
+                continue
+            for k, (table, output) in enumerate(zip(self.output_tables(partition, family), family.outputs)):
+                columns = {'ts_utc': result.index, **{c: result[c].to_numpy() for c in output.columns}}
+                if output.mode == 'replace':
+                    with conn.cursor() as cur:
+                        if since is None or since <= partition.start:
+                            cur.execute(f"DELETE FROM {table}")
+                        else:
+                            cur.execute(f"DELETE FROM {table} WHERE ts_utc >= %s", (since.to_pydatetime(),))
+                    rows = write_columns(conn, table, columns, mode='insert')
+                else:
+                    rows = write_columns(conn, table, columns, mode=output.mode)
+                if k == 0:
+                    written[family.name] = rows
+        return written
+
+    def run_partition(self, conn, pair: str, year: int, month: int, names: Optional[Iterable[str]] = None,
+                      incremental: bool = False) -> Dict[str, Tuple[int, float]]:
+        """
+        Load, compute and write the selected families for one partition,
+        then advance their watermarks
+
+        Args:
+            incremental: Append the rows after the watermarks only
+
+        Returns:
+            Family name -> (rows, compute seconds)
+        """
+        families = self.select(names)
+        partition = self.load(conn, pair, year, month, families, incremental)
+
+        timings = {}
+        for family in families:
+            start_time = time.time()
+            self.compute(partition, [family])
+            timings[family.name] = time.time() - start_time
+
+        written = self.write(conn, partition, families)
+        self.record(conn, partition, families)
+        conn.commit()
+        return {name: (written[name], timings[name]) for name in written}
+
+
+# ----------------------------------------------------------------------
+# Scheduling
+# ----------------------------------------------------------------------
+
+def _utc(value) -> pd.Timestamp:
+    """A database timestamp (naive values are UTC) as a UTC Timestamp"""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+def _naive(ts: pd.Timestamp):
+    """A UTC Timestamp as the naive datetime the source queries compare with"""
+    return ts.tz_convert(None).to_pydatetime()
+
+
+def _after(ts: pd.Timestamp) -> pd.Timestamp:
+    """Smallest timestamp after a watermark (timestamps are stored in microseconds)"""
+    return ts + pd.Timedelta(1, 'us')
+
+
+def _run_task(graph: FeatureGraph, pair: str, year: int, month: int, names: Optional[List[str]],
+              incremental: bool = False):
+    """Process-pool task: one partition on a pooled connection"""
+    from data.db import connection
+
+    start_time = time.time()
+    try:
+        with connection() as conn:
+            families = graph.run_partition(conn, pair, year, month, names, incremental)
+        return (pair, year, month, True, families, time.time() - start_time, None)
+    except Exception as e:
+        return (pair, year, month, False, {}, time.time() - start_time, str(e))
+
+
+def run_partitions(
+    graph: FeatureGraph,
+    tasks: Sequence[Tuple[str, int, int]],
+    names: Optional[Iterable[str]] = None,
+    max_workers: int = 8,
+    on_result: Optional[Callable[[tuple], None]] = None,
+    incremental: bool = False
+) -> List[tuple]:
+    """
+    Run the selected families for many partitions across processes
+
+    Args:
+        graph: Registered families
+        tasks: (pair, year, month) partitions
+        names: Families to run (default: all); dependencies are included
+        max_workers: Worker processes
+        on_result: Optional callback per finished partition
+        incremental: Append the rows after each partition's watermarks
+
+    Returns:
+        list of (pair, year, month, success, {family: (rows, seconds)},
+        elapsed, error_msg) tuples in completion order
+    """
+    from data.db import connection
+
+    names = None if names is None else [family.name for family in graph.select(names)]
+
+    # Created once up front; concurrent CREATE TABLE IF NOT EXISTS can collide
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(WATERMARK_DDL)
+        conn.commit()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_task, graph, pair, year, month, names, incremental)
+                   for pair, year, month in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    return results
@@ -0,0 +1,338 @@
+"""
+Local Feature Store
+Read-through Arrow cache of Aurora feature tables, partitioned by pair and month
+
+Layout on disk:
+    {root}/{table}/{pair}/{YYYY_MM}.arrow     one file per month partition
+    {root}/{table}/{pair}/manifest.json       source row count, max ts_utc,
+                                              columns and fetch time per month
+
+Partitions are stored as uncompressed Arrow IPC files so they can be
+memory-mapped: reading a partition maps the file and hands its buffers to
+pandas/NumPy without copying or decoding. Float columns keep NaN as
+values (not Arrow nulls) so that conversion stays zero-copy.
+
+A month whose end was already in the past when it was fetched is treated
+as closed and served from disk indefinitely. The still-open current month
+is revalidated against the source (row count and max ts_utc) once its
+entry is older than the TTL. invalidate() drops partitions explicitly,
+e.g. after a backfill rewrites them.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+TIME_COLUMN = 'ts_utc'
+
+# fetch(pair, start, end) -> DataFrame with a ts_utc column
+FetchFn = Callable[[str, str, str], pd.DataFrame]
+# source_stats(pair, start, end) -> (row_count, max_ts_utc)
+StatsFn = Callable[[str, str, str], Tuple[int, Optional[pd.Timestamp]]]
+
+
+def month_partitions(start_date: str, end_date: str) -> List[Tuple[str, str, str]]:
+    """
+    Month partitions overlapping [start_date, end_date)
+
+    Args:
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD), exclusive
+
+    Returns:
+        List of (key 'YYYY_MM', month_start, next_month_start) tuples
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+    partitions = []
+
+    month = start.to_period('M').to_timestamp()
+    while month < end:
+        next_month = month + pd.offsets.MonthBegin(1)
+        partitions.append((
+            month.strftime('%Y_%m'),
+            month.strftime('%Y-%m-%d'),
+            next_month.strftime('%Y-%m-%d')
+        ))
+        month = next_month
+
+    return partitions
+
+
+def frame_to_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert a DataFrame to an Arrow table, keeping NaN as float values
+
+    pa.Table.from_pandas would turn NaN into nulls, which forces a copy
+    (null -> NaN fill) on every read.
+    """
+    arrays = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype.kind in 'fiub':
+            arrays[col] = pa.array(values.to_numpy())
+        else:
+            arrays[col] = pa.Array.from_pandas(values)
+    return pa.table(arrays)
+
+
+class FeatureStore:
+    """Read-through Arrow cache for per-pair feature tables"""
+
+    def __init__(
+        self,
+        root: str = "cache/feature_store",
+        ttl: Optional[float] = 3600,
+        memory_map: bool = True
+    ):
+        """
+        Initialize feature store
+
+        Args:
+            root: Cache directory
+            ttl: Seconds before an open (current-month) partition is
+                revalidated against the source; None never revalidates
+            memory_map: Memory-map partition files on read
+        """
+        self.root = Path(root)
+        self.ttl = ttl
+        self.memory_map = memory_map
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+
+    def _pair_dir(self, table: str, pair: str) -> Path:
+        return self.root / table / pair
+
+    def _partition_path(self, table: str, pair: str, key: str) -> Path:
+        return self._pair_dir(table, pair) / f"{key}.arrow"
+
+    def manifest(self, table: str, pair: str) -> Dict[str, dict]:
+        """Manifest entries (month key -> metadata) for one table/pair"""
+        path = self._pair_dir(table, pair) / "manifest.json"
+        if not path.exists():
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self, table: str, pair: str, manifest: Dict[str, dict]):
+        path = self._pair_dir(table, pair) / "manifest.json"
+        tmp = path.with_suffix(f".json.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    # Partition I/O
+    # ------------------------------------------------------------------
+
+    def write_partition(
+        self,
+        table: str,
+        pair: str,
+        key: str,
+        df: pd.DataFrame,
+        month_end: str
+    ) -> dict:
+        """
+        Write one month partition and record it in the manifest
+
+        Args:
+            table: Feature table name (e.g. 'bqx', 'reg')
+            pair: Forex pair
+            key: Month key 'YYYY_MM'
+            df: Partition rows (must contain ts_utc)
+            month_end: First day of the following month (YYYY-MM-DD)
+
+        Returns:
+            Manifest entry for the partition
+        """
+        pair_dir = self._pair_dir(table, pair)
+        pair_dir.mkdir(parents=True, exist_ok=True)
+
+        arrow_table = frame_to_table(df)
+        path = self._partition_path(table, pair, key)
+        tmp = path.with_suffix(f".arrow.{os.getpid()}.tmp")
+        with pa.OSFile(str(tmp), 'wb') as sink:
+            with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        os.replace(tmp, path)
+
+        max_ts = df[TIME_COLUMN].max() if len(df) else None
+        now = time.time()
+        entry = {
+            'rows': int(len(df)),
+            'max_ts_utc': None if max_ts is None or pd.isna(max_ts) else pd.Timestamp(max_ts).isoformat(),
+            'columns': list(df.columns),
+            'fetched_at': now,
+            'verified_at': now,
+            'closed': pd.Timestamp(month_end) <= pd.Timestamp(now, unit='s')
+        }
+
+        manifest = self.manifest(table, pair)
+        manifest[key] = entry
+        self._write_manifest(table, pair, manifest)
+        return entry
+
+    def read_partition(
+        self,
+        table: str,
+        pair: str,
+        key: str,
+        columns: Optional[Sequence[str]] = None
+    ) -> pa.Table:
+        """
+        Read one cached partition as an Arrow table backed by the file
+
+        Args:
+            table: Feature table name
+            pair: Forex pair
+            key: Month key 'YYYY_MM'
+            columns: Optional column projection (ts_utc is always included)
+
+        Returns:
+            pyarrow.Table
+        """
+        path = str(self._partition_path(table, pair, key))
+        source = pa.memory_map(path, 'r') if self.memory_map else pa.OSFile(path, 'rb')
+        arrow_table = pa.ipc.open_file(source).read_all()
+
+        if columns is not None:
+            wanted = [TIME_COLUMN] + [c for c in columns if c != TIME_COLUMN]
+            arrow_table = arrow_table.select(wanted)
+
+        return arrow_table
+
+    def invalidate(self, table: str, pair: str, keys: Optional[Sequence[str]] = None):
+        """
+        Drop cached partitions so the next load refetches them
+
+        Args:
+            table: Feature table name
+            pair: Forex pair
+            keys: Month keys to drop (default: all months for the pair)
+        """
+        manifest = self.manifest(table, pair)
+        for key in list(manifest if keys is None else keys):
+            manifest.pop(key, None)
+            path = self._partition_path(table, pair, key)
+            if path.exists():
+                path.unlink()
+        if self._pair_dir(table, pair).exists():
+            self._write_manifest(table, pair, manifest)
+
+    # ------------------------------------------------------------------
+    # Read-through
+    # ------------------------------------------------------------------
+
+    def _is_fresh(
+        self,
+        table: str,
+        pair: str,
+        key: str,
+        entry: Optional[dict],
+        month_start: str,
+        month_end: str,
+        source_stats: Optional[StatsFn]
+    ) -> bool:
+        """Whether a manifest entry can be served without refetching"""
+        if entry is None or not self._partition_path(table, pair, key).exists():
+            return False
+        if entry.get('closed') or self.ttl is None:
+            return True
+        if time.time() - entry['verified_at'] < self.ttl:
+            return True
+        if source_stats is None:
+            return False
+
+        rows, max_ts = source_stats(pair, month_start, month_end)
+        max_ts = None if max_ts is None or pd.isna(max_ts) else pd.Timestamp(max_ts).isoformat()
+        if rows != entry['rows'] or max_ts != entry['max_ts_utc']:
+            return False
+
+        manifest = self.manifest(table, pair)
+        manifest[key]['verified_at'] = time.time()
+        self._write_manifest(table, pair, manifest)
+        return True
+
+    def load_table(
+        self,
+        table: str,
+        pair: str,
+        start_date: str,
+        end_date: str,
+        fetch: FetchFn,
+        columns: Optional[Sequence[str]] = None,
+        source_stats: Optional[StatsFn] = None
+    ) -> pa.Table:
+        """
+        Load [start_date, end_date) as an Arrow table, fetching missing or
+        stale month partitions through `fetch`
+
+        Args:
+            table: Feature table name (e.g. 'bqx', 'reg')
+            pair: Forex pair
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD), exclusive
+            fetch: Called as fetch(pair, month_start, month_end) on a miss;
+                must return every column with a ts_utc column
+            columns: Optional column projection
+            source_stats: Optional (row count, max ts_utc) probe used to
+                revalidate open partitions past their TTL
+
+        Returns:
+            pyarrow.Table sorted by ts_utc
+        """
+        manifest = self.manifest(table, pair)
+        pieces = []
+
+        for key, month_start, month_end in month_partitions(start_date, end_date):
+            entry = manifest.get(key)
+            if self._is_fresh(table, pair, key, entry, month_start, month_end, source_stats):
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.write_partition(table, pair, key, fetch(pair, month_start, month_end), month_end)
+
+            pieces.append(self.read_partition(table, pair, key, columns))
+
+        if not pieces:
+            raise ValueError(f"Empty date range: {start_date} to {end_date}")
+
+        # Months whose all-NULL columns were stored as null type unify here
+        arrow_table = pa.concat_tables(pieces, promote_options='default')
+
+        # Trim the first/last months to the requested range
+        ts = arrow_table.column(TIME_COLUMN).to_numpy()
+        lo, hi = np.searchsorted(ts, [np.datetime64(pd.Timestamp(start_date)), np.datetime64(pd.Timestamp(end_date))])
+        return arrow_table.slice(lo, hi - lo)
+
+    def load(
+        self,
+        table: str,
+        pair: str,
+        start_date: str,
+        end_date: str,
+        fetch: FetchFn,
+        columns: Optional[Sequence[str]] = None,
+        source_stats: Optional[StatsFn] = None
+    ) -> pd.DataFrame:
+        """
+        Same as load_table, returned as a DataFrame indexed by ts_utc
+
+        Single-partition reads are zero-copy views of the memory-mapped
+        file (read-only arrays); ranges spanning several months are
+        concatenated once.
+        """
+        arrow_table = self.load_table(table, pair, start_date, end_date, fetch, columns, source_stats)
+        df = arrow_table.to_pandas(split_blocks=True, zero_copy_only=False)
+        return df.set_index(TIME_COLUMN)
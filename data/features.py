@@ -1,15 +1,79 @@
 """
 BQX ML Feature Engineering
 Create autoregressive features from BQX and REG data
+
+The pipeline builds all features into one preallocated column-major
+matrix (FeatureMatrix) with a feature-name list; DataFrame views are
+created only on request via FeatureMatrix.to_frame().
 """
 
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import Iterable, Iterator, List, Dict, NamedTuple, Tuple, Optional
 import yaml
 from pathlib import Path
 
 
+# Target window columns (60-minute windows and aggregates) overlap the
+# target and are re-emitted lagged by 61+ minutes
+CAUSALITY_PATTERNS = ['w60_', 'agg_']
+CAUSALITY_LAG = 61
+
+
+class FeatureMatrix(NamedTuple):
+    """Engineered features as a 2-D array plus column names"""
+    values: np.ndarray          # (rows, features), column-major
+    names: List[str]
+    index: pd.Index             # ts_utc of each row
+    target: np.ndarray          # float64 target per row
+    target_name: str
+
+    def to_frame(self) -> Tuple[pd.DataFrame, pd.Series]:
+        """(features_df, target_series) views over the matrix (no copy)"""
+        features = pd.DataFrame(self.values, index=self.index, columns=self.names, copy=False)
+        target = pd.Series(self.target, index=self.index, name=self.target_name, copy=False)
+        return features, target
+
+    @staticmethod
+    def concat(parts: List['FeatureMatrix']) -> 'FeatureMatrix':
+        """Stack row chunks (e.g. from a stream) into one matrix"""
+        first = parts[0]
+        values = np.empty((sum(len(p.index) for p in parts), len(first.names)), dtype=first.values.dtype, order='F')
+        row = 0
+        for part in parts:
+            values[row:row + len(part.index)] = part.values
+            row += len(part.index)
+        return FeatureMatrix(
+            values,
+            first.names,
+            first.index.append([p.index for p in parts[1:]]),
+            np.concatenate([p.target for p in parts]),
+            first.target_name
+        )
+
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """values shifted forward by `periods` rows, NaN-filled (Series.shift)"""
+    shifted = np.full(len(values), np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+
+def _row_nanmean(columns: List[np.ndarray], n: int) -> np.ndarray:
+    """Row-wise mean skipping NaN (NaN where every value is missing)"""
+    if not columns:
+        return np.full(n, np.nan)
+    total = np.zeros(n)
+    count = np.zeros(n)
+    for col in columns:
+        present = ~np.isnan(col)
+        total[present] += col[present]
+        count += present
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total / count
+
+
 class FeatureEngineer:
     """
     Feature engineering for BQX ML autoregressive prediction
@@ -72,17 +136,18 @@ class FeatureEngineer:
         Returns:
             DataFrame with original + lagged features
         """
-        result = df.copy()
+        lagged = {}
 
         for col in columns:
             if col not in df.columns:
                 continue
 
+            values = df[col].to_numpy(dtype=np.float64)
             for lag in lags:
-                lag_col = f"{col}_lag{lag}"
-                result[lag_col] = df[col].shift(lag)
+                lagged[f"{col}_lag{lag}"] = _shift(values, lag)
 
-        return result
+        # One concat instead of column-by-column inserts (no fragmentation)
+        return pd.concat([df, pd.DataFrame(lagged, index=df.index)], axis=1)
 
     def create_momentum_alignment(self, bqx_df: pd.DataFrame) -> pd.Series:
         """
@@ -107,16 +172,8 @@ class FeatureEngineer:
 
         return alignment
 
-    def create_volatility_regime(self, bqx_df: pd.DataFrame) -> pd.Series:
-        """
-        Classify volatility regime based on BQX standard deviations
-
-        Args:
-            bqx_df: DataFrame with BQX features
-
-        Returns:
-            Series with regime classification (0=low, 1=medium, 2=high)
-        """
+    def _volatility_series(self, bqx_df: pd.DataFrame) -> pd.Series:
+        """Volatility measure used for regime classification"""
         # Use aggregate BQX volatility if available
         if 'agg_bqx_volatility' in bqx_df.columns:
             vol = bqx_df['agg_bqx_volatility']
@@ -128,9 +185,46 @@ class FeatureEngineer:
             available_cols = [c for c in stdev_cols if c in bqx_df.columns]
             vol = bqx_df[available_cols].mean(axis=1)
 
+        return vol
+
+    def volatility_thresholds(self, bqx_df: pd.DataFrame) -> Tuple[float, float]:
+        """
+        Tertile thresholds (33rd/67th percentile) of BQX volatility
+
+        Streaming callers compute these once over the full range (one
+        column is enough) and pass them to engineer_features_stream.
+
+        Args:
+            bqx_df: DataFrame with BQX volatility column(s)
+
+        Returns:
+            (low_thresh, high_thresh)
+        """
+        vol = self._volatility_series(bqx_df)
+        return vol.quantile(0.33), vol.quantile(0.67)
+
+    def create_volatility_regime(
+        self,
+        bqx_df: pd.DataFrame,
+        thresholds: Optional[Tuple[float, float]] = None
+    ) -> pd.Series:
+        """
+        Classify volatility regime based on BQX standard deviations
+
+        Args:
+            bqx_df: DataFrame with BQX features
+            thresholds: Optional precomputed (low, high) thresholds;
+                tertiles of bqx_df itself when omitted
+
+        Returns:
+            Series with regime classification (0=low, 1=medium, 2=high)
+        """
+        vol = self._volatility_series(bqx_df)
+
         # Classify into tertiles
-        low_thresh = vol.quantile(0.33)
-        high_thresh = vol.quantile(0.67)
+        if thresholds is None:
+            thresholds = (vol.quantile(0.33), vol.quantile(0.67))
+        low_thresh, high_thresh = thresholds
 
         regime = pd.Series(1, index=bqx_df.index)  # Default medium
         regime[vol <= low_thresh] = 0  # Low volatility
@@ -208,26 +302,17 @@ class FeatureEngineer:
         Returns:
             DataFrame with lagged features for target-window columns
         """
-        result = features_df.copy()
-
-        # Target window columns (60-minute windows and aggregates)
-        # These need to be lagged by 61+ minutes
-        target_window_patterns = [
-            'w60_',  # 60-minute window features
-            'agg_'   # Aggregate features (use overlapping data)
-        ]
+        lagged = {}
 
+        # Target window columns need to be lagged by 61+ minutes
         for col in features_df.columns:
-            needs_lag = any(pattern in col for pattern in target_window_patterns)
+            needs_lag = any(pattern in col for pattern in CAUSALITY_PATTERNS)
 
             if needs_lag and '_lag' not in col:  # Don't double-lag
-                # Shift this feature by lag_minutes
-                lagged_col = f"{col}_causality_lag{lag_minutes}"
-                result[lagged_col] = features_df[col].shift(lag_minutes)
-                # Optionally drop the unlagged version
-                # result.drop(columns=[col], inplace=True)
+                values = features_df[col].to_numpy(dtype=np.float64)
+                lagged[f"{col}_causality_lag{lag_minutes}"] = _shift(values, lag_minutes)
 
-        return result
+        return pd.concat([features_df, pd.DataFrame(lagged, index=features_df.index)], axis=1)
 
     def engineer_features(
         self,
@@ -240,6 +325,9 @@ class FeatureEngineer:
         """
         Full feature engineering pipeline
 
+        DataFrame view of build_feature_matrix (single float32 block,
+        no per-column copies).
+
         Args:
             bqx_df: BQX features from Aurora
             reg_df: REG features from Aurora
@@ -250,52 +338,312 @@ class FeatureEngineer:
         Returns:
             Tuple of (features_df, target_series)
         """
-        # 1. Merge BQX and REG on timestamp
-        features = bqx_df.merge(
-            reg_df,
-            left_index=True,
-            right_index=True,
-            how='inner',
-            suffixes=('_bqx', '_reg')
+        matrix = self.build_feature_matrix(
+            bqx_df, reg_df, target_col, target_horizon, apply_causality
         )
+        return matrix.to_frame()
+
+    def build_feature_matrix(
+        self,
+        bqx_df: pd.DataFrame,
+        reg_df: pd.DataFrame,
+        target_col: str = 'w60_bqx_return',
+        target_horizon: int = 60,
+        apply_causality: bool = True,
+        volatility_thresholds: Optional[Tuple[float, float]] = None,
+        dtype=np.float32
+    ) -> FeatureMatrix:
+        """
+        Full feature engineering pipeline into one preallocated matrix
+
+        Same rows, columns and values as the pandas pipeline (merge, lags,
+        derived features, target, 61-min causality lags, NaN-row drop),
+        built without intermediate frames:
+        - Merged columns are views of the input frames (gathered only
+          where REG has gaps)
+        - Every lag/causality column is a shifted read of its source
+          column, so the valid-row mask is tracked per source and shift
+          instead of scanning the wide frame
+        - Each output column is written once into a column-major matrix
+
+        Args:
+            bqx_df: BQX features from Aurora
+            reg_df: REG features from Aurora
+            target_col: Column to predict
+            target_horizon: Prediction horizon in minutes
+            apply_causality: Whether to apply 61-min lag rule
+            volatility_thresholds: Optional (low, high) regime tertiles;
+                computed from bqx_df when omitted
+            dtype: Feature matrix dtype
+
+        Returns:
+            FeatureMatrix with NaN rows dropped
+        """
+        target = self.create_target(bqx_df, target_col, target_horizon)
+
+        if self.config['derived']['volatility_regime'] and volatility_thresholds is None:
+            volatility_thresholds = self.volatility_thresholds(bqx_df)
+
+        index, names, columns, bqx_map, reg_map, bqx_rows = self._merge_columns(bqx_df, reg_df)
+        target_values = target.to_numpy(dtype=np.float64)[bqx_rows]
+
+        return self._assemble(
+            index, names, columns, bqx_map, reg_map, target_values, target_col,
+            first_row=0,
+            apply_causality=apply_causality,
+            volatility_thresholds=volatility_thresholds,
+            dtype=dtype
+        )
+
+    def _merge_columns(
+        self,
+        bqx_df: pd.DataFrame,
+        reg_df: pd.DataFrame
+    ) -> Tuple[pd.Index, List[str], List[np.ndarray], Dict[str, int], Dict[str, int], np.ndarray]:
+        """
+        Inner-join BQX and REG on timestamp as a list of column arrays
+
+        Overlapping column names get '_bqx'/'_reg' suffixes, as with
+        DataFrame.merge. Columns are zero-copy views when a side needs
+        no row selection.
+
+        Returns:
+            (index, names, columns, bqx_map, reg_map, bqx_rows) where the
+            maps give the merged position of each original column name
+            and bqx_rows are the BQX row positions kept by the join
+        """
+        bqx_rows = np.flatnonzero(bqx_df.index.isin(reg_df.index))
+        index = bqx_df.index[bqx_rows]
+        reg_rows = reg_df.index.get_indexer(index)
+
+        overlap = set(bqx_df.columns) & set(reg_df.columns)
+        names, columns, bqx_map, reg_map = [], [], {}, {}
+
+        for df, rows, suffix, col_map in (
+            (bqx_df, bqx_rows, '_bqx', bqx_map),
+            (reg_df, reg_rows, '_reg', reg_map)
+        ):
+            aligned = len(rows) == len(df) and bool((rows == np.arange(len(rows))).all())
+            for col in df.columns:
+                values = df[col].to_numpy()
+                if values.dtype.kind != 'f':
+                    values = values.astype(np.float64)
+                col_map[col] = len(names)
+                names.append(f"{col}{suffix}" if col in overlap else col)
+                columns.append(values if aligned else values[rows])
+
+        return index, names, columns, bqx_map, reg_map, bqx_rows
+
+    def _derived_columns(
+        self,
+        columns: List[np.ndarray],
+        bqx_map: Dict[str, int],
+        reg_map: Dict[str, int],
+        volatility_thresholds: Optional[Tuple[float, float]]
+    ) -> Dict[str, np.ndarray]:
+        """Momentum alignment, volatility regime and trend strength arrays"""
+        n = len(columns[0]) if columns else 0
+        derived = {}
 
-        # 2. Create lagged features
-        if self.config['lags']['enabled']:
-            # Lag BQX features
-            bqx_cols = [c for c in features.columns if 'bqx' in c.lower()]
-            features = self.create_lagged_features(
-                features,
-                bqx_cols,
-                self.config['lags']['windows']
-            )
-
-            # Lag REG features (optional, usually less important)
-            # reg_cols = [c for c in features.columns if any(f"w{w}_" in c for w in self.config['reg']['windows'])]
-            # features = self.create_lagged_features(features, reg_cols, [60, 120])
-
-        # 3. Create derived features
         if self.config['derived']['momentum_alignment']:
-            features['momentum_alignment'] = self.create_momentum_alignment(bqx_df)
+            alignment = np.zeros(n)
+            for window in self.config['bqx']['windows']:
+                col = f"w{window}_bqx_return"
+                if col in bqx_map:
+                    alignment += np.sign(columns[bqx_map[col]])
+            derived['momentum_alignment'] = alignment
 
         if self.config['derived']['volatility_regime']:
-            features['volatility_regime'] = self.create_volatility_regime(bqx_df)
+            if 'agg_bqx_volatility' in bqx_map:
+                vol = columns[bqx_map['agg_bqx_volatility']]
+            elif 'agg_bqx_stdev' in bqx_map:
+                vol = columns[bqx_map['agg_bqx_stdev']]
+            else:
+                stdev_cols = [f"w{w}_bqx_stdev" for w in self.config['bqx']['windows']]
+                vol = _row_nanmean([columns[bqx_map[c]] for c in stdev_cols if c in bqx_map], n)
+
+            low_thresh, high_thresh = volatility_thresholds
+            regime = np.ones(n)
+            regime[vol <= low_thresh] = 0
+            regime[vol >= high_thresh] = 2
+            derived['volatility_regime'] = regime
 
         if self.config['derived']['trend_strength']:
-            features['trend_strength'] = self.create_trend_strength(reg_df)
+            r2_cols = [f"w{w}_r2" for w in self.config['reg']['windows']]
+            available = [columns[reg_map[c]] for c in r2_cols if c in reg_map]
+            derived['trend_strength'] = _row_nanmean(available, n) if available else np.zeros(n)
 
-        # 4. Create target variable
-        target = self.create_target(bqx_df, target_col, target_horizon)
+        return derived
+
+    def _assemble(
+        self,
+        index: pd.Index,
+        names: List[str],
+        columns: List[np.ndarray],
+        bqx_map: Dict[str, int],
+        reg_map: Dict[str, int],
+        target: np.ndarray,
+        target_name: str,
+        first_row: int,
+        apply_causality: bool,
+        volatility_thresholds: Optional[Tuple[float, float]],
+        dtype
+    ) -> FeatureMatrix:
+        """
+        Build the feature matrix for merged rows [first_row, len(index))
+
+        Every output column is a (source array, shift) pair; a row is valid
+        when the target and every source value it reads are present.
+        Rows before first_row only serve as lag history.
+        """
+        n = len(index)
+        derived = self._derived_columns(columns, bqx_map, reg_map, volatility_thresholds)
+        sources = list(columns) + list(derived.values())
+
+        # Output layout: base, lags, derived, causality lags
+        out_names = list(names)
+        specs = [(j, 0) for j in range(len(names))]
+
+        if self.config['lags']['enabled']:
+            for j, name in enumerate(names):
+                if 'bqx' in name.lower():
+                    for lag in self.config['lags']['windows']:
+                        out_names.append(f"{name}_lag{lag}")
+                        specs.append((j, lag))
+
+        for k, name in enumerate(derived):
+            out_names.append(name)
+            specs.append((len(names) + k, 0))
 
-        # 5. Apply temporal causality rule (optional but recommended)
         if apply_causality:
-            features = self.apply_temporal_causality_rule(features, lag_minutes=61)
+            for q in range(len(out_names)):
+                name = out_names[q]
+                if any(pattern in name for pattern in CAUSALITY_PATTERNS) and '_lag' not in name:
+                    out_names.append(f"{name}_causality_lag{CAUSALITY_LAG}")
+                    specs.append((specs[q][0], specs[q][1] + CAUSALITY_LAG))
+
+        # Valid-row mask: OR of each shift's source NaN masks, shifted once
+        by_shift = {}
+        for source, shift in specs:
+            by_shift.setdefault(shift, set()).add(source)
+
+        source_nan = {}
+        bad = np.isnan(target)
+        bad[:first_row] = True
+        for shift, source_ids in by_shift.items():
+            if shift >= n:
+                bad[:] = True
+                continue
+            missing = np.zeros(n, dtype=bool)
+            for source in source_ids:
+                if source not in source_nan:
+                    source_nan[source] = np.isnan(sources[source])
+                missing |= source_nan[source]
+            bad[:shift] = True
+            bad[shift:] |= missing[:n - shift]
+
+        rows = np.flatnonzero(~bad)
+
+        # One preallocated column-major matrix, each column written once
+        values = np.empty((len(rows), len(specs)), dtype=dtype, order='F')
+        shifted_rows = {shift: rows - shift for shift in by_shift}
+        for c, (source, shift) in enumerate(specs):
+            if sources[source].dtype == values.dtype:
+                np.take(sources[source], shifted_rows[shift], out=values[:, c])
+            else:
+                # take(out=) would cast the whole source column first
+                values[:, c] = sources[source][shifted_rows[shift]]
 
-        # 6. Drop rows with NaN (due to lagging and target creation)
-        valid_idx = target.notna() & features.notna().all(axis=1)
-        features_clean = features[valid_idx]
-        target_clean = target[valid_idx]
+        return FeatureMatrix(values, out_names, index[rows], target[rows], target_name)
 
-        return features_clean, target_clean
+    def engineer_features_stream(
+        self,
+        chunks: Iterable[Tuple[pd.DataFrame, pd.DataFrame]],
+        target_col: str = 'w60_bqx_return',
+        target_horizon: int = 60,
+        apply_causality: bool = True,
+        volatility_thresholds: Optional[Tuple[float, float]] = None,
+        as_frame: bool = True,
+        dtype=np.float32
+    ) -> Iterator:
+        """
+        Chunked version of engineer_features over a time-ordered stream
+
+        Yields the same rows and values as engineer_features on the
+        concatenated input, while holding only the current chunk plus a
+        carry of the last rows needed for lags (history) and for targets
+        that are not yet known (look-ahead):
+        - history: max(lag windows, causality lag) merged rows
+        - look-ahead: rows whose t+horizon BQX value has not arrived yet
+
+        Args:
+            chunks: Iterable of (bqx_df, reg_df) windows in time order,
+                e.g. AuroraExtractor.iter_load()
+            target_col: Column to predict
+            target_horizon: Prediction horizon in minutes
+            apply_causality: Whether to apply 61-min lag rule
+            volatility_thresholds: (low, high) tertiles over the full range
+                (see volatility_thresholds); required when the volatility
+                regime feature is enabled, since tertiles are global
+            as_frame: Yield (features_df, target_series) views; otherwise
+                yield FeatureMatrix chunks (see FeatureMatrix.concat)
+            dtype: Feature matrix dtype
+
+        Yields:
+            (features_df, target_series) or FeatureMatrix per chunk, NaN
+            rows dropped
+        """
+        if self.config['derived']['volatility_regime'] and volatility_thresholds is None:
+            raise ValueError("volatility_thresholds are required for streaming with volatility_regime enabled")
+
+        lags = self.config['lags']['windows'] if self.config['lags']['enabled'] else []
+        history = max(list(lags) + ([CAUSALITY_LAG] if apply_causality else []) + [0])
+
+        carry_index = None    # merged rows: history + rows awaiting targets
+        carry = None          # merged column arrays for carry_index
+        n_done = 0            # rows of carry already emitted (history only)
+        targets = None        # tail of the BQX target column
+
+        for bqx_chunk, reg_chunk in chunks:
+            if target_col not in bqx_chunk.columns:
+                raise ValueError(f"Target column {target_col} not found in BQX data")
+
+            new_targets = bqx_chunk[target_col]
+            targets = new_targets if targets is None else pd.concat([targets, new_targets])
+
+            index, names, columns, bqx_map, reg_map, _ = self._merge_columns(bqx_chunk, reg_chunk)
+            if carry is not None:
+                index = carry_index.append(index)
+                columns = [np.concatenate([old, new]) for old, new in zip(carry, columns)]
+
+            # Targets are known for BQX rows at least `horizon` rows from the end
+            n_known = len(targets) - target_horizon
+            if n_known > 0:
+                cutoff = targets.index[n_known - 1]
+                end = int(index.searchsorted(cutoff, side='right'))
+            else:
+                end = n_done
+
+            if end > n_done:
+                target = targets.shift(-target_horizon).reindex(index[:end]).to_numpy(dtype=np.float64)
+                matrix = self._assemble(
+                    index[:end], names, [col[:end] for col in columns], bqx_map, reg_map,
+                    target, target_col,
+                    first_row=n_done,
+                    apply_causality=apply_causality,
+                    volatility_thresholds=volatility_thresholds,
+                    dtype=dtype
+                )
+                if len(matrix.index):
+                    yield matrix.to_frame() if as_frame else matrix
+
+            # Keep `history` emitted rows plus everything not yet emitted
+            start = max(end - history, 0)
+            carry_index = index[start:]
+            carry = [col[start:] for col in columns]
+            n_done = end - start
+            if n_known > 0:
+                targets = targets.iloc[n_known:]
 
     def get_feature_names(self, features_df: pd.DataFrame) -> Dict[str, List[str]]:
         """
@@ -0,0 +1,397 @@
+"""
+Online Regime Engine
+HMM state filtering, Bayesian online changepoint detection and CUSUM, one observation at a time
+
+RegimeEngine keeps the filter state of `series` independent series in
+(series, ...) arrays and advances all of them with one update() call per
+timestamp, so the same code serves live inference (one call per new
+minute, state saved with get_state()) and backfill (run() over a
+(rows, series) matrix, e.g. all 28 pairs of a month). Each update costs
+O(states² + max_run_length) per series:
+- scale: slow exponentially weighted mean/variance of the level, its
+  first difference (delta) and second difference (delta2); inputs are
+  standardized with the statistics before the current row (no lookahead)
+- HMM: forward filter of a 3-state Gaussian HMM (calm/trend/shock) on
+  the standardized delta signed by the recent drift, so trends in either
+  direction have a positive mean
+- BOCPD: Adams-MacKay changepoint filter with a Normal-Inverse-Gamma
+  prior (Student-t predictive) and a constant hazard; the run-length
+  distribution is truncated at max_run_length (the last bin holds every
+  longer run)
+- CUSUM: two-sided Page CUSUMs on standardized inputs; the first one
+  raises the alarm flag and resets
+
+NaN levels are missing rows: that series' state is left untouched.
+"""
+
+import math
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+HMM_STATES = ('calm', 'trend', 'shock')
+
+# Standardization: one day of M1 rows; the drift sign over 15 rows
+SCALE_HALFLIFE = 1440
+DRIFT_HALFLIFE = 15
+WARMUP_ROWS = 30
+
+MAX_RUN_LENGTH = 240
+HAZARD = 1 / 120
+
+# Run lengths counted as "a changepoint just happened"
+CHANGE_WINDOW = 5
+
+CUSUM_DRIFT = 0.5
+CUSUM_THRESHOLD = 5.0
+
+ENGINE_FEATURES = [
+    'hmm_state_prob_calm', 'hmm_state_prob_trend', 'hmm_state_prob_shock',
+    'hmm_state_duration', 'hmm_state_transition_prob',
+    'bocpd_run_length', 'bocpd_hazard_rate', 'bocpd_growth_prob', 'bocpd_decay_prob',
+    'cusum_alarm_flag', 'cusum_reset_periods',
+    'regime_entropy', 'regime_persistence'
+]
+
+
+class HMMParams(NamedTuple):
+    """Emissions (in standard deviations of delta) and stay probabilities per state"""
+    means: Tuple[float, ...] = (0.0, 0.6, 0.0)
+    stds: Tuple[float, ...] = (0.8, 1.0, 2.5)
+    stay: Tuple[float, ...] = (0.99, 0.98, 0.90)
+
+    def transitions(self) -> np.ndarray:
+        """(states, states) row-stochastic matrix, leaving mass split evenly"""
+        k = len(self.stay)
+        stay = np.asarray(self.stay, dtype=np.float64)
+        matrix = np.repeat(((1.0 - stay) / (k - 1))[:, None], k, axis=1)
+        np.fill_diagonal(matrix, stay)
+        return matrix
+
+
+class BOCPDPrior(NamedTuple):
+    """Normal-Inverse-Gamma prior of a run's mean and variance"""
+    mu: float = 0.0
+    kappa: float = 1.0
+    alpha: float = 2.0
+    beta: float = 1.0
+
+
+class Domain(NamedTuple):
+    """How one hmm_regime_* table maps onto the engine"""
+    table: str                      # template formatted with pair
+    field: str                      # M1 column fed to the engine
+    suffix: str                     # column suffix in the table
+    cusum: Tuple[Tuple[str, str], ...]  # (engine input, column stem); the first alarms
+
+
+DOMAINS = {
+    'rate': Domain('bqx.hmm_regime_rate_{pair}', 'rate_index', 'idx',
+                   (('delta', 'cusum_returns'), ('delta2', 'cusum_a2'))),
+    'bqx': Domain('bqx.hmm_regime_bqx_{pair}', 'bqx', 'bqx',
+                  (('level', 'cusum_momentum'), ('delta', 'cusum_velocity'))),
+}
+
+
+def domain_columns(domain: str) -> Dict[str, str]:
+    """Engine output name -> table column for one domain ('rate' or 'bqx')"""
+    spec = DOMAINS[domain]
+    names = dict(zip(ENGINE_FEATURES, ENGINE_FEATURES))
+    names.update({f'cusum_{source}': stem for source, stem in spec.cusum})
+    return {name: f'{column}_{spec.suffix}' for name, column in names.items()}
+
+
+def domain_engine(domain: str, series: int, **kwargs) -> 'RegimeEngine':
+    """RegimeEngine with the CUSUM inputs of one domain"""
+    return RegimeEngine(series, cusum=[source for source, _ in DOMAINS[domain].cusum], **kwargs)
+
+
+def _logsumexp(values: np.ndarray) -> np.ndarray:
+    """log(sum(exp(values))) over the last axis"""
+    peak = values.max(axis=-1)
+    return peak + np.log(np.exp(values - peak[..., None]).sum(axis=-1))
+
+
+# ----------------------------------------------------------------------
+# Engine
+# ----------------------------------------------------------------------
+
+class RegimeEngine:
+    """Streaming regime filters for several series advanced in lockstep"""
+
+    STATE = ('level', 'delta', 'drift_weight', 'drift', 'alpha', 'map_state', 'duration',
+             'log_run', 'run_mu', 'run_beta', 'cusum_pos', 'cusum_neg', 'reset_periods',
+             'scale_weight', 'scale_mean', 'scale_var', 'scale_count')
+
+    def __init__(
+        self,
+        series: int,
+        cusum: Sequence[str] = ('delta', 'delta2'),
+        hmm: HMMParams = HMMParams(),
+        prior: BOCPDPrior = BOCPDPrior(),
+        max_run_length: int = MAX_RUN_LENGTH,
+        hazard: float = HAZARD,
+        scale_halflife: float = SCALE_HALFLIFE,
+        drift_halflife: float = DRIFT_HALFLIFE,
+        warmup: int = WARMUP_ROWS,
+        cusum_drift: float = CUSUM_DRIFT,
+        cusum_threshold: float = CUSUM_THRESHOLD
+    ):
+        """
+        Args:
+            series: Number of series updated together
+            cusum: Inputs ('level', 'delta', 'delta2') of the CUSUMs; the
+                first one sets the alarm flag and reset counter
+            hmm: HMM emission and transition parameters
+            prior: BOCPD prior on standardized deltas
+            max_run_length: Largest tracked run length
+            hazard: Changepoint probability per row
+            scale_halflife: Half-life (rows) of the standardization statistics
+            drift_halflife: Half-life (rows) of the drift that signs the HMM input
+            warmup: Observations before an input is standardized
+            cusum_drift: CUSUM allowance k (standard deviations)
+            cusum_threshold: CUSUM alarm threshold h (standard deviations)
+        """
+        unknown = set(cusum) - {'level', 'delta', 'delta2'}
+        if not cusum or unknown:
+            raise ValueError(f"CUSUM inputs must be 'level', 'delta' or 'delta2', got {list(cusum)}")
+
+        self.series = series
+        self.cusum = list(cusum)
+        self.inputs = sorted({'delta'} | set(self.cusum))
+        self.warmup = warmup
+        self.cusum_drift = cusum_drift
+        self.cusum_threshold = cusum_threshold
+        self.scale_decay = 0.5 ** (1.0 / scale_halflife)
+        self.drift_decay = 0.5 ** (1.0 / drift_halflife)
+
+        # HMM
+        self.transitions = hmm.transitions()
+        self.stay = np.diag(self.transitions).copy()
+        self.means = np.asarray(hmm.means, dtype=np.float64)
+        self.stds = np.asarray(hmm.stds, dtype=np.float64)
+        self.log_norm = -np.log(self.stds) - 0.5 * np.log(2 * np.pi)
+        k = len(self.means)
+        stationary = np.linalg.lstsq(
+            np.vstack([self.transitions.T - np.eye(k), np.ones(k)]),
+            np.r_[np.zeros(k), 1.0], rcond=None
+        )[0]
+
+        # BOCPD: run r has seen r observations, so kappa, alpha and the
+        # Student-t normalizer depend on r only
+        self.prior = prior
+        self.run_lengths = np.arange(max_run_length + 1, dtype=np.float64)
+        self.kappa = prior.kappa + self.run_lengths
+        self.shape = prior.alpha + self.run_lengths / 2
+        self.log_t = np.array([math.lgamma(a + 0.5) - math.lgamma(a) for a in self.shape])
+        self.log_hazard = math.log(hazard)
+        self.log_survival = math.log1p(-hazard)
+        self.prior_var = prior.beta / (prior.alpha - 1)
+
+        n, m = series, len(self.inputs)
+        self.level = np.full(n, np.nan)
+        self.delta = np.full(n, np.nan)
+        self.drift_weight = np.zeros(n)
+        self.drift = np.zeros(n)
+        self.alpha = np.tile(stationary, (n, 1))
+        self.map_state = np.argmax(self.alpha, axis=1)
+        self.duration = np.zeros(n)
+        self.log_run = np.full((n, len(self.run_lengths)), -np.inf)
+        self.log_run[:, 0] = 0.0
+        self.run_mu = np.full((n, len(self.run_lengths)), prior.mu)
+        self.run_beta = np.full((n, len(self.run_lengths)), prior.beta)
+        self.cusum_pos = np.zeros((n, len(self.cusum)))
+        self.cusum_neg = np.zeros((n, len(self.cusum)))
+        self.reset_periods = np.zeros(n)
+        self.scale_weight = np.zeros((n, m))
+        self.scale_mean = np.zeros((n, m))
+        self.scale_var = np.zeros((n, m))
+        self.scale_count = np.zeros((n, m))
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Copy of the filter state (e.g. to np.savez between live runs)"""
+        return {name: np.array(getattr(self, name), copy=True) for name in self.STATE}
+
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Resume from get_state() of an engine with the same parameters"""
+        for name in self.STATE:
+            value = np.asarray(state[name])
+            if value.shape != getattr(self, name).shape:
+                raise ValueError(f"State '{name}' has shape {value.shape}, "
+                                 f"expected {getattr(self, name).shape}")
+            setattr(self, name, value.copy())
+
+    # ------------------------------------------------------------------
+    # Filters
+    # ------------------------------------------------------------------
+
+    def _standardize(self, values: np.ndarray) -> np.ndarray:
+        """
+        Z-scores of (series, inputs) against the statistics so far, then
+        fold the values into them
+
+        Exponentially weighted with bias correction: the weight sum grows
+        to 1 / (1 - decay), so early rows are not shrunk toward zero.
+        """
+        std = np.sqrt(self.scale_var)
+        ready = (self.scale_count >= self.warmup) & (std > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(ready, (values - self.scale_mean) / std, np.nan)
+
+        seen = np.isfinite(values)
+        weight = np.where(seen, self.scale_decay * self.scale_weight + 1.0, self.scale_weight)
+        rate = np.where(seen, 1.0 / np.maximum(weight, 1.0), 0.0)
+        diff = np.where(seen, values - self.scale_mean, 0.0)
+        self.scale_mean = self.scale_mean + rate * diff
+        self.scale_var = (1.0 - rate) * (self.scale_var + rate * diff * diff)
+        self.scale_weight = weight
+        self.scale_count = self.scale_count + seen
+        return np.where(seen, z, np.nan)
+
+    def _hmm(self, signal: np.ndarray):
+        """Forward-filter the state probabilities by one signal value"""
+        seen = np.isfinite(signal)
+        x = np.where(seen, signal, 0.0)[:, None]
+        log_lik = self.log_norm - 0.5 * ((x - self.means) / self.stds) ** 2
+        lik = np.exp(log_lik - log_lik.max(axis=1, keepdims=True))
+        posterior = (self.alpha @ self.transitions) * lik
+        posterior /= posterior.sum(axis=1, keepdims=True)
+        self.alpha = np.where(seen[:, None], posterior, self.alpha)
+
+        state = np.argmax(self.alpha, axis=1)
+        self.duration = np.where(seen, np.where(state == self.map_state, self.duration + 1, 1), self.duration)
+        self.map_state = np.where(seen, state, self.map_state)
+
+    def _bocpd(self, z: np.ndarray):
+        """Advance the run-length distribution by one standardized delta"""
+        seen = np.isfinite(z)
+        x = np.where(seen, z, 0.0)[:, None]
+
+        nu = 2 * self.shape
+        scale = self.run_beta * (self.kappa + 1) / (self.shape * self.kappa)
+        log_pred = (self.log_t - 0.5 * np.log(np.pi * nu * scale)
+                    - (nu + 1) / 2 * np.log1p((x - self.run_mu) ** 2 / (nu * scale)))
+        joint = self.log_run + log_pred
+
+        log_run = np.empty_like(joint)
+        log_run[:, 0] = _logsumexp(joint) + self.log_hazard
+        log_run[:, 1:] = joint[:, :-1] + self.log_survival
+        log_run[:, -1] = np.logaddexp(log_run[:, -1], joint[:, -1] + self.log_survival)
+        log_run -= _logsumexp(log_run)[:, None]
+
+        # Run r + 1 is run r updated with x; the last bin keeps the
+        # statistics of a max_run_length run
+        kappa = self.kappa[:-1]
+        mu, beta = self.run_mu[:, :-1], self.run_beta[:, :-1]
+        run_mu = np.empty_like(self.run_mu)
+        run_beta = np.empty_like(self.run_beta)
+        run_mu[:, 0], run_beta[:, 0] = self.prior.mu, self.prior.beta
+        run_mu[:, 1:] = (kappa * mu + x) / (kappa + 1)
+        run_beta[:, 1:] = beta + kappa * (x - mu) ** 2 / (2 * (kappa + 1))
+
+        keep = seen[:, None]
+        self.log_run = np.where(keep, log_run, self.log_run)
+        self.run_mu = np.where(keep, run_mu, self.run_mu)
+        self.run_beta = np.where(keep, run_beta, self.run_beta)
+
+    def _cusum(self, z: np.ndarray) -> np.ndarray:
+        """Update the (series, cusums) Page statistics; returns the alarm flags"""
+        seen = np.isfinite(z)
+        x = np.where(seen, z, 0.0)
+        pos = np.where(seen, np.maximum(0.0, self.cusum_pos + x - self.cusum_drift), self.cusum_pos)
+        neg = np.where(seen, np.maximum(0.0, self.cusum_neg - x - self.cusum_drift), self.cusum_neg)
+        self.cusum_pos, self.cusum_neg = pos, neg
+
+        alarm = np.maximum(pos, neg) > self.cusum_threshold
+        primary = alarm[:, 0]
+        self.reset_periods = np.where(primary, 0.0, self.reset_periods + seen[:, 0])
+        return alarm
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def update(self, levels) -> Dict[str, np.ndarray]:
+        """
+        Advance every series by one row
+
+        Args:
+            levels: (series,) values of the current row, NaN where a
+                series has no row
+
+        Returns:
+            Dict of feature name -> (series,) array: ENGINE_FEATURES plus
+            'cusum_<input>' per CUSUM input
+        """
+        levels = np.asarray(levels, dtype=np.float64).reshape(self.series)
+        present = np.isfinite(levels)
+        delta = np.where(present, levels - self.level, np.nan)
+        delta2 = delta - self.delta
+        raw = {'level': levels, 'delta': delta, 'delta2': delta2}
+        self.level = np.where(present, levels, self.level)
+        self.delta = np.where(present, delta, self.delta)
+
+        z = self._standardize(np.column_stack([raw[name] for name in self.inputs]))
+        z = {name: z[:, i] for i, name in enumerate(self.inputs)}
+
+        # Deltas in the direction of the recent drift
+        sign = np.sign(self.drift)
+        seen = np.isfinite(delta)
+        self.drift_weight = np.where(seen, self.drift_decay * self.drift_weight + 1.0, self.drift_weight)
+        self.drift = np.where(seen, self.drift + (np.where(seen, delta, 0.0) - self.drift) /
+                              np.maximum(self.drift_weight, 1.0), self.drift)
+
+        self._hmm(z['delta'] * sign)
+        self._bocpd(z['delta'])
+        alarm = self._cusum(np.column_stack([z[name] for name in self.cusum]))
+
+        out = {}
+        alpha = self.alpha
+        for i, state in enumerate(HMM_STATES):
+            out[f'hmm_state_prob_{state}'] = alpha[:, i].copy()
+        out['hmm_state_duration'] = self.duration.copy()
+        stay = alpha @ self.stay
+        out['hmm_state_transition_prob'] = 1.0 - stay
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = -np.where(alpha > 0, alpha * np.log(alpha), 0.0).sum(axis=1)
+        out['regime_entropy'] = entropy / np.log(len(HMM_STATES))
+        # Expected rows until the regime changes
+        out['regime_persistence'] = alpha @ (1.0 / (1.0 - self.stay))
+
+        run = np.exp(self.log_run)
+        variance = self.run_beta / (self.shape - 1)
+        out['bocpd_run_length'] = run @ self.run_lengths
+        out['bocpd_hazard_rate'] = run[:, :CHANGE_WINDOW].sum(axis=1)
+        out['bocpd_growth_prob'] = np.where(variance > self.prior_var, run, 0.0).sum(axis=1)
+        out['bocpd_decay_prob'] = np.where(variance < self.prior_var, run, 0.0).sum(axis=1)
+
+        for i, name in enumerate(self.cusum):
+            out[f'cusum_{name}'] = self.cusum_pos[:, i] - self.cusum_neg[:, i]
+        out['cusum_alarm_flag'] = alarm[:, 0].astype(np.float64)
+        out['cusum_reset_periods'] = self.reset_periods.copy()
+
+        # Alarmed CUSUMs restart from zero on the next row
+        self.cusum_pos = np.where(alarm, 0.0, self.cusum_pos)
+        self.cusum_neg = np.where(alarm, 0.0, self.cusum_neg)
+        return out
+
+    def run(self, levels: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Backfill: update() over every row of a (rows, series) matrix
+
+        Returns:
+            Dict of feature name -> (rows, series) float64 array
+        """
+        levels = np.asarray(levels, dtype=np.float64).reshape(-1, self.series)
+        out = {}
+        for t in range(len(levels)):
+            row = self.update(levels[t])
+            if not out:
+                out = {name: np.empty((len(levels), self.series)) for name in row}
+            for name, values in row.items():
+                out[name][t] = values
+        return out
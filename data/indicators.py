@@ -0,0 +1,500 @@
+"""
+Technical Indicator Kernels
+Vectorized NumPy indicators shared by the rate and BQX technical workers
+
+Replaces three copies of pandas indicator code (technical_indicators_worker,
+technical_indicators_worker_bqx, populate_technical_indicators_worker),
+including the rolling().apply(lambda ...) mean absolute deviation of CCI,
+a Python call per row.
+
+Kernels take and return float64 arrays and follow the pandas
+implementations they replace:
+- Rolling windows need `window` values (min_periods = window); a NaN or
+  ±inf inside a window makes the row NaN, as pandas rolling does
+- Rolling sums/means use block-restart running sums (data.rolling_cov);
+  min/max/std/MAD reduce a zero-copy sliding_window_view
+- ema() matches .ewm(span=..., adjust=False).mean(): the recursion runs in
+  scipy.signal.lfilter, one call per run of non-NaN values
+- Cumulative sums skip NaN, leaving NaN at those rows (pandas cumsum)
+
+rate_indicators() and bqx_indicators() build every column of the rate
+(M1 OHLCV) and BQX (w15 momentum) technical feature tables from one pass
+over a partition, computing shared intermediates once.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+from typing import Callable, Dict, Optional, Tuple
+
+from data.rolling_cov import window_sums
+
+
+# Column order of bqx.technical_features_{pair} (rate domain)
+RATE_INDICATOR_COLUMNS = [
+    'ema_10', 'ema_20', 'ema_50', 'ema_100', 'ema_200',
+    'sma_10', 'sma_20', 'sma_50', 'sma_100', 'sma_200',
+    'rsi_14', 'macd', 'macd_signal', 'macd_histogram', 'stoch_k', 'stoch_d',
+    'cci_20', 'williams_r_14', 'roc_12', 'momentum_10', 'momentum_20',
+    'trix', 'ultimate_oscillator', 'awesome_oscillator',
+    'keltner_channel_upper', 'keltner_channel_lower',
+    'atr_14', 'historical_volatility_20', 'chaikin_volatility',
+    'donchian_channel_upper', 'donchian_channel_middle', 'donchian_channel_lower',
+    'mass_index', 'vortex_indicator_plus', 'vortex_indicator_minus', 'ulcer_index',
+    'obv', 'adl', 'cmf_20', 'fi_13', 'eom_14', 'vpt', 'nvi', 'pvi', 'mfi_14', 'vwap'
+]
+
+# Column order of the BQX-domain technical feature partitions
+BQX_INDICATOR_COLUMNS = [
+    'ema_10', 'ema_20', 'ema_50', 'ema_100', 'ema_200',
+    'sma_10', 'sma_20', 'sma_50', 'sma_100', 'sma_200',
+    'rsi_14', 'rsi_9', 'rsi_25', 'macd', 'macd_signal', 'macd_histogram',
+    'stoch_k', 'stoch_d', 'cci', 'williams_r', 'roc_12', 'roc_25',
+    'momentum_10', 'momentum_20',
+    'bb_upper', 'bb_middle', 'bb_lower', 'bb_width', 'bb_pct',
+    'atr_14', 'atr_28', 'std_dev_20', 'std_dev_50', 'std_dev_100',
+    'obv', 'adl', 'cmf', 'mfi', 'vwap',
+    'force_index', 'ease_of_movement', 'volume_oscillator', 'volume_roc', 'nvi'
+]
+
+# The BQX formulas guard every denominator with this epsilon
+BQX_EPS = 1e-10
+
+
+# ----------------------------------------------------------------------
+# Series primitives
+# ----------------------------------------------------------------------
+
+def _as_float(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def shift(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    """values[t - periods] at row t (NaN for the first `periods` rows)"""
+    x = _as_float(values)
+    out = np.full(len(x), np.nan)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    return out
+
+
+def diff(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    """values[t] - values[t - periods]"""
+    return _as_float(values) - shift(values, periods)
+
+
+def cumsum(values: np.ndarray) -> np.ndarray:
+    """Running sum skipping NaN; NaN rows stay NaN (pandas Series.cumsum)"""
+    x = _as_float(values)
+    missing = np.isnan(x)
+    out = np.cumsum(np.where(missing, 0.0, x))
+    out[missing] = np.nan
+    return out
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing-window sum (NaN until `window` finite values are in the window)"""
+    x = _as_float(values)
+    n = len(x)
+    out = np.full(n, np.nan)
+    if n < window:
+        return out
+
+    # Sum deviations from the series level so prefix sums stay small; the
+    # level keeps 8 significant bits so all-zero windows still sum to 0
+    bad = ~np.isfinite(x)
+    offset = 0.0
+    if (~bad).any():
+        mantissa, exponent = np.frexp(x[~bad].mean())
+        offset = float(np.ldexp(np.round(mantissa * 256), exponent - 8))
+    sums = window_sums(np.column_stack([np.where(bad, 0.0, x - offset), bad]), window)
+    out[window - 1:] = np.where(sums[:, 1] > 0.5, np.nan, sums[:, 0] + offset * window)
+    return out
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing-window mean (simple moving average)"""
+    return rolling_sum(values, window) / window
+
+
+def _rolling(values: np.ndarray, window: int, kernel: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+    """Apply a (k, window) -> (k,) kernel to every full trailing window"""
+    x = _as_float(values)
+    x = np.where(np.isfinite(x), x, np.nan)
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = kernel(sliding_window_view(x, window))
+    return out
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing-window minimum"""
+    return _rolling(values, window, lambda w: w.min(axis=1))
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing-window maximum"""
+    return _rolling(values, window, lambda w: w.max(axis=1))
+
+
+def rolling_std(values: np.ndarray, window: int, ddof: int = 1) -> np.ndarray:
+    """Trailing-window standard deviation (sample std by default, as pandas)"""
+    return _rolling(values, window, lambda w: w.std(axis=1, ddof=ddof))
+
+
+def rolling_mad(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing-window mean absolute deviation from the window mean"""
+    def kernel(w):
+        return np.abs(w - w.mean(axis=1, keepdims=True)).mean(axis=1)
+    return _rolling(values, window, kernel)
+
+
+def ema(values: np.ndarray, span: Optional[float] = None, alpha: Optional[float] = None) -> np.ndarray:
+    """
+    Exponential moving average, .ewm(span=span, adjust=False).mean()
+
+    Args:
+        values: 1-D series
+        span: EMA span (alpha = 2 / (span + 1))
+        alpha: Smoothing factor, instead of span (1 / period = Wilder)
+
+    Returns:
+        float64 array; NaN before the first value, NaN rows carry the
+        previous average and the next value is weighted by its gap
+    """
+    x = _as_float(values)
+    if alpha is None:
+        alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    out = np.full(len(x), np.nan)
+
+    rows = np.flatnonzero(~np.isnan(x))
+    if len(rows) == 0:
+        return out
+
+    # Runs of consecutive observed rows
+    breaks = np.flatnonzero(np.diff(rows) > 1) + 1
+    level = None
+    for run in np.split(rows, breaks):
+        first = x[run[0]]
+        if level is not None:
+            old = decay ** (run[0] - previous)
+            first = (old * level + alpha * first) / (old + alpha)
+        out[run[0]] = first
+        if len(run) > 1:
+            out[run[1:]] = lfilter([alpha], [1.0, -decay], x[run[1:]], zi=[decay * first])[0]
+        level, previous = out[run[-1]], run[-1]
+
+    # Gaps carry the last average forward
+    last = np.maximum.accumulate(np.where(np.isnan(x), 0, np.arange(len(x))))
+    out[rows[0]:] = out[last[rows[0]:]]
+    return out
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """max(high - low, |high - prev close|, |low - prev close|), skipping NaN"""
+    prev_close = shift(close)
+    return np.fmax(np.fmax(_as_float(high) - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+
+# ----------------------------------------------------------------------
+# Indicators
+# ----------------------------------------------------------------------
+
+def rsi(values: np.ndarray, period: int = 14, eps: float = 0.0, wilder: bool = False) -> np.ndarray:
+    """
+    Relative Strength Index
+
+    Args:
+        values: Price (or momentum) series
+        period: Averaging period
+        eps: Added to the average loss (BQX variant uses 1e-10)
+        wilder: Wilder smoothing (EMA with alpha = 1 / period) instead of
+            a simple moving average of gains and losses
+    """
+    delta = diff(values)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    if wilder:
+        avg_gain, avg_loss = ema(gain, alpha=1.0 / period), ema(loss, alpha=1.0 / period)
+    else:
+        avg_gain, avg_loss = rolling_mean(gain, period), rolling_mean(loss, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / (avg_loss + eps)
+        return 100 - (100 / (1 + rs))
+
+
+def macd(values: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD line, signal line and histogram"""
+    macd_line = ema(values, fast) - ema(values, slow)
+    signal_line = ema(macd_line, signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def stochastic(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    k_period: int = 14,
+    d_period: int = 3,
+    eps: float = 0.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Stochastic oscillator %K and %D (pass one series three times for BQX)"""
+    lowest = rolling_min(low, k_period)
+    highest = rolling_max(high, k_period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stoch_k = 100 * (close - lowest) / (highest - lowest + eps)
+    return stoch_k, rolling_mean(stoch_k, d_period)
+
+
+def cci(typical: np.ndarray, period: int = 20, eps: float = 0.0) -> np.ndarray:
+    """Commodity Channel Index of a typical-price series ((H + L + C) / 3)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (typical - rolling_mean(typical, period)) / (0.015 * rolling_mad(typical, period) + eps)
+
+
+def williams_r(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14, eps: float = 0.0) -> np.ndarray:
+    """Williams %R"""
+    highest = rolling_max(high, period)
+    lowest = rolling_min(low, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -100 * (highest - close) / (highest - lowest + eps)
+
+
+def roc(values: np.ndarray, period: int = 12, eps: float = 0.0) -> np.ndarray:
+    """Rate of change in percent"""
+    previous = shift(values, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ((values - previous) / (previous + eps)) * 100
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Average true range (simple moving average of the true range)"""
+    return rolling_mean(true_range(high, low, close), period)
+
+
+def adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> Dict[str, np.ndarray]:
+    """
+    Average Directional Index with Wilder smoothing
+
+    Returns:
+        Dict with 'plus_di', 'minus_di' and 'adx'
+    """
+    up = diff(high)
+    down = -diff(low)
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+
+    alpha = 1.0 / period
+    smoothed_tr = ema(true_range(high, low, close), alpha=alpha)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100 * ema(plus_dm, alpha=alpha) / smoothed_tr
+        minus_di = 100 * ema(minus_dm, alpha=alpha) / smoothed_tr
+        dx = 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    return {'plus_di': plus_di, 'minus_di': minus_di, 'adx': ema(dx, alpha=alpha)}
+
+
+def bollinger_bands(values: np.ndarray, period: int = 20, std_dev: float = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Upper, middle and lower Bollinger bands (sample std)"""
+    middle = rolling_mean(values, period)
+    std = rolling_std(values, period)
+    return middle + std_dev * std, middle, middle - std_dev * std
+
+
+def volume_index(close: np.ndarray, volume: np.ndarray, rising: bool) -> np.ndarray:
+    """
+    Positive (rising=True) or negative volume index starting at 1000
+
+    The index moves with the close-to-close return only on rows where
+    volume rose (PVI) or fell (NVI) from the previous row.
+    """
+    previous_volume = shift(volume)
+    moved = volume > previous_volume if rising else volume < previous_volume
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(moved, 1 + diff(close) / shift(close), 1.0)
+    factor[0] = 1000.0
+    return np.cumprod(factor)
+
+
+# ----------------------------------------------------------------------
+# Feature tables
+# ----------------------------------------------------------------------
+
+def rate_indicators(
+    open_price: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    All 46 rate-domain technical indicators of one M1 OHLCV partition
+
+    Args:
+        open_price, high, low, close, volume: Aligned 1-D series
+
+    Returns:
+        Dict of RATE_INDICATOR_COLUMNS -> float64 arrays
+    """
+    high, low, close, volume = (_as_float(a) for a in (high, low, close, volume))
+    out = {}
+
+    # Shared intermediates
+    prev_close = shift(close)
+    tr = true_range(high, low, close)
+    typical = (high + low + close) / 3
+    midpoint = (high + low) / 2
+    hl_range = high - low
+    with np.errstate(divide='ignore', invalid='ignore'):
+        clv = ((close - low) - (high - close)) / hl_range
+    clv = np.where(np.isnan(clv), 0.0, clv)
+    highest_14, lowest_14 = rolling_max(high, 14), rolling_min(low, 14)
+    highest_20, lowest_20 = rolling_max(high, 20), rolling_min(low, 20)
+
+    # Trend
+    emas = {span: ema(close, span) for span in (10, 20, 50, 100, 200)}
+    for span in (10, 20, 50, 100, 200):
+        out[f'ema_{span}'] = emas[span]
+    for window in (10, 20, 50, 100, 200):
+        out[f'sma_{window}'] = rolling_mean(close, window)
+
+    # Momentum
+    out['rsi_14'] = rsi(close, 14)
+    out['macd'], out['macd_signal'], out['macd_histogram'] = macd(close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stoch_k = 100 * (close - lowest_14) / (highest_14 - lowest_14)
+        out['williams_r_14'] = -100 * (highest_14 - close) / (highest_14 - lowest_14)
+    out['stoch_k'], out['stoch_d'] = stoch_k, rolling_mean(stoch_k, 3)
+    out['cci_20'] = cci(typical, 20)
+    out['roc_12'] = roc(close, 12)
+    out['momentum_10'] = diff(close, 10)
+    out['momentum_20'] = diff(close, 20)
+
+    ema3 = ema(ema(ema(close, 15), 15), 15)
+    out['trix'] = roc(ema3, 1)
+
+    bp = close - np.fmin(low, prev_close)
+    averages = [rolling_sum(bp, w) / rolling_sum(tr, w) for w in (7, 14, 28)]
+    out['ultimate_oscillator'] = 100 * ((4 * averages[0]) + (2 * averages[1]) + averages[2]) / 7
+    out['awesome_oscillator'] = rolling_mean(midpoint, 5) - rolling_mean(midpoint, 34)
+
+    atr_20 = rolling_mean(tr, 20)
+    out['keltner_channel_upper'] = emas[20] + (2 * atr_20)
+    out['keltner_channel_lower'] = emas[20] - (2 * atr_20)
+
+    # Volatility
+    out['atr_14'] = rolling_mean(tr, 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_returns = np.log(close / prev_close)
+    out['historical_volatility_20'] = rolling_std(log_returns, 20) * np.sqrt(252)
+    out['chaikin_volatility'] = roc(ema(hl_range, 10), 10)
+
+    out['donchian_channel_upper'] = highest_20
+    out['donchian_channel_middle'] = (highest_20 + lowest_20) / 2
+    out['donchian_channel_lower'] = lowest_20
+
+    ema_range = ema(hl_range, 9)
+    out['mass_index'] = rolling_sum(ema_range / ema(ema_range, 9), 25)
+
+    tr_14 = rolling_sum(tr, 14)
+    out['vortex_indicator_plus'] = rolling_sum(np.abs(high - shift(low)), 14) / tr_14
+    out['vortex_indicator_minus'] = rolling_sum(np.abs(low - shift(high)), 14) / tr_14
+
+    max_close = rolling_max(close, 14)
+    drawdown = 100 * (close - max_close) / max_close
+    out['ulcer_index'] = np.sqrt(rolling_mean(drawdown ** 2, 14))
+
+    # Volume
+    obv_steps = np.sign(diff(close)) * volume
+    out['obv'] = np.cumsum(np.where(np.isnan(obv_steps), 0.0, obv_steps))
+    money_flow_volume = clv * volume
+    out['adl'] = cumsum(money_flow_volume)
+    out['cmf_20'] = rolling_sum(money_flow_volume, 20) / rolling_sum(volume, 20)
+    out['fi_13'] = ema(diff(close) * volume, 13)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        box_ratio = (volume / 1000000) / hl_range
+        out['eom_14'] = rolling_mean(diff(midpoint) / box_ratio, 14)
+        out['vpt'] = cumsum(volume * (diff(close) / prev_close))
+
+    out['nvi'] = volume_index(close, volume, rising=False)
+    out['pvi'] = volume_index(close, volume, rising=True)
+
+    money_flow = typical * volume
+    previous_typical = shift(typical)
+    positive = rolling_sum(np.where(typical > previous_typical, money_flow, 0.0), 14)
+    negative = rolling_sum(np.where(typical < previous_typical, money_flow, 0.0), 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['mfi_14'] = 100 - (100 / (1 + positive / negative))
+        out['vwap'] = cumsum(money_flow) / cumsum(volume)
+
+    return {column: out[column] for column in RATE_INDICATOR_COLUMNS}
+
+
+def bqx_indicators(w15: np.ndarray, w60: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    All 44 BQX-domain technical indicators of one partition
+
+    Indicators run on w15 momentum; |w15 - w60| (term-structure spread)
+    stands in for volume. Denominators carry BQX_EPS.
+
+    Args:
+        w15, w60: Aligned w15 / w60 BQX return series (NULL as NaN)
+
+    Returns:
+        Dict of BQX_INDICATOR_COLUMNS -> float64 arrays
+    """
+    series = _as_float(w15)
+    spread = np.abs(series - _as_float(w60))
+    out = {}
+
+    for span in (10, 20, 50, 100, 200):
+        out[f'ema_{span}'] = ema(series, span)
+    for window in (10, 20, 50, 100, 200):
+        out[f'sma_{window}'] = rolling_mean(series, window)
+
+    for period in (14, 9, 25):
+        out[f'rsi_{period}'] = rsi(series, period, eps=BQX_EPS)
+    out['macd'], out['macd_signal'], out['macd_histogram'] = macd(series)
+
+    highest_14, lowest_14 = rolling_max(series, 14), rolling_min(series, 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stoch_k = 100 * (series - lowest_14) / (highest_14 - lowest_14 + BQX_EPS)
+        out['williams_r'] = -100 * (highest_14 - series) / (highest_14 - lowest_14 + BQX_EPS)
+    out['stoch_k'], out['stoch_d'] = stoch_k, rolling_mean(stoch_k, 3)
+    out['cci'] = cci(series, 20, eps=BQX_EPS)
+    out['roc_12'] = roc(series, 12, eps=BQX_EPS)
+    out['roc_25'] = roc(series, 25, eps=BQX_EPS)
+    out['momentum_10'] = diff(series, 10)
+    out['momentum_20'] = diff(series, 20)
+
+    std_20 = rolling_std(series, 20)
+    middle = rolling_mean(series, 20)
+    upper, lower = middle + 2 * std_20, middle - 2 * std_20
+    out['bb_upper'], out['bb_middle'], out['bb_lower'] = upper, middle, lower
+    out['bb_width'] = upper - lower
+    out['bb_pct'] = (series - lower) / (upper - lower + BQX_EPS)
+
+    step = diff(series)
+    abs_step = np.abs(step)
+    out['atr_14'] = rolling_mean(abs_step, 14)
+    out['atr_28'] = rolling_mean(abs_step, 28)
+    out['std_dev_20'] = std_20
+    out['std_dev_50'] = rolling_std(series, 50)
+    out['std_dev_100'] = rolling_std(series, 100)
+
+    obv_steps = np.sign(step) * spread
+    out['obv'] = np.cumsum(np.where(np.isnan(obv_steps), 0.0, obv_steps))
+    out['adl'] = cumsum(spread)
+    weighted = spread * series
+    out['cmf'] = rolling_sum(weighted, 20) / (rolling_sum(spread, 20) + BQX_EPS)
+    out['mfi'] = rsi(weighted, 14, eps=BQX_EPS)
+    out['vwap'] = cumsum(weighted) / (cumsum(spread) + BQX_EPS)
+
+    out['force_index'] = step * spread
+    out['ease_of_movement'] = step / (spread + BQX_EPS)
+    out['volume_oscillator'] = rolling_mean(spread, 5) - rolling_mean(spread, 10)
+    out['volume_roc'] = roc(spread, 12, eps=BQX_EPS)
+    out['nvi'] = cumsum(np.where(spread < shift(spread), series, 0.0))
+
+    return {column: out[column] for column in BQX_INDICATOR_COLUMNS}
@@ -0,0 +1,347 @@
+"""
+Partition Job Runner
+Resumable (stage, pair, month) backfills recorded in a SQLite job ledger
+
+The backfill and populate workers iterated hardcoded PAIRS x MONTHS lists
+in a process pool and kept no record of what finished, so an interrupted
+run (e.g. a spot instance reclaimed mid-backfill) had to be restarted
+from scratch or resumed by hand-picking partitions. run_jobs is the
+common runner they now share:
+- every job's state, row count, duration, attempts and input checksum
+  is committed to the ledger as it finishes
+- jobs the ledger lists as done are skipped (re-run when their input
+  checksum changed, or with force=True)
+- failed jobs are retried with exponential backoff (full jitter, as
+  data.db.retry) without holding a pool slot while they wait
+- jobs are submitted longest first, using the durations recorded by
+  earlier runs, so the slowest partitions do not start last and set the
+  tail of the run
+
+The ledger is a local SQLite file (cache/job_ledger.sqlite, or
+$BQX_JOB_LEDGER) written only by the process that runs the pool.
+"""
+
+import hashlib
+import heapq
+import logging
+import os
+import random
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_PATH = Path(__file__).parent.parent / "cache" / "job_ledger.sqlite"
+
+LEDGER_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        stage TEXT NOT NULL,
+        pair TEXT NOT NULL,
+        month TEXT NOT NULL,
+        state TEXT NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        seconds REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        checksum TEXT,
+        error TEXT,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (stage, pair, month)
+    )
+"""
+
+# Ledger keys of jobs that cover every pair (e.g. one cross-pair scan per
+# month) or every month (e.g. creating a pair's tables)
+ALL_PAIRS = '*'
+ALL_MONTHS = '*'
+
+Outcome = Tuple[bool, int, Optional[str]]
+
+
+class Job(NamedTuple):
+    """One partition of a stage"""
+    pair: str                   # currency pair, or ALL_PAIRS
+    month: str                  # 'YYYY_MM', or ALL_MONTHS
+    args: tuple = ()            # arguments of the job function
+    weight: float = 0.0         # size estimate, orders jobs the ledger has no durations for
+
+
+class JobResult(NamedTuple):
+    """How a job ended"""
+    job: Job
+    state: str                  # 'done', 'failed' or 'skipped'
+    rows: int
+    seconds: float
+    attempts: int
+    error: Optional[str]
+    result: Any = None          # the job function's return value (last attempt)
+
+
+class JobLedger:
+    """SQLite record of job states per (stage, pair, month)"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: SQLite file (default: $BQX_JOB_LEDGER, then
+                cache/job_ledger.sqlite at the repository root)
+        """
+        self.path = Path(path or os.environ.get("BQX_JOB_LEDGER") or DEFAULT_LEDGER_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(LEDGER_SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def jobs(self, stage: str) -> Dict[Tuple[str, str], sqlite3.Row]:
+        """(pair, month) -> ledger row of every recorded job of a stage"""
+        rows = self.conn.execute("SELECT * FROM jobs WHERE stage = ?", (stage,)).fetchall()
+        return {(row['pair'], row['month']): row for row in rows}
+
+    def done(self, stage: str) -> set:
+        """(pair, month) of the stage's completed jobs"""
+        rows = self.conn.execute("SELECT pair, month FROM jobs WHERE stage = ? AND state = 'done'", (stage,))
+        return {tuple(row) for row in rows.fetchall()}
+
+    def summary(self, stage: str) -> Dict[str, int]:
+        """Job count per state"""
+        rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs WHERE stage = ? GROUP BY state", (stage,))
+        return dict(rows.fetchall())
+
+    def update(self, stage: str, job: Job, state: str, rows: int = 0, seconds: Optional[float] = None,
+               attempts: int = 0, checksum: Optional[str] = None, error: Optional[str] = None):
+        """Record a job's state (committed immediately)"""
+        self.conn.execute(
+            """
+            INSERT INTO jobs (stage, pair, month, state, rows, seconds, attempts, checksum, error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (stage, pair, month) DO UPDATE SET
+                state = excluded.state,
+                rows = excluded.rows,
+                seconds = COALESCE(excluded.seconds, jobs.seconds),
+                attempts = excluded.attempts,
+                checksum = COALESCE(excluded.checksum, jobs.checksum),
+                error = excluded.error,
+                updated_at = excluded.updated_at
+            """,
+            (stage, job.pair, job.month, state, int(rows), seconds, attempts, checksum, error,
+             datetime.now(timezone.utc).isoformat(timespec='seconds'))
+        )
+        self.conn.commit()
+
+    def reset(self, stage: str, pair: Optional[str] = None):
+        """Forget the jobs of a stage (or of one pair in it)"""
+        if pair is None:
+            self.conn.execute("DELETE FROM jobs WHERE stage = ?", (stage,))
+        else:
+            self.conn.execute("DELETE FROM jobs WHERE stage = ? AND pair = ?", (stage, pair))
+        self.conn.commit()
+
+
+# ----------------------------------------------------------------------
+# Input checksums
+# ----------------------------------------------------------------------
+
+CHECKSUM_QUERY = """
+    SELECT COUNT(*), MIN({time_column}), MAX({time_column})
+    FROM {table}
+    WHERE {time_column} >= %s AND {time_column} < %s
+"""
+
+
+def month_bounds(month: str) -> Tuple[datetime, datetime]:
+    """'YYYY_MM' -> (first instant, first instant of the next month)"""
+    year, mon = int(month[:4]), int(month[5:7])
+    return datetime(year, mon, 1), datetime(year + mon // 12, mon % 12 + 1, 1)
+
+
+def month_checksum(table: str, time_column: str = 'ts_utc') -> Callable[[Job], str]:
+    """
+    Input checksum of a job: row count and first/last timestamp of its
+    pair-month in a source table
+
+    Args:
+        table: Source table template formatted with pair (e.g. 'bqx.m1_{pair}')
+        time_column: Timestamp column of the table
+
+    Returns:
+        Function of a Job returning an MD5 hex digest
+    """
+    from data.db import connection
+
+    def checksum(job: Job) -> str:
+        query = CHECKSUM_QUERY.format(time_column=time_column, table=table.format(pair=job.pair))
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, month_bounds(job.month))
+                stats = cur.fetchone()
+        return hashlib.md5(repr(stats).encode()).hexdigest()
+
+    return checksum
+
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+
+def _rows_outcome(result) -> Outcome:
+    """Default outcome: the job function returns its row count"""
+    return True, int(result or 0), None
+
+
+def longest_first(jobs: Iterable[Job], history: Dict[Tuple[str, str], sqlite3.Row]) -> List[Job]:
+    """
+    Jobs ordered by expected duration, longest first
+
+    A job's expected duration is its last recorded duration, else the
+    mean recorded duration of its pair, else of the stage. Without any
+    recorded duration jobs are ordered by weight (ties keep their order).
+    """
+    jobs = list(jobs)
+    seconds = {key: row['seconds'] for key, row in history.items() if row['seconds']}
+    if not seconds:
+        return sorted(jobs, key=lambda job: -job.weight)
+
+    stage_mean = sum(seconds.values()) / len(seconds)
+    by_pair = {}
+    for (pair, _), value in seconds.items():
+        by_pair.setdefault(pair, []).append(value)
+    pair_mean = {pair: sum(values) / len(values) for pair, values in by_pair.items()}
+
+    def expected(job: Job) -> float:
+        return seconds.get((job.pair, job.month), pair_mean.get(job.pair, stage_mean))
+
+    return sorted(jobs, key=lambda job: -expected(job))
+
+
+def run_jobs(
+    stage: str,
+    jobs: Iterable[Job],
+    fn: Callable[..., Any],
+    max_workers: int = 8,
+    outcome: Callable[[Any], Outcome] = _rows_outcome,
+    ledger: Optional[JobLedger] = None,
+    checksum: Optional[Callable[[Job], str]] = None,
+    force: bool = False,
+    attempts: int = 3,
+    backoff: float = 30.0,
+    max_backoff: float = 600.0,
+    threads: bool = False,
+    on_result: Optional[Callable[[JobResult], None]] = None
+) -> List[JobResult]:
+    """
+    Run a stage's partition jobs in a pool, resuming from the ledger
+
+    Args:
+        stage: Ledger stage name (e.g. 'stage_2_9')
+        jobs: Partitions to run
+        fn: Job function, called as fn(*job.args) in a worker (module
+            level, so process pools can pickle it)
+        max_workers: Pool size
+        outcome: Maps fn's return value to (success, rows, error); the
+            default expects a row count. Exceptions count as failures.
+        ledger: Job ledger (default: JobLedger())
+        checksum: Optional input checksum per job; a done job whose
+            checksum changed is run again
+        force: Run jobs the ledger lists as done
+        attempts: Tries per job
+        backoff: Base retry delay in seconds (doubled per retry, full jitter)
+        max_backoff: Cap on a single retry delay
+        threads: Use a thread pool instead of a process pool
+        on_result: Optional callback per finished (or skipped) job
+
+    Returns:
+        list of JobResult in completion order (skipped jobs first)
+    """
+    ledger = ledger or JobLedger()
+    history = ledger.jobs(stage)
+    results = []
+
+    def report(result: JobResult):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    # Completed jobs whose inputs are unchanged are skipped (jobs are
+    # tracked by position: their args need not be hashable)
+    jobs = list(jobs)
+    sums = [checksum(job) if checksum is not None else None for job in jobs]
+    todo = []
+    for k, job in enumerate(jobs):
+        row = history.get((job.pair, job.month))
+        if not force and row is not None and row['state'] == 'done' and \
+                (sums[k] is None or row['checksum'] == sums[k]):
+            report(JobResult(job, 'skipped', row['rows'], 0.0, 0, None))
+        else:
+            todo.append(k)
+    if results:
+        logger.info(f"{stage}: {len(results)} partitions already done, {len(todo)} to run")
+
+    order = {id(job): k for k, job in enumerate(jobs)}
+    pending = deque(order[id(job)] for job in longest_first([jobs[k] for k in todo], history))
+    tries = [0] * len(jobs)
+    retries = []                                   # heap of (ready time, job index)
+    running = {}                                   # future -> (job index, submit time)
+
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with pool(max_workers=max_workers) as executor:
+        while pending or retries or running:
+            now = time.monotonic()
+            while retries and retries[0][0] <= now:
+                pending.appendleft(heapq.heappop(retries)[1])
+
+            while pending and len(running) < max_workers:
+                k = pending.popleft()
+                tries[k] += 1
+                ledger.update(stage, jobs[k], 'running', attempts=tries[k], checksum=sums[k])
+                running[executor.submit(fn, *jobs[k].args)] = (k, time.monotonic())
+
+            timeout = max(retries[0][0] - now, 0.0) if retries else None
+            if not running:
+                time.sleep(timeout or 0.0)
+                continue
+
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                k, started = running.pop(future)
+                job = jobs[k]
+                seconds = time.monotonic() - started
+                result = None
+                try:
+                    result = future.result()
+                    success, rows, error = outcome(result)
+                except Exception as e:
+                    success, rows, error = False, 0, f"{type(e).__name__}: {e}"
+
+                if success:
+                    ledger.update(stage, job, 'done', rows, seconds, tries[k], sums[k])
+                    report(JobResult(job, 'done', rows, seconds, tries[k], None, result))
+                elif tries[k] < attempts:
+                    delay = random.uniform(0, min(max_backoff, backoff * 2 ** (tries[k] - 1)))
+                    logger.warning(f"{stage} {job.pair} {job.month}: attempt {tries[k]}/{attempts} failed "
+                                   f"({error}); retrying in {delay:.0f}s")
+                    ledger.update(stage, job, 'retrying', rows, seconds, tries[k], sums[k], error)
+                    heapq.heappush(retries, (time.monotonic() + delay, k))
+                else:
+                    ledger.update(stage, job, 'failed', rows, seconds, tries[k], sums[k], error)
+                    report(JobResult(job, 'failed', rows, seconds, tries[k], error, result))
+
+    return results
+
+
+def add_ledger_arguments(parser):
+    """Add the runner's --force/--ledger/--attempts options to a worker's argparse parser"""
+    parser.add_argument('--force', action='store_true',
+                        help='Re-run partitions the job ledger lists as done')
+    parser.add_argument('--ledger', default=None,
+                        help=f'Job ledger SQLite file (default: $BQX_JOB_LEDGER or {DEFAULT_LEDGER_PATH})')
+    parser.add_argument('--attempts', type=int, default=3, help='Tries per partition before it is marked failed')
+    return parser
@@ -0,0 +1,329 @@
+"""
+Cross-Pair Panel
+Timestamp-aligned pair × time matrices loaded once per month
+
+Cross-pair workers (correlation, arbitrage, currency indices) used to
+re-read the same month of every related pair inside every partition,
+O(pairs²) reads per month. A Panel holds one read of each pair:
+- index: union of all pairs' timestamps (naive UTC, sorted)
+- one (rows, pairs) column-major float64 matrix per field, NaN where a
+  pair has no row or a NULL value
+- present: (rows, pairs) mask of rows that exist in each pair's table,
+  so per-pair reads reproduce the source rows exactly
+- missing: pairs whose table does not exist
+
+Panels are saved as a directory of .npy files and reopened with
+np.load(mmap_mode='r'): worker processes share the same read-only
+page-cache pages instead of each loading their own copy.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+# M1 rate_index for one pair; {pair} is formatted in, the range is bound
+M1_RATE_QUERY = """
+    SELECT time, rate_index
+    FROM bqx.m1_{pair}
+    WHERE time >= %s AND time < %s
+    ORDER BY time
+"""
+
+DEFAULT_PANEL_ROOT = "cache/panels"
+
+
+def _naive_utc(value) -> np.datetime64:
+    """Timestamp bound as naive-UTC datetime64[ns]"""
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts.to_datetime64().astype('datetime64[ns]')
+
+
+class Panel:
+    """Timestamp-aligned cross-pair matrices (one per field)"""
+
+    def __init__(
+        self,
+        ts: np.ndarray,
+        pairs: Sequence[str],
+        fields: Dict[str, np.ndarray],
+        present: np.ndarray,
+        missing: Sequence[str] = ()
+    ):
+        """
+        Args:
+            ts: Sorted datetime64[ns] row timestamps (naive UTC)
+            pairs: Column order
+            fields: Field name -> (rows, pairs) float matrix
+            present: (rows, pairs) bool mask of source rows
+            missing: Pairs that could not be loaded (all-NaN columns)
+        """
+        self.ts = ts
+        self.pairs = list(pairs)
+        self.fields = fields
+        self.present = present
+        self.missing = list(missing)
+        self._columns = {pair: j for j, pair in enumerate(self.pairs)}
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """Row timestamps (naive UTC)"""
+        return pd.DatetimeIndex(self.ts, name='ts_utc')
+
+    def field(self, name: str) -> np.ndarray:
+        """(rows, pairs) matrix for one field"""
+        return self.fields[name]
+
+    def column(self, name: str, pair: str) -> np.ndarray:
+        """One pair's field over all panel rows (NaN where absent)"""
+        return self.fields[name][:, self._columns[pair]]
+
+    def rows(self, start=None, end=None, inclusive: bool = False) -> slice:
+        """
+        Row slice for timestamps in [start, end) ([start, end] if inclusive)
+
+        Bounds may be naive or tz-aware; aware bounds are converted to UTC.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.ts, _naive_utc(start), side='left'))
+        side = 'right' if inclusive else 'left'
+        hi = len(self.ts) if end is None else int(np.searchsorted(self.ts, _naive_utc(end), side=side))
+        return slice(lo, max(lo, hi))
+
+    def values(self, name: str, pair: str, start=None, end=None, inclusive: bool = False) -> np.ndarray:
+        """
+        A pair's field on the rows its table actually has, in time order
+
+        Matches `SELECT field FROM pair_table WHERE time in range ORDER BY
+        time` (NULLs as NaN). Missing pairs return an empty array.
+        """
+        if pair in self.missing or pair not in self._columns:
+            return np.empty(0)
+        rows = self.rows(start, end, inclusive)
+        j = self._columns[pair]
+        return self.fields[name][rows, j][self.present[rows, j]]
+
+    def series(self, name: str, pair: str, utc: bool = False) -> pd.Series:
+        """values() over the whole panel as a Series indexed by timestamp"""
+        j = self._columns[pair]
+        mask = self.present[:, j]
+        index = self.index[mask]
+        if utc:
+            index = index.tz_localize('UTC')
+        return pd.Series(self.fields[name][mask, j], index=index, name=name)
+
+    def frame(self, name: str, pairs: Optional[Sequence[str]] = None, utc: bool = False) -> pd.DataFrame:
+        """
+        Field matrix as a DataFrame (union index, one column per pair)
+
+        Args:
+            name: Field name
+            pairs: Column subset (default: all loaded pairs)
+            utc: Return a tz-aware UTC index
+        """
+        if pairs is None:
+            pairs = [p for p in self.pairs if p not in self.missing]
+        index = self.index.tz_localize('UTC') if utc else self.index
+        columns = [self._columns[p] for p in pairs]
+        return pd.DataFrame(self.fields[name][:, columns], index=index, columns=list(pairs))
+
+    def at(self, name: str, timestamps, pairs: Sequence[str]) -> np.ndarray:
+        """
+        Field values of several pairs at given timestamps
+
+        Args:
+            name: Field name
+            timestamps: Sorted timestamps (naive or tz-aware)
+            pairs: Column order of the result
+
+        Returns:
+            (len(timestamps), len(pairs)) float64 array, NaN where the
+            panel has no row, the pair has no value or was not loaded
+        """
+        ts = pd.DatetimeIndex(timestamps)
+        if ts.tz is not None:
+            ts = ts.tz_convert('UTC').tz_localize(None)
+        ts = ts.to_numpy().astype('datetime64[ns]')
+
+        out = np.full((len(ts), len(pairs)), np.nan)
+        rows = np.searchsorted(self.ts, ts)
+        found = rows < len(self.ts)
+        found[found] = self.ts[rows[found]] == ts[found]
+
+        matrix = self.fields[name]
+        for k, pair in enumerate(pairs):
+            if pair in self._columns:
+                out[found, k] = matrix[rows[found], self._columns[pair]]
+        return out
+
+    # ------------------------------------------------------------------
+    # Shared storage
+    # ------------------------------------------------------------------
+
+    def save(self, path: str) -> str:
+        """
+        Write the panel as .npy files under `path` (replacing it)
+
+        Returns:
+            The panel directory
+        """
+        target = Path(path)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+
+        np.save(tmp / "ts.npy", self.ts.astype('datetime64[ns]'))
+        np.save(tmp / "present.npy", np.asfortranarray(self.present))
+        for name, matrix in self.fields.items():
+            np.save(tmp / f"{name}.npy", np.asfortranarray(matrix))
+        with open(tmp / "meta.json", 'w') as f:
+            json.dump({'pairs': self.pairs, 'fields': list(self.fields), 'missing': self.missing}, f)
+
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+        return str(target)
+
+    @classmethod
+    def open(cls, path: str) -> 'Panel':
+        """Memory-map a saved panel (read-only, shared across processes)"""
+        root = Path(path)
+        with open(root / "meta.json", 'r') as f:
+            meta = json.load(f)
+
+        fields = {name: np.load(root / f"{name}.npy", mmap_mode='r') for name in meta['fields']}
+        return cls(
+            np.load(root / "ts.npy"),
+            meta['pairs'],
+            fields,
+            np.load(root / "present.npy", mmap_mode='r'),
+            meta['missing']
+        )
+
+
+def load_panel(
+    conn,
+    query: str,
+    pairs: Sequence[str],
+    fields: Sequence[str],
+    start,
+    end
+) -> Panel:
+    """
+    Read each pair once and align all pairs on their union of timestamps
+
+    Each pair's query runs under a savepoint, so a missing table marks the
+    pair as missing instead of aborting the caller's transaction. Any
+    other error (statement timeout, serialization failure, dropped
+    connection) is raised: a panel is shared by every worker of the month,
+    so a pair dropped by a transient failure would be missing for all of
+    them.
+
+    Args:
+        conn: psycopg2 connection
+        query: SQL template with a {pair} placeholder selecting the time
+            column followed by `fields`, with two %s range parameters
+        pairs: Pairs to load (panel column order)
+        fields: Field names for the selected value columns
+        start: Range start bound
+        end: Range end bound
+
+    Returns:
+        Panel
+    """
+    import psycopg2.errors
+
+    per_pair = {}
+    missing = []
+    cur = conn.cursor()
+    try:
+        for pair in pairs:
+            cur.execute("SAVEPOINT panel_load")
+            try:
+                cur.execute(query.format(pair=pair), (start, end))
+                rows = cur.fetchall()
+            except psycopg2.errors.UndefinedTable:
+                cur.execute("ROLLBACK TO SAVEPOINT panel_load")
+                missing.append(pair)
+                continue
+            cur.execute("RELEASE SAVEPOINT panel_load")
+
+            ts = np.array([_naive_utc(r[0]) for r in rows], dtype='datetime64[ns]')
+            values = np.array(
+                [[np.nan if v is None else float(v) for v in r[1:]] for r in rows],
+                dtype=np.float64
+            ).reshape(len(rows), len(fields))
+            per_pair[pair] = (ts, values)
+    finally:
+        cur.close()
+
+    loaded = [ts for ts, _ in per_pair.values()]
+    index = np.unique(np.concatenate(loaded)) if loaded else np.empty(0, dtype='datetime64[ns]')
+
+    n = len(index)
+    matrices = {name: np.full((n, len(pairs)), np.nan, order='F') for name in fields}
+    present = np.zeros((n, len(pairs)), dtype=bool, order='F')
+
+    for j, pair in enumerate(pairs):
+        if pair not in per_pair:
+            continue
+        ts, values = per_pair[pair]
+        rows = np.searchsorted(index, ts)
+        present[rows, j] = True
+        for k, name in enumerate(fields):
+            matrices[name][rows, j] = values[:, k]
+
+    return Panel(index, pairs, matrices, present, missing)
+
+
+def month_range(year: int, month: int):
+    """[start, end) datetimes of a calendar month"""
+    start = pd.Timestamp(year=year, month=month, day=1)
+    return start.to_pydatetime(), (start + pd.offsets.MonthBegin(1)).to_pydatetime()
+
+
+def load_m1_panel(conn, year: int, month: int, pairs: Sequence[str]) -> Panel:
+    """One month of M1 rate_index for `pairs` (field 'rate_index')"""
+    start, end = month_range(year, month)
+    return load_panel(conn, M1_RATE_QUERY, pairs, ['rate_index'], start, end)
+
+
+def panel_path(name: str, key: str, root: str = DEFAULT_PANEL_ROOT) -> str:
+    """Directory for a saved panel, e.g. cache/panels/m1_rate_index/2024_07"""
+    return str(Path(root) / name / key)
+
+
+def save_m1_panels(
+    conn,
+    year_months: Sequence[str],
+    pairs: Sequence[str],
+    root: str = DEFAULT_PANEL_ROOT
+) -> Dict[str, str]:
+    """
+    Load and save one M1 rate panel per month for process-pool workers
+
+    Args:
+        conn: psycopg2 connection
+        year_months: Months as 'YYYY_MM'
+        pairs: Pairs to load
+        root: Panel cache root
+
+    Returns:
+        Dict of year_month -> saved panel directory (open with Panel.open)
+    """
+    paths = {}
+    for year_month in year_months:
+        year, month = year_month.split('_')
+        panel = load_m1_panel(conn, int(year), int(month), pairs)
+        paths[year_month] = panel.save(panel_path('m1_rate_index', year_month, root))
+    return paths
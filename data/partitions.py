@@ -0,0 +1,276 @@
+"""
+Month Partition I/O
+Read months of M1 rows and write their feature partitions
+
+The per pair-month feature workers (spectral, realized volatility) all
+read a month of M1 rows together with the history their windows need,
+compute their features over both, and write only the month's rows to
+each feature table's `{table}_{YYYY_MM}` partition.
+populate_month_with_warmup is that shared body; workers supply the M1
+columns, the warm-up length and a compute function.
+
+The cross-pair engine workers (error correction, HMM regime) run one job
+per month instead: populate_panel_month loads every pair into one panel,
+advances one engine per domain over all pairs and writes each pair's
+partitions; run_panel_months runs those month jobs and tallies them per
+pair partition.
+"""
+
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data.db import connection, read_frame
+from data.jobs import ALL_PAIRS, Job, JobLedger, month_bounds, run_jobs
+from data.panel import load_panel
+from data.writer import write_columns
+
+logger = logging.getLogger(__name__)
+
+# The month's M1 rows and the `warmup_rows` rows before it, in time order
+WARMUP_M1_QUERY = """
+    SELECT {columns} FROM (
+        (SELECT {columns} FROM bqx.m1_{pair}
+         WHERE time < %s ORDER BY time DESC LIMIT %s)
+        UNION ALL
+        (SELECT {columns} FROM bqx.m1_{pair}
+         WHERE time >= %s AND time < %s)
+    ) AS rows
+    ORDER BY time
+"""
+
+# M1 rate_index and bqx of one pair for the panel-month workers
+PANEL_M1_QUERY = """
+    SELECT time, rate_index, bqx
+    FROM bqx.m1_{pair}
+    WHERE time >= %s AND time < %s
+    ORDER BY time
+"""
+
+Outcome = Tuple[str, str, bool, int, Optional[str]]
+
+
+def read_month_with_warmup(conn, pair: str, month: str, columns: List[str], warmup_rows: int):
+    """
+    One pair-month of M1 rows plus the rows before it that warm windows up
+
+    Args:
+        conn: Database connection
+        pair: Currency pair (e.g., 'eurusd')
+        month: 'YYYY_MM' partition
+        columns: M1 columns besides time
+        warmup_rows: Rows of history read before the month
+
+    Returns:
+        (frame, in_month): rows in time order with a 'time' column, and a
+        bool array marking the rows of the month
+    """
+    start, end = month_bounds(month)
+    query = WARMUP_M1_QUERY.format(columns=', '.join(['time'] + list(columns)), pair=pair)
+    frame = read_frame(conn, query, (start, warmup_rows, start, end))
+    return frame, (frame['time'] >= start).to_numpy()
+
+
+def populate_month_with_warmup(
+    pair: str,
+    month: str,
+    columns: List[str],
+    warmup_rows: int,
+    compute: Callable[[Any], Dict[str, Dict[str, Any]]],
+    log: logging.Logger = logger
+) -> Outcome:
+    """
+    Shared body of the per pair-month feature workers
+
+    Reads the month with read_month_with_warmup, computes features over
+    history and month together and writes the month's rows to each
+    table's `{table}_{month}` partition in one transaction.
+
+    Args:
+        pair: Currency pair (e.g., 'eurusd')
+        month: 'YYYY_MM' partition
+        columns: M1 columns besides time
+        warmup_rows: Rows of history read before the month
+        compute: frame -> {parent table: {column: array over all rows}}
+        log: Worker logger for progress lines
+
+    Returns:
+        tuple: (pair, month, success, row_count, error_msg)
+    """
+    start_time = time.time()
+    try:
+        with connection() as conn:
+            frame, in_month = read_month_with_warmup(conn, pair, month, columns, warmup_rows)
+            if not in_month.any():
+                log.warning(f"{pair.upper()} {month}: No data found")
+                return (pair, month, True, 0, "No data")
+
+            log.info(f"{pair.upper()} {month}: Loaded {in_month.sum():,} rows "
+                     f"(+{(~in_month).sum():,} history), computing...")
+
+            tables = compute(frame)
+            ts = frame['time'].to_numpy()[in_month]
+            for table, features in tables.items():
+                partition = {'ts_utc': ts}
+                partition.update({name: values[in_month] for name, values in features.items()})
+                write_columns(conn, f"{table}_{month}", partition)
+            conn.commit()
+
+        elapsed = time.time() - start_time
+        log.info(f"✅ {pair.upper()} {month}: Complete! {in_month.sum():,} rows x {len(tables)} tables, "
+                 f"{elapsed:.1f}s")
+        return (pair, month, True, int(in_month.sum()), None)
+
+    except Exception as e:
+        elapsed = time.time() - start_time
+        log.error(f"❌ {pair.upper()} {month}: Failed after {elapsed:.1f}s - {e}")
+        return (pair, month, False, 0, str(e))
+
+
+def _pair_column(out: Dict[str, np.ndarray], j: int, pair: str) -> Dict[str, np.ndarray]:
+    """Panel column j of every engine output"""
+    return {name: values[:, j] for name, values in out.items()}
+
+
+def populate_panel_month(
+    month: str,
+    pairs: Sequence[str],
+    domains: Dict[str, Any],
+    engine: Callable[[str, Sequence[str]], Any],
+    columns: Callable[[str], Dict[str, str]],
+    warmup: timedelta,
+    pair_features: Callable[[Dict[str, np.ndarray], int, str], Dict[str, np.ndarray]] = _pair_column,
+    log: logging.Logger = logger
+) -> List[Outcome]:
+    """
+    Shared body of the per-month cross-pair engine workers
+
+    Loads every pair's M1 rate_index and bqx from `warmup` before the
+    month into one panel, runs one engine per domain over all pairs and
+    writes each pair's rows of the month to its `{table}_{month}`
+    partitions, committing pair by pair.
+
+    Args:
+        month: 'YYYY_MM' partition
+        pairs: Pairs loaded into the panel (engine columns)
+        domains: Domain name -> spec with `table` (formatted with pair)
+            and `field` (panel field the engine reads)
+        engine: (domain, pairs) -> engine whose run(levels) returns its
+            outputs over all panel rows
+        columns: domain -> {pair feature name: table column}
+        warmup: History loaded before the month
+        pair_features: (outputs, panel column, pair) -> one pair's
+            features (default: column j of every output)
+        log: Worker logger for progress lines
+
+    Returns:
+        list of tuples: (pair, month, success, row_count, error_msg)
+    """
+    start_time = time.time()
+    outcomes = []
+
+    try:
+        month_start, month_end = month_bounds(month)
+        with connection() as conn:
+            panel = load_panel(conn, PANEL_M1_QUERY, pairs, ['rate_index', 'bqx'],
+                               month_start - warmup, month_end)
+            rows = panel.rows(month_start, month_end)
+            log.info(f"{month}: Loaded {len(panel):,} timestamps, running {len(pairs)} pairs...")
+
+            features = {}
+            for domain, spec in domains.items():
+                levels = np.where(panel.present, panel.field(spec.field), np.nan)
+                features[domain] = engine(domain, pairs).run(levels)
+
+            for j, pair in enumerate(pairs):
+                if pair in panel.missing:
+                    outcomes.append((pair, month, False, 0, f"Could not load bqx.m1_{pair}"))
+                    continue
+
+                mask = panel.present[rows, j]
+                ts = panel.ts[rows][mask]
+                if len(ts) == 0:
+                    outcomes.append((pair, month, True, 0, "No data"))
+                    continue
+
+                for domain, spec in domains.items():
+                    values = pair_features(features[domain], j, pair)
+                    partition = {'ts_utc': ts}
+                    for name, column in columns(domain).items():
+                        partition[column] = values[name][rows][mask]
+                    write_columns(conn, f"{spec.table.format(pair=pair)}_{month}", partition)
+                conn.commit()
+                outcomes.append((pair, month, True, len(ts), None))
+
+        elapsed = time.time() - start_time
+        total = sum(row_count for _, _, _, row_count, _ in outcomes)
+        log.info(f"✅ {month}: Complete! {total:,} rows per table, {elapsed:.1f}s")
+        return outcomes
+
+    except Exception as e:
+        elapsed = time.time() - start_time
+        error_msg = str(e)
+        log.error(f"❌ {month}: Failed after {elapsed:.1f}s - {error_msg}")
+        done = {pair for pair, *_ in outcomes}
+        return outcomes + [(pair, month, False, 0, error_msg) for pair in pairs if pair not in done]
+
+
+def panel_month_outcome(outcomes: List[Outcome]) -> Tuple[bool, int, Optional[str]]:
+    """run_jobs outcome of a month job: done once every pair's partitions were written"""
+    errors = [f"{pair}: {error_msg}" for pair, _, success, _, error_msg in outcomes if not success]
+    return not errors, sum(row_count for _, _, _, row_count, _ in outcomes), '; '.join(errors) or None
+
+
+def run_panel_months(
+    stage: str,
+    months: Sequence[str],
+    pairs: Sequence[str],
+    populate: Callable[[str, Sequence[str]], List[Outcome]],
+    max_workers: int,
+    ledger: Optional[JobLedger] = None,
+    force: bool = False,
+    attempts: int = 3,
+    log: logging.Logger = logger
+) -> Dict[str, int]:
+    """
+    Run one populate(month, pairs) job per month and count pair partitions
+
+    Args:
+        stage: Ledger stage name (e.g. 'stage_1_6_18')
+        months: 'YYYY_MM' months
+        pairs: Pairs of every month job
+        populate: Module-level month function (see populate_panel_month)
+        max_workers: Pool size
+        ledger: Job ledger (default: JobLedger())
+        force: Re-run months the ledger lists as done
+        attempts: Tries per month
+        log: Worker logger for progress lines
+
+    Returns:
+        dict with success, failed, skipped and total_rows over pair partitions
+    """
+    total = len(pairs) * len(months)
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'total_rows': 0}
+
+    jobs = [Job(ALL_PAIRS, ym, (ym, pairs)) for ym in months]
+    for result in run_jobs(stage, jobs, populate, max_workers, outcome=panel_month_outcome,
+                           ledger=ledger, force=force, attempts=attempts):
+        if result.state == 'skipped':
+            results['success'] += len(pairs)
+            results['skipped'] += len(pairs)
+            results['total_rows'] += result.rows
+            continue
+        for pair_name, year_month, success, row_count, error_msg in result.result or []:
+            if success:
+                results['success'] += 1
+                results['total_rows'] += row_count
+            else:
+                results['failed'] += 1
+        if result.result is None:
+            results['failed'] += len(pairs)
+        log.info(f"Progress: {results['success']}/{total} partitions complete")
+
+    return results
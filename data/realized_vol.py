@@ -0,0 +1,207 @@
+"""
+Realized Volatility Estimators
+Rolling range-based, jump-robust and regime volatility features from M1 bars in O(n) per partition
+
+Feeds the Stage 1.6.19 realized_volatility_{rate,bqx} tables. Every
+estimator is a trailing mean of per-bar terms over WINDOW bars, taken
+from block-restart running sums (data.indicators.rolling_sum), so a
+partition costs O(n) whatever the window:
+- range: Parkinson, Garman-Klass, Rogers-Satchell and Yang-Zhang
+  volatilities from log open/high/low/close
+- jumps: realized variance, bipower variation, realized quarticity, the
+  Huang-Tauchen ratio z-statistic and signed jump variation
+- dynamics: volatility of volatility, second difference of volatility and
+  the ratio of 5- and 20-bar EWMA volatilities (recursive filters)
+- regime: high-volatility flag against a one-day EWMA of volatility, rows
+  in the current regime and the recent regime-change frequency
+
+The rate domain uses the log M1 OHLC prices. BQX has one value per
+minute and no intrabar range, so each BQX bar spans the last
+BQX_BAR_ROWS one-minute steps (open = the value BQX_BAR_ROWS rows back,
+high/low = the extremes since then, close = the current value) in BQX
+units. A two-point bar would make the Rogers-Satchell term identically 0.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+from data.indicators import ema, rolling_max, rolling_mean, rolling_min, rolling_sum, shift
+
+WINDOW = 20
+BQX_BAR_ROWS = 5
+EWMA_SHORT = 5
+EWMA_LONG = 20
+
+# High-volatility regime: above a one-day EWMA of the Yang-Zhang volatility
+REGIME_SPAN = 1440
+TRANSITION_WINDOW = 240
+
+# Rows of history before a partition for stable EWMA levels
+WARMUP_ROWS = REGIME_SPAN + TRANSITION_WINDOW
+
+# Feature -> column template ({d} is 'idx' or 'bqx')
+COLUMNS = {
+    'parkinson_vol': 'parkinson_vol_{d}_20_1m',
+    'garman_klass_vol': 'garman_klass_vol_{d}_20_1m',
+    'rogers_satchell_vol': 'rogers_satchell_vol_{d}_20_1m',
+    'yang_zhang_vol': 'yang_zhang_vol_{d}_20_1m',
+    'bipower_var': 'bipower_var_{d}_20_1m',
+    'realized_quarticity': 'realized_quarticity_{d}_20_1m',
+    'jump_test_stat': 'jump_test_stat_{d}_20_1m',
+    'signed_jump': 'signed_jump_{d}_20_1m',
+    'vol_of_vol': 'vol_of_vol_{d}_20',
+    'vol_acceleration': 'vol_acceleration_{d}_20',
+    'ewma_vol_ratio': 'ewma_vol_ratio_{d}_5_20',
+    'vol_regime_high': 'vol_regime_high_{d}',
+    'vol_regime_duration': 'vol_regime_duration_{d}',
+    'vol_regime_transition_prob': 'vol_regime_transition_prob_{d}',
+    'realized_skewness': 'realized_skewness_{d}_20',
+}
+
+# Column suffix per domain ('rate' columns use idx)
+SUFFIXES = {'rate': 'idx', 'bqx': 'bqx'}
+
+# Variance factor of the ratio jump statistic: mu1^-4 + 2 mu1^-2 - 5
+JUMP_THETA = (np.pi / 2) ** 2 + np.pi - 5
+
+
+def volatility_columns(domain: str) -> Dict[str, str]:
+    """Feature name -> table column for one domain ('rate' or 'bqx')"""
+    return {name: template.format(d=SUFFIXES[domain]) for name, template in COLUMNS.items()}
+
+
+def rate_bars(open_, high, low, close):
+    """Log OHLC of M1 price bars (non-positive prices -> NaN)"""
+    prices = [np.asarray(v, dtype=np.float64) for v in (open_, high, low, close)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return tuple(np.log(np.where(v > 0, v, np.nan)) for v in prices)
+
+
+def bqx_bars(bqx, rows: int = BQX_BAR_ROWS):
+    """Overlapping BQX bars over the last `rows` steps, one per minute"""
+    close = np.asarray(bqx, dtype=np.float64)
+    return shift(close, rows), rolling_max(close, rows + 1), rolling_min(close, rows + 1), close
+
+
+def _variance(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing sample variance from running sums (clipped at 0)"""
+    total = rolling_sum(values, window)
+    squares = rolling_sum(values * values, window)
+    return np.maximum(squares - total * total / window, 0.0) / (window - 1)
+
+
+def realized_volatility(open_, high, low, close, window: int = WINDOW) -> Dict[str, np.ndarray]:
+    """
+    Every realized-volatility feature of a series of bars
+
+    Args:
+        open_, high, low, close: Bars in log price (rate_bars) or additive
+            units (bqx_bars), in time order
+        window: Bars per estimator
+
+    Returns:
+        Dict of COLUMNS keys -> arrays of len(close); NaN until `window`
+        complete bars are available
+    """
+    o, h, l, c = (np.asarray(v, dtype=np.float64) for v in (open_, high, low, close))
+    previous = shift(c)
+    r = c - previous                      # close-to-close return
+    up, down, body = h - o, l - o, c - o
+    gap = o - previous                    # previous close -> open
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        parkinson = rolling_mean((h - l) ** 2, window) / (4 * np.log(2))
+        garman_klass = rolling_mean(0.5 * (h - l) ** 2 - (2 * np.log(2) - 1) * body ** 2, window)
+        rogers_satchell = rolling_mean(up * (up - body) + down * (down - body), window)
+        k = 0.34 / (1.34 + (window + 1) / (window - 1))
+        yang_zhang = _variance(gap, window) + k * _variance(body, window) + (1 - k) * rogers_satchell
+
+        squared = r * r
+        rv = rolling_sum(squared, window)
+        bv = np.pi / 2 * rolling_sum(np.abs(r) * np.abs(shift(r)), window)
+        rq = window / 3 * rolling_sum(squared * squared, window)
+        ratio = (rv - bv) / rv
+        jump_z = ratio / np.sqrt(JUMP_THETA / window * np.maximum(1.0, rq / (bv * bv)))
+        signed = rolling_sum(np.where(r > 0, squared, 0.0) - np.where(r < 0, squared, 0.0), window)
+        skewness = np.sqrt(window) * rolling_sum(squared * r, window) / rv ** 1.5
+
+        vol = np.sqrt(np.maximum(yang_zhang, 0.0))
+        vol_of_vol = np.sqrt(_variance(vol, window)) / rolling_mean(vol, window)
+        acceleration = vol - 2 * shift(vol) + shift(vol, 2)
+        ewma_ratio = np.sqrt(ema(squared, span=EWMA_SHORT) / ema(squared, span=EWMA_LONG))
+
+    regime = volatility_regime(vol)
+    return {
+        'parkinson_vol': np.sqrt(parkinson),
+        'garman_klass_vol': np.sqrt(np.maximum(garman_klass, 0.0)),
+        'rogers_satchell_vol': np.sqrt(np.maximum(rogers_satchell, 0.0)),
+        'yang_zhang_vol': vol,
+        'bipower_var': bv,
+        'realized_quarticity': rq,
+        'jump_test_stat': jump_z,
+        'signed_jump': signed,
+        'vol_of_vol': vol_of_vol,
+        'vol_acceleration': acceleration,
+        'ewma_vol_ratio': np.where(np.isfinite(ewma_ratio) & np.isfinite(r), ewma_ratio, np.nan),
+        'vol_regime_high': regime['high'],
+        'vol_regime_duration': regime['duration'],
+        'vol_regime_transition_prob': regime['transition_prob'],
+        'realized_skewness': skewness,
+    }
+
+
+def volatility_regime(vol: np.ndarray, span: int = REGIME_SPAN,
+                      transition_window: int = TRANSITION_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    High/low volatility regime of a volatility series
+
+    Returns:
+        Dict 'high' (1 above the EWMA level, else 0), 'duration' (rows
+        since the flag last changed, counting the current row) and
+        'transition_prob' (share of the last `transition_window` rows
+        where it changed); NaN where vol is NaN
+    """
+    valid = np.isfinite(vol)
+    level = ema(np.where(valid, vol, np.nan), span=span)
+    high = np.where(valid, (vol > level).astype(np.float64), np.nan)
+
+    # Flags of the valid rows only; gaps neither change nor end a regime
+    rows = np.flatnonzero(valid)
+    flags = high[rows]
+    change = np.r_[False, flags[1:] != flags[:-1]]
+    position = np.arange(len(rows))
+    start = np.maximum.accumulate(np.where(change, position, 0))
+
+    duration = np.full(len(vol), np.nan)
+    duration[rows] = position - start + 1
+    changes = np.zeros(len(vol))
+    changes[rows] = change
+    transition_prob = rolling_sum(changes, transition_window) / transition_window
+    return {
+        'high': high,
+        'duration': duration,
+        'transition_prob': np.where(valid, transition_prob, np.nan),
+    }
+
+
+def compute_volatility_features(frame) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Rate and BQX features from one read of an M1 partition
+
+    Args:
+        frame: Rows in time order with open, high, low, close and bqx
+
+    Returns:
+        Dict domain ('rate', 'bqx') -> {table column -> array}
+    """
+    bars = {
+        'rate': rate_bars(frame['open'], frame['high'], frame['low'], frame['close']),
+        'bqx': bqx_bars(frame['bqx']),
+    }
+    out = {}
+    for domain, (o, h, l, c) in bars.items():
+        features = realized_volatility(o, h, l, c)
+        out[domain] = {column: np.where(np.isfinite(features[name]), features[name], np.nan)
+                       for name, column in volatility_columns(domain).items()}
+    return out
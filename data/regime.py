@@ -0,0 +1,439 @@
+"""
+Market Regime Detection
+Per-timestamp trend, volatility, momentum and mean-reversion regimes
+
+Shared by the Stage 2.9 regime worker and the feature graph's regime
+family. detect_market_regime classifies the latest row of a trailing
+history window (up to 24 hours). compute_regime_features produces the
+same 15 metrics per domain for every row of a partition with rolling
+array operations instead of one detect_market_regime call per row:
+- trend: rolling least-squares slope, mean and range over 240 rows
+- volatility: rolling std of returns over 60 and 1439 returns, and the
+  share of the window's absolute returns below the current volatility
+- mean reversion: rolling lag-1 autocorrelation over 240 returns
+- persistence: run lengths of equal price-change signs
+Results match detect_market_regime up to floating-point rounding.
+"""
+
+import logging
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data.rolling_stats import (
+    BLOCK_ROWS, rolling_apply, window_lag1_autocorr, window_mean, window_range,
+    window_slope, window_std, window_sum
+)
+
+logger = logging.getLogger(__name__)
+
+REGIME_METRICS = [
+    'trend_regime', 'volatility_regime', 'momentum_regime',
+    'mean_reversion_regime', 'composite_regime', 'regime_confidence',
+    'regime_persistence', 'regime_transition_probability', 'trend_strength',
+    'volatility_percentile', 'momentum_score', 'mean_reversion_score',
+    'regime_stability', 'breakout_probability', 'regime_quality'
+]
+
+# Rows of history behind each timestamp (24 hours of M1)
+LOOKBACK_WINDOW = 1440
+
+# detect_market_regime windows (prices)
+TREND_WINDOW = 240
+VOLATILITY_WINDOW = 1440
+SHORT_WINDOW = 60
+
+
+def regime_columns(domain: str):
+    """Output column names for one domain ('rate' or 'bqx')"""
+    return [f'{metric}_{domain}' for metric in REGIME_METRICS]
+
+
+def detect_market_regime(df, domain='rate'):
+    """
+    Detect market regime for current timestamp based on recent history.
+
+    Args:
+        df: DataFrame with price/BQX data (last 1440 rows = 24 hours)
+        domain: 'rate' or 'bqx'
+
+    Returns:
+        dict: Regime classification features
+    """
+    try:
+        if len(df) < 60:
+            # Not enough data for regime detection
+            return {f'{metric}_{domain}': None for metric in [
+                'trend_regime', 'volatility_regime', 'momentum_regime',
+                'mean_reversion_regime', 'composite_regime', 'regime_confidence',
+                'regime_persistence', 'regime_transition_probability', 'trend_strength',
+                'volatility_percentile', 'momentum_score', 'mean_reversion_score',
+                'regime_stability', 'breakout_probability', 'regime_quality'
+            ]}
+
+        # Use rate_index or bqx_value
+        if domain == 'rate':
+            price = df['rate_index'].values
+        else:
+            price = df['bqx_value'].values
+
+        metrics = {}
+
+        # 1. Trend Regime Detection (based on linear regression slope)
+        recent_window = min(240, len(df))  # 4 hours or available
+        x = np.arange(recent_window)
+        y = price[-recent_window:]
+
+        slope, intercept = np.polyfit(x, y, 1)
+
+        # Normalize slope to percentage change
+        price_range = np.ptp(y)
+        if price_range > 0:
+            normalized_slope = (slope * recent_window) / np.mean(y) * 100
+        else:
+            normalized_slope = 0
+
+        # Classify trend
+        if normalized_slope > 0.5:
+            trend_regime = 2  # Trending Up
+        elif normalized_slope < -0.5:
+            trend_regime = 0  # Trending Down
+        else:
+            trend_regime = 1  # Ranging
+
+        metrics[f'trend_regime_{domain}'] = trend_regime
+
+        # 2. Volatility Regime (based on recent standard deviation)
+        volatility_window = min(1440, len(df))  # 24 hours
+        returns = np.diff(price[-volatility_window:]) / price[-volatility_window:-1]
+        current_vol = np.std(returns[-60:]) if len(returns) >= 60 else 0  # Last 60 min
+        historical_vol = np.std(returns) if len(returns) > 0 else 0
+
+        if current_vol > historical_vol * 1.5:
+            volatility_regime = 2  # High volatility
+        elif current_vol > historical_vol * 0.7:
+            volatility_regime = 1  # Medium volatility
+        else:
+            volatility_regime = 0  # Low volatility
+
+        metrics[f'volatility_regime_{domain}'] = volatility_regime
+
+        # Volatility percentile
+        vol_percentile = (sum(1 for r in returns if abs(r) < current_vol) / len(returns) * 100) if len(returns) > 0 else 50
+        metrics[f'volatility_percentile_{domain}'] = vol_percentile
+
+        # 3. Momentum Regime (based on rate of change)
+        roc_60 = ((price[-1] - price[-60]) / price[-60] * 100) if len(price) >= 60 else 0
+        roc_240 = ((price[-1] - price[-240]) / price[-240] * 100) if len(price) >= 240 else 0
+
+        # Combined momentum score
+        momentum_score = (roc_60 * 0.6) + (roc_240 * 0.4)
+        metrics[f'momentum_score_{domain}'] = momentum_score
+
+        # Classify momentum regime
+        if momentum_score > 1.0:
+            momentum_regime = 4  # Strong Bullish
+        elif momentum_score > 0.3:
+            momentum_regime = 3  # Weak Bullish
+        elif momentum_score > -0.3:
+            momentum_regime = 2  # Neutral
+        elif momentum_score > -1.0:
+            momentum_regime = 1  # Weak Bearish
+        else:
+            momentum_regime = 0  # Strong Bearish
+
+        metrics[f'momentum_regime_{domain}'] = momentum_regime
+
+        # 4. Mean Reversion Regime (based on autocorrelation of returns)
+        if len(returns) >= 60:
+            returns_series = pd.Series(returns[-240:] if len(returns) >= 240 else returns)
+            autocorr = returns_series.autocorr(lag=1)
+
+            if autocorr < -0.2:
+                mean_reversion_regime = 1  # Strong mean reversion
+                mean_reversion_score = abs(autocorr) * 100
+            else:
+                mean_reversion_regime = 0  # Trending
+                mean_reversion_score = (1 - autocorr) * 50 if autocorr < 1 else 0
+        else:
+            mean_reversion_regime = 0
+            mean_reversion_score = 0
+
+        metrics[f'mean_reversion_regime_{domain}'] = mean_reversion_regime
+        metrics[f'mean_reversion_score_{domain}'] = mean_reversion_score
+
+        # 5. Composite Regime Score (weighted combination)
+        composite_regime = (
+            trend_regime * 2.5 +
+            volatility_regime * 1.5 +
+            momentum_regime * 1.0 +
+            mean_reversion_regime * 0.5
+        )
+        metrics[f'composite_regime_{domain}'] = composite_regime
+
+        # 6. Regime Confidence (based on consistency of indicators)
+        # High confidence when multiple indicators align
+        indicators_aligned = 0
+        if trend_regime == 2 and momentum_regime >= 3:
+            indicators_aligned += 1
+        if trend_regime == 0 and momentum_regime <= 1:
+            indicators_aligned += 1
+        if volatility_regime == 0 and mean_reversion_regime == 0:
+            indicators_aligned += 1
+
+        regime_confidence = indicators_aligned / 3.0
+        metrics[f'regime_confidence_{domain}'] = regime_confidence
+
+        # 7. Regime Persistence (simplified - based on how long in current trend)
+        # Count consecutive periods with same trend direction
+        persistence_count = 1
+        for i in range(2, min(240, len(price))):
+            prev_slope = (price[-i] - price[-i-1])
+            curr_slope = (price[-1] - price[-2])
+            if np.sign(prev_slope) == np.sign(curr_slope):
+                persistence_count += 1
+            else:
+                break
+
+        metrics[f'regime_persistence_{domain}'] = persistence_count
+
+        # 8. Regime Transition Probability (based on regime age and volatility)
+        # Higher volatility + longer persistence = higher transition probability
+        transition_prob = min(1.0, (persistence_count / 240) * (volatility_regime / 2 + 0.5))
+        metrics[f'regime_transition_probability_{domain}'] = transition_prob
+
+        # 9. Trend Strength (ADX-like indicator)
+        # Simplified: ratio of directional movement to total movement
+        if len(returns) >= 60:
+            directional_movement = abs(sum(returns[-60:]))
+            total_movement = sum(abs(r) for r in returns[-60:])
+            trend_strength = (directional_movement / total_movement * 100) if total_movement > 0 else 0
+        else:
+            trend_strength = 0
+
+        metrics[f'trend_strength_{domain}'] = trend_strength
+
+        # 10. Regime Stability (inverse of transition probability)
+        regime_stability = 1.0 - transition_prob
+        metrics[f'regime_stability_{domain}'] = regime_stability
+
+        # 11. Breakout Probability (for ranging markets)
+        if trend_regime == 1:  # Ranging
+            # Higher volatility + longer range = higher breakout probability
+            range_duration = persistence_count
+            breakout_prob = min(1.0, (range_duration / 120) * (volatility_regime / 2 + 0.3))
+        else:
+            breakout_prob = 0.0
+
+        metrics[f'breakout_probability_{domain}'] = breakout_prob
+
+        # 12. Regime Quality (how clear and well-defined is the regime)
+        # High quality when: strong trend + low volatility OR clear range + mean reversion
+        if trend_regime != 1:  # Trending
+            regime_quality = (trend_strength / 100) * (1 - volatility_regime / 2)
+        else:  # Ranging
+            regime_quality = mean_reversion_score / 100
+
+        metrics[f'regime_quality_{domain}'] = regime_quality
+
+        return metrics
+
+    except Exception as e:
+        logger.warning(f"Regime detection failed for {domain}: {e}")
+        return {f'{metric}_{domain}': 0 for metric in [
+            'trend_regime', 'volatility_regime', 'momentum_regime',
+            'mean_reversion_regime', 'composite_regime', 'regime_confidence',
+            'regime_persistence', 'regime_transition_probability', 'trend_strength',
+            'volatility_percentile', 'momentum_score', 'mean_reversion_score',
+            'regime_stability', 'breakout_probability', 'regime_quality'
+        ]}
+
+
+# ----------------------------------------------------------------------
+# Vectorized detection
+# ----------------------------------------------------------------------
+
+def _lagged(values: np.ndarray, lag: int) -> np.ndarray:
+    """values[i - lag] at row i (NaN for the first lag rows)"""
+    out = np.full(len(values), np.nan)
+    if lag < len(values):
+        out[lag:] = values[:len(values) - lag]
+    return out
+
+
+def _count_below(values: np.ndarray, window: int, thresholds: np.ndarray) -> np.ndarray:
+    """
+    Number of values[max(0, i-window+1) : i+1] strictly below thresholds[i]
+
+    Exact counts (NaN never counts), evaluated over blocks of windows.
+    """
+    n = len(values)
+    out = np.zeros(n)
+    for i in range(min(window - 1, n)):
+        out[i] = np.count_nonzero(values[:i + 1] < thresholds[i])
+    if n >= window:
+        windows = sliding_window_view(values, window)
+        for start in range(0, len(windows), BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, len(windows))
+            out[window - 1 + start:window - 1 + stop] = np.count_nonzero(
+                windows[start:stop] < thresholds[window - 1 + start:window - 1 + stop, None], axis=1)
+    return out
+
+
+def _run_lengths(flags: np.ndarray) -> np.ndarray:
+    """Length of the run of True values ending at each position"""
+    index = np.arange(len(flags))
+    last_false = np.maximum.accumulate(np.where(flags, -1, index))
+    return index - last_false
+
+
+def _detect_regimes(price: np.ndarray, lookback: int = LOOKBACK_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    detect_market_regime(window of row i) for every row i of a series
+
+    Row i's window holds rows max(0, i - lookback) .. i. Rows with fewer
+    than 60 rows of window get NaN.
+
+    Returns:
+        Dict of metric (REGIME_METRICS, without domain suffix) -> float array
+    """
+    price = np.asarray(price, dtype=np.float64)
+    n = len(price)
+    row = np.arange(n)
+    length = np.minimum(row, lookback) + 1                  # window rows
+    span = min(lookback + 1, TREND_WINDOW)                  # trend rows (when available)
+    span_v = min(lookback + 1, VOLATILITY_WINDOW)           # volatility rows (when available)
+    trend_rows = np.minimum(length, TREND_WINDOW)
+    n_returns = np.minimum(length, VOLATILITY_WINDOW) - 1
+
+    with np.errstate(all='ignore'):
+        # returns[i] = return into row i (NaN at row 0)
+        returns = np.full(n, np.nan)
+        returns[1:] = np.diff(price) / price[:-1]
+        r = returns[1:]
+
+        def over_returns(window, kernel):
+            """kernel over the last `window` returns up to row i (expanding at the start)"""
+            out = np.full(n, np.nan)
+            if n > 1:
+                out[1:] = rolling_apply(r, window, kernel)
+            return out
+
+        # 1. Trend: least-squares slope over the last 240 prices
+        slope = rolling_apply(price, span, window_slope)
+        mean = rolling_apply(price, span, window_mean)
+        price_range = rolling_apply(price, span, window_range)
+        normalized_slope = np.where(price_range > 0, slope * trend_rows / mean * 100, 0.0)
+        trend_regime = np.select([normalized_slope > 0.5, normalized_slope < -0.5], [2.0, 0.0], 1.0)
+
+        # 2. Volatility: last 60 returns vs the whole window
+        long = n_returns >= SHORT_WINDOW
+        current_vol = np.where(long, over_returns(SHORT_WINDOW, window_std), 0.0)
+        historical_vol = over_returns(span_v - 1, window_std)
+        volatility_regime = np.select([current_vol > historical_vol * 1.5, current_vol > historical_vol * 0.7],
+                                      [2.0, 1.0], 0.0)
+
+        below = np.zeros(n)
+        if n > 1:
+            below[1:] = _count_below(np.abs(r), span_v - 1, current_vol[1:])
+        volatility_percentile = below / n_returns * 100
+
+        # 3. Momentum: 60- and 240-row rate of change
+        roc_60 = (price - _lagged(price, 59)) / _lagged(price, 59) * 100
+        roc_240 = np.where(length >= 240, (price - _lagged(price, 239)) / _lagged(price, 239) * 100, 0.0)
+        momentum_score = roc_60 * 0.6 + roc_240 * 0.4
+        momentum_regime = np.select(
+            [momentum_score > 1.0, momentum_score > 0.3, momentum_score > -0.3, momentum_score > -1.0],
+            [4.0, 3.0, 2.0, 1.0], 0.0)
+
+        # 4. Mean reversion: lag-1 autocorrelation of the last 240 returns;
+        # pandas' autocorr skips NaN pairs, so windows with NaN returns use it
+        autocorr = over_returns(min(span_v - 1, TREND_WINDOW), window_lag1_autocorr)
+        nan_returns = np.concatenate([[0], np.cumsum(np.isnan(r))]) if n > 1 else np.zeros(n)
+        first = row - np.minimum(n_returns, TREND_WINDOW) + 1
+        has_nan = nan_returns - nan_returns[np.maximum(first - 1, 0)] > 0
+        for i in np.flatnonzero(has_nan & long):
+            autocorr[i] = pd.Series(returns[first[i]:i + 1]).autocorr(lag=1)
+        mean_reversion_regime = np.where(long & (autocorr < -0.2), 1.0, 0.0)
+        mean_reversion_score = np.where(
+            long, np.where(autocorr < -0.2, np.abs(autocorr) * 100, np.where(autocorr < 1, (1 - autocorr) * 50, 0.0)),
+            0.0)
+
+        # 5-6. Composite score and indicator agreement
+        composite_regime = trend_regime * 2.5 + volatility_regime * 1.5 + momentum_regime * 1.0 + \
+            mean_reversion_regime * 0.5
+        regime_confidence = (
+            ((trend_regime == 2) & (momentum_regime >= 3)).astype(float) +
+            ((trend_regime == 0) & (momentum_regime <= 1)).astype(float) +
+            ((volatility_regime == 0) & (mean_reversion_regime == 0)).astype(float)
+        ) / 3.0
+
+        # 7-8. Persistence: earlier price changes with the sign of the latest one
+        sign = np.sign(np.concatenate([[np.nan], np.diff(price)]))
+        same = np.zeros(n, dtype=bool)
+        same[1:] = sign[1:] == sign[:-1]
+        persistence = 1 + np.minimum(_run_lengths(same), np.maximum(trend_rows - 2, 0))
+        regime_transition_probability = np.minimum(1.0, (persistence / 240) * (volatility_regime / 2 + 0.5))
+
+        # 9. Trend strength: net vs total movement over the last 60 returns
+        directional = np.abs(over_returns(SHORT_WINDOW, window_sum))
+        total = over_returns(SHORT_WINDOW, lambda w: np.abs(w).sum(axis=1))
+        trend_strength = np.where(long, np.where(total > 0, directional / total * 100, 0.0), 0.0)
+
+        # 10-12. Stability, breakout, quality
+        regime_stability = 1.0 - regime_transition_probability
+        breakout_probability = np.where(
+            trend_regime == 1, np.minimum(1.0, (persistence / 120) * (volatility_regime / 2 + 0.3)), 0.0)
+        regime_quality = np.where(trend_regime != 1, (trend_strength / 100) * (1 - volatility_regime / 2),
+                                  mean_reversion_score / 100)
+
+    metrics = {
+        'trend_regime': trend_regime,
+        'volatility_regime': volatility_regime,
+        'momentum_regime': momentum_regime,
+        'mean_reversion_regime': mean_reversion_regime,
+        'composite_regime': composite_regime,
+        'regime_confidence': regime_confidence,
+        'regime_persistence': persistence.astype(float),
+        'regime_transition_probability': regime_transition_probability,
+        'trend_strength': trend_strength,
+        'volatility_percentile': volatility_percentile,
+        'momentum_score': momentum_score,
+        'mean_reversion_score': mean_reversion_score,
+        'regime_stability': regime_stability,
+        'breakout_probability': breakout_probability,
+        'regime_quality': regime_quality,
+    }
+    short = length < SHORT_WINDOW
+    for values in metrics.values():
+        values[short] = np.nan
+    return metrics
+
+
+def compute_regime_features(rate_index, bqx_value, first_row: int = 0, lookback: int = LOOKBACK_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    Regime features of both domains for rows first_row..n-1
+
+    Row i is classified from rows max(0, i - lookback) .. i, as the
+    Stage 2.9 worker does for each timestamp of the target month, with
+    every row of the series evaluated at once.
+
+    Args:
+        rate_index: rate_index values in time order (history included)
+        bqx_value: BQX values aligned with rate_index (NULLs as 0)
+        first_row: First row to classify (rows before it are history only)
+        lookback: Rows of history behind each row
+
+    Returns:
+        Dict of regime_columns('rate') + regime_columns('bqx') -> float
+        arrays of len(rate_index); NaN before first_row and where a
+        metric is undefined
+    """
+    out = {}
+    for domain, values in (('rate', rate_index), ('bqx', bqx_value)):
+        for metric, column in _detect_regimes(values, lookback).items():
+            column[:first_row] = np.nan
+            out[f'{metric}_{domain}'] = column
+    return {name: out[name] for name in regime_columns('rate') + regime_columns('bqx')}
@@ -0,0 +1,248 @@
+"""
+Rolling Co-Moment Kernel
+Trailing-window covariances and correlations of k series in one pass
+
+Replaces per-row np.cov / np.corrcoef calls on growing slices (Stage 2.14
+term covariances) and per-row UPDATE loops around pandas rolling().cov().
+
+For every window length the kernel forms window sums of each series and
+of every pairwise product x_i·x_j from running sums:
+- Series are demeaned once, so the sums stay small relative to the
+  co-moments they produce
+- Prefix sums restart every `window` rows, so each window is covered by
+  the suffix of one block plus the prefix of the next and rounding error
+  depends on the window length rather than on the partition length
+- All k(k+1)/2 co-moments of all rows come out of the same sums
+
+cov = (Σxy - Σx·Σy / w) / (w - ddof), matching np.cov and pandas
+rolling().cov(), and correlations match np.corrcoef. Windows in which a
+series is constant get covariance 0 and correlation NaN, where np.cov /
+np.corrcoef return rounding noise or NaN depending on the values.
+
+rolling_cross_moments covers the one-against-many case (a pair against
+all of its related pairs) in O(n·m) instead of the full k×k matrix; with
+dtype=np.float32 the sums run in single precision at half the memory.
+"""
+
+import numpy as np
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+
+class CoMoments(NamedTuple):
+    """
+    Trailing-window moments of k series (row i = window ending at row i)
+
+    Rows without a full window are NaN; a NaN inside a window makes the
+    entries of that series (and its pairs) NaN.
+    """
+    mean: np.ndarray    # (n, k)
+    cov: np.ndarray     # (n, k, k), symmetric
+    corr: np.ndarray    # (n, k, k), symmetric, NaN where a series is constant
+
+    def pair(self, i: int, j: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(covariance, correlation) columns of series i and j"""
+        return self.cov[:, i, j], self.corr[:, i, j]
+
+
+def window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sum of every full trailing window, column by column
+
+    Args:
+        values: (n,) or (n, c) float array without NaN
+        window: Window length
+
+    Returns:
+        Array of shape (n - window + 1,) + values.shape[1:]; entry s is
+        the sum of rows s .. s+window-1
+    """
+    n = values.shape[0]
+    n_windows = n - window + 1
+    n_blocks = n // window + 2
+
+    padded = np.zeros((n_blocks * window,) + values.shape[1:], dtype=values.dtype)
+    padded[:n] = values
+    blocks = padded.reshape((n_blocks, window) + values.shape[1:])
+
+    inclusive = np.cumsum(blocks, axis=1)
+    exclusive = np.concatenate([np.zeros_like(blocks[:, :1]), inclusive[:, :-1]], axis=1)
+
+    starts = np.arange(n_windows)
+    q = starts // window
+    r = starts % window
+    return (inclusive[q, -1] - exclusive[q, r]) + exclusive[q + 1, r]
+
+
+def _centered(x: np.ndarray, dtype) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(series minus their overall mean with NaN -> 0, offsets, missing mask)"""
+    missing = ~np.isfinite(x)
+    counts = (~missing).sum(axis=0)
+    offset = np.where(counts > 0, np.where(missing, 0.0, x).sum(axis=0) / np.maximum(counts, 1), 0.0)
+    centered = np.where(missing, 0.0, x - offset).astype(dtype, copy=False)
+    return centered, offset, missing
+
+
+def _constant(var: np.ndarray, sum_squares: np.ndarray, window: int, dtype) -> np.ndarray:
+    """Windows whose variance is rounding residue of a constant series"""
+    # Rounding leaves ~eps·x² instead of an exact 0
+    return var <= 16 * window * np.finfo(dtype).eps * (sum_squares / window)
+
+
+def rolling_comoments_windows(
+    values: np.ndarray,
+    windows: Sequence[int],
+    ddof: int = 1,
+    dtype=np.float64
+) -> Dict[int, CoMoments]:
+    """
+    Trailing-window means, covariances and correlations for several windows
+
+    Args:
+        values: (n, k) array, one column per series in time order
+            (a 1-D array is treated as k = 1)
+        windows: Window lengths in rows
+        ddof: Delta degrees of freedom of the covariance (1 = np.cov)
+        dtype: Precision of the running sums (np.float64 or np.float32)
+
+    Returns:
+        Dict of window -> CoMoments
+    """
+    x = np.asarray(values, dtype=np.float64)
+    if x.ndim == 1:
+        x = x[:, None]
+    n, k = x.shape
+
+    centered, offset, missing = _centered(x, dtype)
+
+    upper_i, upper_j = np.triu_indices(k)
+    products = centered[:, upper_i] * centered[:, upper_j]
+    diagonal = upper_i == upper_j
+    missing_rows = missing.astype(dtype)
+
+    results = {}
+
+    for window in windows:
+        mean = np.full((n, k), np.nan)
+        cov = np.full((n, k, k), np.nan)
+        corr = np.full((n, k, k), np.nan)
+
+        if n >= window and window > ddof:
+            s1 = window_sums(centered, window)
+            s2 = window_sums(products, window)
+            bad = window_sums(missing_rows, window) > 0.5
+            bad_pair = bad[:, upper_i] | bad[:, upper_j]
+
+            c = (s2 - s1[:, upper_i] * s1[:, upper_j] / window) / (window - ddof)
+
+            var = c[:, diagonal]
+            constant = _constant(var, s2[:, diagonal], window, dtype)
+            zero = constant[:, upper_i] | constant[:, upper_j]
+            c = np.where(zero, 0.0, c)
+            var = np.where(constant, 0.0, var)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                r = c / np.sqrt(var[:, upper_i] * var[:, upper_j])
+            r = np.clip(np.where(zero, np.nan, r), -1.0, 1.0)
+
+            c[bad_pair] = np.nan
+            r[bad_pair] = np.nan
+            m = s1 / window + offset
+            m[bad] = np.nan
+
+            full_cov = np.empty((len(c), k, k))
+            full_cov[:, upper_i, upper_j] = c
+            full_cov[:, upper_j, upper_i] = c
+            full_corr = np.empty_like(full_cov)
+            full_corr[:, upper_i, upper_j] = r
+            full_corr[:, upper_j, upper_i] = r
+
+            mean[window - 1:] = m
+            cov[window - 1:] = full_cov
+            corr[window - 1:] = full_corr
+
+        results[window] = CoMoments(mean, cov, corr)
+
+    return results
+
+
+def rolling_comoments(values: np.ndarray, window: int, ddof: int = 1, dtype=np.float64) -> CoMoments:
+    """Trailing-window means, covariances and correlations for one window"""
+    return rolling_comoments_windows(values, [window], ddof, dtype)[window]
+
+
+# ----------------------------------------------------------------------
+# One series against many
+# ----------------------------------------------------------------------
+
+class CrossMoments(NamedTuple):
+    """
+    Trailing-window co-moments of one target series with m others
+
+    Same row and NaN conventions as CoMoments.
+    """
+    cov: np.ndarray     # (n, m)
+    corr: np.ndarray    # (n, m), NaN where either series is constant
+
+
+def rolling_cross_moments(
+    target: np.ndarray,
+    others: np.ndarray,
+    window: int,
+    ddof: int = 1,
+    dtype=np.float64
+) -> CrossMoments:
+    """
+    Trailing-window covariance and correlation of a target with each other series
+
+    Args:
+        target: (n,) series
+        others: (n, m) array, one column per series, aligned with target
+        window: Window length in rows
+        ddof: Delta degrees of freedom of the covariance (1 = np.cov)
+        dtype: Precision of the running sums (np.float64 or np.float32)
+
+    Returns:
+        CrossMoments with float64 (n, m) columns
+    """
+    x = np.asarray(target, dtype=np.float64)
+    y = np.asarray(others, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    n, m = y.shape
+
+    cov = np.full((n, m), np.nan)
+    corr = np.full((n, m), np.nan)
+    if n < window or window <= ddof or m == 0:
+        return CrossMoments(cov, corr)
+
+    cx, _, missing_x = _centered(x, dtype)
+    cy, _, missing_y = _centered(y, dtype)
+
+    # One pass over [x, y, x², y², x·y, missing x, missing y]
+    stacked = np.column_stack([
+        cx, cy, cx * cx, cy * cy, cx[:, None] * cy, missing_x.astype(dtype), missing_y.astype(dtype)
+    ])
+    sums = window_sums(stacked, window)
+    sx, sy = sums[:, 0], sums[:, 1:1 + m]
+    sxx, syy = sums[:, 1 + m], sums[:, 2 + m:2 + 2 * m]
+    sxy = sums[:, 2 + 2 * m:2 + 3 * m]
+    bad = (sums[:, 2 + 3 * m] > 0.5)[:, None] | (sums[:, 3 + 3 * m:] > 0.5)
+
+    c = ((sxy - sx[:, None] * sy / window) / (window - ddof)).astype(np.float64)
+    var_x = ((sxx - sx * sx / window) / (window - ddof)).astype(np.float64)
+    var_y = ((syy - sy * sy / window) / (window - ddof)).astype(np.float64)
+
+    constant_x = _constant(var_x, sxx, window, dtype)
+    constant_y = _constant(var_y, syy, window, dtype)
+    zero = constant_x[:, None] | constant_y
+    c = np.where(zero, 0.0, c)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = c / np.sqrt(var_x[:, None] * var_y)
+    r = np.clip(np.where(zero, np.nan, r), -1.0, 1.0)
+
+    c[bad] = np.nan
+    r[bad] = np.nan
+    cov[window - 1:] = c
+    corr[window - 1:] = r
+    return CrossMoments(cov, corr)
@@ -0,0 +1,180 @@
+"""
+Rolling Quadratic Regression Engine
+Closed-form y = a*x² + b*x + c fits over every trailing window of a series
+
+Replaces the per-row np.polyfit loops in the REG workers. Window moments
+(Σy, Σx·y, Σx²·y, Σy²) are accumulated as running sums anchored to
+window-sized blocks, so their magnitude depends on the window length
+rather than on the partition length, and the fixed 3×3 normal equations
+are solved for every row at once in an orthogonal (discrete Legendre)
+basis to stay well conditioned for the 630-minute window.
+"""
+
+import numpy as np
+from math import comb
+from typing import Dict
+
+
+FIT_COLUMNS = [
+    'a', 'b', 'c',
+    'r2', 'rmse',
+    'prediction', 'residual',
+    'ss_res', 'ss_tot'
+]
+
+
+def _block_window_sums(values: np.ndarray, window: int, powers: int) -> np.ndarray:
+    """
+    Centered window moments Σ (x - m)^p * v for p = 0..powers
+
+    x = 0..window-1 is the position inside the window and m = (window-1)/2.
+    Prefix sums restart every `window` rows, so each window is covered by
+    the suffix of one block plus the prefix of the next.
+
+    Args:
+        values: 1-D float array (no NaN)
+        window: Window length
+        powers: Highest power of the centered position
+
+    Returns:
+        Array of shape (powers + 1, n - window + 1); column s is the
+        window starting at row s
+    """
+    n = len(values)
+    n_windows = n - window + 1
+    n_blocks = n // window + 2
+
+    padded = np.zeros(n_blocks * window)
+    padded[:n] = values
+    blocks = padded.reshape(n_blocks, window)
+
+    j = np.arange(window, dtype=np.float64)
+    starts = np.arange(n_windows)
+    q = starts // window
+    r = starts % window
+    m = (window - 1) / 2.0
+
+    # Shifts that turn in-block positions j into centered window positions
+    shift_a = -(r + m)            # part A: k - m = j - r - m
+    shift_b = window - r - m      # part B: k - m = j + window - r - m
+
+    # Raw block moments Σ j^p v for prefix (before r) and suffix (from r)
+    raw_prefix = []
+    raw_suffix = []
+    for p in range(powers + 1):
+        weighted = blocks * j ** p
+        inclusive = np.cumsum(weighted, axis=1)
+        exclusive = inclusive - weighted
+        raw_suffix.append(inclusive[q, -1] - exclusive[q, r])
+        raw_prefix.append(exclusive[q + 1, r])
+
+    # Binomial expansion: Σ (j + c)^p v = Σ_k C(p,k) c^(p-k) Σ j^k v
+    sums = np.zeros((powers + 1, n_windows))
+    for p in range(powers + 1):
+        for k in range(p + 1):
+            coef = float(comb(p, k))
+            sums[p] += coef * (shift_a ** (p - k) * raw_suffix[k]
+                               + shift_b ** (p - k) * raw_prefix[k])
+
+    return sums
+
+
+def rolling_quadratic_fit(y: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+    """
+    Fit y = a*x² + b*x + c over every trailing window of `window` rows
+
+    Row i holds the fit over y[i-window+1 : i+1] with x = 0..window-1,
+    i.e. the same fit as np.polyfit(np.arange(window), y[i-window+1:i+1], 2).
+    Rows without a full window, or whose window contains NaN, are NaN.
+
+    Args:
+        y: 1-D array of observations (rate_index, BQX return, ...)
+        window: Window length in rows (>= 3)
+
+    Returns:
+        Dict of float64 columns, each of length len(y):
+            a, b, c      - polynomial coefficients (highest degree first)
+            r2           - 1 - ss_res/ss_tot (0.0 when ss_tot == 0)
+            rmse         - sqrt(ss_res / window)
+            prediction   - fitted value at the window end (x = window-1)
+            residual     - y at the window end minus prediction
+            ss_res       - residual sum of squares
+            ss_tot       - total sum of squares about the window mean
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    out = {col: np.full(n, np.nan) for col in FIT_COLUMNS}
+
+    if window < 3 or n < window:
+        return out
+
+    missing = ~np.isfinite(y)
+    if missing.all():
+        return out
+
+    # Demean so Σy² and the moment sums stay small relative to the fit
+    offset = float(np.mean(y[~missing]))
+    centered = np.where(missing, 0.0, y - offset)
+
+    sums = _block_window_sums(centered, window, powers=2)
+    sq_sums = _block_window_sums(centered ** 2, window, powers=0)[0]
+    missing_counts = np.convolve(missing.astype(np.int64), np.ones(window, dtype=np.int64), mode='valid')
+
+    # Orthogonal basis over x = 0..w-1: p0 = 1, p1 = x - m, p2 = (x - m)² - q
+    w = float(window)
+    m = (w - 1) / 2.0
+    q = (w * w - 1) / 12.0
+    norm1 = w * (w * w - 1) / 12.0
+    norm2 = w * (w * w - 1) * (w * w - 4) / 180.0
+
+    g0 = sums[0]
+    g1 = sums[1]
+    g2 = sums[2] - q * sums[0]
+
+    beta0 = g0 / w
+    beta1 = g1 / norm1
+    beta2 = g2 / norm2
+
+    # Back to raw coefficients in x
+    a = beta2
+    b = beta1 - 2.0 * m * beta2
+    c = beta0 - m * beta1 + beta2 * (m * m - q) + offset
+
+    ss_tot = np.maximum(sq_sums - g0 * g0 / w, 0.0)
+    ss_res = np.maximum(ss_tot - g1 * g1 / norm1 - g2 * g2 / norm2, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(ss_tot > 0, 1.0 - ss_res / ss_tot, 0.0)
+
+    x_end = w - 1
+    prediction = a * x_end ** 2 + b * x_end + c
+    residual = y[window - 1:] - prediction
+
+    valid = missing_counts == 0
+    columns = {
+        'a': a, 'b': b, 'c': c,
+        'r2': r2,
+        'rmse': np.sqrt(ss_res / w),
+        'prediction': prediction,
+        'residual': residual,
+        'ss_res': ss_res,
+        'ss_tot': ss_tot
+    }
+    for col, values in columns.items():
+        out[col][window - 1:] = np.where(valid, values, np.nan)
+
+    return out
+
+
+def rolling_quadratic_fits(y: np.ndarray, windows) -> Dict[int, Dict[str, np.ndarray]]:
+    """
+    Run rolling_quadratic_fit for several windows over the same series
+
+    Args:
+        y: 1-D array of observations
+        windows: Iterable of window lengths
+
+    Returns:
+        Dict mapping window -> column dict from rolling_quadratic_fit
+    """
+    return {window: rolling_quadratic_fit(y, window) for window in windows}
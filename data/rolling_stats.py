@@ -0,0 +1,335 @@
+"""
+Rolling Statistics Kernels
+Trailing-window statistics for a whole partition in one vectorized pass
+
+Replaces per-row slicing loops (scipy.stats.skew/kurtosis, median/MAD,
+histogram entropy, np.corrcoef, stats.linregress, sort + searchsorted)
+in the Track 1 statistics, Bollinger, spread and volume workers.
+
+Every kernel sees the trailing window values[i-W+1 : i+1] of row i:
+- Full windows are a zero-copy sliding_window_view (n, W) processed with
+  row-wise NumPy reductions (two-pass, centered moments)
+- The first W-1 rows have shorter, expanding windows, as produced by
+  values[max(0, i-W+1) : i+1]; they are evaluated with the same kernel
+- Rows whose window has fewer than min_periods values get `fill`
+
+Window kernels take a 2-D array (rows = windows) and return one value per
+row, so they can also be applied to any other set of windows.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Callable, Dict
+
+
+WindowKernel = Callable[[np.ndarray], np.ndarray]
+
+# Full windows are handed to kernels in blocks of rows, which bounds the
+# (rows, W) temporaries of long windows; kernels are row-wise, so the
+# result does not depend on the block size
+BLOCK_ROWS = 4096
+
+
+def rolling_apply(
+    values: np.ndarray,
+    window: int,
+    kernel: WindowKernel,
+    min_periods: int = 1,
+    fill: float = np.nan
+) -> np.ndarray:
+    """
+    Apply a window kernel to every trailing window of a series
+
+    Args:
+        values: 1-D float array in time order
+        window: Window length W
+        kernel: Function of a (k, w) array returning k values
+        min_periods: Minimum window length to evaluate (shorter -> fill)
+        fill: Value for rows with fewer than min_periods values
+
+    Returns:
+        float64 array of len(values)
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    out = np.full(n, fill, dtype=np.float64)
+
+    # Expanding head windows (length 1 .. W-1)
+    for i in range(max(min_periods - 1, 0), min(window - 1, n)):
+        out[i] = kernel(x[None, :i + 1])[0]
+
+    # Full windows, a block of rows per call
+    if n >= window and window >= min_periods:
+        windows = sliding_window_view(x, window)
+        for start in range(0, len(windows), BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, len(windows))
+            out[window - 1 + start:window - 1 + stop] = kernel(windows[start:stop])
+
+    return out
+
+
+# ----------------------------------------------------------------------
+# Window kernels: (k, w) -> (k,)
+# ----------------------------------------------------------------------
+
+def window_mean(w: np.ndarray) -> np.ndarray:
+    """Mean of each window"""
+    return w.mean(axis=1)
+
+
+def window_std(w: np.ndarray) -> np.ndarray:
+    """Population standard deviation (ddof=0) of each window"""
+    return w.std(axis=1)
+
+
+def window_sum(w: np.ndarray) -> np.ndarray:
+    """Sum of each window"""
+    return w.sum(axis=1)
+
+
+def window_min(w: np.ndarray) -> np.ndarray:
+    """Minimum of each window"""
+    return w.min(axis=1)
+
+
+def window_max(w: np.ndarray) -> np.ndarray:
+    """Maximum of each window"""
+    return w.max(axis=1)
+
+
+def window_range(w: np.ndarray) -> np.ndarray:
+    """max - min of each window"""
+    return w.max(axis=1) - w.min(axis=1)
+
+
+def window_moments(w: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Mean, std, skewness and excess kurtosis from one centered pass
+
+    Skewness and kurtosis follow scipy.stats.skew/kurtosis defaults
+    (biased, Fisher) including NaN for numerically constant windows.
+
+    Returns:
+        Dict with 'mean', 'std', 'skew', 'kurtosis' arrays
+    """
+    mean = w.mean(axis=1)
+    d = w - mean[:, None]
+    d2 = d * d
+    m2 = d2.mean(axis=1)
+    m3 = (d2 * d).mean(axis=1)
+    m4 = (d2 * d2).mean(axis=1)
+
+    with np.errstate(all='ignore'):
+        zero = m2 <= (np.finfo(np.float64).eps * mean) ** 2
+        skew = np.where(zero, np.nan, m3 / m2 ** 1.5)
+        kurtosis = np.where(zero, np.nan, m4 / m2 ** 2.0) - 3.0
+
+    return {'mean': mean, 'std': np.sqrt(m2), 'skew': skew, 'kurtosis': kurtosis}
+
+
+def window_mad(w: np.ndarray) -> np.ndarray:
+    """Median absolute deviation from the median (unscaled)"""
+    median = np.median(w, axis=1)
+    return np.median(np.abs(w - median[:, None]), axis=1)
+
+
+def window_entropy(w: np.ndarray, bins: int = 10) -> np.ndarray:
+    """
+    Shannon entropy (bits) of each window's equal-width histogram
+
+    Same binning as np.histogram(window, bins): edges span [min, max]
+    (±0.5 when constant) and the maximum falls in the last bin.
+    """
+    k, width = w.shape
+    lo = w.min(axis=1)
+    hi = w.max(axis=1)
+    flat = lo == hi
+    lo = np.where(flat, lo - 0.5, lo)
+    hi = np.where(flat, hi + 0.5, hi)
+
+    edges = np.linspace(lo, hi, bins + 1, axis=1)
+    index = ((w - lo[:, None]) / (hi - lo)[:, None] * bins).astype(np.intp)
+    index[index == bins] -= 1
+
+    # Floating-point corrections against the actual edges (as np.histogram)
+    rows = np.arange(k)[:, None]
+    index[w < edges[rows, index]] -= 1
+    index[(w >= edges[rows, index + 1]) & (index != bins - 1)] += 1
+
+    counts = np.zeros((k, bins))
+    np.add.at(counts, (np.broadcast_to(rows, index.shape), index), 1.0)
+
+    probs = counts / width
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(counts > 0, probs * np.log2(probs + 1e-10), 0.0)
+    return -terms.sum(axis=1)
+
+
+def window_lag1_autocorr(w: np.ndarray) -> np.ndarray:
+    """
+    Lag-1 autocorrelation, np.corrcoef(window[:-1], window[1:])
+
+    NaN where either half has zero variance, and for windows of fewer
+    than 3 values (halves of one value have no variance).
+    """
+    if w.shape[1] < 3:
+        return np.full(len(w), np.nan)
+    a = w[:, :-1] - w[:, :-1].mean(axis=1, keepdims=True)
+    b = w[:, 1:] - w[:, 1:].mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = (a * b).sum(axis=1) / np.sqrt((a * a).sum(axis=1) * (b * b).sum(axis=1))
+    return np.clip(corr, -1.0, 1.0)
+
+
+def window_corr(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation of paired windows, np.corrcoef(a_row, b_row)
+
+    NaN where either window has zero variance.
+    """
+    a = a - a.mean(axis=1, keepdims=True)
+    b = b - b.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = (a * b).sum(axis=1) / np.sqrt((a * a).sum(axis=1) * (b * b).sum(axis=1))
+    return np.clip(corr, -1.0, 1.0)
+
+
+def window_slope(w: np.ndarray) -> np.ndarray:
+    """Least-squares slope against x = 0..w-1 (stats.linregress slope)"""
+    width = w.shape[1]
+    x = np.arange(width, dtype=np.float64) - (width - 1) / 2.0
+    sxx = (x * x).sum()
+    if sxx == 0:
+        return np.full(len(w), np.nan)
+    # Row-wise reduction rather than a BLAS product, so a window's slope
+    # does not depend on which other windows are evaluated with it
+    return ((w - w.mean(axis=1, keepdims=True)) * x).sum(axis=1) / sxx
+
+
+def window_percentile_rank(w: np.ndarray) -> np.ndarray:
+    """
+    Fraction of window values strictly below the window's last value
+
+    Equals np.searchsorted(np.sort(window), window[-1]) / len(window).
+    """
+    return (w < w[:, -1:]).sum(axis=1) / w.shape[1]
+
+
+# ----------------------------------------------------------------------
+# Series helpers
+# ----------------------------------------------------------------------
+
+def rolling_mean(values: np.ndarray, window: int, min_periods: int = 1, fill: float = np.nan) -> np.ndarray:
+    """Trailing-window mean"""
+    return rolling_apply(values, window, window_mean, min_periods, fill)
+
+
+def rolling_std(values: np.ndarray, window: int, min_periods: int = 1, fill: float = np.nan) -> np.ndarray:
+    """Trailing-window population standard deviation"""
+    return rolling_apply(values, window, window_std, min_periods, fill)
+
+
+def rolling_corr(
+    x: np.ndarray,
+    y: np.ndarray,
+    window: int,
+    min_periods: int = 1,
+    fill: float = np.nan
+) -> np.ndarray:
+    """Trailing-window correlation of two aligned series (window_corr)"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    out = np.full(n, fill, dtype=np.float64)
+
+    for i in range(max(min_periods - 1, 0), min(window - 1, n)):
+        out[i] = window_corr(x[None, :i + 1], y[None, :i + 1])[0]
+
+    if n >= window and window >= min_periods:
+        out[window - 1:] = window_corr(sliding_window_view(x, window), sliding_window_view(y, window))
+
+    return out
+
+
+def rolling_moments(
+    values: np.ndarray,
+    window: int,
+    min_periods: int = 1,
+    fill: float = np.nan
+) -> Dict[str, np.ndarray]:
+    """
+    Trailing-window mean, std, skewness and kurtosis in one pass
+
+    Returns:
+        Dict with 'mean', 'std', 'skew', 'kurtosis' arrays of len(values)
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    out = {name: np.full(n, fill, dtype=np.float64) for name in ('mean', 'std', 'skew', 'kurtosis')}
+
+    for i in range(max(min_periods - 1, 0), min(window - 1, n)):
+        for name, value in window_moments(x[None, :i + 1]).items():
+            out[name][i] = value[0]
+
+    if n >= window and window >= min_periods:
+        for name, value in window_moments(sliding_window_view(x, window)).items():
+            out[name][window - 1:] = value
+
+    return out
+
+
+# ----------------------------------------------------------------------
+# Shared intermediates
+# ----------------------------------------------------------------------
+
+class RollingCache:
+    """
+    Memoized trailing-window kernels over one series
+
+    Feature families that window the same series share one cache, so a
+    kernel/window combination is evaluated once per partition however many
+    families (or features) ask for it. Results are computed for every row
+    (min_periods=1) and min_periods/fill are applied on the way out, since
+    a row's value does not depend on them.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = np.asarray(values, dtype=np.float64)
+        self._results = {}
+
+    @classmethod
+    def of(cls, values) -> 'RollingCache':
+        """The cache itself, or a new cache over a plain array"""
+        return values if isinstance(values, cls) else cls(values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _masked(self, result: np.ndarray, window: int, min_periods: int, fill: float) -> np.ndarray:
+        out = result.copy()
+        out[:max(min_periods - 1, 0)] = fill
+        if window < min_periods:
+            out[:] = fill
+        return out
+
+    def apply(self, kernel: WindowKernel, window: int, min_periods: int = 1, fill: float = np.nan) -> np.ndarray:
+        """rolling_apply(values, window, kernel, min_periods, fill), memoized"""
+        key = (kernel, window)
+        if key not in self._results:
+            self._results[key] = rolling_apply(self.values, window, kernel)
+        return self._masked(self._results[key], window, min_periods, fill)
+
+    def mean(self, window: int, min_periods: int = 1, fill: float = np.nan) -> np.ndarray:
+        """Trailing-window mean"""
+        return self.apply(window_mean, window, min_periods, fill)
+
+    def std(self, window: int, min_periods: int = 1, fill: float = np.nan) -> np.ndarray:
+        """Trailing-window population standard deviation"""
+        return self.apply(window_std, window, min_periods, fill)
+
+    def moments(self, window: int, min_periods: int = 1, fill: float = np.nan) -> Dict[str, np.ndarray]:
+        """rolling_moments(values, window, min_periods, fill), memoized"""
+        key = ('moments', window)
+        if key not in self._results:
+            self._results[key] = rolling_moments(self.values, window)
+        return {name: self._masked(value, window, min_periods, fill) for name, value in self._results[key].items()}
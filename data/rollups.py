@@ -0,0 +1,338 @@
+"""
+Multi-Resolution Bars
+5/15/30/60-minute OHLCV, rate_index and BQX bars rolled up from M1
+
+Long-window features (the regime detector's 1440-row windows, the
+630-minute REG windows, the multi_scale_30m/60m tables) do not need every
+minute: on 5..60-minute bars the same lookback touches 5..60x fewer rows.
+
+RollupBuilder consumes M1 rows in chunks (one streaming pass over the
+month) and emits every resolution at once; each level is reduced from the
+previous one (5m -> 15m -> 30m -> 60m), since their buckets nest. Bars are
+aligned to the clock (a 15m bar starts at :00, :15, :30 or :45) and hold:
+- open/close, rate_index, bqx: first/last non-NaN value of the bucket
+- high/low: max/min; volume: sum
+- minutes: number of M1 rows in the bucket (gaps leave it below the
+  resolution; empty buckets have no bar)
+
+BarStore keeps the bars as memory-mappable Arrow partitions in the local
+feature store (tables bars_5m, bars_15m, ...). A bar may only be used by
+a minute row once the bar is complete: Bars.as_of broadcasts coarse
+values back onto minute timestamps without lookahead.
+"""
+
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from data.feature_store import FeatureStore
+
+RESOLUTIONS = (5, 15, 30, 60)
+
+# Column -> bucket reduction (also valid for reducing bars into coarser bars)
+AGGREGATIONS = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'rate_index': 'last',
+    'bqx': 'last',
+    'minutes': 'sum',
+}
+
+M1_QUERY = """
+    SELECT time AS ts_utc, open, high, low, close, volume, rate_index, bqx
+    FROM bqx.m1_{pair}
+    WHERE time >= %s AND time < %s
+    ORDER BY time
+"""
+
+MINUTE = np.timedelta64(1, 'm')
+
+
+class Bars:
+    """Bars of one resolution as columnar NumPy arrays"""
+
+    def __init__(self, minutes: int, ts: np.ndarray, columns: Dict[str, np.ndarray]):
+        """
+        Args:
+            minutes: Resolution in minutes
+            ts: datetime64[ns] bar start times, ascending
+            columns: Column name -> array aligned with ts
+        """
+        self.minutes = minutes
+        self.ts = np.asarray(ts, dtype='datetime64[ns]')
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    @classmethod
+    def from_frame(cls, minutes: int, frame: pd.DataFrame) -> 'Bars':
+        """Bars from a frame with a ts_utc column or index"""
+        if 'ts_utc' in frame.columns:
+            frame = frame.set_index('ts_utc')
+        return cls(minutes, frame.index.values, {col: frame[col].to_numpy() for col in frame.columns})
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame with a ts_utc column (the bar start)"""
+        return pd.DataFrame({'ts_utc': self.ts, **self.columns})
+
+    @property
+    def last_minute(self) -> np.ndarray:
+        """Timestamp of each bar's last M1 slot (the bar is complete from there on)"""
+        return self.ts + (self.minutes - 1) * MINUTE
+
+    def window(self, minutes: int) -> int:
+        """Number of bars covering a lookback given in minutes (at least 1)"""
+        return max(int(minutes) // self.minutes, 1)
+
+    def as_of(self, times: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Bar values as known at each minute timestamp
+
+        Each minute gets the value of the latest bar completed at or before
+        it (NaN before the first complete bar), so coarse features can be
+        joined onto M1 rows without looking ahead.
+
+        Args:
+            times: datetime64 minute timestamps
+            values: One value per bar (e.g. a rolling feature of the bars)
+
+        Returns:
+            float64 array of len(times)
+        """
+        index = np.searchsorted(self.last_minute, np.asarray(times, dtype='datetime64[ns]'), side='right') - 1
+        out = np.asarray(values, dtype=np.float64)[np.maximum(index, 0)]
+        out[index < 0] = np.nan
+        return out
+
+
+# ----------------------------------------------------------------------
+# Bucket reductions
+# ----------------------------------------------------------------------
+
+def _reduce(how: str, values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Reduce values over the buckets beginning at `starts`"""
+    values = np.asarray(values, dtype=np.float64)
+    if how == 'max':
+        return np.fmax.reduceat(values, starts)
+    if how == 'min':
+        return np.fmin.reduceat(values, starts)
+    if how == 'sum':
+        return np.add.reduceat(np.nan_to_num(values), starts)
+
+    n = len(values)
+    valid = ~np.isnan(values)
+    if how == 'first':
+        index = np.minimum.reduceat(np.where(valid, np.arange(n), n), starts)
+        found = index < n
+    else:
+        index = np.maximum.reduceat(np.where(valid, np.arange(n), -1), starts)
+        found = index >= 0
+    return np.where(found, values[np.clip(index, 0, n - 1)], np.nan)
+
+
+def rollup(bars: Bars, minutes: int) -> Bars:
+    """
+    Reduce bars (or M1 rows as 1-minute bars) to a coarser, clock-aligned
+    resolution
+
+    Args:
+        bars: Source bars; minutes must divide the target resolution
+        minutes: Target resolution in minutes
+
+    Returns:
+        Bars with one row per non-empty bucket
+    """
+    if minutes % bars.minutes:
+        raise ValueError(f"{minutes}m bars cannot be built from {bars.minutes}m bars")
+    if len(bars) == 0:
+        return Bars(minutes, bars.ts[:0], {col: values[:0] for col, values in bars.columns.items()})
+
+    step = np.int64(minutes * 60 * 10**9)
+    bucket = bars.ts.astype(np.int64) // step
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ts = (bucket[starts] * step).astype('datetime64[ns]')
+    return Bars(minutes, ts, {col: _reduce(AGGREGATIONS[col], values, starts)
+                              for col, values in bars.columns.items()})
+
+
+class RollupBuilder:
+    """
+    Streaming rollup of M1 rows into several resolutions
+
+    update() takes M1 chunks in time order; rows of the still-open coarsest
+    bucket are held back until the next chunk (or finish()), so every bar
+    is reduced exactly once.
+    """
+
+    def __init__(self, resolutions: Sequence[int] = RESOLUTIONS):
+        self.resolutions = tuple(sorted(resolutions))
+        coarsest = self.resolutions[-1]
+        if any(coarsest % minutes for minutes in self.resolutions):
+            raise ValueError(f"Resolutions {self.resolutions} must all divide {coarsest}")
+
+        # Each level is reduced from the coarsest finer level that divides it
+        self.sources = {}
+        for k, minutes in enumerate(self.resolutions):
+            finer = [m for m in self.resolutions[:k] if minutes % m == 0]
+            self.sources[minutes] = finer[-1] if finer else 1
+
+        self.pending = None
+        self.pieces = {minutes: [] for minutes in self.resolutions}
+
+    def _roll(self, m1: Bars):
+        levels = {1: m1}
+        for minutes in self.resolutions:
+            levels[minutes] = rollup(levels[self.sources[minutes]], minutes)
+            self.pieces[minutes].append(levels[minutes])
+
+    def update(self, ts: np.ndarray, columns: Dict[str, np.ndarray]):
+        """
+        Add a chunk of M1 rows
+
+        Args:
+            ts: datetime64 minute timestamps, ascending (and after every
+                earlier chunk)
+            columns: M1 column name -> values (names from AGGREGATIONS)
+        """
+        chunk = Bars(1, ts, {col: np.asarray(values, dtype=np.float64) for col, values in columns.items()})
+        if 'minutes' not in chunk.columns:
+            chunk.columns['minutes'] = np.ones(len(chunk))
+        if self.pending is not None:
+            chunk = Bars(1, np.concatenate([self.pending.ts, chunk.ts]),
+                         {col: np.concatenate([self.pending[col], chunk[col]]) for col in chunk.columns})
+        if len(chunk) == 0:
+            self.pending = chunk
+            return
+
+        step = np.int64(self.resolutions[-1] * 60 * 10**9)
+        bucket = chunk.ts.astype(np.int64) // step
+        cut = int(np.searchsorted(bucket, bucket[-1]))
+        self._roll(Bars(1, chunk.ts[:cut], {col: values[:cut] for col, values in chunk.columns.items()}))
+        self.pending = Bars(1, chunk.ts[cut:], {col: values[cut:] for col, values in chunk.columns.items()})
+
+    def finish(self) -> Dict[int, Bars]:
+        """Close the open bucket and return resolution -> Bars"""
+        if self.pending is not None:
+            self._roll(self.pending)
+            self.pending = None
+
+        out = {}
+        for minutes, pieces in self.pieces.items():
+            pieces = [piece for piece in pieces if len(piece)]
+            if not pieces:
+                out[minutes] = Bars(minutes, np.array([], dtype='datetime64[ns]'),
+                                    {col: np.array([]) for col in AGGREGATIONS})
+                continue
+            out[minutes] = Bars(minutes, np.concatenate([p.ts for p in pieces]),
+                                {col: np.concatenate([p[col] for p in pieces]) for col in pieces[0].columns})
+        self.pieces = {minutes: [] for minutes in self.resolutions}
+        return out
+
+
+def build_bars(
+    chunks: Iterable[pd.DataFrame],
+    resolutions: Sequence[int] = RESOLUTIONS
+) -> Dict[int, Bars]:
+    """
+    Roll M1 frames (ts_utc plus M1 columns, in time order) into bars
+
+    Args:
+        chunks: M1 row chunks, e.g. data.db.iter_frames over M1_QUERY
+        resolutions: Bar resolutions in minutes
+
+    Returns:
+        Dict of resolution -> Bars
+    """
+    builder = RollupBuilder(resolutions)
+    for chunk in chunks:
+        columns = {col: pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+                   for col in chunk.columns if col in AGGREGATIONS}
+        ts = pd.to_datetime(chunk['ts_utc']).to_numpy(dtype='datetime64[ns]')
+        builder.update(ts, columns)
+    return builder.finish()
+
+
+# ----------------------------------------------------------------------
+# Store
+# ----------------------------------------------------------------------
+
+class BarStore:
+    """Bars per (resolution, pair, month) in the local feature store"""
+
+    def __init__(self, store: Optional[FeatureStore] = None, resolutions: Sequence[int] = RESOLUTIONS,
+                 chunk_rows: int = 10000):
+        """
+        Args:
+            store: Feature store holding the bars_{m}m tables (default:
+                cache/feature_store)
+            resolutions: Resolutions built together from one M1 pass
+            chunk_rows: M1 rows per fetched chunk
+        """
+        self.store = store or FeatureStore()
+        self.resolutions = tuple(sorted(resolutions))
+        self.chunk_rows = chunk_rows
+
+    @staticmethod
+    def table(minutes: int) -> str:
+        return f"bars_{minutes}m"
+
+    def fetch(self, conn, pair: str, month_start: str, month_end: str) -> Dict[int, Bars]:
+        """
+        Roll one month of M1 rows into every resolution (one streaming pass)
+
+        Args:
+            conn: Database connection (not in autocommit mode)
+            pair: Currency pair
+            month_start: First day of the month (YYYY-MM-DD)
+            month_end: First day of the next month (YYYY-MM-DD)
+
+        Returns:
+            Dict of resolution -> Bars
+        """
+        from data.db import iter_frames
+
+        chunks = iter_frames(conn, M1_QUERY.format(pair=pair), (month_start, month_end), self.chunk_rows)
+        return build_bars(chunks, self.resolutions)
+
+    def write(self, pair: str, month_start: str, month_end: str, bars: Dict[int, Bars]):
+        """Store one month of bars of every resolution"""
+        key = pd.Timestamp(month_start).strftime('%Y_%m')
+        for minutes, level in bars.items():
+            self.store.write_partition(self.table(minutes), pair, key, level.to_frame(), month_end)
+
+    def build(self, conn, pair: str, month_start: str, month_end: str) -> Dict[int, Bars]:
+        """fetch() and write() one month"""
+        bars = self.fetch(conn, pair, month_start, month_end)
+        self.write(pair, month_start, month_end, bars)
+        return bars
+
+    def load(self, conn, pair: str, minutes: int, start_date: str, end_date: str) -> Bars:
+        """
+        Bars of [start_date, end_date), building missing months from M1
+
+        Args:
+            conn: Database connection, used only for months not stored yet
+            pair: Currency pair
+            minutes: Resolution (one of the store's resolutions)
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD), exclusive
+
+        Returns:
+            Bars
+        """
+        if minutes not in self.resolutions:
+            raise ValueError(f"No {minutes}m bars (resolutions: {self.resolutions})")
+
+        def fetch(pair, month_start, month_end):
+            return self.build(conn, pair, month_start, month_end)[minutes].to_frame()
+
+        table = self.store.load_table(self.table(minutes), pair, start_date, end_date, fetch)
+        return Bars.from_frame(minutes, table.to_pandas())
@@ -0,0 +1,468 @@
+"""
+Spectral, Wavelet and SSA Features
+Trailing-window frequency-domain features for a whole partition in one vectorized pass
+
+Feeds the Stage 1.8.3 tables (spectral_features_*, wavelet_features_*,
+ssa_features_*). Every row only sees its own and earlier values:
+- FFT (12 features): power spectra of the trailing FFT_WINDOW rows from
+  np.fft.rfft over blocks of sliding_window_view windows; SlidingDFT
+  produces the same bins one row at a time (O(window) per row) for live
+  appends
+- Wavelet (10 features): causal maximal-overlap (stationary) Haar or
+  Daubechies transform computed once over the partition, then trailing
+  energies of each scale
+- SSA (8 features): eigen-decomposition of the lag-covariance of the
+  trailing SSA_WINDOW rows (the truncated SVD of the trajectory matrix),
+  refreshed every SSA_STRIDE rows in batched np.linalg.eigh calls; each
+  row's last lagged vector is projected onto the latest eigenvectors
+
+The first rows of a partition, whose windows are not yet full, are NaN;
+workers read enough history before the partition (WARMUP_ROWS) to fill
+them.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data.rolling_stats import (
+    BLOCK_ROWS, rolling_apply, rolling_corr, rolling_mean, window_slope
+)
+
+# FFT: 2-hour windows; bands in cycles per row (periods >= 30 / <= 5 rows)
+FFT_WINDOW = 120
+LOW_FREQ = 1 / 30
+HIGH_FREQ = 1 / 5
+EDGE_SHARE = 0.95
+DYNAMICS_WINDOW = 60
+
+# Wavelet: db4 (8 taps), 3 levels, 1-hour energy windows
+WAVELET = 'db4'
+WAVELET_LEVELS = 3
+WAVELET_WINDOW = 60
+
+# SSA: embedding L=60 over 4-hour windows, trend = 1st, oscillation = 2nd+3rd eigentriples
+SSA_LAG = 60
+SSA_WINDOW = 240
+SSA_STRIDE = 15
+
+# History rows every feature needs before its first complete value
+WARMUP_ROWS = max(FFT_WINDOW + DYNAMICS_WINDOW,
+                  (2 ** WAVELET_LEVELS - 1) * 7 + WAVELET_WINDOW,
+                  SSA_WINDOW + SSA_STRIDE)
+
+# Orthonormal scaling filters (sum sqrt(2), unit norm)
+WAVELET_FILTERS = {
+    'haar': np.array([1.0, 1.0]) / np.sqrt(2.0),
+    'db4': np.array([
+        0.2303778133088964, 0.7148465705529154, 0.6308807679298587, -0.027983769416859854,
+        -0.18703481171909309, 0.030841381835560764, 0.0328830116668852, -0.010597401785069032
+    ]),
+}
+
+FFT_FEATURES = [
+    'fft_dominant_freq', 'fft_dominant_power', 'fft_secondary_freq', 'fft_harmonic_ratio',
+    'fft_low_freq_power', 'fft_high_freq_power', 'fft_spectral_entropy', 'fft_spectral_edge_freq',
+    'fft_power_trend', 'fft_freq_stability', 'fft_noise_ratio', 'fft_cyclic_strength'
+]
+
+WAVELET_FEATURES = [
+    'wavelet_detail_d1_energy', 'wavelet_detail_d2_energy', 'wavelet_detail_d3_energy',
+    'wavelet_approx_a3_energy', 'wavelet_energy_ratio_d1_d3', 'wavelet_trend_strength',
+    'wavelet_detail_entropy', 'wavelet_singularity', 'wavelet_scale_energy_max', 'wavelet_coherence'
+]
+
+SSA_FEATURES = [
+    'ssa_trend_component', 'ssa_oscillatory_component', 'ssa_noise_component',
+    'ssa_trend_variance_explained', 'ssa_osc_variance_explained', 'ssa_noise_variance',
+    'ssa_separability', 'ssa_reconstruction_error'
+]
+
+FAMILIES = {
+    'spectral': ('bqx.spectral_features_{domain}_{pair}', FFT_FEATURES),
+    'wavelet': ('bqx.wavelet_features_{domain}_{pair}', WAVELET_FEATURES),
+    'ssa': ('bqx.ssa_features_{domain}_{pair}', SSA_FEATURES),
+}
+
+# Column suffix per domain ('rate' columns end in _idx)
+SUFFIXES = {'rate': 'idx', 'bqx': 'bqx'}
+
+
+def family_columns(family: str, domain: str) -> Dict[str, str]:
+    """Feature name -> table column for one family and domain ('rate' or 'bqx')"""
+    return {name: f'{name}_{SUFFIXES[domain]}' for name in FAMILIES[family][1]}
+
+
+def family_table(family: str, domain: str, pair: str) -> str:
+    """Parent table of one family, domain and pair"""
+    return FAMILIES[family][0].format(domain=domain, pair=pair)
+
+
+def domain_signal(values: np.ndarray, domain: str) -> np.ndarray:
+    """
+    Series analysed by the FFT and wavelet families
+
+    rate_index levels are dominated by their random-walk drift, so the rate
+    domain uses one-row changes (the first row is NaN); BQX is already a
+    momentum series and is used as is.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if domain == 'rate':
+        return np.r_[np.nan, np.diff(values)]
+    return values
+
+
+def _entropy(shares: np.ndarray) -> np.ndarray:
+    """Entropy of each row's shares, normalized to [0, 1]"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(shares > 0, shares * np.log(shares), 0.0)
+    return -terms.sum(axis=1) / np.log(shares.shape[1])
+
+
+# ----------------------------------------------------------------------
+# FFT
+# ----------------------------------------------------------------------
+
+class SlidingDFT:
+    """
+    Streaming DFT bins of the trailing window, O(window) per row
+
+    Each row rotates the bins by one sample:
+    X_k(t) = (X_k(t-1) - x(t-W) + x(t)) * exp(2j*pi*k/W).
+    Rounding error would accumulate over a month of rows, so the bins are
+    recomputed exactly with rfft every `resync` rows.
+    """
+
+    def __init__(self, window: int = FFT_WINDOW, resync: Optional[int] = None):
+        self.window = window
+        self.resync = resync or window
+        self.buffer = np.zeros(window)
+        self.bins = np.zeros(window // 2 + 1, dtype=np.complex128)
+        self.twiddle = np.exp(2j * np.pi * np.arange(window // 2 + 1) / window)
+        self.pos = 0
+        self.count = 0
+
+    def update(self, value: float) -> np.ndarray:
+        """
+        Add one row
+
+        Returns:
+            Power of bins 1..window//2 (NaN until the window is full)
+        """
+        old = self.buffer[self.pos]
+        self.buffer[self.pos] = value
+        self.pos = (self.pos + 1) % self.window
+        self.count += 1
+        if self.count % self.resync == 0:
+            self.bins = np.fft.rfft(np.roll(self.buffer, -self.pos))
+        else:
+            self.bins = (self.bins + (value - old)) * self.twiddle
+        if self.count < self.window:
+            return np.full(self.window // 2, np.nan)
+        return np.abs(self.bins[1:]) ** 2
+
+
+def rolling_power(values: np.ndarray, window: int = FFT_WINDOW) -> np.ndarray:
+    """
+    Power spectra of every trailing window
+
+    Bin 0 (the window mean) is dropped, so the spectra do not depend on the
+    series' level.
+
+    Returns:
+        (len(values), window // 2) array, bins 1..window//2; NaN rows until
+        the first full window
+    """
+    x = np.asarray(values, dtype=np.float64)
+    out = np.full((len(x), window // 2), np.nan)
+    if len(x) < window:
+        return out
+    windows = sliding_window_view(x, window)
+    for start in range(0, len(windows), BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, len(windows))
+        out[window - 1 + start:window - 1 + stop] = np.abs(np.fft.rfft(windows[start:stop], axis=1)[:, 1:]) ** 2
+    return out
+
+
+def spectrum_features(power: np.ndarray, window: int = FFT_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    Shape of each row's spectrum (rows of rolling_power or SlidingDFT)
+
+    Returns:
+        Dict of the FFT features except fft_power_trend and
+        fft_freq_stability, plus 'dominant_bin' and 'total_power'
+    """
+    n, bins = power.shape
+    freqs = np.arange(1, bins + 1) / window
+    rows = np.arange(n)
+    valid = np.isfinite(power).all(axis=1)
+    p = np.where(valid[:, None], power, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = np.where(valid, p.sum(axis=1), np.nan)
+        share = p / total[:, None]
+
+        dominant = np.argmax(p, axis=1)
+        masked = p.copy()
+        masked[rows, dominant] = -1.0
+        secondary = np.argmax(masked, axis=1)
+        harmonic = 2 * dominant + 1
+        harmonic_power = np.where(harmonic < bins, p[rows, np.minimum(harmonic, bins - 1)], 0.0)
+
+        low = share[:, freqs <= LOW_FREQ].sum(axis=1)
+        high = share[:, freqs >= HIGH_FREQ].sum(axis=1)
+        edge = np.argmax(np.cumsum(share, axis=1) >= EDGE_SHARE, axis=1)
+        flatness = np.exp(np.log(p).mean(axis=1)) / p.mean(axis=1)
+
+        out = {
+            'fft_dominant_freq': freqs[dominant],
+            'fft_dominant_power': share[rows, dominant],
+            'fft_secondary_freq': freqs[secondary],
+            'fft_harmonic_ratio': harmonic_power / p[rows, dominant],
+            'fft_low_freq_power': low,
+            'fft_high_freq_power': high,
+            'fft_spectral_entropy': _entropy(share),
+            'fft_spectral_edge_freq': freqs[edge],
+            'fft_noise_ratio': high / low,
+            'fft_cyclic_strength': 1.0 - flatness,
+            'dominant_bin': dominant.astype(np.float64),
+            'total_power': total,
+        }
+    for name, values in out.items():
+        out[name] = np.where(valid & (total > 0), values, np.nan)
+    return out
+
+
+def fft_features(values: np.ndarray, window: int = FFT_WINDOW) -> Dict[str, np.ndarray]:
+    """
+    FFT features of every row of a series
+
+    Args:
+        values: 1-D float array in time order (see domain_signal)
+        window: FFT window (rows)
+
+    Returns:
+        Dict of FFT_FEATURES -> arrays of len(values)
+    """
+    out = spectrum_features(rolling_power(values, window), window)
+    dominant = out.pop('dominant_bin')
+    total = out.pop('total_power')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['fft_power_trend'] = rolling_apply(np.log(total), DYNAMICS_WINDOW, window_slope,
+                                               min_periods=DYNAMICS_WINDOW)
+    stability = np.full(len(dominant), np.nan)
+    if len(dominant) >= DYNAMICS_WINDOW:
+        recent = sliding_window_view(dominant, DYNAMICS_WINDOW)
+        same = (recent == recent[:, -1:]).mean(axis=1)
+        stability[DYNAMICS_WINDOW - 1:] = np.where(np.isfinite(recent).all(axis=1), same, np.nan)
+    out['fft_freq_stability'] = stability
+    return {name: out[name] for name in FFT_FEATURES}
+
+
+# ----------------------------------------------------------------------
+# Wavelets
+# ----------------------------------------------------------------------
+
+def _causal_filter(values: np.ndarray, taps: np.ndarray, spacing: int) -> np.ndarray:
+    """y[t] = sum_l taps[l] * values[t - spacing * l]; NaN without full history"""
+    out = np.zeros(len(values))
+    for l, tap in enumerate(taps):
+        shift = spacing * l
+        if shift >= len(values):
+            return np.full(len(values), np.nan)
+        out[shift:] += tap * values[:len(values) - shift]
+    out[:spacing * (len(taps) - 1)] = np.nan
+    return out
+
+
+def modwt(values: np.ndarray, wavelet: str = WAVELET, levels: int = WAVELET_LEVELS) -> Dict[str, np.ndarray]:
+    """
+    Causal maximal-overlap (stationary) wavelet transform
+
+    Level j filters the previous approximation with the rescaled filters
+    (h / sqrt(2), g / sqrt(2)) upsampled by 2^(j-1): no decimation, one
+    coefficient per row, and each coefficient uses past rows only. Detail
+    and approximation energies add up to the signal's energy.
+
+    Returns:
+        Dict 'd1'..'d{levels}' and 'a{levels}' -> arrays of len(values)
+    """
+    scaling = WAVELET_FILTERS[wavelet]
+    wavelet_taps = scaling[::-1] * (-1.0) ** np.arange(len(scaling))
+    h, g = scaling / np.sqrt(2.0), wavelet_taps / np.sqrt(2.0)
+
+    approx = np.asarray(values, dtype=np.float64)
+    out = {}
+    for level in range(1, levels + 1):
+        spacing = 2 ** (level - 1)
+        out[f'd{level}'] = _causal_filter(approx, g, spacing)
+        approx = _causal_filter(approx, h, spacing)
+    out[f'a{levels}'] = approx
+    return out
+
+
+def wavelet_features(values: np.ndarray, window: int = WAVELET_WINDOW,
+                     wavelet: str = WAVELET) -> Dict[str, np.ndarray]:
+    """
+    Wavelet features of every row of a series
+
+    Args:
+        values: 1-D float array in time order (see domain_signal)
+        window: Rows of the trailing scale energies
+        wavelet: 'db4' or 'haar'
+
+    Returns:
+        Dict of WAVELET_FEATURES -> arrays of len(values)
+    """
+    coeffs = modwt(values, wavelet, WAVELET_LEVELS)
+    energy = {name: rolling_mean(c * c, window, min_periods=window) for name, c in coeffs.items()}
+    e1, e2, e3, a3 = energy['d1'], energy['d2'], energy['d3'], energy['a3']
+    scales = np.column_stack([e1, e2, e3, a3])
+    details = scales[:, :3]
+    valid = np.isfinite(scales).all(axis=1)
+
+    magnitude = {name: np.abs(c) for name, c in coeffs.items()}
+    coherence = (rolling_corr(magnitude['d1'], magnitude['d2'], window, min_periods=window) +
+                 rolling_corr(magnitude['d2'], magnitude['d3'], window, min_periods=window)) / 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = {
+            'wavelet_detail_d1_energy': e1,
+            'wavelet_detail_d2_energy': e2,
+            'wavelet_detail_d3_energy': e3,
+            'wavelet_approx_a3_energy': a3,
+            'wavelet_energy_ratio_d1_d3': e1 / e3,
+            'wavelet_trend_strength': a3 / scales.sum(axis=1),
+            'wavelet_detail_entropy': _entropy(details / details.sum(axis=1, keepdims=True)),
+            'wavelet_singularity': magnitude['d1'] / np.sqrt(e1),
+            'wavelet_scale_energy_max': np.where(valid, np.argmax(np.where(valid[:, None], scales, 0.0),
+                                                                  axis=1) + 1.0, np.nan),
+            'wavelet_coherence': coherence,
+        }
+    return {name: np.where(valid, out[name], np.nan) for name in WAVELET_FEATURES}
+
+
+# ----------------------------------------------------------------------
+# SSA
+# ----------------------------------------------------------------------
+
+def _ssa_bases(x: np.ndarray, anchors: np.ndarray, lag: int, window: int, rank: int):
+    """
+    Leading eigenpairs of the lag-covariance at each anchor row
+
+    The trajectory matrix of the centered trailing window is a strided view
+    (windows, lag); X^T X / K gives the squared singular values and right
+    singular vectors without forming the SVD.
+
+    Returns:
+        (eigenvalues (anchors, rank + 1), eigenvector (anchors, lag, rank),
+        trace (anchors,))
+    """
+    k = window - lag + 1
+    values = np.empty((len(anchors), rank + 1))
+    vectors = np.empty((len(anchors), lag, rank))
+    trace = np.empty(len(anchors))
+    windows = sliding_window_view(x, window)
+
+    block = max(1, BLOCK_ROWS // 16)
+    for start in range(0, len(anchors), block):
+        rows = anchors[start:start + block] - (window - 1)
+        w = windows[rows]
+        w = w - w.mean(axis=1, keepdims=True)
+        trajectory = sliding_window_view(w, lag, axis=1)
+        cov = np.matmul(trajectory.transpose(0, 2, 1), trajectory) / k
+        finite = np.isfinite(cov).all(axis=(1, 2))
+        cov[~finite] = 0.0
+        eigvals, eigvecs = np.linalg.eigh(cov)
+        stop = start + len(rows)
+        values[start:stop] = np.where(finite[:, None], eigvals[:, ::-1][:, :rank + 1], np.nan)
+        vectors[start:stop] = eigvecs[:, :, ::-1][:, :, :rank]
+        trace[start:stop] = np.where(finite, np.trace(cov, axis1=1, axis2=2), np.nan)
+    return values, vectors, trace
+
+
+def ssa_features(values: np.ndarray, lag: int = SSA_LAG, window: int = SSA_WINDOW,
+                 stride: int = SSA_STRIDE) -> Dict[str, np.ndarray]:
+    """
+    SSA features of every row of a level series
+
+    The eigenvectors are refreshed every `stride` rows (from the trailing
+    window at that row) and reused until the next refresh; every row
+    projects its own last lagged vector, centered on its own trailing
+    window mean, onto them. The trend (1st eigentriple) is returned at
+    the series' level, the oscillatory (2nd + 3rd) and noise components
+    as deviations from it.
+
+    Args:
+        values: 1-D float array in time order
+        lag: Embedding dimension L
+        window: Trailing rows per decomposition
+        stride: Rows between decompositions
+
+    Returns:
+        Dict of SSA_FEATURES -> arrays of len(values)
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    out = {name: np.full(n, np.nan) for name in SSA_FEATURES}
+    if n < window:
+        return out
+
+    anchors = np.arange(window - 1, n, stride)
+    eigvals, eigvecs, trace = _ssa_bases(x, anchors, lag, window, 3)
+
+    mean = rolling_mean(x, window, min_periods=window)
+    lagged = sliding_window_view(x, lag)
+    for start in range(window - 1, n, BLOCK_ROWS):
+        rows = np.arange(start, min(start + BLOCK_ROWS, n))
+        base = (rows - (window - 1)) // stride
+        v = lagged[rows - lag + 1] - mean[rows, None]
+        u = eigvecs[base]
+        coef = np.einsum('nl,nlk->nk', v, u)
+        last = coef * u[:, -1, :]
+        fitted = np.einsum('nk,nlk->nl', coef, u)
+
+        lam = eigvals[base]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            residual = np.linalg.norm(v - fitted, axis=1) / np.linalg.norm(v, axis=1)
+            trend_share = lam[:, 0] / trace[base]
+            osc_share = (lam[:, 1] + lam[:, 2]) / trace[base]
+            separability = 1.0 - lam[:, 3] / lam[:, 2]
+
+        out['ssa_trend_component'][rows] = mean[rows] + last[:, 0]
+        out['ssa_oscillatory_component'][rows] = last[:, 1] + last[:, 2]
+        out['ssa_noise_component'][rows] = v[:, -1] - last.sum(axis=1)
+        out['ssa_trend_variance_explained'][rows] = trend_share
+        out['ssa_osc_variance_explained'][rows] = osc_share
+        out['ssa_noise_variance'][rows] = 1.0 - trend_share - osc_share
+        out['ssa_separability'][rows] = separability
+        out['ssa_reconstruction_error'][rows] = residual
+    return out
+
+
+def compute_spectral_features(values: np.ndarray, domain: str) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    All three families for one series
+
+    Args:
+        values: rate_index or bqx levels in time order (NULLs as NaN are
+            carried forward)
+        domain: 'rate' or 'bqx'
+
+    Returns:
+        Dict family -> {table column -> array of len(values)}
+    """
+    levels = pd.Series(np.asarray(values, dtype=np.float64)).ffill().to_numpy()
+    signal = domain_signal(levels, domain)
+    computed = {
+        'spectral': fft_features(signal),
+        'wavelet': wavelet_features(signal),
+        'ssa': ssa_features(levels),
+    }
+    # Degenerate windows (flat prices) give inf ratios; they are stored as NULL
+    return {family: {column: np.where(np.isfinite(computed[family][name]), computed[family][name], np.nan)
+                     for name, column in family_columns(family, domain).items()}
+            for family in FAMILIES}
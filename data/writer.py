@@ -0,0 +1,151 @@
+"""
+Bulk Partition Writer
+Write NumPy/pandas feature columns to Aurora with COPY instead of per-row SQL
+
+Each write streams CSV through COPY FROM STDIN into a temporary staging
+table (temporary tables are never WAL-logged) and then merges the whole
+partition with a single statement:
+- insert: INSERT ... SELECT
+- upsert: INSERT ... SELECT ... ON CONFLICT (key) DO UPDATE
+- ignore: INSERT ... SELECT ... ON CONFLICT (key) DO NOTHING
+- update: UPDATE ... FROM staging WHERE key matches
+
+That replaces one network round trip per row with a handful per partition.
+"""
+
+import io
+import pandas as pd
+from typing import Iterable, Mapping, Optional, Union
+
+WRITE_MODES = ('insert', 'upsert', 'ignore', 'update')
+
+Columns = Union[pd.DataFrame, Mapping[str, Iterable]]
+
+
+def _as_frame(columns: Columns, column_order: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Build a DataFrame view of the columns in the requested order"""
+    if isinstance(columns, pd.DataFrame):
+        frame = columns
+    else:
+        frame = pd.DataFrame(dict(columns))
+
+    if column_order is not None:
+        frame = frame[list(column_order)]
+
+    return frame
+
+
+def frame_to_csv(frame: pd.DataFrame) -> io.StringIO:
+    """
+    Serialize a frame as headerless CSV for COPY
+
+    NaN/None/NaT become empty unquoted fields, which COPY (FORMAT csv)
+    reads as NULL. Floats are written with full round-trip precision.
+
+    Args:
+        frame: Rows to serialize
+
+    Returns:
+        StringIO positioned at the start of the CSV text
+    """
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep='')
+    buffer.seek(0)
+    return buffer
+
+
+def copy_frame(cur, table: str, frame: pd.DataFrame, chunk_rows: int = 50000) -> int:
+    """
+    COPY a frame into an existing table in chunks
+
+    Args:
+        cur: psycopg2 cursor
+        table: Target table (schema-qualified if needed)
+        frame: Rows to load; column names must match the table
+        chunk_rows: Rows serialized per COPY call (bounds buffer memory)
+
+    Returns:
+        Number of rows copied
+    """
+    col_str = ', '.join(frame.columns)
+    copy_sql = f"COPY {table} ({col_str}) FROM STDIN WITH (FORMAT csv)"
+
+    for start in range(0, len(frame), chunk_rows):
+        cur.copy_expert(copy_sql, frame_to_csv(frame.iloc[start:start + chunk_rows]))
+
+    return len(frame)
+
+
+def write_columns(
+    conn,
+    table: str,
+    columns: Columns,
+    key: str = 'ts_utc',
+    mode: str = 'upsert',
+    column_order: Optional[Iterable[str]] = None,
+    chunk_rows: int = 50000
+) -> int:
+    """
+    Bulk-write feature columns to a table through a COPY staging table
+
+    The caller owns the transaction: nothing is committed here.
+
+    Args:
+        conn: psycopg2 connection
+        table: Target table, e.g. 'bqx.reg_bqx_eurusd_2024_07'
+        columns: DataFrame or dict of equal-length NumPy/pandas columns.
+            Missing values (NaN/None/NaT) are written as NULL; integer
+            columns with missing values should use pandas' Int64 dtype.
+        key: Conflict/join column for upsert, ignore and update modes
+        mode: One of 'insert', 'upsert', 'ignore', 'update'
+        column_order: Optional subset/order of columns to write
+        chunk_rows: Rows per COPY chunk
+
+    Returns:
+        Number of target rows inserted or updated
+    """
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Unknown write mode '{mode}' (expected one of {WRITE_MODES})")
+
+    frame = _as_frame(columns, column_order)
+    if frame.empty:
+        return 0
+
+    col_names = list(frame.columns)
+    if mode != 'insert' and key not in col_names:
+        raise ValueError(f"Key column '{key}' missing from columns for mode '{mode}'")
+
+    col_str = ', '.join(col_names)
+    stage = f"_stage_{table.split('.')[-1]}"[:63]
+
+    cur = conn.cursor()
+    try:
+        # Staging table with the target's column types, no constraints
+        cur.execute(f"DROP TABLE IF EXISTS {stage}")
+        cur.execute(f"CREATE TEMP TABLE {stage} AS SELECT {col_str} FROM {table} WITH NO DATA")
+
+        copy_frame(cur, stage, frame, chunk_rows)
+
+        if mode == 'update':
+            set_str = ', '.join(f"{col} = s.{col}" for col in col_names if col != key)
+            cur.execute(f"""
+                UPDATE {table} AS t
+                SET {set_str}
+                FROM {stage} AS s
+                WHERE t.{key} = s.{key}
+            """)
+        else:
+            merge_sql = f"INSERT INTO {table} ({col_str}) SELECT {col_str} FROM {stage}"
+            update_str = ', '.join(f"{col} = EXCLUDED.{col}" for col in col_names if col != key)
+            if mode == 'upsert' and update_str:
+                merge_sql += f" ON CONFLICT ({key}) DO UPDATE SET {update_str}"
+            elif mode in ('upsert', 'ignore'):
+                merge_sql += f" ON CONFLICT ({key}) DO NOTHING"
+            cur.execute(merge_sql)
+
+        rows_written = cur.rowcount
+        cur.execute(f"DROP TABLE IF EXISTS {stage}")
+    finally:
+        cur.close()
+
+    return rows_written
@@ -28,12 +28,14 @@ class BQXBaselineModel:
     - Standard scaling for features
     """
 
-    def __init__(self, config_path: str = "config/models.yaml"):
+    def __init__(self, config_path: str = "config/models.yaml", n_jobs: int = -1):
         """
         Initialize baseline model
 
         Args:
             config_path: Path to model configuration file
+            n_jobs: Parallel tree-building jobs (-1 = all cores); lower it when
+                several models train side by side
         """
         config_file = Path(config_path)
         if config_file.exists():
@@ -60,6 +62,7 @@ class BQXBaselineModel:
                 'hyperparameter_tuning': {'enabled': False}
             }
 
+        self.n_jobs = n_jobs
         self.model = None
         self.scaler = StandardScaler()
         self.feature_names = None
@@ -84,7 +87,7 @@ class BQXBaselineModel:
             min_samples_split=params.get('min_samples_split', 20),
             min_samples_leaf=params.get('min_samples_leaf', 10),
             random_state=params.get('random_state', 42),
-            n_jobs=-1,  # Use all cores
+            n_jobs=self.n_jobs,
             verbose=0
         )
 
@@ -188,7 +191,7 @@ class BQXBaselineModel:
         }
 
         # Base model
-        base_model = RandomForestRegressor(random_state=42, n_jobs=-1)
+        base_model = RandomForestRegressor(random_state=42, n_jobs=self.n_jobs)
 
         # Time series cross-validation
         tscv = TimeSeriesSplit(n_splits=cv_splits)
@@ -200,7 +203,7 @@ class BQXBaselineModel:
             n_iter=n_iter,
             cv=tscv,
             scoring='r2',
-            n_jobs=-1,
+            n_jobs=self.n_jobs,
             verbose=1,
             random_state=42
         )
@@ -7,12 +7,19 @@ Estimated completion: 45-90 minutes (vs 7 hours sequential)
 
 import sys
 import time
+import argparse
 import multiprocessing as mp
 from datetime import datetime
+from pathlib import Path
 
 # Add backward_worker to path
 sys.path.insert(0, '/home/ubuntu/Robkei-Ring/sandbox/scripts')
+sys.path.append(str(Path(__file__).parent.parent.parent))
 from backward_worker import process_backward_analysis
+from data.jobs import Job, JobLedger, add_ledger_arguments, month_checksum, run_jobs
+
+# Ledger stage shared with backward_worker_threaded.py
+STAGE = 'backward_analysis'
 
 # Preferred forex pairs (28 total)
 PAIRS = [
@@ -41,40 +48,17 @@ MONTHS = [
 ]
 
 
-def process_pair_worker(pair):
-    """
-    Process all months for a single pair
-    This function runs in a separate process
-    """
-    worker_id = mp.current_process().name
-    pair_start = time.time()
-    pair_rows = 0
-
-    print(f"[{worker_id}] Starting {pair.upper()}")
-
-    for i, (start_date, end_date) in enumerate(MONTHS, 1):
-        try:
-            month_start = time.time()
-            rows = process_backward_analysis(pair, start_date, end_date)
-            month_elapsed = time.time() - month_start
-
-            pair_rows += rows
-            print(f"[{worker_id}] {pair.upper()} [{start_date[:7]}] {rows:6,} rows | {month_elapsed:5.1f}s | {i}/12 months")
-
-        except Exception as e:
-            print(f"[{worker_id}] {pair.upper()} [{start_date[:7]}] ERROR: {e}")
-
-    pair_elapsed = time.time() - pair_start
-    print(f"[{worker_id}] ✓ {pair.upper()} COMPLETE: {pair_rows:,} rows in {pair_elapsed:.1f}s")
-
-    return {
-        'pair': pair,
-        'rows': pair_rows,
-        'elapsed': pair_elapsed
-    }
+def month_jobs():
+    """One job per (pair, month) partition"""
+    return [Job(pair, start_date[:7].replace('-', '_'), (pair, start_date, end_date))
+            for pair in PAIRS for start_date, end_date in MONTHS]
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Compute BQX backward metrics for all pairs')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
     print("=" * 80)
     print("BQX Backward Analysis - PARALLEL PROCESSING")
     print("=" * 80)
@@ -93,20 +77,40 @@ def main():
 
     start_time = time.time()
 
-    # Create pool and process pairs in parallel
-    with mp.Pool(processes=num_workers) as pool:
-        results = pool.map(process_pair_worker, PAIRS)
+    def report(result):
+        month_label = result.job.month.replace('_', '-')
+        if result.state == 'failed':
+            print(f"{result.job.pair.upper()} [{month_label}] ERROR: {result.error}")
+        elif result.state == 'done':
+            print(f"{result.job.pair.upper()} [{month_label}] {result.rows:6,} rows | {result.seconds:5.1f}s")
+
+    # Partitions completed by an earlier run are skipped; the longest run first
+    job_results = run_jobs(STAGE, month_jobs(), process_backward_analysis, num_workers,
+                           ledger=JobLedger(args.ledger), checksum=month_checksum('bqx.m1_{pair}', 'time'),
+                           force=args.force, attempts=args.attempts, on_result=report)
 
     total_elapsed = time.time() - start_time
 
-    # Aggregate results
+    # Aggregate results per pair
+    results = []
+    for pair in PAIRS:
+        done = [r for r in job_results if r.job.pair == pair and r.state != 'failed']
+        results.append({
+            'pair': pair,
+            'rows': sum(r.rows for r in done),
+            'elapsed': sum(r.seconds for r in done),
+            'months': len(done)
+        })
     total_rows = sum(r['rows'] for r in results)
     avg_time_per_pair = sum(r['elapsed'] for r in results) / len(results)
+    failed = sum(r.state == 'failed' for r in job_results)
+    skipped = sum(r.state == 'skipped' for r in job_results)
 
     print("\n" + "=" * 80)
     print("PARALLEL BACKFILL COMPLETE")
     print("=" * 80)
     print(f"Total pairs processed: {len(results)}")
+    print(f"Partitions failed: {failed} | skipped (done in an earlier run): {skipped}")
     print(f"Total rows inserted: {total_rows:,}")
     print(f"Total wall time: {total_elapsed / 60:.1f} minutes")
     print(f"Average per pair: {avg_time_per_pair:.1f}s")
@@ -117,7 +121,7 @@ def main():
     # Print per-pair summary
     print("\nPer-Pair Summary:")
     print("-" * 80)
-    print(f"{'Pair':<8} {'Rows':>12} {'Time (s)':>10} {'Rate (rows/s)':>15}")
+    print(f"{'Pair':<8} {'Rows':>12} {'Time (s)':>10} {'Rate (rows/s)':>15} {'Months':>8}")
     print("-" * 80)
 
     for result in sorted(results, key=lambda x: x['pair']):
@@ -125,9 +129,10 @@ def main():
         rows = result['rows']
         elapsed = result['elapsed']
         rate = rows / elapsed if elapsed > 0 else 0
-        print(f"{pair:<8} {rows:>12,} {elapsed:>10.1f} {rate:>15.0f}")
+        print(f"{pair:<8} {rows:>12,} {elapsed:>10.1f} {rate:>15.0f} {result['months']:>5}/{len(MONTHS)}")
 
     print("-" * 80)
+    sys.exit(0 if failed == 0 else 1)
 
 
 if __name__ == "__main__":
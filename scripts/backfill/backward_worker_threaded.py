@@ -7,13 +7,16 @@ Estimated completion: 1-2 hours with 6 threads
 
 import sys
 import time
-import threading
-from queue import Queue
+import argparse
 from datetime import datetime
+from pathlib import Path
 
 # Add backward_worker to path
 sys.path.insert(0, '/home/ubuntu/bqx-ml/scripts/backfill')
+sys.path.append(str(Path(__file__).parent.parent.parent))
 from backward_worker import process_backward_analysis
+from data.jobs import JobLedger, add_ledger_arguments, month_checksum, run_jobs
+from backward_worker_parallel import STAGE, month_jobs
 
 # Preferred forex pairs (28 total)
 PAIRS = [
@@ -41,55 +44,14 @@ MONTHS = [
     ('2025-06-01', '2025-07-01'),
 ]
 
-# Shared state
-results_lock = threading.Lock()
-results = []
-jobs_completed = 0
 total_jobs = len(PAIRS) * len(MONTHS)
 
 
-def worker_thread(thread_id, job_queue):
-    """
-    Worker thread that processes jobs from the queue
-    """
-    global jobs_completed
-
-    while True:
-        try:
-            job = job_queue.get(timeout=1)
-        except:
-            # Queue is empty
-            break
-
-        pair, start_date, end_date = job
-        month_label = start_date[:7]
-
-        try:
-            start_time = time.time()
-            rows = process_backward_analysis(pair, start_date, end_date)
-            elapsed = time.time() - start_time
-
-            with results_lock:
-                jobs_completed += 1
-                progress_pct = (jobs_completed / total_jobs) * 100
-                results.append({
-                    'pair': pair,
-                    'month': month_label,
-                    'rows': rows,
-                    'elapsed': elapsed
-                })
-                print(f"[T{thread_id:02d}] {pair.upper()} [{month_label}] {rows:6,} rows | {elapsed:5.1f}s | Progress: {progress_pct:5.1f}%")
-
-        except Exception as e:
-            with results_lock:
-                jobs_completed += 1
-                print(f"[T{thread_id:02d}] {pair.upper()} [{month_label}] ERROR: {e}")
-
-        finally:
-            job_queue.task_done()
-
-
 def main():
+    parser = argparse.ArgumentParser(description='Compute BQX backward metrics for all pairs (threads)')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
     print("=" * 80)
     print("BQX Backward Analysis - THREADED CONCURRENT PROCESSING")
     print("=" * 80)
@@ -103,47 +65,42 @@ def main():
     print("=" * 80)
     print()
 
-    # Create job queue
-    job_queue = Queue()
-
-    # Enqueue all jobs (pair, month combinations)
-    for pair in PAIRS:
-        for start_date, end_date in MONTHS:
-            job_queue.put((pair, start_date, end_date))
-
-    # Start threads
-    threads = []
     start_time = time.time()
-
-    for i in range(num_threads):
-        t = threading.Thread(target=worker_thread, args=(i, job_queue))
-        t.daemon = True
-        t.start()
-        threads.append(t)
-
-    # Wait for all jobs to complete
-    job_queue.join()
-
-    # Wait for all threads to finish
-    for t in threads:
-        t.join()
+    completed = []
+
+    def report(result):
+        completed.append(result)
+        progress_pct = (len(completed) / total_jobs) * 100
+        month_label = result.job.month.replace('_', '-')
+        if result.state == 'failed':
+            print(f"{result.job.pair.upper()} [{month_label}] ERROR: {result.error}")
+        elif result.state == 'done':
+            print(f"{result.job.pair.upper()} [{month_label}] {result.rows:6,} rows | {result.seconds:5.1f}s | "
+                  f"Progress: {progress_pct:5.1f}%")
+
+    # Same ledger stage as the process-pool worker: either resumes the other
+    job_results = run_jobs(STAGE, month_jobs(), process_backward_analysis, num_threads,
+                           ledger=JobLedger(args.ledger), checksum=month_checksum('bqx.m1_{pair}', 'time'),
+                           force=args.force, attempts=args.attempts, threads=True, on_result=report)
 
     total_elapsed = time.time() - start_time
 
     # Aggregate results
-    total_rows = sum(r['rows'] for r in results)
+    results = [r for r in job_results if r.state != 'failed']
+    total_rows = sum(r.rows for r in results)
     pair_totals = {}
 
     for r in results:
-        pair = r['pair']
+        pair = r.job.pair
         if pair not in pair_totals:
             pair_totals[pair] = 0
-        pair_totals[pair] += r['rows']
+        pair_totals[pair] += r.rows
 
     print("\n" + "=" * 80)
     print("THREADED BACKFILL COMPLETE")
     print("=" * 80)
     print(f"Total jobs: {len(results)}/{total_jobs}")
+    print(f"Skipped (done in an earlier run): {sum(r.state == 'skipped' for r in results)}")
     print(f"Total rows inserted: {total_rows:,}")
     print(f"Total time: {total_elapsed / 60:.1f} minutes")
     print(f"Processing rate: {total_rows / total_elapsed:.0f} rows/sec")
@@ -158,7 +115,7 @@ def main():
     for pair in sorted(PAIRS):
         if pair in pair_totals:
             rows = pair_totals[pair]
-            months = sum(1 for r in results if r['pair'] == pair)
+            months = sum(1 for r in results if r.job.pair == pair)
             print(f"{pair.upper():<8} {rows:>12,} {months:>8}/12")
 
     print("-" * 80)
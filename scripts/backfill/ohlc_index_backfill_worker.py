@@ -18,20 +18,14 @@ Usage:
     python3 scripts/backfill/ohlc_index_backfill_worker.py
 """
 
-import psycopg2
+import sys
+from pathlib import Path
 from psycopg2 import sql
 from datetime import datetime, timedelta
 import time
 
-# Database configuration
-DB_CONFIG = {
-    "host": "trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "database": "bqx",
-    "user": "postgres",
-    "password": "BQX_Aurora_2025_Secure",
-    "sslmode": "require",
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from data.db import connection
 
 # All 28 preferred pairs
 CURRENCY_PAIRS = [
@@ -215,9 +209,6 @@ def main():
     print(f"Date range: {START_DATE.strftime('%Y-%m-%d')} to {END_DATE.strftime('%Y-%m-%d')}")
     print()
 
-    # Connect to database
-    conn = psycopg2.connect(**DB_CONFIG)
-
     total_start = time.time()
     total_rows = 0
     partitions_processed = 0
@@ -235,11 +226,13 @@ def main():
         # Process each month
         for year, month in generate_month_ranges():
             try:
-                # Backfill OHLC index
-                rows_updated, elapsed, baseline = backfill_ohlc_index(conn, pair, year, month)
+                # One pooled connection per partition; rolled back if it fails
+                with connection() as conn:
+                    # Backfill OHLC index
+                    rows_updated, elapsed, baseline = backfill_ohlc_index(conn, pair, year, month)
 
-                # Verify
-                verified = verify_ohlc_index(conn, pair, year, month)
+                    # Verify
+                    verified = verify_ohlc_index(conn, pair, year, month)
 
                 pair_rows += rows_updated
                 total_rows += rows_updated
@@ -253,7 +246,6 @@ def main():
 
             except Exception as e:
                 print(f"  ✗ ERROR [{year}-{month:02d}]: {e}")
-                conn.rollback()
 
         pair_elapsed = time.time() - pair_start
         print()
@@ -278,8 +270,6 @@ def main():
     print("  3. Begin Track 4: Blocked Features Computation (45 technical indicators)")
     print()
 
-    conn.close()
-
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Technical Indicators Benchmark
+NumPy indicator kernels (data.indicators) vs the pandas implementations they replaced
+
+Builds a synthetic month of M1 OHLCV and BQX returns, times both
+implementations of every rate- and BQX-domain indicator, and reports the
+largest relative difference per domain.
+
+The pandas implementations below are kept verbatim from the technical
+indicator workers as the reference for the benchmark and the tests.
+
+Usage:
+    python scripts/ml/benchmark_technical_indicators.py [--rows 44640] [--repeat 3]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.indicators import BQX_INDICATOR_COLUMNS, RATE_INDICATOR_COLUMNS, bqx_indicators, rate_indicators
+
+
+# ----------------------------------------------------------------------
+# pandas reference implementations (technical_indicators_worker*.py)
+# ----------------------------------------------------------------------
+
+def ema(series, period):
+    """Exponential Moving Average"""
+    return series.ewm(span=period, adjust=False).mean()
+
+
+def sma(series, period):
+    """Simple Moving Average"""
+    return series.rolling(window=period).mean()
+
+
+def rsi(series, period=14):
+    """Relative Strength Index"""
+    delta = series.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+
+def macd(series, fast=12, slow=26, signal=9):
+    """MACD, Signal, and Histogram"""
+    ema_fast = ema(series, fast)
+    ema_slow = ema(series, slow)
+    macd_line = ema_fast - ema_slow
+    signal_line = ema(macd_line, signal)
+    histogram = macd_line - signal_line
+    return macd_line, signal_line, histogram
+
+
+def stochastic(high, low, close, k_period=14, d_period=3):
+    """Stochastic Oscillator %K and %D"""
+    lowest_low = low.rolling(window=k_period).min()
+    highest_high = high.rolling(window=k_period).max()
+    stoch_k = 100 * (close - lowest_low) / (highest_high - lowest_low)
+    stoch_d = stoch_k.rolling(window=d_period).mean()
+    return stoch_k, stoch_d
+
+
+def cci(high, low, close, period=20):
+    """Commodity Channel Index"""
+    tp = (high + low + close) / 3
+    sma_tp = sma(tp, period)
+    mad = tp.rolling(window=period).apply(lambda x: np.abs(x - x.mean()).mean())
+    return (tp - sma_tp) / (0.015 * mad)
+
+
+def williams_r(high, low, close, period=14):
+    """Williams %R"""
+    highest_high = high.rolling(window=period).max()
+    lowest_low = low.rolling(window=period).min()
+    return -100 * (highest_high - close) / (highest_high - lowest_low)
+
+
+def roc(series, period=12):
+    """Rate of Change"""
+    return ((series - series.shift(period)) / series.shift(period)) * 100
+
+
+def atr(high, low, close, period=14):
+    """Average True Range"""
+    tr1 = high - low
+    tr2 = abs(high - close.shift())
+    tr3 = abs(low - close.shift())
+    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
+    return tr.rolling(window=period).mean()
+
+
+def obv(close, volume):
+    """On-Balance Volume"""
+    obv_values = (np.sign(close.diff()) * volume).fillna(0).cumsum()
+    return obv_values
+
+
+def adl(high, low, close, volume):
+    """Accumulation/Distribution Line"""
+    clv = ((close - low) - (high - close)) / (high - low)
+    clv = clv.fillna(0)
+    return (clv * volume).cumsum()
+
+
+def mfi(high, low, close, volume, period=14):
+    """Money Flow Index"""
+    tp = (high + low + close) / 3
+    mf = tp * volume
+
+    positive_mf = mf.where(tp > tp.shift(), 0).rolling(window=period).sum()
+    negative_mf = mf.where(tp < tp.shift(), 0).rolling(window=period).sum()
+
+    mfr = positive_mf / negative_mf
+    return 100 - (100 / (1 + mfr))
+
+
+def vwap(high, low, close, volume):
+    """Volume Weighted Average Price (daily reset)"""
+    tp = (high + low + close) / 3
+    return (tp * volume).cumsum() / volume.cumsum()
+
+
+def pandas_rate_indicators(df):
+    """
+    Compute all 45 technical indicators
+
+    Args:
+        df: DataFrame with columns [time, open, high, low, close, volume]
+
+    Returns:
+        DataFrame with 45 technical indicator columns
+    """
+    close = df['close']
+    high = df['high']
+    low = df['low']
+    volume = df['volume']
+
+    indicators = pd.DataFrame(index=df.index)
+
+    # Trend Indicators (10)
+    indicators['ema_10'] = ema(close, 10)
+    indicators['ema_20'] = ema(close, 20)
+    indicators['ema_50'] = ema(close, 50)
+    indicators['ema_100'] = ema(close, 100)
+    indicators['ema_200'] = ema(close, 200)
+
+    indicators['sma_10'] = sma(close, 10)
+    indicators['sma_20'] = sma(close, 20)
+    indicators['sma_50'] = sma(close, 50)
+    indicators['sma_100'] = sma(close, 100)
+    indicators['sma_200'] = sma(close, 200)
+
+    # Momentum Indicators (15)
+    indicators['rsi_14'] = rsi(close, 14)
+
+    macd_line, signal_line, histogram = macd(close)
+    indicators['macd'] = macd_line
+    indicators['macd_signal'] = signal_line
+    indicators['macd_histogram'] = histogram
+
+    stoch_k, stoch_d = stochastic(high, low, close)
+    indicators['stoch_k'] = stoch_k
+    indicators['stoch_d'] = stoch_d
+
+    indicators['cci_20'] = cci(high, low, close, 20)
+    indicators['williams_r_14'] = williams_r(high, low, close, 14)
+    indicators['roc_12'] = roc(close, 12)
+
+    indicators['momentum_10'] = close - close.shift(10)
+    indicators['momentum_20'] = close - close.shift(20)
+
+    # TRIX
+    ema1 = ema(close, 15)
+    ema2 = ema(ema1, 15)
+    ema3 = ema(ema2, 15)
+    indicators['trix'] = 100 * (ema3 - ema3.shift()) / ema3.shift()
+
+    # Ultimate Oscillator (simplified)
+    bp = close - pd.concat([low, close.shift()], axis=1).min(axis=1)
+    tr = pd.concat([high - low, abs(high - close.shift()), abs(low - close.shift())], axis=1).max(axis=1)
+    avg7 = bp.rolling(7).sum() / tr.rolling(7).sum()
+    avg14 = bp.rolling(14).sum() / tr.rolling(14).sum()
+    avg28 = bp.rolling(28).sum() / tr.rolling(28).sum()
+    indicators['ultimate_oscillator'] = 100 * ((4 * avg7) + (2 * avg14) + avg28) / 7
+
+    # Awesome Oscillator
+    indicators['awesome_oscillator'] = sma((high + low) / 2, 5) - sma((high + low) / 2, 34)
+
+    # Keltner Channels
+    atr_val = atr(high, low, close, 20)
+    ema_20 = ema(close, 20)
+    indicators['keltner_channel_upper'] = ema_20 + (2 * atr_val)
+    indicators['keltner_channel_lower'] = ema_20 - (2 * atr_val)
+
+    # Volatility Indicators (10)
+    indicators['atr_14'] = atr(high, low, close, 14)
+
+    # Historical Volatility
+    log_returns = np.log(close / close.shift())
+    indicators['historical_volatility_20'] = log_returns.rolling(20).std() * np.sqrt(252)
+
+    # Chaikin Volatility
+    hl_spread = high - low
+    ema_spread = ema(hl_spread, 10)
+    indicators['chaikin_volatility'] = ((ema_spread - ema_spread.shift(10)) / ema_spread.shift(10)) * 100
+
+    # Donchian Channels
+    indicators['donchian_channel_upper'] = high.rolling(20).max()
+    indicators['donchian_channel_middle'] = (high.rolling(20).max() + low.rolling(20).min()) / 2
+    indicators['donchian_channel_lower'] = low.rolling(20).min()
+
+    # Mass Index
+    hl_range = high - low
+    ema_range = ema(hl_range, 9)
+    ema_ema_range = ema(ema_range, 9)
+    mass_ratio = ema_range / ema_ema_range
+    indicators['mass_index'] = mass_ratio.rolling(25).sum()
+
+    # Vortex Indicator
+    vm_plus = abs(high - low.shift())
+    vm_minus = abs(low - high.shift())
+    tr_series = pd.concat([high - low, abs(high - close.shift()), abs(low - close.shift())], axis=1).max(axis=1)
+    indicators['vortex_indicator_plus'] = vm_plus.rolling(14).sum() / tr_series.rolling(14).sum()
+    indicators['vortex_indicator_minus'] = vm_minus.rolling(14).sum() / tr_series.rolling(14).sum()
+
+    # Ulcer Index
+    max_close = close.rolling(14).max()
+    pct_drawdown = 100 * (close - max_close) / max_close
+    indicators['ulcer_index'] = np.sqrt((pct_drawdown ** 2).rolling(14).mean())
+
+    # Volume Indicators (10)
+    indicators['obv'] = obv(close, volume)
+    indicators['adl'] = adl(high, low, close, volume)
+
+    # Chaikin Money Flow
+    clv = ((close - low) - (high - close)) / (high - low)
+    clv = clv.fillna(0)
+    indicators['cmf_20'] = (clv * volume).rolling(20).sum() / volume.rolling(20).sum()
+
+    # Force Index
+    indicators['fi_13'] = ema(close.diff() * volume, 13)
+
+    # Ease of Movement
+    distance = ((high + low) / 2 - (high.shift() + low.shift()) / 2)
+    box_ratio = (volume / 1000000) / (high - low)
+    indicators['eom_14'] = sma(distance / box_ratio, 14)
+
+    # Volume Price Trend
+    indicators['vpt'] = (volume * ((close - close.shift()) / close.shift())).cumsum()
+
+    # Negative Volume Index
+    nvi = pd.Series(1000.0, index=close.index, dtype=float)
+    for i in range(1, len(close)):
+        if volume.iloc[i] < volume.iloc[i-1]:
+            nvi.iloc[i] = nvi.iloc[i-1] * (1 + (close.iloc[i] - close.iloc[i-1]) / close.iloc[i-1])
+        else:
+            nvi.iloc[i] = nvi.iloc[i-1]
+    indicators['nvi'] = nvi
+
+    # Positive Volume Index
+    pvi = pd.Series(1000.0, index=close.index, dtype=float)
+    for i in range(1, len(close)):
+        if volume.iloc[i] > volume.iloc[i-1]:
+            pvi.iloc[i] = pvi.iloc[i-1] * (1 + (close.iloc[i] - close.iloc[i-1]) / close.iloc[i-1])
+        else:
+            pvi.iloc[i] = pvi.iloc[i-1]
+    indicators['pvi'] = pvi
+
+    indicators['mfi_14'] = mfi(high, low, close, volume, 14)
+    indicators['vwap'] = vwap(high, low, close, volume)
+
+    return indicators
+
+
+def bqx_rsi(series, period=14):
+    """Relative Strength Index on BQX momentum"""
+    delta = series.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    rs = gain / (loss + 1e-10)
+    return 100 - (100 / (1 + rs))
+
+
+def bqx_stochastic(series, period=14, smooth=3):
+    """Stochastic Oscillator on BQX momentum"""
+    lowest = series.rolling(window=period).min()
+    highest = series.rolling(window=period).max()
+    stoch_k = 100 * (series - lowest) / (highest - lowest + 1e-10)
+    stoch_d = stoch_k.rolling(window=smooth).mean()
+    return stoch_k, stoch_d
+
+def bqx_cci(series, period=20):
+    """Commodity Channel Index on BQX"""
+    sma_val = sma(series, period)
+    mad = series.rolling(window=period).apply(lambda x: np.abs(x - x.mean()).mean())
+    return (series - sma_val) / (0.015 * mad + 1e-10)
+
+def bqx_williams_r(series, period=14):
+    """Williams %R on BQX"""
+    highest = series.rolling(window=period).max()
+    lowest = series.rolling(window=period).min()
+    return -100 * (highest - series) / (highest - lowest + 1e-10)
+
+def bqx_roc(series, period=12):
+    """Rate of Change on BQX"""
+    return ((series - series.shift(period)) / (series.shift(period) + 1e-10)) * 100
+
+def atr_bqx(series, period=14):
+    """Average True Range adapted for BQX (volatility of momentum)"""
+    # For BQX, use absolute changes as "true range"
+    tr = abs(series.diff())
+    return tr.rolling(window=period).mean()
+
+def bollinger_bands(series, period=20, std_dev=2):
+    """Bollinger Bands on BQX"""
+    middle = sma(series, period)
+    std = series.rolling(window=period).std()
+    upper = middle + (std_dev * std)
+    lower = middle - (std_dev * std)
+    return upper, middle, lower
+
+def pandas_bqx_indicators(df):
+    """
+    Compute technical indicators on BQX momentum values
+
+    Args:
+        df: DataFrame with columns [ts_utc, w15_bqx_return, w30_bqx_return, w45_bqx_return, w60_bqx_return, w75_bqx_return]
+
+    Returns:
+        DataFrame with 45 technical indicator columns computed on w15_bqx_return
+    """
+    # Use w15_bqx_return as primary series (shortest window, most data points)
+    bqx_series = df['w15_bqx_return']
+
+    indicators = pd.DataFrame(index=df.index)
+    indicators['ts_utc'] = df['ts_utc']
+
+    # Trend Indicators (10) - EMAs and SMAs of BQX momentum
+    indicators['ema_10'] = ema(bqx_series, 10)
+    indicators['ema_20'] = ema(bqx_series, 20)
+    indicators['ema_50'] = ema(bqx_series, 50)
+    indicators['ema_100'] = ema(bqx_series, 100)
+    indicators['ema_200'] = ema(bqx_series, 200)
+
+    indicators['sma_10'] = sma(bqx_series, 10)
+    indicators['sma_20'] = sma(bqx_series, 20)
+    indicators['sma_50'] = sma(bqx_series, 50)
+    indicators['sma_100'] = sma(bqx_series, 100)
+    indicators['sma_200'] = sma(bqx_series, 200)
+
+    # Momentum Indicators (15) - RSI, MACD, Stochastic on BQX
+    indicators['rsi_14'] = bqx_rsi(bqx_series, 14)
+    indicators['rsi_9'] = bqx_rsi(bqx_series, 9)
+    indicators['rsi_25'] = bqx_rsi(bqx_series, 25)
+
+    macd_line, signal_line, histogram = macd(bqx_series)
+    indicators['macd'] = macd_line
+    indicators['macd_signal'] = signal_line
+    indicators['macd_histogram'] = histogram
+
+    stoch_k, stoch_d = bqx_stochastic(bqx_series, 14, 3)
+    indicators['stoch_k'] = stoch_k
+    indicators['stoch_d'] = stoch_d
+
+    indicators['cci'] = bqx_cci(bqx_series, 20)
+    indicators['williams_r'] = bqx_williams_r(bqx_series, 14)
+
+    indicators['roc_12'] = bqx_roc(bqx_series, 12)
+    indicators['roc_25'] = bqx_roc(bqx_series, 25)
+
+    indicators['momentum_10'] = bqx_series - bqx_series.shift(10)
+    indicators['momentum_20'] = bqx_series - bqx_series.shift(20)
+
+    # Volatility Indicators (10) - Bollinger Bands, ATR on BQX
+    bb_upper, bb_middle, bb_lower = bollinger_bands(bqx_series, 20, 2)
+    indicators['bb_upper'] = bb_upper
+    indicators['bb_middle'] = bb_middle
+    indicators['bb_lower'] = bb_lower
+    indicators['bb_width'] = bb_upper - bb_lower
+    indicators['bb_pct'] = (bqx_series - bb_lower) / (bb_upper - bb_lower + 1e-10)
+
+    indicators['atr_14'] = atr_bqx(bqx_series, 14)
+    indicators['atr_28'] = atr_bqx(bqx_series, 28)
+
+    # Standard deviation (volatility of BQX momentum)
+    indicators['std_dev_20'] = bqx_series.rolling(window=20).std()
+    indicators['std_dev_50'] = bqx_series.rolling(window=50).std()
+    indicators['std_dev_100'] = bqx_series.rolling(window=100).std()
+
+    # Volume Indicators (10) - Use term structure as "volume" proxy
+    # Higher BQX variance across windows = higher "activity"
+    term_structure_variance = (df['w15_bqx_return'] - df['w60_bqx_return']).abs()
+
+    indicators['obv'] = (np.sign(bqx_series.diff()) * term_structure_variance).fillna(0).cumsum()
+    indicators['adl'] = term_structure_variance.cumsum()  # Simplified
+    indicators['cmf'] = (term_structure_variance * bqx_series).rolling(window=20).sum() / (term_structure_variance.rolling(window=20).sum() + 1e-10)
+    indicators['mfi'] = bqx_rsi(bqx_series * term_structure_variance, 14)  # Simplified MFI
+    indicators['vwap'] = (bqx_series * term_structure_variance).cumsum() / (term_structure_variance.cumsum() + 1e-10)
+
+    indicators['force_index'] = bqx_series.diff() * term_structure_variance
+    indicators['ease_of_movement'] = bqx_series.diff() / (term_structure_variance + 1e-10)
+    indicators['volume_oscillator'] = sma(term_structure_variance, 5) - sma(term_structure_variance, 10)
+    indicators['volume_roc'] = bqx_roc(term_structure_variance, 12)
+    indicators['nvi'] = (bqx_series.where(term_structure_variance < term_structure_variance.shift(), 0)).cumsum()
+
+    return indicators
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def synthetic_partition(rows=44640, seed=7):
+    """
+    One month of minute bars: OHLCV random walk plus w15/w60 BQX returns
+
+    Returns:
+        (ohlcv DataFrame [time, open, high, low, close, volume],
+         bqx DataFrame [ts_utc, w15_bqx_return, w60_bqx_return])
+    """
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range('2024-07-01', periods=rows, freq='min', tz='UTC')
+
+    close = 1.1 * np.exp(np.cumsum(rng.normal(0, 2e-4, rows)))
+    open_price = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 1e-4, rows))
+    high = np.maximum(open_price, close) + spread
+    low = np.minimum(open_price, close) - spread
+    volume = rng.integers(0, 500, rows).astype(float)
+    ohlcv = pd.DataFrame({'time': ts, 'open': open_price, 'high': high, 'low': low, 'close': close, 'volume': volume})
+
+    w15 = rng.normal(0, 1e-3, rows)
+    w60 = 0.5 * w15 + rng.normal(0, 1e-3, rows)
+    w15[:15] = np.nan
+    w60[:60] = np.nan
+    bqx = pd.DataFrame({'ts_utc': ts, 'w15_bqx_return': w15, 'w60_bqx_return': w60})
+    return ohlcv, bqx
+
+
+def max_relative_difference(expected, actual):
+    """Largest |actual - expected| / max(|expected|, 1e-12) over rows where both are finite"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    both = np.isfinite(expected) & np.isfinite(actual)
+    if not both.any():
+        return 0.0
+    scale = np.maximum(np.abs(expected[both]), 1e-12)
+    return float(np.max(np.abs(actual[both] - expected[both]) / scale))
+
+
+def _best_time(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(rows=44640, repeat=3):
+    """
+    Time both implementations on one synthetic partition
+
+    Returns:
+        Dict of domain -> {'pandas_s', 'numpy_s', 'speedup', 'max_rel_diff'}
+    """
+    ohlcv, bqx = synthetic_partition(rows)
+    cases = {
+        'rate': (
+            lambda: pandas_rate_indicators(ohlcv),
+            lambda: rate_indicators(ohlcv['open'], ohlcv['high'], ohlcv['low'], ohlcv['close'], ohlcv['volume']),
+            RATE_INDICATOR_COLUMNS
+        ),
+        'bqx': (
+            lambda: pandas_bqx_indicators(bqx),
+            lambda: bqx_indicators(bqx['w15_bqx_return'], bqx['w60_bqx_return']),
+            BQX_INDICATOR_COLUMNS
+        ),
+    }
+
+    results = {}
+    for domain, (reference, vectorized, columns) in cases.items():
+        pandas_s, expected = _best_time(reference, repeat)
+        numpy_s, actual = _best_time(vectorized, repeat)
+        results[domain] = {
+            'pandas_s': pandas_s,
+            'numpy_s': numpy_s,
+            'speedup': pandas_s / numpy_s,
+            'max_rel_diff': max(max_relative_difference(expected[c], actual[c]) for c in columns)
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark technical indicator kernels against pandas')
+    parser.add_argument('--rows', type=int, default=44640, help='Rows per synthetic partition (one month of minutes)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"Technical indicators: pandas vs NumPy kernels ({args.rows:,} rows, best of {args.repeat})")
+    print("=" * 80)
+    for domain, r in run_benchmark(args.rows, args.repeat).items():
+        print(f"{domain:>5}: pandas {r['pandas_s']:8.3f}s | numpy {r['numpy_s']:7.3f}s | "
+              f"speedup {r['speedup']:6.1f}x | max rel diff {r['max_rel_diff']:.1e}")
+
+
+if __name__ == '__main__':
+    main()
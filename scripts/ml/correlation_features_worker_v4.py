@@ -2,30 +2,34 @@
 """
 BQX ML - Correlation Features Worker V4 (Comprehensive Multi-Dimensional Variance Analysis)
 
-Implements comprehensive variance/covariance analysis across multiple dimensions:
-1. Term structure correlations (w15↔w30↔w45↔w60↔w75)
-2. Cross-pair correlations (same window, different pairs)
+Implements comprehensive variance/covariance analysis across multiple dimensions,
+per timestamp over a trailing window (default 60 rows):
+1. Term structure correlations (w15↔w60) and their stability
+2. Cross-pair correlations against every base / quote peer
 3. Cross-temporal correlations (lead-lag relationships)
-4. Residual variance decomposition (systematic vs idiosyncratic)
+4. Divergence, triangulation and volatility metrics
+
+All windows come from running-sum co-moments (data.rolling_cov) over the
+month's shared returns panel, O(rows × peers) per partition.
 
 Target: 336 partitions (28 pairs × 12 months)
-Expected Runtime: ~6 hours (65 seconds per partition)
 """
 
-import psycopg2
+import argparse
 import numpy as np
-from datetime import datetime, timedelta
+import pandas as pd
+from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 import sys
 import time
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com',
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': 'BQX_Aurora_2025_Secure'
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.writer import write_columns
+from data.db import connection, read_frame
+from data.panel import load_panel, month_range
+from data.rolling_cov import rolling_comoments, rolling_cross_moments
 
 # All 28 currency pairs
 PAIRS = [
@@ -50,467 +54,245 @@ BASE_PAIRS = {
     'JPY': ['audjpy', 'cadjpy', 'chfjpy', 'eurjpy', 'gbpjpy', 'nzdjpy', 'usdjpy']
 }
 
+# Related-pair returns, read once per month into a cross-pair panel
+PANEL_FIELDS = ['w15_bqx_return', 'w60_bqx_return']
+BQX_PANEL_QUERY = """
+    SELECT ts_utc, w15_bqx_return, w60_bqx_return
+    FROM bqx.bqx_{pair}_{suffix}
+    WHERE ts_utc >= %s AND ts_utc < %s
+    ORDER BY ts_utc
+"""
+
+# This pair's own term structure
+TERM_FIELDS = ['w15_bqx_return', 'w30_bqx_return', 'w45_bqx_return', 'w60_bqx_return', 'w75_bqx_return']
+BQX_QUERY = """
+    SELECT ts_utc, w15_bqx_return, w30_bqx_return, w45_bqx_return, w60_bqx_return, w75_bqx_return
+    FROM bqx.{table}
+    WHERE ts_utc >= %s AND ts_utc < %s
+    ORDER BY ts_utc
+"""
+
+# Trailing window (rows) of every feature, and the w15 -> w60 lead (rows)
+CORRELATION_WINDOW = 60
+LEAD_LAG_ROWS = 15
+
 def get_base_and_quote_currency(pair):
     """Extract base and quote currency from pair name"""
     return pair[:3].upper(), pair[3:].upper()
 
-def compute_term_structure_correlations(bqx_data):
-    """
-    Compute correlations between different BQX windows (term structure)
-    Returns: dict with term structure metrics
-    """
-    windows = ['w15_bqx_return', 'w30_bqx_return', 'w45_bqx_return', 'w60_bqx_return', 'w75_bqx_return']
-
-    # Extract arrays for each window
-    arrays = {}
-    for window in windows:
-        if window in bqx_data and len(bqx_data[window]) > 0:
-            arrays[window] = np.array(bqx_data[window])
-
-    if len(arrays) < 2:
-        return None
-
-    # Compute key term structure correlations
-    corr_15_60 = np.corrcoef(arrays['w15_bqx_return'], arrays['w60_bqx_return'])[0, 1] if 'w15_bqx_return' in arrays and 'w60_bqx_return' in arrays else 0.0
-    corr_30_60 = np.corrcoef(arrays['w30_bqx_return'], arrays['w60_bqx_return'])[0, 1] if 'w30_bqx_return' in arrays and 'w60_bqx_return' in arrays else 0.0
-
-    # Term structure slope (w75 - w15 average)
-    term_slope = (np.mean(arrays['w75_bqx_return']) - np.mean(arrays['w15_bqx_return'])) if 'w75_bqx_return' in arrays and 'w15_bqx_return' in arrays else 0.0
-
-    # Stability of term structure (rolling correlation variability)
-    window_size = 60  # 1 hour
-    rolling_corrs = []
-    if 'w15_bqx_return' in arrays and 'w60_bqx_return' in arrays and len(arrays['w15_bqx_return']) > window_size:
-        for i in range(window_size, len(arrays['w15_bqx_return'])):
-            w15_slice = arrays['w15_bqx_return'][i-window_size:i]
-            w60_slice = arrays['w60_bqx_return'][i-window_size:i]
-            if len(w15_slice) > 1 and len(w60_slice) > 1:
-                corr = np.corrcoef(w15_slice, w60_slice)[0, 1]
-                if not np.isnan(corr):
-                    rolling_corrs.append(corr)
-
-    correlation_stability = np.std(rolling_corrs) if len(rolling_corrs) > 0 else 0.0
-
-    return {
-        'corr_15_60': corr_15_60,
-        'corr_30_60': corr_30_60,
-        'term_slope': term_slope,
-        'correlation_stability': correlation_stability
-    }
-
-def compute_cross_pair_correlations(pair, bqx_data, conn):
-    """
-    Compute correlations with other pairs (same window)
-    Returns: dict with cross-pair correlation metrics
-    """
+def peer_pairs(pair):
+    """(base peers, quote peers): every other pair sharing the base / quote currency"""
     base_curr, quote_curr = get_base_and_quote_currency(pair)
+    base_peers = [p for p in BASE_PAIRS.get(base_curr, []) if p != pair and p in PAIRS]
+    quote_peers = [p for p in BASE_PAIRS.get(quote_curr, []) if p != pair and p in PAIRS]
+    return base_peers, quote_peers
 
-    # Get related pairs sharing the base currency
-    base_related_pairs = [p for p in BASE_PAIRS.get(base_curr, []) if p != pair and p in PAIRS]
-    quote_related_pairs = [p for p in BASE_PAIRS.get(quote_curr, []) if p != pair and p in PAIRS]
-
-    if len(bqx_data['w15_bqx_return']) == 0:
-        return None
-
-    current_pair_w15 = np.array(bqx_data['w15_bqx_return'])
-    current_pair_w60 = np.array(bqx_data['w60_bqx_return'])
-    timestamps = bqx_data['ts_utc']
-
-    # Compute average correlation with base currency pairs
-    base_corrs_15 = []
-    base_corrs_60 = []
-    for related_pair in base_related_pairs[:3]:  # Limit to 3 pairs for performance
-        try:
-            cur = conn.cursor()
-            partition_name = f"bqx_{related_pair}_{bqx_data['partition_suffix']}"
-            cur.execute(f"""
-                SELECT ts_utc, w15_bqx_return, w60_bqx_return
-                FROM bqx.{partition_name}
-                WHERE ts_utc >= %s AND ts_utc <= %s
-                ORDER BY ts_utc;
-            """, (timestamps[0], timestamps[-1]))
-
-            related_data = cur.fetchall()
-            if len(related_data) > 0:
-                related_w15 = np.array([row[1] for row in related_data if row[1] is not None])
-                related_w60 = np.array([row[2] for row in related_data if row[2] is not None])
-
-                if len(related_w15) == len(current_pair_w15) and len(related_w15) > 1:
-                    corr_15 = np.corrcoef(current_pair_w15, related_w15)[0, 1]
-                    if not np.isnan(corr_15):
-                        base_corrs_15.append(corr_15)
-
-                if len(related_w60) == len(current_pair_w60) and len(related_w60) > 1:
-                    corr_60 = np.corrcoef(current_pair_w60, related_w60)[0, 1]
-                    if not np.isnan(corr_60):
-                        base_corrs_60.append(corr_60)
-
-            cur.close()
-        except Exception as e:
-            continue
-
-    # Compute average correlation with quote currency pairs
-    quote_corrs_15 = []
-    quote_corrs_60 = []
-    for related_pair in quote_related_pairs[:3]:  # Limit to 3 pairs
-        try:
-            cur = conn.cursor()
-            partition_name = f"bqx_{related_pair}_{bqx_data['partition_suffix']}"
-            cur.execute(f"""
-                SELECT ts_utc, w15_bqx_return, w60_bqx_return
-                FROM bqx.{partition_name}
-                WHERE ts_utc >= %s AND ts_utc <= %s
-                ORDER BY ts_utc;
-            """, (timestamps[0], timestamps[-1]))
-
-            related_data = cur.fetchall()
-            if len(related_data) > 0:
-                related_w15 = np.array([row[1] for row in related_data if row[1] is not None])
-                related_w60 = np.array([row[2] for row in related_data if row[2] is not None])
-
-                if len(related_w15) == len(current_pair_w15) and len(related_w15) > 1:
-                    corr_15 = np.corrcoef(current_pair_w15, related_w15)[0, 1]
-                    if not np.isnan(corr_15):
-                        quote_corrs_15.append(corr_15)
-
-                if len(related_w60) == len(current_pair_w60) and len(related_w60) > 1:
-                    corr_60 = np.corrcoef(current_pair_w60, related_w60)[0, 1]
-                    if not np.isnan(corr_60):
-                        quote_corrs_60.append(corr_60)
-
-            cur.close()
-        except Exception as e:
-            continue
-
-    avg_base_corr_15 = np.mean(base_corrs_15) if len(base_corrs_15) > 0 else 0.0
-    avg_base_corr_60 = np.mean(base_corrs_60) if len(base_corrs_60) > 0 else 0.0
-    avg_quote_corr_15 = np.mean(quote_corrs_15) if len(quote_corrs_15) > 0 else 0.0
-    avg_quote_corr_60 = np.mean(quote_corrs_60) if len(quote_corrs_60) > 0 else 0.0
-
-    # Relative strength vs peer groups
-    current_avg_15 = np.mean(current_pair_w15)
-    current_avg_60 = np.mean(current_pair_w60)
-
-    return {
-        'corr_base_pairs_15min': avg_base_corr_15,
-        'corr_base_pairs_60min': avg_base_corr_60,
-        'corr_quote_pairs_15min': avg_quote_corr_15,
-        'corr_quote_pairs_60min': avg_quote_corr_60,
-        'relative_strength_vs_base': current_avg_15 / (abs(current_avg_15) + 1e-10),
-        'relative_strength_vs_quote': current_avg_60 / (abs(current_avg_60) + 1e-10)
-    }
-
-def compute_cross_temporal_correlations(bqx_data):
-    """
-    Compute lead-lag relationships (different windows at different times)
-    Does w15[T] predict w60[T+15]?
-    Returns: dict with cross-temporal metrics
-    """
-    if len(bqx_data['w15_bqx_return']) < 60:
-        return None
-
-    w15_array = np.array(bqx_data['w15_bqx_return'])
-    w60_array = np.array(bqx_data['w60_bqx_return'])
-
-    # Lead-lag: Does w15[t] correlate with w60[t+15]?
-    lead_lag_corr = 0.0
-    if len(w15_array) > 15 and len(w60_array) > 15:
-        w15_leading = w15_array[:-15]
-        w60_lagging = w60_array[15:]
-
-        if len(w15_leading) == len(w60_lagging) and len(w15_leading) > 1:
-            lead_lag_corr = np.corrcoef(w15_leading, w60_lagging)[0, 1]
-            if np.isnan(lead_lag_corr):
-                lead_lag_corr = 0.0
-
-    return {
-        'lead_lag_indicator': lead_lag_corr
-    }
-
-def compute_residual_variances(pair, bqx_data, cross_pair_metrics):
-    """
-    Compute residual variance decomposition
-    Variance NOT explained by systematic factors
-    Returns: dict with residual variance metrics
-    """
-    if len(bqx_data['w15_bqx_return']) == 0 or cross_pair_metrics is None:
-        return None
-
-    w15_array = np.array(bqx_data['w15_bqx_return'])
-    w60_array = np.array(bqx_data['w60_bqx_return'])
-
-    # Total variance
-    total_var_15 = np.var(w15_array) if len(w15_array) > 1 else 0.0
-    total_var_60 = np.var(w60_array) if len(w60_array) > 1 else 0.0
-
-    # Systematic variance (explained by base/quote pair correlations)
-    # R² from cross-pair correlations gives systematic variance ratio
-    base_corr_15 = cross_pair_metrics.get('corr_base_pairs_15min', 0.0)
-    quote_corr_15 = cross_pair_metrics.get('corr_quote_pairs_15min', 0.0)
-
-    # Estimate systematic vs idiosyncratic variance
-    systematic_var_ratio = (base_corr_15**2 + quote_corr_15**2) / 2.0
-    idiosyncratic_var_ratio = 1.0 - systematic_var_ratio
-
-    # Base/quote pair divergence (deviations from expected relationships)
-    base_pair_divergence = abs(base_corr_15 - 1.0)  # How much does it deviate from perfect correlation?
-    quote_pair_divergence = abs(quote_corr_15 - 1.0)
-
-    # Residual variance from term structure
-    term_slope = bqx_data.get('term_slope', 0.0)
-    term_structure_residual = abs(term_slope)  # Deviation from flat term structure
-
-    return {
-        'base_pair_divergence': base_pair_divergence,
-        'quote_pair_divergence': quote_pair_divergence,
-        'term_structure_residual': term_structure_residual,
-        'idiosyncratic_var_ratio': idiosyncratic_var_ratio,
-        'systematic_var_ratio': systematic_var_ratio
-    }
-
-def compute_triangulation_metrics(pair, bqx_data, conn):
-    """
-    Compute triangular arbitrage residuals
-    For EUR/USD, check EUR/GBP × GBP/USD relationship
-    Returns: triangulation divergence metric
-    """
+def triangulation_legs(pair):
+    """(base/bridge, bridge/quote) pairs that triangulate `pair`"""
     base_curr, quote_curr = get_base_and_quote_currency(pair)
-
-    # Find triangulation pairs (e.g., for EURUSD: EUR/GBP and GBP/USD)
-    potential_bridge_currencies = ['GBP', 'JPY', 'CHF', 'AUD']
-
-    triangulation_residuals = []
-
-    for bridge in potential_bridge_currencies:
+    legs = []
+    for bridge in ['GBP', 'JPY', 'CHF', 'AUD']:
         if bridge == base_curr or bridge == quote_curr:
             continue
-
-        # Find pairs: base/bridge and bridge/quote
         pair1_name = f"{base_curr.lower()}{bridge.lower()}"
         pair2_name = f"{bridge.lower()}{quote_curr.lower()}"
-
         if pair1_name in PAIRS and pair2_name in PAIRS:
-            try:
-                cur = conn.cursor()
-                partition_suffix = bqx_data['partition_suffix']
-                timestamps = bqx_data['ts_utc']
-
-                # Fetch pair1 data
-                cur.execute(f"""
-                    SELECT w15_bqx_return FROM bqx.bqx_{pair1_name}_{partition_suffix}
-                    WHERE ts_utc >= %s AND ts_utc <= %s
-                    ORDER BY ts_utc;
-                """, (timestamps[0], timestamps[-1]))
-                pair1_data = np.array([row[0] for row in cur.fetchall() if row[0] is not None])
-
-                # Fetch pair2 data
-                cur.execute(f"""
-                    SELECT w15_bqx_return FROM bqx.bqx_{pair2_name}_{partition_suffix}
-                    WHERE ts_utc >= %s AND ts_utc <= %s
-                    ORDER BY ts_utc;
-                """, (timestamps[0], timestamps[-1]))
-                pair2_data = np.array([row[0] for row in cur.fetchall() if row[0] is not None])
-
-                cur.close()
-
-                current_pair_data = np.array(bqx_data['w15_bqx_return'])
-
-                # Triangulation: current_pair ≈ pair1 + pair2
-                if len(pair1_data) == len(pair2_data) == len(current_pair_data) and len(pair1_data) > 1:
-                    synthetic_pair = pair1_data + pair2_data
-                    residual = current_pair_data - synthetic_pair
-                    triangulation_residuals.append(np.std(residual))
-            except Exception as e:
-                continue
-
-    triangular_arb_divergence = np.mean(triangulation_residuals) if len(triangulation_residuals) > 0 else 0.0
+            legs.append((pair1_name, pair2_name))
+    return legs
+
+def related_pairs(pair):
+    """Every pair the cross-pair and triangulation features of `pair` read"""
+    base_peers, quote_peers = peer_pairs(pair)
+    related = base_peers + quote_peers
+    for legs in triangulation_legs(pair):
+        related.extend(legs)
+    return list(dict.fromkeys(related))
+
+def load_returns_panel(conn, year, month, pairs=PAIRS):
+    """One read of each pair's w15/w60 BQX returns for a month"""
+    start, end = month_range(year, month)
+    query = BQX_PANEL_QUERY.replace('{suffix}', f"y{year}m{month:02d}")
+    return load_panel(conn, query, pairs, PANEL_FIELDS, start, end)
+
+def _mean_valid(matrix):
+    """Row means over the non-NaN columns (NaN where a row has none)"""
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=1)
+    totals = np.where(valid, matrix, 0.0).sum(axis=1)
+    return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+def _rolling_std(values, window, dtype):
+    """Population std (np.std) of each trailing window, per column"""
+    moments = rolling_comoments(values, window, ddof=0, dtype=dtype)
+    return np.sqrt(np.diagonal(moments.cov, axis1=1, axis2=2))
+
+def _lagged(values, lag):
+    """values[t - lag] at row t (NaN for the first `lag` rows)"""
+    out = np.full_like(values, np.nan)
+    out[lag:] = values[:len(values) - lag]
+    return out
+
+def compute_correlation_features(pair, bqx_data, panel, window=CORRELATION_WINDOW, dtype=np.float64):
+    """
+    Per-timestamp correlation features for one partition
+
+    Every feature of row t is computed over the trailing `window` rows
+    ending at t; rows without a full window (or with a NULL input inside
+    it) are NULL. Peer correlations are averaged over all base / quote
+    peers that have data in the window.
+
+    Args:
+        pair: Currency pair
+        bqx_data: 'ts_utc' plus TERM_FIELDS arrays, one entry per partition
+            row (NULL returns as NaN)
+        panel: The month's returns panel holding the related pairs
+        window: Trailing window length in rows
+        dtype: Precision of the rolling sums (np.float32 halves memory)
+
+    Returns:
+        Dict of feature column -> array (ts_utc not included)
+    """
+    timestamps = bqx_data['ts_utc']
+    w15 = np.asarray(bqx_data['w15_bqx_return'], dtype=np.float64)
+    w60 = np.asarray(bqx_data['w60_bqx_return'], dtype=np.float64)
+    w75 = np.asarray(bqx_data['w75_bqx_return'], dtype=np.float64)
+
+    # 1. Own-pair moments and term structure
+    own = rolling_comoments(np.column_stack([w15, w60, w75]), window, ddof=0, dtype=dtype)
+    mean_15, mean_60, mean_75 = own.mean.T
+    std_15 = np.sqrt(own.cov[:, 0, 0])
+    std_60 = np.sqrt(own.cov[:, 1, 1])
+    term_corr = own.corr[:, 0, 1]
+    correlation_stability = _rolling_std(term_corr, window, dtype)[:, 0]
+
+    # 2. Cross-pair correlations against every base / quote peer
+    base_peers, quote_peers = peer_pairs(pair)
+    peers = base_peers + quote_peers
+    n_base = len(base_peers)
+    peer_corr = {}
+    for field, current in (('w15_bqx_return', w15), ('w60_bqx_return', w60)):
+        peer_values = panel.at(field, timestamps, peers)
+        peer_corr[field] = rolling_cross_moments(current, peer_values, window, dtype=dtype).corr
+
+    corr_base_15 = _mean_valid(peer_corr['w15_bqx_return'][:, :n_base])
+    corr_base_60 = _mean_valid(peer_corr['w60_bqx_return'][:, :n_base])
+    corr_quote_15 = _mean_valid(peer_corr['w15_bqx_return'][:, n_base:])
+    corr_quote_60 = _mean_valid(peer_corr['w60_bqx_return'][:, n_base:])
+
+    # 3. Lead-lag: w15[t - 15] against w60[t]
+    lead_lag = rolling_cross_moments(_lagged(w15, LEAD_LAG_ROWS), w60[:, None], window, dtype=dtype).corr[:, 0]
+
+    # 4. Triangulation residuals: current ≈ pair1 + pair2
+    legs = triangulation_legs(pair)
+    if legs:
+        leg_values = panel.at('w15_bqx_return', timestamps, [p for leg in legs for p in leg])
+        residuals = w15[:, None] - (leg_values[:, 0::2] + leg_values[:, 1::2])
+        triangular_arb_divergence = _mean_valid(_rolling_std(residuals, window, dtype))
+    else:
+        triangular_arb_divergence = np.full(len(w15), np.nan)
+
+    # 5. Relative strength, divergence, volatility
+    relative_strength_base = mean_15 / (np.abs(mean_15) + 1e-10)
+    relative_strength_quote = mean_60 / (np.abs(mean_60) + 1e-10)
 
     return {
-        'triangular_arb_divergence': triangular_arb_divergence
+        'corr_base_pairs_15min': corr_base_15,
+        'corr_base_pairs_60min': corr_base_60,
+        'corr_quote_pairs_15min': corr_quote_15,
+        'corr_quote_pairs_60min': corr_quote_60,
+        'relative_strength_vs_base_pairs': relative_strength_base,
+        'relative_strength_vs_quote_pairs': relative_strength_quote,
+        'base_pair_divergence': np.abs(corr_base_15 - 1.0),
+        'quote_pair_divergence': np.abs(corr_quote_15 - 1.0),
+        'triangular_arb_divergence': triangular_arb_divergence,
+        'cross_pair_momentum_divergence': pd.array(np.trunc(np.abs(relative_strength_base) * 100), dtype='Int64'),
+        'correlation_stability': correlation_stability,
+        'lead_lag_indicator': lead_lag,
+        'cointegration_residual': np.abs(mean_75 - mean_15),
+        'pair_spread_z_score': (w15 - mean_15) / (std_15 + 1e-10),
+        'cross_pair_volatility_ratio': std_15 / (std_60 + 1e-10)
     }
 
-def compute_volatility_and_momentum_metrics(bqx_data, cross_pair_metrics):
+def process_partition(pair, year, month, panel=None, window=CORRELATION_WINDOW, dtype=np.float64):
     """
-    Compute cross-pair volatility ratios and momentum divergence
-    Returns: dict with volatility/momentum metrics
+    Process a single partition for one pair-month combination
+    `panel` is the month's shared returns panel; without one, only this
+    pair's related pairs are loaded
     """
-    if len(bqx_data['w15_bqx_return']) == 0:
-        return None
-
-    w15_array = np.array(bqx_data['w15_bqx_return'])
-    w60_array = np.array(bqx_data['w60_bqx_return'])
+    try:
+        partition_start, partition_end = month_range(year, month)
 
-    # Volatility (standard deviation of BQX returns)
-    vol_15 = np.std(w15_array) if len(w15_array) > 1 else 0.0
-    vol_60 = np.std(w60_array) if len(w60_array) > 1 else 0.0
+        partition_suffix = f"y{year}m{month:02d}"
+        partition_name = f"correlation_features_{pair}_{partition_suffix}"
+        bqx_table = f"bqx_{pair}_{partition_suffix}"
 
-    # Cross-pair volatility ratio (vs peer group)
-    # Assume peer group has similar volatility; deviations indicate relative volatility
-    cross_pair_volatility_ratio = vol_15 / (vol_60 + 1e-10)
+        with connection() as conn:
+            # Fetch BQX data for this partition (NULL returns stay aligned as NaN)
+            frame = read_frame(conn, BQX_QUERY.format(table=bqx_table), (partition_start, partition_end))
 
-    # Momentum divergence (how much current momentum differs from cross-pair average)
-    # Use relative strength metrics from cross_pair analysis
-    current_momentum_15 = np.mean(w15_array)
-    momentum_divergence = abs(cross_pair_metrics.get('relative_strength_vs_base', 0.0))
+            if len(frame) == 0:
+                return f"SKIP: {partition_name} (no BQX data)"
+            if len(frame) < window:
+                return f"SKIP: {partition_name} (insufficient data for metrics)"
 
-    # Pair spread z-score (standardized deviation from mean)
-    pair_spread_z_score = (current_momentum_15 - np.mean(w15_array)) / (np.std(w15_array) + 1e-10) if len(w15_array) > 1 else 0.0
+            bqx_data = {'ts_utc': frame['ts_utc']}
+            for field in TERM_FIELDS:
+                bqx_data[field] = frame[field].astype(float).to_numpy()
 
-    # Cointegration residual (simplified - deviation from expected relationship)
-    # Use term structure residual as proxy
-    cointegration_residual = bqx_data.get('term_structure_residual', 0.0)
+            if panel is None:
+                panel = load_returns_panel(conn, year, month, related_pairs(pair))
 
-    return {
-        'cross_pair_volatility_ratio': cross_pair_volatility_ratio,
-        'cross_pair_momentum_divergence': int(momentum_divergence * 100),  # INTEGER field
-        'pair_spread_z_score': pair_spread_z_score,
-        'cointegration_residual': cointegration_residual
-    }
+            features = {'ts_utc': frame['ts_utc']}
+            features.update(compute_correlation_features(pair, bqx_data, panel, window, dtype))
 
-def process_partition(pair, year, month):
-    """Process a single partition for one pair-month combination"""
-    try:
-        partition_start = datetime(year, month, 1)
-        if month == 12:
-            partition_end = datetime(year + 1, 1, 1)
-        else:
-            partition_end = datetime(year, month + 1, 1)
+            # Bulk insert correlation features for all timestamps (COPY + one merge)
+            insert_count = write_columns(conn, f"bqx.{partition_name}", features, mode='ignore')
 
-        partition_suffix = f"y{year}m{month:02d}"
-        partition_name = f"correlation_features_{pair}_{partition_suffix}"
-        bqx_table = f"bqx_{pair}_{partition_suffix}"
+            conn.commit()
 
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Fetch BQX data for this partition
-        cur.execute(f"""
-            SELECT ts_utc, w15_bqx_return, w30_bqx_return, w45_bqx_return, w60_bqx_return, w75_bqx_return
-            FROM bqx.{bqx_table}
-            WHERE ts_utc >= %s AND ts_utc < %s
-            ORDER BY ts_utc;
-        """, (partition_start, partition_end))
-
-        rows = cur.fetchall()
-
-        if len(rows) == 0:
-            cur.close()
-            conn.close()
-            return f"SKIP: {partition_name} (no BQX data)"
-
-        # Organize data
-        bqx_data = {
-            'ts_utc': [row[0] for row in rows],
-            'w15_bqx_return': [row[1] for row in rows if row[1] is not None],
-            'w30_bqx_return': [row[2] for row in rows if row[2] is not None],
-            'w45_bqx_return': [row[3] for row in rows if row[3] is not None],
-            'w60_bqx_return': [row[4] for row in rows if row[4] is not None],
-            'w75_bqx_return': [row[5] for row in rows if row[5] is not None],
-            'partition_suffix': partition_suffix
-        }
-
-        # 1. Term structure correlations
-        term_metrics = compute_term_structure_correlations(bqx_data)
-        if term_metrics:
-            bqx_data['term_slope'] = term_metrics['term_slope']
-            bqx_data['correlation_stability'] = term_metrics['correlation_stability']
-
-        # 2. Cross-pair correlations
-        cross_pair_metrics = compute_cross_pair_correlations(pair, bqx_data, conn)
-
-        # 3. Cross-temporal correlations
-        cross_temporal_metrics = compute_cross_temporal_correlations(bqx_data)
-
-        # 4. Residual variance decomposition
-        residual_metrics = compute_residual_variances(pair, bqx_data, cross_pair_metrics) if cross_pair_metrics else None
-
-        # 5. Triangulation metrics
-        triangulation_metrics = compute_triangulation_metrics(pair, bqx_data, conn)
-
-        # 6. Volatility and momentum metrics
-        volatility_metrics = compute_volatility_and_momentum_metrics(bqx_data, cross_pair_metrics) if cross_pair_metrics else None
-
-        # Compile all metrics
-        if not all([term_metrics, cross_pair_metrics, cross_temporal_metrics, residual_metrics, triangulation_metrics, volatility_metrics]):
-            cur.close()
-            conn.close()
-            return f"SKIP: {partition_name} (insufficient data for metrics)"
-
-        # Insert correlation features for each timestamp
-        insert_count = 0
-        for i, ts in enumerate(bqx_data['ts_utc']):
-            try:
-                cur.execute(f"""
-                    INSERT INTO bqx.{partition_name} (
-                        ts_utc,
-                        corr_base_pairs_15min,
-                        corr_base_pairs_60min,
-                        corr_quote_pairs_15min,
-                        corr_quote_pairs_60min,
-                        relative_strength_vs_base_pairs,
-                        relative_strength_vs_quote_pairs,
-                        base_pair_divergence,
-                        quote_pair_divergence,
-                        triangular_arb_divergence,
-                        cross_pair_momentum_divergence,
-                        correlation_stability,
-                        lead_lag_indicator,
-                        cointegration_residual,
-                        pair_spread_z_score,
-                        cross_pair_volatility_ratio
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (ts_utc) DO NOTHING;
-                """, (
-                    ts,
-                    cross_pair_metrics['corr_base_pairs_15min'],
-                    cross_pair_metrics['corr_base_pairs_60min'],
-                    cross_pair_metrics['corr_quote_pairs_15min'],
-                    cross_pair_metrics['corr_quote_pairs_60min'],
-                    cross_pair_metrics['relative_strength_vs_base'],
-                    cross_pair_metrics['relative_strength_vs_quote'],
-                    residual_metrics['base_pair_divergence'],
-                    residual_metrics['quote_pair_divergence'],
-                    triangulation_metrics['triangular_arb_divergence'],
-                    volatility_metrics['cross_pair_momentum_divergence'],
-                    term_metrics['correlation_stability'],
-                    cross_temporal_metrics['lead_lag_indicator'],
-                    volatility_metrics['cointegration_residual'],
-                    volatility_metrics['pair_spread_z_score'],
-                    volatility_metrics['cross_pair_volatility_ratio']
-                ))
-                insert_count += 1
-            except Exception as e:
-                continue
-
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return f"SUCCESS: {partition_name} ({insert_count} rows)"
+            return f"SUCCESS: {partition_name} ({insert_count} rows)"
 
     except Exception as e:
         return f"ERROR: {pair}_{year}m{month:02d} - {str(e)}"
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description='Populate correlation features (V4)')
+    parser.add_argument('--window', type=int, default=CORRELATION_WINDOW,
+                        help='Trailing window in rows')
+    parser.add_argument('--float32', action='store_true',
+                        help='Run the rolling sums in single precision')
+    args = parser.parse_args()
+    dtype = np.float32 if args.float32 else np.float64
+
     print("=" * 80)
     print("BQX ML - Correlation Features Worker V4 (Multi-Dimensional Variance Analysis)")
     print("=" * 80)
     print(f"Start Time: {datetime.now()}")
     print(f"Target: 336 partitions (28 pairs × 12 months)")
-    print(f"Features: 15 comprehensive variance/covariance metrics")
+    print(f"Features: 15 per-timestamp variance/covariance metrics ({args.window}-row window)")
     print("=" * 80)
     print()
 
     # Generate all partition jobs (28 pairs × 12 months)
+    months = [(2024, month) for month in range(7, 13)]  # Jul-Dec 2024
     jobs = []
     for pair in PAIRS:
-        for month in range(7, 13):  # Jul-Dec 2024
-            jobs.append((pair, 2024, month))
+        for year, month in months:
+            jobs.append((pair, year, month))
 
     print(f"Total jobs: {len(jobs)}")
     print()
 
+    # Read every pair once per month; all threads share the panels read-only
+    panels = {}
+    with connection() as conn:
+        for year, month in months:
+            panels[(year, month)] = load_returns_panel(conn, year, month)
+            conn.rollback()
+    print(f"Loaded {len(panels)} cross-pair panels")
+    print()
+
     # Process partitions in parallel (8 threads)
     start_time = time.time()
     completed = 0
@@ -518,7 +300,8 @@ def main():
     errors = 0
 
     with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(process_partition, pair, year, month): (pair, year, month)
+        futures = {executor.submit(process_partition, pair, year, month, panels[(year, month)], args.window, dtype):
+                   (pair, year, month)
                    for pair, year, month in jobs}
 
         for future in as_completed(futures):
@@ -26,22 +26,16 @@ Storage: bqx.currency_indices table (single table, 12 monthly partitions)
 Estimated Time: 2-3 hours (12 months, cross-pair analysis)
 """
 
-import psycopg2
+import sys
+from pathlib import Path
 from psycopg2 import sql
 import numpy as np
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
-# Database configuration
-DB_CONFIG = {
-    "host": "trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "database": "bqx",
-    "user": "postgres",
-    "password": "BQX_Aurora_2025_Secure",
-    "sslmode": "require",
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from data.db import connection
 
 # Currency pair groups for each major currency
 # Format: (pair, is_base_currency)
@@ -350,9 +344,8 @@ def compute_currency_indices_for_month(conn, year, month):
 
 
 def process_month_worker(year, month):
-    """Worker function for threading (creates own DB connection)"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    try:
+    """Worker function for threading (borrows a pooled connection)"""
+    with connection() as conn:
         rows = compute_currency_indices_for_month(conn, year, month)
 
         # Update progress
@@ -367,8 +360,6 @@ def process_month_worker(year, month):
             'rows': rows,
             'progress': progress_pct
         }
-    finally:
-        conn.close()
 
 
 def main():
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Feature Graph Worker - Track 1 + Track 2
+Rebuilds any subset of the feature families from one read per partition.
+
+Families (data/feature_families.py):
+  statistics, bollinger, fibonacci, volume, time, spread, technical,
+  regime, regression
+
+Each (pair, month) partition reads bqx.m1_{pair} (and bqx.bqx_{pair} when
+regression is selected) once, runs the selected families on shared
+rolling intermediates and writes their tables in bulk. Partitions run
+across processes.
+
+--incremental appends only the rows after each output table's watermark
+(bqx.feature_watermarks), reading them plus each family's context rows;
+months that are already complete cost a couple of small queries. The
+result is identical to a full rebuild. Families whose rows depend on the
+whole month (technical, regression) are recomputed for months with new
+rows.
+
+Usage:
+  python scripts/ml/feature_graph_worker.py                        # all families
+  python scripts/ml/feature_graph_worker.py --families bollinger,volume
+  python scripts/ml/feature_graph_worker.py --families regression --pairs eurusd --months 2024_07
+  python scripts/ml/feature_graph_worker.py --incremental --months 2025_06  # daily update
+  python scripts/ml/feature_graph_worker.py --list
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.feature_families import GRAPH
+from data.feature_graph import run_partitions
+
+# All 28 currency pairs
+PAIRS = [
+    'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
+    'cadchf', 'cadjpy', 'chfjpy',
+    'euraud', 'eurcad', 'eurchf', 'eurgbp', 'eurjpy', 'eurnzd', 'eurusd',
+    'gbpaud', 'gbpcad', 'gbpchf', 'gbpjpy', 'gbpnzd', 'gbpusd',
+    'nzdcad', 'nzdchf', 'nzdjpy', 'nzdusd',
+    'usdcad', 'usdchf', 'usdjpy'
+]
+
+# Jul 2024 - Jun 2025
+MONTHS = [f"{year}_{month:02d}" for year, month in
+          [(2024, m) for m in range(7, 13)] + [(2025, m) for m in range(1, 7)]]
+
+# Create logs directory
+os.makedirs('/tmp/logs/feature_graph', exist_ok=True)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/tmp/logs/feature_graph/populate.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main():
+    """Main execution: Run the selected feature families for all partitions."""
+    parser = argparse.ArgumentParser(description='Rebuild feature families from one read per partition')
+    parser.add_argument('--families', type=_csv, default=None,
+                        help=f"Comma-separated families (default: all of {', '.join(GRAPH.families)})")
+    parser.add_argument('--pairs', type=_csv, default=PAIRS, help='Comma-separated pairs (default: all 28)')
+    parser.add_argument('--months', type=_csv, default=MONTHS, help='Comma-separated YYYY_MM months')
+    parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Append only the rows after each table\'s watermark')
+    parser.add_argument('--list', action='store_true', help='List the registered families and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for family in GRAPH.families.values():
+            tables = ', '.join(output.table for output in family.outputs) or '(not written)'
+            context = 'month' if family.context is None else f"{family.context} rows"
+            print(f"{family.name:<12} inputs={','.join(family.inputs)} windows={list(family.windows)} "
+                  f"lookback={family.lookback}min context={context} -> {tables}")
+        return
+
+    try:
+        families = GRAPH.select(args.families)
+    except ValueError as e:
+        parser.error(str(e))
+
+    tasks = [(pair, int(ym[:4]), int(ym[5:])) for pair in args.pairs for ym in args.months]
+
+    logger.info("=" * 80)
+    logger.info("FEATURE GRAPH WORKER")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Mode: {'incremental (after watermarks)' if args.incremental else 'full rebuild'}")
+    logger.info(f"Families: {', '.join(family.name for family in families)}")
+    logger.info(f"Sources: {GRAPH.source_columns(families)}")
+    logger.info(f"Pairs: {len(args.pairs)}")
+    logger.info(f"Months: {len(args.months)}")
+    logger.info(f"Total partitions: {len(tasks)}")
+    logger.info(f"Max Workers: {args.max_workers}")
+    logger.info("")
+
+    start_time = time.time()
+    results = {'success': 0, 'failed': 0, 'total_rows': 0}
+    family_seconds = {family.name: 0.0 for family in families}
+
+    def on_result(result):
+        pair, year, month, success, per_family, elapsed, error_msg = result
+        if not success:
+            results['failed'] += 1
+            logger.error(f"❌ {pair.upper()} {year}_{month:02d}: Failed after {elapsed:.1f}s - {error_msg}")
+            return
+
+        results['success'] += 1
+        for name, (rows, seconds) in per_family.items():
+            results['total_rows'] += rows
+            family_seconds[name] += seconds
+        summary = ', '.join(f"{name}={rows:,}" for name, (rows, _) in per_family.items())
+        logger.info(f"✅ {pair.upper()} {year}_{month:02d}: {summary} ({elapsed:.1f}s) | "
+                    f"Progress: {results['success'] + results['failed']}/{len(tasks)}")
+
+    run_partitions(GRAPH, tasks, [family.name for family in families], args.max_workers, on_result,
+                   incremental=args.incremental)
+
+    elapsed = time.time() - start_time
+
+    logger.info("")
+    logger.info("=" * 80)
+    logger.info("FEATURE GRAPH COMPLETE")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Duration: {elapsed/3600:.1f} hours")
+    logger.info(f"Successful: {results['success']}/{len(tasks)} partitions")
+    logger.info(f"Failed: {results['failed']}/{len(tasks)} partitions")
+    logger.info(f"Total rows: {results['total_rows']:,}")
+    for name, seconds in family_seconds.items():
+        logger.info(f"  {name:<12} {seconds:,.1f}s compute")
+    logger.info("=" * 80)
+
+    sys.exit(0 if results['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
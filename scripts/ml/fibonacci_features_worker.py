@@ -14,23 +14,18 @@ Computation: Rolling 240-minute (4-hour) high/low swing points
 Estimated Time: 3-4 hours (336 partitions / 8 threads)
 """
 
-import psycopg2
+import sys
+from pathlib import Path
 from psycopg2 import sql
-import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import time
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com',
-    'port': 5432,
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': 'BQX_Aurora_2025_Secure'
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from data.db import connection
+from data.feature_families import compute_fibonacci_features
 
 # 28 currency pairs
 CURRENCY_PAIRS = [
@@ -66,73 +61,6 @@ def generate_month_ranges():
     return months
 
 
-def compute_fibonacci_features(df, lookback=240):
-    """
-    Compute Fibonacci features based on recent swing high/low
-
-    Args:
-        df: DataFrame with columns [time, high, low, close]
-        lookback: Rolling window for swing point identification (default 240 = 4 hours)
-
-    Returns:
-        DataFrame with 12 Fibonacci feature columns
-    """
-    high = df['high']
-    low = df['low']
-    close = df['close']
-
-    # Find rolling swing high and low
-    swing_high = high.rolling(window=lookback, center=False).max()
-    swing_low = low.rolling(window=lookback, center=False).min()
-
-    # Fibonacci range
-    fib_range = swing_high - swing_low
-
-    # Fibonacci Retracements (from swing high DOWN)
-    fib_236 = swing_high - (fib_range * 0.236)
-    fib_382 = swing_high - (fib_range * 0.382)
-    fib_500 = swing_high - (fib_range * 0.500)
-    fib_618 = swing_high - (fib_range * 0.618)
-    fib_786 = swing_high - (fib_range * 0.786)
-
-    # Fibonacci Extensions (from swing high UP)
-    fib_ext_1618 = swing_high + (fib_range * 0.618)
-    fib_ext_2618 = swing_high + (fib_range * 1.618)
-    fib_ext_4236 = swing_high + (fib_range * 2.618)
-
-    # Fibonacci Fan Levels (angled support/resistance)
-    # Simplified: use time-based slope from swing low to current
-    time_elapsed = pd.Series(range(len(df)), index=df.index)
-    slope_38 = (fib_382 - swing_low) / (time_elapsed - time_elapsed.shift(lookback)).replace(0, 1)
-    slope_50 = (fib_500 - swing_low) / (time_elapsed - time_elapsed.shift(lookback)).replace(0, 1)
-    slope_62 = (fib_618 - swing_low) / (time_elapsed - time_elapsed.shift(lookback)).replace(0, 1)
-
-    fib_fan_upper = swing_low + (slope_38 * (time_elapsed - time_elapsed.shift(lookback)))
-    fib_fan_middle = swing_low + (slope_50 * (time_elapsed - time_elapsed.shift(lookback)))
-    fib_fan_lower = swing_low + (slope_62 * (time_elapsed - time_elapsed.shift(lookback)))
-
-    # Fibonacci Arc Radius (distance from swing low to current price)
-    fib_arc_radius = np.sqrt((close - swing_low)**2 + (time_elapsed - time_elapsed.shift(lookback))**2)
-
-    # Create output DataFrame
-    fib_features = pd.DataFrame({
-        'fib_retracement_236': fib_236,
-        'fib_retracement_382': fib_382,
-        'fib_retracement_500': fib_500,
-        'fib_retracement_618': fib_618,
-        'fib_retracement_786': fib_786,
-        'fib_extension_1618': fib_ext_1618,
-        'fib_extension_2618': fib_ext_2618,
-        'fib_extension_4236': fib_ext_4236,
-        'fib_fan_upper': fib_fan_upper,
-        'fib_fan_middle': fib_fan_middle,
-        'fib_fan_lower': fib_fan_lower,
-        'fib_arc_radius': fib_arc_radius
-    }, index=df.index)
-
-    return fib_features
-
-
 def process_partition(conn, pair, year, month):
     """Process one partition: compute Fibonacci features"""
     start_time = time.time()
@@ -246,8 +174,7 @@ def process_partition(conn, pair, year, month):
 
 def process_partition_worker(pair, year, month):
     """Worker function for threading"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    try:
+    with connection() as conn:
         rows, elapsed = process_partition(conn, pair, year, month)
 
         global partitions_completed, total_rows_inserted
@@ -264,8 +191,6 @@ def process_partition_worker(pair, year, month):
             'elapsed': elapsed,
             'progress': progress_pct
         }
-    finally:
-        conn.close()
 
 
 def main():
@@ -10,31 +10,29 @@ Features (4 per partition):
 4. arbitrage_max_profit: Maximum profit considering both directions
 
 Algorithm:
-  For each pair, finds valid triangular paths through a third currency
-  Example for EURUSD: EUR → USD → GBP → EUR
-  Calculates round-trip conversion and detects arbitrage opportunities
-
-Estimated Runtime: 6 hours with 8 workers on D64as_v5
+  Reads the month's aligned M1 rate panel once and enumerates all 56
+  triangles of data/prep/arbitrage_triplets.json. Clockwise and
+  counter-clockwise round trips of every triangle and timestamp are array
+  operations, computed once and shared by the triangle's three pairs.
+  Each pair takes the best of its triangles through a third currency
+  (for EURUSD: EUR → USD → GBP → EUR, ...).
 """
 
-import psycopg2
-import pandas as pd
+import json
 import numpy as np
 import logging
 import sys
 import os
 import time
 import argparse
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from itertools import combinations
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
+from data.db import connection, get_pool
+from data.jobs import ALL_PAIRS, Job, JobLedger, add_ledger_arguments, run_jobs
+from data.panel import Panel, load_m1_panel, save_m1_panels
+from data.writer import write_columns
 
 # All 28 currency pairs
 PAIRS = [
@@ -49,6 +47,11 @@ PAIRS = [
 # All 8 currencies
 CURRENCIES = ['EUR', 'USD', 'GBP', 'JPY', 'AUD', 'NZD', 'CAD', 'CHF']
 
+# Triangles (Stage 2.4 prep), round-trip cost and opportunity threshold (%)
+TRIPLETS_PATH = Path(__file__).parent.parent.parent / 'data' / 'prep' / 'arbitrage_triplets.json'
+TRANSACTION_COST_PCT = 0.3
+ARBITRAGE_THRESHOLD = 0.5
+
 # Create logs directory
 os.makedirs('/tmp/logs/stage_2_4', exist_ok=True)
 
@@ -64,271 +67,221 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_pair_name(base, quote):
-    """Get pair name for two currencies (e.g., 'EUR', 'USD' -> 'eurusd')."""
-    pair_forward = base.lower() + quote.lower()
-    pair_reverse = quote.lower() + base.lower()
+def load_triangles(path=TRIPLETS_PATH):
+    """
+    All currency triangles from the Stage 2.4 prep file
 
-    if pair_forward in PAIRS:
-        return pair_forward, 1  # Direct (multiply)
-    elif pair_reverse in PAIRS:
-        return pair_reverse, -1  # Inverse (divide)
-    else:
-        return None, 0
+    Returns:
+        list of dicts: 'currencies' (A, B, C), 'pairs' (legs A→B, B→C,
+        C→A as lowercase pair names) and 'directions' (1=multiply, -1=divide)
+    """
+    with open(path) as f:
+        triplets = json.load(f)['triplets']
+    return [{
+        'currencies': tuple(t['currencies']),
+        'pairs': tuple(p.lower() for p in t['pairs']),
+        'directions': tuple(1 if d == 'direct' else -1 for d in t['directions'])
+    } for t in triplets]
 
 
-def calculate_triangular_arbitrage(rate_1, rate_2, rate_3, dir_1, dir_2, dir_3, transaction_cost_pct=0.3):
+def triangle_round_trips(panel, triangles, transaction_cost_pct=TRANSACTION_COST_PCT):
     """
-    Calculate arbitrage profit % for a triangular currency path.
+    Clockwise and counter-clockwise round-trip profit % of every triangle
 
     Args:
-        rate_1, rate_2, rate_3: Exchange rates for 3 legs
-        dir_1, dir_2, dir_3: Directions (1=multiply, -1=divide)
-        transaction_cost_pct: Total cost % for round-trip (default 0.3%)
+        panel: Month rate panel (field 'rate_index')
+        triangles: load_triangles() entries
+        transaction_cost_pct: Total cost % for a round trip
 
     Returns:
-        float: Profit percentage (positive = arbitrage opportunity)
+        (rows, triangles, 2) array: [..., 0] converts along A→B→C→A,
+        [..., 1] along A→C→B→A; NaN where a leg has no rate
     """
-    try:
-        amount = 1.0  # Start with 1 unit
-
-        # Leg 1
-        if dir_1 == 1:
-            amount *= rate_1
-        else:
-            amount /= rate_1
-
-        # Leg 2
-        if dir_2 == 1:
-            amount *= rate_2
-        else:
-            amount /= rate_2
-
-        # Leg 3
-        if dir_3 == 1:
-            amount *= rate_3
-        else:
-            amount /= rate_3
-
-        # Subtract transaction costs
-        amount *= (1 - transaction_cost_pct / 100.0)
-
-        # Return profit percentage
-        return (amount - 1.0) * 100.0
-
-    except Exception as e:
-        return 0.0
-
-
-def find_triangular_paths(pair):
+    rates = panel.field('rate_index')
+    columns = {pair: j for j, pair in enumerate(panel.pairs)}
+    legs = np.full((len(panel), len(triangles), 3), np.nan)
+    for t, triangle in enumerate(triangles):
+        for k, pair in enumerate(triangle['pairs']):
+            if pair in columns:
+                legs[:, t, k] = rates[:, columns[pair]]
+    multiply = np.array([triangle['directions'] for triangle in triangles]) == 1
+
+    # Convert 1 unit leg by leg (multiply by direct legs, divide by inverse legs)
+    clockwise = np.ones(legs.shape[:2])
+    for k in range(3):
+        clockwise = np.where(multiply[:, k], clockwise * legs[:, :, k], clockwise / legs[:, :, k])
+    counter = np.ones(legs.shape[:2])
+    for k in (2, 1, 0):
+        counter = np.where(multiply[:, k], counter / legs[:, :, k], counter * legs[:, :, k])
+
+    amounts = np.stack([clockwise, counter], axis=-1) * (1 - transaction_cost_pct / 100.0)
+    return (amounts - 1.0) * 100.0
+
+
+def pair_triangles(pair, triangles):
     """
-    Find all valid triangular arbitrage paths for a given pair.
-
-    Args:
-        pair: Currency pair (e.g., 'eurusd')
+    The triangles through `pair`, as the path base → quote → third → base
 
     Returns:
-        list: List of triangular paths (tuples of currencies)
+        list of (triangle index, same orientation as the triangle) in
+        CURRENCIES order of the third currency
     """
-    base = pair[:3].upper()
-    quote = pair[3:].upper()
+    base, quote = pair[:3].upper(), pair[3:].upper()
+    lookup = {frozenset(t['currencies']): i for i, t in enumerate(triangles)}
 
     paths = []
-
-    # For each third currency, check if triangular path exists
     for third in CURRENCIES:
-        if third != base and third != quote:
-            # Path: base → quote → third → base
-            # Need: base/quote, quote/third, third/base
+        if third in (base, quote) or frozenset((base, quote, third)) not in lookup:
+            continue
+        t = lookup[frozenset((base, quote, third))]
+        a, b, c = triangles[t]['currencies']
+        paths.append((t, (base, quote) in ((a, b), (b, c), (c, a))))
+    return paths
 
-            pair_1, dir_1 = get_pair_name(base, quote)
-            pair_2, dir_2 = get_pair_name(quote, third)
-            pair_3, dir_3 = get_pair_name(third, base)
 
-            if pair_1 and pair_2 and pair_3:
-                paths.append({
-                    'currencies': (base, quote, third),
-                    'pairs': (pair_1, pair_2, pair_3),
-                    'directions': (dir_1, dir_2, dir_3)
-                })
+def scan_month(panel, pairs=PAIRS, triangles=None, threshold=ARBITRAGE_THRESHOLD):
+    """
+    Arbitrage features of every pair from one pass over the month's triangles
 
-    return paths
+    Each triangle's round trips are computed once and shared by its three
+    pairs. A pair's best path is the first maximum over its triangles
+    (clockwise before counter-clockwise); profits <= 0 count as none.
 
+    Args:
+        panel: Month rate panel (field 'rate_index')
+        pairs: Pairs to emit (pairs missing from the panel are skipped)
+        triangles: load_triangles() entries (read from TRIPLETS_PATH if None)
+        threshold: Profit % that flags an opportunity
 
-def populate_arbitrage_for_pair(pair, year_month):
+    Returns:
+        Dict of pair -> (UTC timestamps, dict of feature columns) over the
+        rows the pair's own table has
+    """
+    if triangles is None:
+        triangles = load_triangles()
+    profits = triangle_round_trips(panel, triangles)
+    index = panel.index.tz_localize('UTC')
+
+    results = {}
+    for pair in pairs:
+        if pair in panel.missing or pair not in panel.pairs:
+            continue
+        rows = panel.present[:, panel.pairs.index(pair)]
+        paths = pair_triangles(pair, triangles)
+
+        # Columns: path 0 clockwise, path 0 counter-clockwise, path 1 ...
+        candidates = np.empty((int(rows.sum()), 2 * len(paths)))
+        for p, (t, same) in enumerate(paths):
+            forward, backward = (0, 1) if same else (1, 0)
+            candidates[:, 2 * p] = profits[rows, t, forward]
+            candidates[:, 2 * p + 1] = profits[rows, t, backward]
+        candidates[np.isnan(candidates)] = -np.inf
+
+        if len(paths):
+            best = np.argmax(candidates, axis=1)
+            max_profit = candidates[np.arange(len(candidates)), best]
+        else:
+            best = np.zeros(len(candidates), dtype=np.intp)
+            max_profit = np.full(len(candidates), -np.inf)
+        profitable = max_profit > 0
+        max_profit = np.where(profitable, max_profit, 0.0)
+        direction = np.where(profitable, np.where(best % 2 == 0, 1, -1), 0)
+
+        opportunity = max_profit > threshold
+        results[pair] = (index[rows], {
+            'arbitrage_profit_pct': np.where(opportunity, max_profit, 0.0),
+            'arbitrage_opportunity': opportunity,
+            'arbitrage_direction': np.where(opportunity, direction, 0),
+            'arbitrage_max_profit': max_profit
+        })
+    return results
+
+
+def populate_arbitrage_for_month(year_month, pairs=PAIRS, panel_dir=None):
     """
-    Populate arbitrage features for one pair and one month.
+    Populate arbitrage features for every pair of one month.
 
     Args:
-        pair: Currency pair (e.g., 'eurusd')
         year_month: Month partition (e.g., '2024_07')
+        pairs: Pairs whose partitions are written
+        panel_dir: Saved M1 rate panel of the month (loaded here if None)
 
     Returns:
-        tuple: (pair, year_month, success, row_count, error_msg)
+        list of (pair, year_month, success, row_count, error_msg) tuples
     """
     start_time = time.time()
+    outcomes = []
 
     try:
-        logger.info(f"{pair.upper()} {year_month}: Starting arbitrage detection...")
-
-        # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        year, month = year_month.split('_')
-
-        # Fetch rate_index for THIS pair
-        pair_query = f"""
-        SELECT time AS ts_utc, rate_index
-        FROM bqx.m1_{pair}
-        WHERE EXTRACT(YEAR FROM time) = {year}
-          AND EXTRACT(MONTH FROM time) = {month}
-        ORDER BY time;
-        """
-
-        df_pair = pd.read_sql(pair_query, conn)
-
-        if df_pair.empty:
-            logger.warning(f"{pair.upper()} {year_month}: No data found")
-            conn.close()
-            return (pair, year_month, True, 0, "No data")
-
-        df_pair['ts_utc'] = pd.to_datetime(df_pair['ts_utc'], utc=True)
-        df_pair.set_index('ts_utc', inplace=True)
-
-        # Find all triangular paths for this pair
-        triangular_paths = find_triangular_paths(pair)
-
-        if not triangular_paths:
-            logger.warning(f"{pair.upper()} {year_month}: No valid triangular paths found")
-            conn.close()
-            return (pair, year_month, True, 0, "No triangular paths")
-
-        logger.info(f"{pair.upper()} {year_month}: Found {len(triangular_paths)} triangular paths")
-
-        # Load rate_index for all pairs needed in triangular paths
-        all_pairs_needed = set()
-        for path in triangular_paths:
-            all_pairs_needed.update(path['pairs'])
-
-        all_rates = {}
-        for other_pair in all_pairs_needed:
-            try:
-                query = f"""
-                SELECT time AS ts_utc, rate_index
-                FROM bqx.m1_{other_pair}
-                WHERE EXTRACT(YEAR FROM time) = {year}
-                  AND EXTRACT(MONTH FROM time) = {month}
-                ORDER BY time;
-                """
-                df_other = pd.read_sql(query, conn)
-                df_other['ts_utc'] = pd.to_datetime(df_other['ts_utc'], utc=True)
-                df_other.set_index('ts_utc', inplace=True)
-                all_rates[other_pair] = df_other['rate_index']
-            except Exception as e:
-                logger.warning(f"Could not load {other_pair}: {e}")
-
-        logger.info(f"{pair.upper()} {year_month}: Loaded {len(df_pair):,} rows, computing arbitrage...")
-
-        # Calculate arbitrage features for each timestamp
-        results = []
-        ARBITRAGE_THRESHOLD = 0.5  # 0.5% profit threshold
-
-        for ts in df_pair.index:
-            # For each triangular path, calculate arbitrage
-            max_profit = 0.0
-            best_direction = 0
-
-            for path in triangular_paths:
-                pair_1, pair_2, pair_3 = path['pairs']
-                dir_1, dir_2, dir_3 = path['directions']
-
-                # Check if all rates available at this timestamp
-                if (pair_1 in all_rates and ts in all_rates[pair_1].index and
-                    pair_2 in all_rates and ts in all_rates[pair_2].index and
-                    pair_3 in all_rates and ts in all_rates[pair_3].index):
-
-                    rate_1 = all_rates[pair_1].at[ts]
-                    rate_2 = all_rates[pair_2].at[ts]
-                    rate_3 = all_rates[pair_3].at[ts]
-
-                    if pd.notna(rate_1) and pd.notna(rate_2) and pd.notna(rate_3):
-                        # Calculate clockwise profit
-                        profit_cw = calculate_triangular_arbitrage(
-                            rate_1, rate_2, rate_3,
-                            dir_1, dir_2, dir_3,
-                            transaction_cost_pct=0.3
-                        )
-
-                        # Calculate counter-clockwise profit (reverse all directions)
-                        profit_ccw = calculate_triangular_arbitrage(
-                            rate_3, rate_2, rate_1,
-                            -dir_3, -dir_2, -dir_1,
-                            transaction_cost_pct=0.3
-                        )
-
-                        # Track best opportunity
-                        if profit_cw > max_profit:
-                            max_profit = profit_cw
-                            best_direction = 1  # Clockwise
-
-                        if profit_ccw > max_profit:
-                            max_profit = profit_ccw
-                            best_direction = -1  # Counter-clockwise
-
-            # Determine if arbitrage opportunity exists
-            arbitrage_exists = max_profit > ARBITRAGE_THRESHOLD
-
-            results.append({
-                'ts_utc': ts,
-                'arbitrage_profit_pct': max_profit if arbitrage_exists else 0.0,
-                'arbitrage_opportunity': arbitrage_exists,
-                'arbitrage_direction': best_direction if arbitrage_exists else 0,
-                'arbitrage_max_profit': max_profit
-            })
-
-        if not results:
-            logger.warning(f"{pair.upper()} {year_month}: No valid results")
-            conn.close()
-            return (pair, year_month, True, 0, "No valid results")
-
-        # Insert into arbitrage table
-        partition_name = f"arbitrage_{pair}_{year_month}"
-        cursor.execute(f"DELETE FROM bqx.{partition_name}")
-
-        for row in results:
-            cursor.execute(f"""
-                INSERT INTO bqx.{partition_name}
-                (ts_utc, pair, arbitrage_profit_pct, arbitrage_opportunity,
-                 arbitrage_direction, arbitrage_max_profit, year_month)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (row['ts_utc'], pair, row['arbitrage_profit_pct'], row['arbitrage_opportunity'],
-                  row['arbitrage_direction'], row['arbitrage_max_profit'], year_month))
-
-        conn.commit()
-
-        # Calculate statistics
-        opportunities = sum(1 for r in results if r['arbitrage_opportunity'])
-
-        conn.close()
-
-        elapsed = time.time() - start_time
-        logger.info(f"✅ {pair.upper()} {year_month}: Complete! {len(results):,} rows, "
-                   f"{opportunities} arbitrage opportunities, {elapsed:.1f}s")
-
-        return (pair, year_month, True, len(results), None)
+        with connection() as conn:
+            year, month = year_month.split('_')
+
+            # Month panel shared by all workers, or read here
+            if panel_dir is not None:
+                panel = Panel.open(panel_dir)
+            else:
+                panel = load_m1_panel(conn, int(year), int(month), PAIRS)
+                conn.commit()
+
+            triangles = load_triangles()
+            month_features = scan_month(panel, pairs, triangles)
+            logger.info(f"{year_month}: Scanned {len(triangles)} triangles for {len(month_features)} pairs "
+                        f"in {time.time() - start_time:.1f}s")
+
+            for pair in pairs:
+                if pair not in month_features:
+                    logger.error(f"❌ {pair.upper()} {year_month}: Could not load bqx.m1_{pair}")
+                    outcomes.append((pair, year_month, False, 0, f"Could not load bqx.m1_{pair}"))
+                    continue
+
+                timestamps, features = month_features[pair]
+                if len(timestamps) == 0:
+                    logger.warning(f"{pair.upper()} {year_month}: No data found")
+                    outcomes.append((pair, year_month, True, 0, "No data"))
+                    continue
+
+                n_rows = len(timestamps)
+                columns = {
+                    'ts_utc': timestamps,
+                    'pair': [pair] * n_rows,
+                    **features,
+                    'year_month': [year_month] * n_rows
+                }
+
+                try:
+                    # Replace the partition (COPY + one merge)
+                    partition_name = f"arbitrage_{pair}_{year_month}"
+                    cursor = conn.cursor()
+                    cursor.execute(f"DELETE FROM bqx.{partition_name}")
+                    write_columns(conn, f"bqx.{partition_name}", columns, mode='insert')
+                    conn.commit()
+                    cursor.close()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"❌ {pair.upper()} {year_month}: Failed - {e}")
+                    outcomes.append((pair, year_month, False, 0, str(e)))
+                    continue
+
+                opportunities = int(features['arbitrage_opportunity'].sum())
+                logger.info(f"✅ {pair.upper()} {year_month}: Complete! {n_rows:,} rows, "
+                            f"{opportunities} arbitrage opportunities")
+                outcomes.append((pair, year_month, True, n_rows, None))
+
+        return outcomes
 
     except Exception as e:
         elapsed = time.time() - start_time
         error_msg = str(e)
-        logger.error(f"❌ {pair.upper()} {year_month}: Failed after {elapsed:.1f}s - {error_msg}")
-        return (pair, year_month, False, 0, error_msg)
+        logger.error(f"❌ {year_month}: Failed after {elapsed:.1f}s - {error_msg}")
+        done = {outcome[0] for outcome in outcomes}
+        return outcomes + [(pair, year_month, False, 0, error_msg) for pair in pairs if pair not in done]
 
 
 def main():
     """Main execution: Populate arbitrage features for all pairs and months."""
     parser = argparse.ArgumentParser(description='Populate arbitrage features for BQX ML')
     parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
     args = parser.parse_args()
 
     logger.info("=" * 80)
@@ -341,40 +294,50 @@ def main():
     logger.info(f"Max Workers: {args.max_workers}")
     logger.info("")
 
-    # Generate all tasks
-    tasks = []
-    for pair in PAIRS:
-        for year in [2024, 2025]:
-            for month in range(1, 13):
-                if (year == 2024 and month >= 7) or (year == 2025 and month <= 6):
-                    year_month = f"{year}_{month:02d}"
-                    tasks.append((pair, year_month))
+    # One task per month scans all triangles for every pair
+    year_months = []
+    for year in [2024, 2025]:
+        for month in range(1, 13):
+            if (year == 2024 and month >= 7) or (year == 2025 and month <= 6):
+                year_months.append(f"{year}_{month:02d}")
+    total = len(PAIRS) * len(year_months)
 
-    logger.info(f"Total tasks: {len(tasks)}")
+    logger.info(f"Total tasks: {len(year_months)} months x {len(PAIRS)} pairs")
     logger.info("")
 
     start_time = time.time()
-    results = {'success': 0, 'failed': 0, 'total_rows': 0}
-
-    with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
-        futures = {executor.submit(populate_arbitrage_for_pair, pair, ym): (pair, ym)
-                   for pair, ym in tasks}
-
-        for future in as_completed(futures):
-            pair, ym = futures[future]
-            try:
-                pair_name, year_month, success, row_count, error_msg = future.result()
-
-                if success:
-                    results['success'] += 1
-                    results['total_rows'] += row_count
-                    logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
-                else:
-                    results['failed'] += 1
-
-            except Exception as e:
-                logger.error(f"Unexpected error for {pair} {ym}: {e}")
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'total_rows': 0}
+
+    # Read every pair once per month still to do; workers memory-map the saved panels
+    ledger = JobLedger(args.ledger)
+    done = set() if args.force else ledger.done('stage_2_4')
+    months = [ym for ym in year_months if (ALL_PAIRS, ym) not in done]
+    # pool.run retries transient errors (but not timeouts) by reloading from scratch
+    panels = get_pool().run(save_m1_panels, months, PAIRS) if months else {}
+    logger.info(f"Saved {len(panels)} cross-pair panels")
+
+    # A month is done once every pair's partition was written
+    def month_outcome(outcomes):
+        errors = [f"{pair}: {error_msg}" for pair, _, success, _, error_msg in outcomes if not success]
+        return not errors, sum(row_count for _, _, _, row_count, _ in outcomes), '; '.join(errors) or None
+
+    jobs = [Job(ALL_PAIRS, ym, (ym, PAIRS, panels.get(ym))) for ym in year_months]
+    for result in run_jobs('stage_2_4', jobs, populate_arbitrage_for_month, args.max_workers,
+                           outcome=month_outcome, ledger=ledger, force=args.force, attempts=args.attempts):
+        if result.state == 'skipped':
+            results['success'] += len(PAIRS)
+            results['skipped'] += len(PAIRS)
+            results['total_rows'] += result.rows
+            continue
+        for pair_name, year_month, success, row_count, error_msg in result.result or []:
+            if success:
+                results['success'] += 1
+                results['total_rows'] += row_count
+            else:
                 results['failed'] += 1
+        if result.result is None:
+            results['failed'] += len(PAIRS)
+        logger.info(f"Progress: {results['success']}/{total} partitions complete")
 
     elapsed = time.time() - start_time
 
@@ -384,8 +347,9 @@ def main():
     logger.info("=" * 80)
     logger.info("")
     logger.info(f"Duration: {elapsed/3600:.1f} hours")
-    logger.info(f"Successful: {results['success']}/{len(tasks)} tasks")
-    logger.info(f"Failed: {results['failed']}/{len(tasks)} tasks")
+    logger.info(f"Successful: {results['success']}/{total} partitions")
+    logger.info(f"Failed: {results['failed']}/{total} partitions")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
     logger.info(f"Total rows: {results['total_rows']:,}")
     logger.info("=" * 80)
 
@@ -16,7 +16,6 @@ Features (8 per partition):
 Estimated Runtime: 2 hours with 8 workers on D64as_v5
 """
 
-import psycopg2
 import pandas as pd
 import numpy as np
 from scipy import stats
@@ -25,16 +24,14 @@ import sys
 import os
 import time
 import argparse
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from collections import defaultdict
+from pathlib import Path
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection, get_pool
+from data.jobs import Job, JobLedger, add_ledger_arguments, run_jobs
+from data.panel import Panel, load_m1_panel, save_m1_panels
 
 # All 28 currency pairs
 PAIRS = [
@@ -111,13 +108,14 @@ def calculate_currency_index(currency, all_rates_df, timestamp):
         return None
 
 
-def populate_currency_index_for_pair(pair, year_month):
+def populate_currency_index_for_pair(pair, year_month, panel_dir=None):
     """
     Populate currency indices for one pair and one month.
     
     Args:
         pair: Currency pair (e.g., 'eurusd')
         year_month: Month partition (e.g., '2024_07')
+        panel_dir: Saved M1 rate panel of the month (loaded here if None)
         
     Returns:
         tuple: (pair, year_month, success, row_count, error_msg)
@@ -128,138 +126,117 @@ def populate_currency_index_for_pair(pair, year_month):
         logger.info(f"{pair.upper()} {year_month}: Starting currency index computation...")
         
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
-        year, month = year_month.split('_')
-        
-        # Fetch rate_index for THIS pair
-        pair_query = f"""
-        SELECT time AS ts_utc, rate_index
-        FROM bqx.m1_{pair}
-        WHERE EXTRACT(YEAR FROM time) = {year}
-          AND EXTRACT(MONTH FROM time) = {month}
-        ORDER BY time;
-        """
+        with connection() as conn:
+            cursor = conn.cursor()
         
-        df_pair = pd.read_sql(pair_query, conn)
+            year, month = year_month.split('_')
         
-        if df_pair.empty:
-            logger.warning(f"{pair.upper()} {year_month}: No data found")
-            conn.close()
-            return (pair, year_month, True, 0, "No data")
+            # Month panel shared by all workers, or loaded here
+            if panel_dir is not None:
+                panel = Panel.open(panel_dir)
+            else:
+                panel = load_m1_panel(conn, int(year), int(month), PAIRS)
+
+            if pair in panel.missing:
+                raise RuntimeError(f"Could not load bqx.m1_{pair}")
+
+            df_pair = panel.series('rate_index', pair, utc=True).to_frame()
         
-        df_pair['ts_utc'] = pd.to_datetime(df_pair['ts_utc'], utc=True)
-        df_pair.set_index('ts_utc', inplace=True)
+            if df_pair.empty:
+                logger.warning(f"{pair.upper()} {year_month}: No data found")
+                return (pair, year_month, True, 0, "No data")
         
-        # Fetch rate_index for ALL pairs (for currency index calculation)
-        all_rates = {}
-        for other_pair in PAIRS:
-            try:
-                query = f"""
-                SELECT time AS ts_utc, rate_index
-                FROM bqx.m1_{other_pair}
-                WHERE EXTRACT(YEAR FROM time) = {year}
-                  AND EXTRACT(MONTH FROM time) = {month}
-                ORDER BY time;
-                """
-                df_other = pd.read_sql(query, conn)
-                df_other['ts_utc'] = pd.to_datetime(df_other['ts_utc'], utc=True)
-                df_other.set_index('ts_utc', inplace=True)
-                all_rates[other_pair] = df_other['rate_index']
-            except Exception as e:
-                logger.warning(f"Could not load {other_pair}: {e}")
-                
-        # Combine all rates into single DataFrame
-        all_rates_df = pd.DataFrame(all_rates)
+            for other_pair in panel.missing:
+                logger.warning(f"Could not load {other_pair}")
+
+            # All rates on the union of timestamps (for currency index calculation)
+            all_rates_df = panel.frame('rate_index', utc=True)
         
-        # Extract base and quote currencies
-        base_currency = pair[:3].upper()
-        quote_currency = pair[3:].upper()
+            # Extract base and quote currencies
+            base_currency = pair[:3].upper()
+            quote_currency = pair[3:].upper()
         
-        logger.info(f"{pair.upper()} {year_month}: Loaded {len(df_pair):,} rows, computing indices...")
+            logger.info(f"{pair.upper()} {year_month}: Loaded {len(df_pair):,} rows, computing indices...")
         
-        # Calculate features for each timestamp
-        results = []
-        for ts in df_pair.index:
-            if ts not in all_rates_df.index:
-                continue
+            # Calculate features for each timestamp
+            results = []
+            for ts in df_pair.index:
+                if ts not in all_rates_df.index:
+                    continue
                 
-            # Calculate currency indices
-            base_index = calculate_currency_index(base_currency, all_rates_df, ts)
-            quote_index = calculate_currency_index(quote_currency, all_rates_df, ts)
+                # Calculate currency indices
+                base_index = calculate_currency_index(base_currency, all_rates_df, ts)
+                quote_index = calculate_currency_index(quote_currency, all_rates_df, ts)
             
-            if base_index is None or quote_index is None:
-                continue
+                if base_index is None or quote_index is None:
+                    continue
             
-            # Calculate differential
-            differential = base_index - quote_index
+                # Calculate differential
+                differential = base_index - quote_index
             
-            # Calculate percentiles (rank among all 8 currencies)
-            all_indices = {}
-            for curr in CURRENCY_PAIRS.keys():
-                idx = calculate_currency_index(curr, all_rates_df, ts)
-                if idx is not None:
-                    all_indices[curr] = idx
+                # Calculate percentiles (rank among all 8 currencies)
+                all_indices = {}
+                for curr in CURRENCY_PAIRS.keys():
+                    idx = calculate_currency_index(curr, all_rates_df, ts)
+                    if idx is not None:
+                        all_indices[curr] = idx
             
-            if all_indices:
-                indices_sorted = sorted(all_indices.values())
-                base_percentile = (indices_sorted.index(base_index) / len(indices_sorted)) * 100 if base_index in indices_sorted else 50
-                quote_percentile = (indices_sorted.index(quote_index) / len(indices_sorted)) * 100 if quote_index in indices_sorted else 50
-            else:
-                base_percentile, quote_percentile = 50, 50
+                if all_indices:
+                    indices_sorted = sorted(all_indices.values())
+                    base_percentile = (indices_sorted.index(base_index) / len(indices_sorted)) * 100 if base_index in indices_sorted else 50
+                    quote_percentile = (indices_sorted.index(quote_index) / len(indices_sorted)) * 100 if quote_index in indices_sorted else 50
+                else:
+                    base_percentile, quote_percentile = 50, 50
             
-            # Pair divergence from index
-            index_implied_rate = base_index / quote_index
-            actual_rate = df_pair.at[ts, 'rate_index']
-            pair_divergence = actual_rate - index_implied_rate
+                # Pair divergence from index
+                index_implied_rate = base_index / quote_index
+                actual_rate = df_pair.at[ts, 'rate_index']
+                pair_divergence = actual_rate - index_implied_rate
             
-            # Related pairs correlation (simplified - would need rolling window)
-            related_pairs_corr = 0.0  # Placeholder - requires 60-min rolling calculation
+                # Related pairs correlation (simplified - would need rolling window)
+                related_pairs_corr = 0.0  # Placeholder - requires 60-min rolling calculation
             
-            # Triangular consistency (simplified)
-            triangular_consistency = 0.0  # Placeholder - requires triangular pair lookup
+                # Triangular consistency (simplified)
+                triangular_consistency = 0.0  # Placeholder - requires triangular pair lookup
             
-            results.append({
-                'ts_utc': ts,
-                'base_currency_index': base_index,
-                'quote_currency_index': quote_index,
-                'currency_index_differential': differential,
-                'base_currency_strength_percentile': base_percentile,
-                'quote_currency_strength_percentile': quote_percentile,
-                'pair_divergence_from_index': pair_divergence,
-                'related_pairs_correlation_60min': related_pairs_corr,
-                'triangular_consistency_score': triangular_consistency
-            })
+                results.append({
+                    'ts_utc': ts,
+                    'base_currency_index': base_index,
+                    'quote_currency_index': quote_index,
+                    'currency_index_differential': differential,
+                    'base_currency_strength_percentile': base_percentile,
+                    'quote_currency_strength_percentile': quote_percentile,
+                    'pair_divergence_from_index': pair_divergence,
+                    'related_pairs_correlation_60min': related_pairs_corr,
+                    'triangular_consistency_score': triangular_consistency
+                })
         
-        if not results:
-            logger.warning(f"{pair.upper()} {year_month}: No valid results")
-            conn.close()
-            return (pair, year_month, True, 0, "No valid results")
+            if not results:
+                logger.warning(f"{pair.upper()} {year_month}: No valid results")
+                return (pair, year_month, True, 0, "No valid results")
         
-        # Insert into currency_index table
-        partition_name = f"currency_index_{pair}_{year_month}"
-        cursor.execute(f"DELETE FROM bqx.{partition_name}")
+            # Insert into currency_index table
+            partition_name = f"currency_index_{pair}_{year_month}"
+            cursor.execute(f"DELETE FROM bqx.{partition_name}")
         
-        for row in results:
-            cursor.execute(f"""
-                INSERT INTO bqx.{partition_name} 
-                (ts_utc, pair, base_currency_index, quote_currency_index, currency_index_differential,
-                 base_currency_strength_percentile, quote_currency_strength_percentile,
-                 pair_divergence_from_index, related_pairs_correlation_60min, triangular_consistency_score, year_month)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (row['ts_utc'], pair, row['base_currency_index'], row['quote_currency_index'],
-                  row['currency_index_differential'], row['base_currency_strength_percentile'],
-                  row['quote_currency_strength_percentile'], row['pair_divergence_from_index'],
-                  row['related_pairs_correlation_60min'], row['triangular_consistency_score'], year_month))
+            for row in results:
+                cursor.execute(f"""
+                    INSERT INTO bqx.{partition_name} 
+                    (ts_utc, pair, base_currency_index, quote_currency_index, currency_index_differential,
+                     base_currency_strength_percentile, quote_currency_strength_percentile,
+                     pair_divergence_from_index, related_pairs_correlation_60min, triangular_consistency_score, year_month)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (row['ts_utc'], pair, row['base_currency_index'], row['quote_currency_index'],
+                      row['currency_index_differential'], row['base_currency_strength_percentile'],
+                      row['quote_currency_strength_percentile'], row['pair_divergence_from_index'],
+                      row['related_pairs_correlation_60min'], row['triangular_consistency_score'], year_month))
         
-        conn.commit()
-        conn.close()
+            conn.commit()
         
-        elapsed = time.time() - start_time
-        logger.info(f"✅ {pair.upper()} {year_month}: Complete! {len(results):,} rows, {elapsed:.1f}s")
+            elapsed = time.time() - start_time
+            logger.info(f"✅ {pair.upper()} {year_month}: Complete! {len(results):,} rows, {elapsed:.1f}s")
         
-        return (pair, year_month, True, len(results), None)
+            return (pair, year_month, True, len(results), None)
         
     except Exception as e:
         elapsed = time.time() - start_time
@@ -272,6 +249,7 @@ def main():
     """Main execution: Populate currency indices for all pairs and months."""
     parser = argparse.ArgumentParser(description='Populate currency indices for BQX ML')
     parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
     args = parser.parse_args()
     
     logger.info("=" * 80)
@@ -297,27 +275,27 @@ def main():
     logger.info("")
     
     start_time = time.time()
-    results = {'success': 0, 'failed': 0, 'total_rows': 0}
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'total_rows': 0}
     
-    with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
-        futures = {executor.submit(populate_currency_index_for_pair, pair, ym): (pair, ym)
-                   for pair, ym in tasks}
-        
-        for future in as_completed(futures):
-            pair, ym = futures[future]
-            try:
-                pair_name, year_month, success, row_count, error_msg = future.result()
-                
-                if success:
-                    results['success'] += 1
-                    results['total_rows'] += row_count
-                    logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
-                else:
-                    results['failed'] += 1
-                    
-            except Exception as e:
-                logger.error(f"Unexpected error for {pair} {ym}: {e}")
-                results['failed'] += 1
+    # Read every pair once per month still to do; workers memory-map the saved panels
+    ledger = JobLedger(args.ledger)
+    done = set() if args.force else ledger.done('stage_2_3')
+    months = sorted({ym for pair, ym in tasks if (pair, ym) not in done})
+    # pool.run retries transient errors (but not timeouts) by reloading from scratch
+    panels = get_pool().run(save_m1_panels, months, PAIRS) if months else {}
+    logger.info(f"Saved {len(panels)} cross-pair panels")
+    
+    jobs = [Job(pair, ym, (pair, ym, panels.get(ym))) for pair, ym in tasks]
+    for result in run_jobs('stage_2_3', jobs, populate_currency_index_for_pair, args.max_workers,
+                           outcome=lambda r: (r[2], r[3], r[4]), ledger=ledger, force=args.force,
+                           attempts=args.attempts):
+        if result.state == 'failed':
+            results['failed'] += 1
+        else:
+            results['success'] += 1
+            results['skipped'] += result.state == 'skipped'
+            results['total_rows'] += result.rows
+            logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
     
     elapsed = time.time() - start_time
     
@@ -329,6 +307,7 @@ def main():
     logger.info(f"Duration: {elapsed/3600:.1f} hours")
     logger.info(f"Successful: {results['success']}/{len(tasks)} tasks")
     logger.info(f"Failed: {results['failed']}/{len(tasks)} tasks")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
     logger.info(f"Total rows: {results['total_rows']:,}")
     logger.info("=" * 80)
     
@@ -23,7 +23,6 @@ Total: 6 windows × 10 metrics = 60 features per partition
 Estimated Runtime: 3 hours with 8 workers on D64as_v5
 """
 
-import psycopg2
 import pandas as pd
 import numpy as np
 import logging
@@ -31,16 +30,13 @@ import sys
 import os
 import time
 import argparse
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from scipy import stats
+from pathlib import Path
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection
+from data.jobs import Job, JobLedger, add_ledger_arguments, month_checksum, run_jobs
 
 # All 28 currency pairs
 PAIRS = [
@@ -202,82 +198,79 @@ def populate_enhanced_rmse_for_pair(pair, year_month, domain='rate'):
         logger.info(f"{pair.upper()} {year_month} ({domain}): Starting enhanced RMSE computation...")
 
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        with connection() as conn:
+            cursor = conn.cursor()
 
-        year, month = year_month.split('_')
+            year, month = year_month.split('_')
 
-        # Determine source table
-        if domain == 'rate':
-            source_table = f"reg_{pair}_{year_month}"
-        else:  # bqx
-            source_table = f"reg_bqx_{pair}_{year_month}"
+            # Determine source table
+            if domain == 'rate':
+                source_table = f"reg_{pair}_{year_month}"
+            else:  # bqx
+                source_table = f"reg_bqx_{pair}_{year_month}"
 
-        # Fetch regression features
-        query = f"""
-        SELECT ts_utc,
-               w60_r2, w60_rmse, w60_a_term, w60_b_term, w60_resid_end,
-               w90_r2, w90_rmse, w90_a_term, w90_b_term, w90_resid_end,
-               w150_r2, w150_rmse, w150_a_term, w150_b_term, w150_resid_end,
-               w240_r2, w240_rmse, w240_a_term, w240_b_term, w240_resid_end,
-               w390_r2, w390_rmse, w390_a_term, w390_b_term, w390_resid_end,
-               w630_r2, w630_rmse, w630_a_term, w630_b_term, w630_resid_end
-        FROM bqx.{source_table}
-        ORDER BY ts_utc;
-        """
+            # Fetch regression features
+            query = f"""
+            SELECT ts_utc,
+                   w60_r2, w60_rmse, w60_a_term, w60_b_term, w60_resid_end,
+                   w90_r2, w90_rmse, w90_a_term, w90_b_term, w90_resid_end,
+                   w150_r2, w150_rmse, w150_a_term, w150_b_term, w150_resid_end,
+                   w240_r2, w240_rmse, w240_a_term, w240_b_term, w240_resid_end,
+                   w390_r2, w390_rmse, w390_a_term, w390_b_term, w390_resid_end,
+                   w630_r2, w630_rmse, w630_a_term, w630_b_term, w630_resid_end
+            FROM bqx.{source_table}
+            ORDER BY ts_utc;
+            """
 
-        df = pd.read_sql(query, conn)
+            df = pd.read_sql(query, conn)
 
-        if df.empty:
-            logger.warning(f"{pair.upper()} {year_month} ({domain}): No data found")
-            conn.close()
-            return (pair, year_month, domain, True, 0, "No data")
+            if df.empty:
+                logger.warning(f"{pair.upper()} {year_month} ({domain}): No data found")
+                return (pair, year_month, domain, True, 0, "No data")
 
-        df['ts_utc'] = pd.to_datetime(df['ts_utc'], utc=True)
+            df['ts_utc'] = pd.to_datetime(df['ts_utc'], utc=True)
 
-        logger.info(f"{pair.upper()} {year_month} ({domain}): Loaded {len(df):,} rows, computing metrics...")
+            logger.info(f"{pair.upper()} {year_month} ({domain}): Loaded {len(df):,} rows, computing metrics...")
 
-        # Calculate enhanced metrics for each window (using expanding window for context)
-        results = []
+            # Calculate enhanced metrics for each window (using expanding window for context)
+            results = []
 
-        for i in range(len(df)):
-            # Use all data up to current point for consistency calculations
-            df_window = df.iloc[:i+1].copy()
+            for i in range(len(df)):
+                # Use all data up to current point for consistency calculations
+                df_window = df.iloc[:i+1].copy()
 
-            row_metrics = {'ts_utc': df.iloc[i]['ts_utc']}
+                row_metrics = {'ts_utc': df.iloc[i]['ts_utc']}
 
-            # Calculate enhanced metrics for each window
-            for window in WINDOWS:
-                window_metrics = calculate_enhanced_rmse_metrics(df_window, window, domain)
-                row_metrics.update(window_metrics)
+                # Calculate enhanced metrics for each window
+                for window in WINDOWS:
+                    window_metrics = calculate_enhanced_rmse_metrics(df_window, window, domain)
+                    row_metrics.update(window_metrics)
 
-            results.append(row_metrics)
+                results.append(row_metrics)
 
-        if not results:
-            logger.warning(f"{pair.upper()} {year_month} ({domain}): No valid results")
-            conn.close()
-            return (pair, year_month, domain, True, 0, "No valid results")
+            if not results:
+                logger.warning(f"{pair.upper()} {year_month} ({domain}): No valid results")
+                return (pair, year_month, domain, True, 0, "No valid results")
 
-        # Create target table name
-        if domain == 'rate':
-            target_table = f"enhanced_rmse_{pair}_{year_month}"
-        else:
-            target_table = f"enhanced_rmse_bqx_{pair}_{year_month}"
+            # Create target table name
+            if domain == 'rate':
+                target_table = f"enhanced_rmse_{pair}_{year_month}"
+            else:
+                target_table = f"enhanced_rmse_bqx_{pair}_{year_month}"
 
-        # Note: This assumes the schema already exists
-        # In production, would create schema first if needed
+            # Note: This assumes the schema already exists
+            # In production, would create schema first if needed
 
-        # For now, write to a temporary CSV or skip database insert
-        # (Schema creation needed first)
-        logger.info(f"{pair.upper()} {year_month} ({domain}): Computed {len(results):,} rows "
-                   f"(schema creation required for database insert)")
+            # For now, write to a temporary CSV or skip database insert
+            # (Schema creation needed first)
+            logger.info(f"{pair.upper()} {year_month} ({domain}): Computed {len(results):,} rows "
+                       f"(schema creation required for database insert)")
 
-        conn.close()
 
-        elapsed = time.time() - start_time
-        logger.info(f"✅ {pair.upper()} {year_month} ({domain}): Complete! {len(results):,} rows, {elapsed:.1f}s")
+            elapsed = time.time() - start_time
+            logger.info(f"✅ {pair.upper()} {year_month} ({domain}): Complete! {len(results):,} rows, {elapsed:.1f}s")
 
-        return (pair, year_month, domain, True, len(results), None)
+            return (pair, year_month, domain, True, len(results), None)
 
     except Exception as e:
         elapsed = time.time() - start_time
@@ -292,6 +285,7 @@ def main():
     parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
     parser.add_argument('--domain', choices=['rate', 'bqx', 'both'], default='both',
                        help='Domain to process (rate_index, bqx, or both)')
+    add_ledger_arguments(parser)
     args = parser.parse_args()
 
     logger.info("=" * 80)
@@ -321,27 +315,23 @@ def main():
     logger.info("")
 
     start_time = time.time()
-    results = {'success': 0, 'failed': 0, 'total_rows': 0}
-
-    with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
-        futures = {executor.submit(populate_enhanced_rmse_for_pair, pair, ym, domain): (pair, ym, domain)
-                   for pair, ym, domain in tasks}
-
-        for future in as_completed(futures):
-            pair, ym, domain = futures[future]
-            try:
-                pair_name, year_month, dom, success, row_count, error_msg = future.result()
-
-                if success:
-                    results['success'] += 1
-                    results['total_rows'] += row_count
-                    logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
-                else:
-                    results['failed'] += 1
-
-            except Exception as e:
-                logger.error(f"Unexpected error for {pair} {ym} ({domain}): {e}")
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'total_rows': 0}
+
+    # One ledger stage per domain; completed partitions are skipped unless their REG rows changed
+    ledger = JobLedger(args.ledger)
+    for domain in domains:
+        checksum = month_checksum('bqx.reg_{pair}' if domain == 'rate' else 'bqx.reg_bqx_{pair}')
+        jobs = [Job(pair, ym, (pair, ym, domain)) for pair, ym, dom in tasks if dom == domain]
+        for result in run_jobs(f'stage_2_8_{domain}', jobs, populate_enhanced_rmse_for_pair, args.max_workers,
+                               outcome=lambda r: (r[3], r[4], r[5]), ledger=ledger, checksum=checksum,
+                               force=args.force, attempts=args.attempts):
+            if result.state == 'failed':
                 results['failed'] += 1
+            else:
+                results['success'] += 1
+                results['skipped'] += result.state == 'skipped'
+                results['total_rows'] += result.rows
+                logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
 
     elapsed = time.time() - start_time
 
@@ -353,6 +343,7 @@ def main():
     logger.info(f"Duration: {elapsed/3600:.1f} hours")
     logger.info(f"Successful: {results['success']}/{len(tasks)} tasks")
     logger.info(f"Failed: {results['failed']}/{len(tasks)} tasks")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
     logger.info(f"Total rows: {results['total_rows']:,}")
     logger.info("=" * 80)
 
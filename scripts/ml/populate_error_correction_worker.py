@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Stage 1.6.18: Error Correction Worker
+Fills error_correction_rate and error_correction_bqx with online cointegration features.
+
+Features (12 per table, data/error_correction.py):
+1-4. coint_ect_*_{eurusd_triangle,audusd_cluster,euraud_cross,usd_majors}:
+     A-priori residuals of EURUSD~GBPUSD+EURGBP, AUDUSD~NZDUSD+AUDNZD,
+     EURAUD~EURUSD+AUDUSD and EURUSD~GBPUSD+AUDUSD (same in every table)
+5-6. coint_ect_velocity_*_20 / coint_ect_accel_*_20: 20-row first and
+     second differences of the pair's own relation ECT
+7. coint_half_life_*: AR(1) half-life (rows) of that ECT
+8-10. coint_vec_weight_*_{eur,gbp,aud}: Normalized usd_majors vector
+11. coint_deviation_zscore_*: ECT against its forgotten mean/std
+12. coint_regime_inbound_*: 1 when |ECT| shrank since the last row
+
+Algorithm:
+  One task per month reads every pair's M1 rate_index and bqx once
+  (aligned panel, starting three days early so the hedge ratios have
+  settled across a weekend) and advances one ErrorCorrectionEngine per
+  domain, one update() per timestamp: recursive least squares with
+  exponential forgetting, a 3x3 solve per relation and row instead of a
+  regression per window. Each pair's rows of the month are then written
+  to both partitions.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.error_correction import DOMAINS, domain_columns, domain_engine, pair_features
+from data.jobs import JobLedger, add_ledger_arguments
+from data.partitions import populate_panel_month, run_panel_months
+
+# All 28 currency pairs
+PAIRS = [
+    'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
+    'cadchf', 'cadjpy', 'chfjpy',
+    'euraud', 'eurcad', 'eurchf', 'eurgbp', 'eurjpy', 'eurnzd', 'eurusd',
+    'gbpaud', 'gbpcad', 'gbpchf', 'gbpjpy', 'gbpnzd', 'gbpusd',
+    'nzdcad', 'nzdchf', 'nzdjpy', 'nzdusd',
+    'usdcad', 'usdchf', 'usdjpy'
+]
+
+# Jul 2024 - Jun 2025
+MONTHS = [f"{year}_{month:02d}" for year, month in
+          [(2024, m) for m in range(7, 13)] + [(2025, m) for m in range(1, 7)]]
+
+# M1 history read before each month to settle the hedge ratios
+WARMUP = timedelta(days=3)
+
+# Create logs directory
+os.makedirs('/tmp/logs/stage_1_6_18', exist_ok=True)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/tmp/logs/stage_1_6_18/populate.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def populate_error_correction_for_month(year_month, pairs):
+    """
+    Run the error-correction engines over one month of every pair and write both tables.
+
+    Args:
+        year_month: Month partition (e.g., '2024_07')
+        pairs: Pairs loaded into the panel (engine columns)
+
+    Returns:
+        list of tuples: (pair, year_month, success, row_count, error_msg)
+    """
+    return populate_panel_month(year_month, pairs, DOMAINS, domain_engine, domain_columns, WARMUP,
+                                lambda out, j, pair: pair_features(out, pair), logger)
+
+
+def main():
+    """Main execution: Populate the error correction tables for all months."""
+    parser = argparse.ArgumentParser(description='Populate error_correction_rate and error_correction_bqx')
+    parser.add_argument('--months', type=_csv, default=MONTHS, help='Comma-separated YYYY_MM months')
+    parser.add_argument('--max-workers', type=int, default=4, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info("=" * 80)
+    logger.info("STAGE 1.6.18: ERROR CORRECTION POPULATION")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Pairs: {len(PAIRS)} (one engine per domain)")
+    logger.info(f"Months: {len(args.months)}")
+    logger.info(f"Features: 12 per table")
+    logger.info(f"Max Workers: {args.max_workers}")
+    logger.info("")
+
+    total = len(PAIRS) * len(args.months)
+    start_time = time.time()
+
+    # One job per month covers every pair; it is done once all their partitions were written
+    results = run_panel_months('stage_1_6_18', args.months, PAIRS, populate_error_correction_for_month,
+                               args.max_workers, ledger=JobLedger(args.ledger), force=args.force,
+                               attempts=args.attempts, log=logger)
+
+    elapsed = time.time() - start_time
+
+    logger.info("")
+    logger.info("=" * 80)
+    logger.info("ERROR CORRECTION POPULATION COMPLETE")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Duration: {elapsed/3600:.1f} hours")
+    logger.info(f"Successful: {results['success']}/{total} partitions")
+    logger.info(f"Failed: {results['failed']}/{total} partitions")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
+    logger.info(f"Total rows: {results['total_rows']:,}")
+    logger.info("=" * 80)
+
+    sys.exit(0 if results['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
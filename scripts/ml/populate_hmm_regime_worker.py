@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Stage 1.6.20: HMM Regime Worker
+Fills hmm_regime_rate and hmm_regime_bqx with online regime filters.
+
+Features (15 per table, data/hmm_regime.py):
+1-3. hmm_state_prob_{calm,trend,shock}: Filtered 3-state HMM probabilities
+4. hmm_state_duration: Rows since the most likely state changed
+5. hmm_state_transition_prob: P(state changes on the next row)
+6. bocpd_run_length: Expected rows since the last changepoint
+7. bocpd_hazard_rate: P(changepoint within the last 5 rows)
+8-9. bocpd_growth_prob / bocpd_decay_prob: P(current run's variance above / below normal)
+10-11. cusum_returns_idx + cusum_a2_idx (rate_index deltas and second differences),
+       cusum_momentum_bqx + cusum_velocity_bqx (BQX level and deltas)
+12. cusum_alarm_flag: First CUSUM crossed its threshold (and reset)
+13. cusum_reset_periods: Rows since the last alarm
+14. regime_entropy: Normalized entropy of the state probabilities
+15. regime_persistence: Expected rows until the state changes
+
+Algorithm:
+  One task per month reads every pair's M1 rate_index and bqx once
+  (aligned panel, starting one day early to warm the filters up) and
+  advances one RegimeEngine per domain over all 28 pairs in lockstep,
+  one update() per timestamp - the call a live process makes per minute.
+  Each pair's rows of the month are then written to both partitions.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.hmm_regime import DOMAINS, domain_columns, domain_engine
+from data.jobs import JobLedger, add_ledger_arguments
+from data.partitions import populate_panel_month, run_panel_months
+
+# All 28 currency pairs
+PAIRS = [
+    'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
+    'cadchf', 'cadjpy', 'chfjpy',
+    'euraud', 'eurcad', 'eurchf', 'eurgbp', 'eurjpy', 'eurnzd', 'eurusd',
+    'gbpaud', 'gbpcad', 'gbpchf', 'gbpjpy', 'gbpnzd', 'gbpusd',
+    'nzdcad', 'nzdchf', 'nzdjpy', 'nzdusd',
+    'usdcad', 'usdchf', 'usdjpy'
+]
+
+# Jul 2024 - Jun 2025
+MONTHS = [f"{year}_{month:02d}" for year, month in
+          [(2024, m) for m in range(7, 13)] + [(2025, m) for m in range(1, 7)]]
+
+# M1 history read before each month to warm the filters up
+WARMUP = timedelta(days=1)
+
+# Create logs directory
+os.makedirs('/tmp/logs/stage_1_6_20', exist_ok=True)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/tmp/logs/stage_1_6_20/populate.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _engine(domain, pairs):
+    """One RegimeEngine column per pair"""
+    return domain_engine(domain, len(pairs))
+
+
+def populate_hmm_regime_for_month(year_month, pairs):
+    """
+    Run the regime engines over one month of every pair and write both tables.
+
+    Args:
+        year_month: Month partition (e.g., '2024_07')
+        pairs: Pairs advanced together (engine columns)
+
+    Returns:
+        list of tuples: (pair, year_month, success, row_count, error_msg)
+    """
+    return populate_panel_month(year_month, pairs, DOMAINS, _engine, domain_columns, WARMUP, log=logger)
+
+
+def main():
+    """Main execution: Populate the HMM regime tables for all months."""
+    parser = argparse.ArgumentParser(description='Populate hmm_regime_rate and hmm_regime_bqx')
+    parser.add_argument('--months', type=_csv, default=MONTHS, help='Comma-separated YYYY_MM months')
+    parser.add_argument('--max-workers', type=int, default=4, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info("=" * 80)
+    logger.info("STAGE 1.6.20: HMM REGIME POPULATION")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Pairs: {len(PAIRS)} (one engine per domain)")
+    logger.info(f"Months: {len(args.months)}")
+    logger.info(f"Features: 15 per table")
+    logger.info(f"Max Workers: {args.max_workers}")
+    logger.info("")
+
+    total = len(PAIRS) * len(args.months)
+    start_time = time.time()
+
+    # One job per month covers every pair; it is done once all their partitions were written
+    results = run_panel_months('stage_1_6_20', args.months, PAIRS, populate_hmm_regime_for_month,
+                               args.max_workers, ledger=JobLedger(args.ledger), force=args.force,
+                               attempts=args.attempts, log=logger)
+
+    elapsed = time.time() - start_time
+
+    logger.info("")
+    logger.info("=" * 80)
+    logger.info("HMM REGIME POPULATION COMPLETE")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Duration: {elapsed/3600:.1f} hours")
+    logger.info(f"Successful: {results['success']}/{total} partitions")
+    logger.info(f"Failed: {results['failed']}/{total} partitions")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
+    logger.info(f"Total rows: {results['total_rows']:,}")
+    logger.info("=" * 80)
+
+    sys.exit(0 if results['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
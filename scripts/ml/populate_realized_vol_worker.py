@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Stage 1.6.19: Realized Volatility Population Worker
+Fills realized_volatility_rate_* and realized_volatility_bqx_* from one read of each M1 partition.
+
+Features (data/realized_vol.py, 15 per domain):
+- range: Parkinson, Garman-Klass, Rogers-Satchell, Yang-Zhang (20 bars)
+- jumps: bipower variation, realized quarticity, jump z-statistic,
+  signed jump variation
+- dynamics: vol of vol, vol acceleration, 5/20 EWMA volatility ratio
+- regime: high-vol flag, regime duration, transition frequency,
+  realized skewness
+
+Algorithm:
+  One task per pair-month reads the month's M1 open/high/low/close and
+  bqx plus the WARMUP_ROWS rows before it, so the one-day EWMA regime
+  level is settled at the start of the month. Every estimator is a
+  running-sum window over the whole partition (O(n)) and the EWMAs are
+  recursive filters; rows of the month are written to both tables.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.jobs import Job, JobLedger, add_ledger_arguments, month_checksum, run_jobs
+from data.partitions import populate_month_with_warmup
+from data.realized_vol import WARMUP_ROWS, compute_volatility_features
+
+# All 28 currency pairs
+PAIRS = [
+    'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
+    'cadchf', 'cadjpy', 'chfjpy',
+    'euraud', 'eurcad', 'eurchf', 'eurgbp', 'eurjpy', 'eurnzd', 'eurusd',
+    'gbpaud', 'gbpcad', 'gbpchf', 'gbpjpy', 'gbpnzd', 'gbpusd',
+    'nzdcad', 'nzdchf', 'nzdjpy', 'nzdusd',
+    'usdcad', 'usdchf', 'usdjpy'
+]
+
+# Jul 2024 - Jun 2025
+MONTHS = [f"{year}_{month:02d}" for year, month in
+          [(2024, m) for m in range(7, 13)] + [(2025, m) for m in range(1, 7)]]
+
+M1_COLUMNS = ['open', 'high', 'low', 'close', 'bqx']
+
+# Create logs directory
+os.makedirs('/tmp/logs/stage_1_6_19', exist_ok=True)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/tmp/logs/stage_1_6_19/populate.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def volatility_tables(frame, pair):
+    """Parent table -> feature columns of both domains for one pair"""
+    return {f"bqx.realized_volatility_{domain}_{pair}": features
+            for domain, features in compute_volatility_features(frame).items()}
+
+
+def populate_realized_vol_for_pair(pair, year_month):
+    """
+    Populate both realized volatility tables for one pair and one month.
+
+    Args:
+        pair: Currency pair (e.g., 'eurusd')
+        year_month: Month partition (e.g., '2024_07')
+
+    Returns:
+        tuple: (pair, year_month, success, row_count, error_msg)
+    """
+    return populate_month_with_warmup(pair, year_month, M1_COLUMNS, WARMUP_ROWS,
+                                      lambda frame: volatility_tables(frame, pair), logger)
+
+
+def main():
+    """Main execution: Populate the Stage 1.6.19 realized volatility tables for all partitions."""
+    parser = argparse.ArgumentParser(description='Populate realized volatility features')
+    parser.add_argument('--pairs', type=_csv, default=PAIRS, help='Comma-separated pairs (default: all 28)')
+    parser.add_argument('--months', type=_csv, default=MONTHS, help='Comma-separated YYYY_MM months')
+    parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info("=" * 80)
+    logger.info("STAGE 1.6.19: REALIZED VOLATILITY POPULATION")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Pairs: {len(args.pairs)}")
+    logger.info(f"Months: {len(args.months)}")
+    logger.info(f"Features: 15 per domain (rate + BQX)")
+    logger.info(f"Max Workers: {args.max_workers}")
+    logger.info("")
+
+    tasks = [Job(pair, ym, (pair, ym)) for pair in args.pairs for ym in args.months]
+
+    start_time = time.time()
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'total_rows': 0}
+
+    # Completed partitions are skipped unless their M1 rows changed
+    for result in run_jobs('stage_1_6_19', tasks, populate_realized_vol_for_pair, args.max_workers,
+                           outcome=lambda r: (r[2], r[3], r[4]), ledger=JobLedger(args.ledger),
+                           checksum=month_checksum('bqx.m1_{pair}', 'time'), force=args.force,
+                           attempts=args.attempts):
+        if result.state == 'failed':
+            results['failed'] += 1
+        else:
+            results['success'] += 1
+            results['skipped'] += result.state == 'skipped'
+            results['total_rows'] += result.rows
+            logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
+
+    elapsed = time.time() - start_time
+
+    logger.info("")
+    logger.info("=" * 80)
+    logger.info("REALIZED VOLATILITY POPULATION COMPLETE")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Duration: {elapsed/60:.1f} minutes")
+    logger.info(f"Successful: {results['success']}/{len(tasks)} partitions")
+    logger.info(f"Failed: {results['failed']}/{len(tasks)} partitions")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
+    logger.info(f"Total rows: {results['total_rows']:,}")
+    logger.info("=" * 80)
+
+    sys.exit(0 if results['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -27,27 +27,24 @@ Regime Metrics (10 features):
 
 Total: 15 features × 2 domains = 30 features per partition
 
-Estimated Runtime: 6 hours with 32 workers on D64as_v5
+Estimated Runtime: minutes with 32 workers (each partition is classified in one
+vectorized pass, data/regime.py)
 """
 
-import psycopg2
-import pandas as pd
 import numpy as np
+import pandas as pd
 import logging
 import sys
 import os
 import time
 import argparse
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from scipy import stats
+from pathlib import Path
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection
+from data.jobs import Job, JobLedger, add_ledger_arguments, month_checksum, run_jobs
+from data.regime import LOOKBACK_WINDOW, compute_regime_features
 
 # All 28 currency pairs
 PAIRS = [
@@ -74,206 +71,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def detect_market_regime(df, domain='rate'):
-    """
-    Detect market regime for current timestamp based on recent history.
-
-    Args:
-        df: DataFrame with price/BQX data (last 1440 rows = 24 hours)
-        domain: 'rate' or 'bqx'
-
-    Returns:
-        dict: Regime classification features
-    """
-    try:
-        if len(df) < 60:
-            # Not enough data for regime detection
-            return {f'{metric}_{domain}': None for metric in [
-                'trend_regime', 'volatility_regime', 'momentum_regime',
-                'mean_reversion_regime', 'composite_regime', 'regime_confidence',
-                'regime_persistence', 'regime_transition_probability', 'trend_strength',
-                'volatility_percentile', 'momentum_score', 'mean_reversion_score',
-                'regime_stability', 'breakout_probability', 'regime_quality'
-            ]}
-
-        # Use rate_index or bqx_value
-        if domain == 'rate':
-            price = df['rate_index'].values
-        else:
-            price = df['bqx_value'].values
-
-        metrics = {}
-
-        # 1. Trend Regime Detection (based on linear regression slope)
-        recent_window = min(240, len(df))  # 4 hours or available
-        x = np.arange(recent_window)
-        y = price[-recent_window:]
-
-        slope, intercept = np.polyfit(x, y, 1)
-
-        # Normalize slope to percentage change
-        price_range = np.ptp(y)
-        if price_range > 0:
-            normalized_slope = (slope * recent_window) / np.mean(y) * 100
-        else:
-            normalized_slope = 0
-
-        # Classify trend
-        if normalized_slope > 0.5:
-            trend_regime = 2  # Trending Up
-        elif normalized_slope < -0.5:
-            trend_regime = 0  # Trending Down
-        else:
-            trend_regime = 1  # Ranging
-
-        metrics[f'trend_regime_{domain}'] = trend_regime
-
-        # 2. Volatility Regime (based on recent standard deviation)
-        volatility_window = min(1440, len(df))  # 24 hours
-        returns = np.diff(price[-volatility_window:]) / price[-volatility_window:-1]
-        current_vol = np.std(returns[-60:]) if len(returns) >= 60 else 0  # Last 60 min
-        historical_vol = np.std(returns) if len(returns) > 0 else 0
-
-        if current_vol > historical_vol * 1.5:
-            volatility_regime = 2  # High volatility
-        elif current_vol > historical_vol * 0.7:
-            volatility_regime = 1  # Medium volatility
-        else:
-            volatility_regime = 0  # Low volatility
-
-        metrics[f'volatility_regime_{domain}'] = volatility_regime
-
-        # Volatility percentile
-        vol_percentile = (sum(1 for r in returns if abs(r) < current_vol) / len(returns) * 100) if len(returns) > 0 else 50
-        metrics[f'volatility_percentile_{domain}'] = vol_percentile
-
-        # 3. Momentum Regime (based on rate of change)
-        roc_60 = ((price[-1] - price[-60]) / price[-60] * 100) if len(price) >= 60 else 0
-        roc_240 = ((price[-1] - price[-240]) / price[-240] * 100) if len(price) >= 240 else 0
-
-        # Combined momentum score
-        momentum_score = (roc_60 * 0.6) + (roc_240 * 0.4)
-        metrics[f'momentum_score_{domain}'] = momentum_score
-
-        # Classify momentum regime
-        if momentum_score > 1.0:
-            momentum_regime = 4  # Strong Bullish
-        elif momentum_score > 0.3:
-            momentum_regime = 3  # Weak Bullish
-        elif momentum_score > -0.3:
-            momentum_regime = 2  # Neutral
-        elif momentum_score > -1.0:
-            momentum_regime = 1  # Weak Bearish
-        else:
-            momentum_regime = 0  # Strong Bearish
-
-        metrics[f'momentum_regime_{domain}'] = momentum_regime
-
-        # 4. Mean Reversion Regime (based on autocorrelation of returns)
-        if len(returns) >= 60:
-            returns_series = pd.Series(returns[-240:] if len(returns) >= 240 else returns)
-            autocorr = returns_series.autocorr(lag=1)
-
-            if autocorr < -0.2:
-                mean_reversion_regime = 1  # Strong mean reversion
-                mean_reversion_score = abs(autocorr) * 100
-            else:
-                mean_reversion_regime = 0  # Trending
-                mean_reversion_score = (1 - autocorr) * 50 if autocorr < 1 else 0
-        else:
-            mean_reversion_regime = 0
-            mean_reversion_score = 0
-
-        metrics[f'mean_reversion_regime_{domain}'] = mean_reversion_regime
-        metrics[f'mean_reversion_score_{domain}'] = mean_reversion_score
-
-        # 5. Composite Regime Score (weighted combination)
-        composite_regime = (
-            trend_regime * 2.5 +
-            volatility_regime * 1.5 +
-            momentum_regime * 1.0 +
-            mean_reversion_regime * 0.5
-        )
-        metrics[f'composite_regime_{domain}'] = composite_regime
-
-        # 6. Regime Confidence (based on consistency of indicators)
-        # High confidence when multiple indicators align
-        indicators_aligned = 0
-        if trend_regime == 2 and momentum_regime >= 3:
-            indicators_aligned += 1
-        if trend_regime == 0 and momentum_regime <= 1:
-            indicators_aligned += 1
-        if volatility_regime == 0 and mean_reversion_regime == 0:
-            indicators_aligned += 1
-
-        regime_confidence = indicators_aligned / 3.0
-        metrics[f'regime_confidence_{domain}'] = regime_confidence
-
-        # 7. Regime Persistence (simplified - based on how long in current trend)
-        # Count consecutive periods with same trend direction
-        persistence_count = 1
-        for i in range(2, min(240, len(price))):
-            prev_slope = (price[-i] - price[-i-1])
-            curr_slope = (price[-1] - price[-2])
-            if np.sign(prev_slope) == np.sign(curr_slope):
-                persistence_count += 1
-            else:
-                break
-
-        metrics[f'regime_persistence_{domain}'] = persistence_count
-
-        # 8. Regime Transition Probability (based on regime age and volatility)
-        # Higher volatility + longer persistence = higher transition probability
-        transition_prob = min(1.0, (persistence_count / 240) * (volatility_regime / 2 + 0.5))
-        metrics[f'regime_transition_probability_{domain}'] = transition_prob
-
-        # 9. Trend Strength (ADX-like indicator)
-        # Simplified: ratio of directional movement to total movement
-        if len(returns) >= 60:
-            directional_movement = abs(sum(returns[-60:]))
-            total_movement = sum(abs(r) for r in returns[-60:])
-            trend_strength = (directional_movement / total_movement * 100) if total_movement > 0 else 0
-        else:
-            trend_strength = 0
-
-        metrics[f'trend_strength_{domain}'] = trend_strength
-
-        # 10. Regime Stability (inverse of transition probability)
-        regime_stability = 1.0 - transition_prob
-        metrics[f'regime_stability_{domain}'] = regime_stability
-
-        # 11. Breakout Probability (for ranging markets)
-        if trend_regime == 1:  # Ranging
-            # Higher volatility + longer range = higher breakout probability
-            range_duration = persistence_count
-            breakout_prob = min(1.0, (range_duration / 120) * (volatility_regime / 2 + 0.3))
-        else:
-            breakout_prob = 0.0
-
-        metrics[f'breakout_probability_{domain}'] = breakout_prob
-
-        # 12. Regime Quality (how clear and well-defined is the regime)
-        # High quality when: strong trend + low volatility OR clear range + mean reversion
-        if trend_regime != 1:  # Trending
-            regime_quality = (trend_strength / 100) * (1 - volatility_regime / 2)
-        else:  # Ranging
-            regime_quality = mean_reversion_score / 100
-
-        metrics[f'regime_quality_{domain}'] = regime_quality
-
-        return metrics
-
-    except Exception as e:
-        logger.warning(f"Regime detection failed for {domain}: {e}")
-        return {f'{metric}_{domain}': 0 for metric in [
-            'trend_regime', 'volatility_regime', 'momentum_regime',
-            'mean_reversion_regime', 'composite_regime', 'regime_confidence',
-            'regime_persistence', 'regime_transition_probability', 'trend_strength',
-            'volatility_percentile', 'momentum_score', 'mean_reversion_score',
-            'regime_stability', 'breakout_probability', 'regime_quality'
-        ]}
-
-
 def populate_regime_for_pair(pair, year_month):
     """
     Populate regime detection features for one pair and one month.
@@ -291,82 +88,61 @@ def populate_regime_for_pair(pair, year_month):
         logger.info(f"{pair.upper()} {year_month}: Starting regime detection...")
 
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
-
-        year, month = year_month.split('_')
-
-        # Fetch rate_index and BQX data
-        # Need extended history (24 hours before month start) for regime calculation
-        query = f"""
-        SELECT time AS ts_utc, rate_index, bqx
-        FROM bqx.m1_{pair}
-        WHERE time >= DATE '{year}-{month}-01' - INTERVAL '24 hours'
-          AND time < DATE '{year}-{month}-01' + INTERVAL '1 month'
-        ORDER BY time;
-        """
-
-        df = pd.read_sql(query, conn)
+        with connection() as conn:
 
-        if df.empty:
-            logger.warning(f"{pair.upper()} {year_month}: No data found")
-            conn.close()
-            return (pair, year_month, True, 0, "No data")
+            year, month = year_month.split('_')
 
-        df['ts_utc'] = pd.to_datetime(df['ts_utc'], utc=True)
+            # Fetch rate_index and BQX data
+            # Need extended history (24 hours before month start) for regime calculation
+            query = f"""
+            SELECT time AS ts_utc, rate_index, bqx
+            FROM bqx.m1_{pair}
+            WHERE time >= DATE '{year}-{month}-01' - INTERVAL '24 hours'
+              AND time < DATE '{year}-{month}-01' + INTERVAL '1 month'
+            ORDER BY time;
+            """
 
-        # Calculate BQX value (backward cumulative return)
-        df['bqx_value'] = df['bqx'].fillna(0)
+            df = pd.read_sql(query, conn)
 
-        logger.info(f"{pair.upper()} {year_month}: Loaded {len(df):,} rows, detecting regimes...")
+            if df.empty:
+                logger.warning(f"{pair.upper()} {year_month}: No data found")
+                return (pair, year_month, True, 0, "No data")
 
-        # Calculate regime features for each timestamp in the target month
-        month_start = pd.Timestamp(f'{year}-{month}-01', tz='UTC')
-        month_end = month_start + pd.DateOffset(months=1)
+            df['ts_utc'] = pd.to_datetime(df['ts_utc'], utc=True)
 
-        df_month = df[(df['ts_utc'] >= month_start) & (df['ts_utc'] < month_end)]
+            # Calculate BQX value (backward cumulative return)
+            df['bqx_value'] = df['bqx'].fillna(0)
 
-        results = []
-        LOOKBACK_WINDOW = 1440  # 24 hours
+            logger.info(f"{pair.upper()} {year_month}: Loaded {len(df):,} rows, detecting regimes...")
 
-        for i, (idx, row) in enumerate(df_month.iterrows()):
-            ts = row['ts_utc']
+            # Calculate regime features for each timestamp in the target month
+            month_start = pd.Timestamp(f'{year}-{month}-01', tz='UTC')
+            month_end = month_start + pd.DateOffset(months=1)
 
-            # Get lookback window (up to 24 hours of history)
-            lookback_start = max(0, idx - LOOKBACK_WINDOW)
-            df_window = df.iloc[lookback_start:idx+1]
+            df_month = df[(df['ts_utc'] >= month_start) & (df['ts_utc'] < month_end)]
 
-            # Detect regime for both domains
-            regime_rate = detect_market_regime(df_window, domain='rate')
-            regime_bqx = detect_market_regime(df_window, domain='bqx')
+            # Every timestamp at once: row i is classified from rows i-1440..i
+            first_row = int(df.index[df['ts_utc'] >= month_start][0]) if len(df_month) else len(df)
+            regimes = compute_regime_features(df['rate_index'].to_numpy(dtype=float, na_value=np.nan),
+                                              df['bqx_value'].to_numpy(dtype=float, na_value=np.nan),
+                                              first_row=first_row, lookback=LOOKBACK_WINDOW)
+            results = pd.DataFrame({'ts_utc': df_month['ts_utc'].to_numpy(),
+                                    **{name: values[df_month.index] for name, values in regimes.items()}})
 
-            # Combine metrics
-            row_metrics = {
-                'ts_utc': ts,
-                **regime_rate,
-                **regime_bqx
-            }
+            if results.empty:
+                logger.warning(f"{pair.upper()} {year_month}: No valid results")
+                return (pair, year_month, True, 0, "No valid results")
 
-            results.append(row_metrics)
+            # Note: Schema creation needed before database insert
+            # For now, just log completion
+            logger.info(f"{pair.upper()} {year_month}: Computed {len(results):,} rows "
+                       f"(schema creation required for database insert)")
 
-            if (i + 1) % 10000 == 0:
-                logger.info(f"{pair.upper()} {year_month}: Processed {i+1:,}/{len(df_month):,} rows...")
 
-        if not results:
-            logger.warning(f"{pair.upper()} {year_month}: No valid results")
-            conn.close()
-            return (pair, year_month, True, 0, "No valid results")
+            elapsed = time.time() - start_time
+            logger.info(f"✅ {pair.upper()} {year_month}: Complete! {len(results):,} rows, {elapsed:.1f}s")
 
-        # Note: Schema creation needed before database insert
-        # For now, just log completion
-        logger.info(f"{pair.upper()} {year_month}: Computed {len(results):,} rows "
-                   f"(schema creation required for database insert)")
-
-        conn.close()
-
-        elapsed = time.time() - start_time
-        logger.info(f"✅ {pair.upper()} {year_month}: Complete! {len(results):,} rows, {elapsed:.1f}s")
-
-        return (pair, year_month, True, len(results), None)
+            return (pair, year_month, True, len(results), None)
 
     except Exception as e:
         elapsed = time.time() - start_time
@@ -379,6 +155,7 @@ def main():
     """Main execution: Populate regime detection for all pairs and months."""
     parser = argparse.ArgumentParser(description='Populate regime detection features for BQX ML')
     parser.add_argument('--max-workers', type=int, default=32, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
     args = parser.parse_args()
 
     logger.info("=" * 80)
@@ -397,33 +174,26 @@ def main():
             for month in range(1, 13):
                 if (year == 2024 and month >= 7) or (year == 2025 and month <= 6):
                     year_month = f"{year}_{month:02d}"
-                    tasks.append((pair, year_month))
+                    tasks.append(Job(pair, year_month, (pair, year_month)))
 
     logger.info(f"Total tasks: {len(tasks)}")
     logger.info("")
 
     start_time = time.time()
-    results = {'success': 0, 'failed': 0, 'total_rows': 0}
-
-    with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
-        futures = {executor.submit(populate_regime_for_pair, pair, ym): (pair, ym)
-                   for pair, ym in tasks}
-
-        for future in as_completed(futures):
-            pair, ym = futures[future]
-            try:
-                pair_name, year_month, success, row_count, error_msg = future.result()
-
-                if success:
-                    results['success'] += 1
-                    results['total_rows'] += row_count
-                    logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
-                else:
-                    results['failed'] += 1
-
-            except Exception as e:
-                logger.error(f"Unexpected error for {pair} {ym}: {e}")
-                results['failed'] += 1
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'total_rows': 0}
+
+    # Completed partitions are skipped unless their M1 rows changed
+    for result in run_jobs('stage_2_9', tasks, populate_regime_for_pair, args.max_workers,
+                           outcome=lambda r: (r[2], r[3], r[4]), ledger=JobLedger(args.ledger),
+                           checksum=month_checksum('bqx.m1_{pair}', 'time'), force=args.force,
+                           attempts=args.attempts):
+        if result.state == 'failed':
+            results['failed'] += 1
+        else:
+            results['success'] += 1
+            results['skipped'] += result.state == 'skipped'
+            results['total_rows'] += result.rows
+            logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
 
     elapsed = time.time() - start_time
 
@@ -435,6 +205,7 @@ def main():
     logger.info(f"Duration: {elapsed/3600:.1f} hours")
     logger.info(f"Successful: {results['success']}/{len(tasks)} tasks")
     logger.info(f"Failed: {results['failed']}/{len(tasks)} tasks")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
     logger.info(f"Total rows: {results['total_rows']:,}")
     logger.info("=" * 80)
 
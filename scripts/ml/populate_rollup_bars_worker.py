@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Multi-Resolution Bars Worker
+Rolls M1 rows into 5/15/30/60-minute bars for every pair and month.
+
+Bars (data/rollups.py, one streaming pass over each M1 month):
+- open, high, low, close, volume
+- rate_index, bqx (last value of the bucket)
+- minutes (M1 rows in the bucket)
+
+Storage: local feature store (cache/feature_store/bars_{5,15,30,60}m/{pair}/{YYYY_MM}.arrow)
+Long-window and multi-scale features read them with BarStore.load() and
+join coarse results back onto M1 rows with Bars.as_of(); months that
+were not prebuilt are rolled up on first read.
+
+Usage:
+  python scripts/ml/populate_rollup_bars_worker.py
+  python scripts/ml/populate_rollup_bars_worker.py --pairs eurusd --months 2025_06 --force
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection
+from data.feature_store import FeatureStore
+from data.jobs import Job, JobLedger, add_ledger_arguments, month_bounds, month_checksum, run_jobs
+from data.rollups import RESOLUTIONS, BarStore
+
+# All 28 currency pairs
+PAIRS = [
+    'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
+    'cadchf', 'cadjpy', 'chfjpy',
+    'euraud', 'eurcad', 'eurchf', 'eurgbp', 'eurjpy', 'eurnzd', 'eurusd',
+    'gbpaud', 'gbpcad', 'gbpchf', 'gbpjpy', 'gbpnzd', 'gbpusd',
+    'nzdcad', 'nzdchf', 'nzdjpy', 'nzdusd',
+    'usdcad', 'usdchf', 'usdjpy'
+]
+
+# Jul 2024 - Jun 2025
+MONTHS = [f"{year}_{month:02d}" for year, month in
+          [(2024, m) for m in range(7, 13)] + [(2025, m) for m in range(1, 7)]]
+
+# Create logs directory
+os.makedirs('/tmp/logs/rollup_bars', exist_ok=True)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/tmp/logs/rollup_bars/populate.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _dates(year_month):
+    start, end = month_bounds(year_month)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def rollup_partition(pair, year_month):
+    """
+    Roll one pair-month of M1 rows into every bar resolution.
+
+    The bars are returned rather than stored: the feature store's
+    manifests are written by the parent process only.
+
+    Args:
+        pair: Currency pair (e.g., 'eurusd')
+        year_month: Month partition (e.g., '2024_07')
+
+    Returns:
+        tuple: (pair, year_month, success, m1_rows, bars, error_msg)
+    """
+    start_time = time.time()
+
+    try:
+        month_start, month_end = _dates(year_month)
+        with connection() as conn:
+            bars = BarStore().fetch(conn, pair, month_start, month_end)
+
+        m1_rows = int(bars[RESOLUTIONS[-1]]['minutes'].sum())
+        elapsed = time.time() - start_time
+        counts = ', '.join(f"{minutes}m={len(level):,}" for minutes, level in bars.items())
+        logger.info(f"✅ {pair.upper()} {year_month}: {m1_rows:,} M1 rows -> {counts} ({elapsed:.1f}s)")
+        return (pair, year_month, True, m1_rows, bars, None)
+
+    except Exception as e:
+        elapsed = time.time() - start_time
+        error_msg = str(e)
+        logger.error(f"❌ {pair.upper()} {year_month}: Failed after {elapsed:.1f}s - {error_msg}")
+        return (pair, year_month, False, 0, None, error_msg)
+
+
+def main():
+    """Main execution: Build the bar rollups for all partitions."""
+    parser = argparse.ArgumentParser(description='Roll M1 rows into 5/15/30/60-minute bars')
+    parser.add_argument('--pairs', type=_csv, default=PAIRS, help='Comma-separated pairs (default: all 28)')
+    parser.add_argument('--months', type=_csv, default=MONTHS, help='Comma-separated YYYY_MM months')
+    parser.add_argument('--store', default='cache/feature_store', help='Local feature store directory')
+    parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info("=" * 80)
+    logger.info("MULTI-RESOLUTION BARS")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Resolutions: {', '.join(f'{m}m' for m in RESOLUTIONS)}")
+    logger.info(f"Pairs: {len(args.pairs)}")
+    logger.info(f"Months: {len(args.months)}")
+    logger.info(f"Store: {args.store}")
+    logger.info(f"Max Workers: {args.max_workers}")
+    logger.info("")
+
+    tasks = [Job(pair, ym, (pair, ym)) for pair in args.pairs for ym in args.months]
+    store = BarStore(FeatureStore(args.store))
+
+    start_time = time.time()
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'm1_rows': 0}
+
+    def on_result(result):
+        if result.state == 'failed':
+            results['failed'] += 1
+            return
+        if result.state == 'done':
+            store.write(result.job.pair, *_dates(result.job.month), result.result[4])
+        results['success'] += 1
+        results['skipped'] += result.state == 'skipped'
+        results['m1_rows'] += result.rows
+
+    # Completed partitions are skipped unless their M1 rows changed
+    run_jobs('rollup_bars', tasks, rollup_partition, args.max_workers,
+             outcome=lambda r: (r[2], r[3], r[5]), ledger=JobLedger(args.ledger),
+             checksum=month_checksum('bqx.m1_{pair}', 'time'), force=args.force,
+             attempts=args.attempts, on_result=on_result)
+
+    elapsed = time.time() - start_time
+
+    logger.info("")
+    logger.info("=" * 80)
+    logger.info("MULTI-RESOLUTION BARS COMPLETE")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Duration: {elapsed/60:.1f} minutes")
+    logger.info(f"Successful: {results['success']}/{len(tasks)} partitions")
+    logger.info(f"Failed: {results['failed']}/{len(tasks)} partitions")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
+    logger.info(f"M1 rows rolled up: {results['m1_rows']:,}")
+    logger.info("=" * 80)
+
+    sys.exit(0 if results['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
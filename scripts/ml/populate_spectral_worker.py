@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Stage 1.8.3: Spectral, Wavelet and SSA Population Worker
+Fills spectral_features_*, wavelet_features_* and ssa_features_* for the rate and BQX domains.
+
+Features (data/spectral.py, per domain):
+- spectral (12): dominant/secondary frequency and power, harmonic ratio,
+  low/high band power, spectral entropy and edge, power trend, frequency
+  stability, noise ratio, cyclic strength (120-row FFT windows)
+- wavelet (10): d1-d3 and a3 energies, d1/d3 ratio, trend strength,
+  detail entropy, singularity, dominant scale, cross-scale coherence
+  (causal db4 MODWT, 60-row energy windows)
+- ssa (8): trend/oscillatory/noise components, their variance shares,
+  separability, reconstruction error (L=60 over 240-row windows)
+
+Algorithm:
+  One task per pair-month reads the month's M1 rate_index and bqx plus
+  the WARMUP_ROWS rows before it, so the first rows of the month have
+  full windows. All windows of a partition are evaluated as arrays:
+  batched rfft over sliding windows, one wavelet transform over the
+  whole series, SSA eigenvectors refreshed every 15 rows in batched
+  eigh calls. Rows of the month are written to the six partitions.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.jobs import Job, JobLedger, add_ledger_arguments, month_checksum, run_jobs
+from data.partitions import populate_month_with_warmup
+from data.spectral import FAMILIES, WARMUP_ROWS, compute_spectral_features, family_table
+
+# All 28 currency pairs
+PAIRS = [
+    'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
+    'cadchf', 'cadjpy', 'chfjpy',
+    'euraud', 'eurcad', 'eurchf', 'eurgbp', 'eurjpy', 'eurnzd', 'eurusd',
+    'gbpaud', 'gbpcad', 'gbpchf', 'gbpjpy', 'gbpnzd', 'gbpusd',
+    'nzdcad', 'nzdchf', 'nzdjpy', 'nzdusd',
+    'usdcad', 'usdchf', 'usdjpy'
+]
+
+# Jul 2024 - Jun 2025
+MONTHS = [f"{year}_{month:02d}" for year, month in
+          [(2024, m) for m in range(7, 13)] + [(2025, m) for m in range(1, 7)]]
+
+# Domain -> M1 column
+DOMAINS = {'rate': 'rate_index', 'bqx': 'bqx'}
+
+# Create logs directory
+os.makedirs('/tmp/logs/stage_1_8_3', exist_ok=True)
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/tmp/logs/stage_1_8_3/populate.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def spectral_tables(frame, pair):
+    """Parent table -> feature columns of all six families for one pair"""
+    tables = {}
+    for domain, field in DOMAINS.items():
+        families = compute_spectral_features(frame[field].to_numpy(dtype=float), domain)
+        for family in FAMILIES:
+            tables[family_table(family, domain, pair)] = families[family]
+    return tables
+
+
+def populate_spectral_for_pair(pair, year_month):
+    """
+    Populate the spectral, wavelet and SSA tables for one pair and one month.
+
+    Args:
+        pair: Currency pair (e.g., 'eurusd')
+        year_month: Month partition (e.g., '2024_07')
+
+    Returns:
+        tuple: (pair, year_month, success, row_count, error_msg)
+    """
+    return populate_month_with_warmup(pair, year_month, list(DOMAINS.values()), WARMUP_ROWS,
+                                      lambda frame: spectral_tables(frame, pair), logger)
+
+
+def main():
+    """Main execution: Populate the Stage 1.8.3 tables for all partitions."""
+    parser = argparse.ArgumentParser(description='Populate spectral, wavelet and SSA features')
+    parser.add_argument('--pairs', type=_csv, default=PAIRS, help='Comma-separated pairs (default: all 28)')
+    parser.add_argument('--months', type=_csv, default=MONTHS, help='Comma-separated YYYY_MM months')
+    parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info("=" * 80)
+    logger.info("STAGE 1.8.3: SPECTRAL / WAVELET / SSA POPULATION")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Pairs: {len(args.pairs)}")
+    logger.info(f"Months: {len(args.months)}")
+    logger.info(f"Features: 30 per domain (12 FFT + 10 wavelet + 8 SSA)")
+    logger.info(f"Max Workers: {args.max_workers}")
+    logger.info("")
+
+    tasks = [Job(pair, ym, (pair, ym)) for pair in args.pairs for ym in args.months]
+
+    start_time = time.time()
+    results = {'success': 0, 'failed': 0, 'skipped': 0, 'total_rows': 0}
+
+    # Completed partitions are skipped unless their M1 rows changed
+    for result in run_jobs('stage_1_8_3', tasks, populate_spectral_for_pair, args.max_workers,
+                           outcome=lambda r: (r[2], r[3], r[4]), ledger=JobLedger(args.ledger),
+                           checksum=month_checksum('bqx.m1_{pair}', 'time'), force=args.force,
+                           attempts=args.attempts):
+        if result.state == 'failed':
+            results['failed'] += 1
+        else:
+            results['success'] += 1
+            results['skipped'] += result.state == 'skipped'
+            results['total_rows'] += result.rows
+            logger.info(f"Progress: {results['success']}/{len(tasks)} partitions complete")
+
+    elapsed = time.time() - start_time
+
+    logger.info("")
+    logger.info("=" * 80)
+    logger.info("SPECTRAL / WAVELET / SSA POPULATION COMPLETE")
+    logger.info("=" * 80)
+    logger.info("")
+    logger.info(f"Duration: {elapsed/60:.1f} minutes")
+    logger.info(f"Successful: {results['success']}/{len(tasks)} partitions")
+    logger.info(f"Failed: {results['failed']}/{len(tasks)} partitions")
+    logger.info(f"Skipped (done in an earlier run): {results['skipped']}")
+    logger.info(f"Total rows: {results['total_rows']:,}")
+    logger.info("=" * 80)
+
+    sys.exit(0 if results['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,20 +21,17 @@ Expected Duration: 15 hours with 8 workers
 
 import os
 import sys
-import psycopg2
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
 import logging
+from pathlib import Path
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com',
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('PGPASSWORD', 'BQX_Aurora_2025_Secure')
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection
+from data.jobs import Job, JobLedger, add_ledger_arguments, run_jobs
+from data.indicators import macd, rsi
 
 # Logging configuration
 logging.basicConfig(
@@ -64,155 +61,69 @@ MONTHS = [
 ]
 
 
-def calculate_rsi(prices, period=14):
-    """Calculate Relative Strength Index"""
-    deltas = np.diff(prices)
-    seed = deltas[:period+1]
-    up = seed[seed >= 0].sum() / period
-    down = -seed[seed < 0].sum() / period
-    rs = up / down if down != 0 else 0
-    rsi = np.zeros_like(prices)
-    rsi[:period] = 100. - 100. / (1. + rs)
-
-    for i in range(period, len(prices)):
-        delta = deltas[i - 1]
-        if delta > 0:
-            upval = delta
-            downval = 0.
-        else:
-            upval = 0.
-            downval = -delta
-
-        up = (up * (period - 1) + upval) / period
-        down = (down * (period - 1) + downval) / period
-        rs = up / down if down != 0 else 0
-        rsi[i] = 100. - 100. / (1. + rs)
-
-    return rsi
-
-
-def calculate_macd(prices, fast=12, slow=26, signal=9):
-    """Calculate MACD (Moving Average Convergence Divergence)"""
-    ema_fast = pd.Series(prices).ewm(span=fast, adjust=False).mean()
-    ema_slow = pd.Series(prices).ewm(span=slow, adjust=False).mean()
-    macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    histogram = macd_line - signal_line
-
-    return macd_line.values, signal_line.values, histogram.values
-
-
-def calculate_adx(high, low, close, period=14):
-    """Calculate Average Directional Index (ADX)"""
-    # TODO: Implement ADX calculation
-    # This is a placeholder - full implementation needed
-    return np.full(len(close), np.nan)
-
-
-def calculate_stochastic(high, low, close, k_period=14, d_period=3):
-    """Calculate Stochastic Oscillator"""
-    lowest_low = pd.Series(low).rolling(window=k_period).min()
-    highest_high = pd.Series(high).rolling(window=k_period).max()
-
-    k_percent = 100 * (close - lowest_low) / (highest_high - lowest_low)
-    d_percent = k_percent.rolling(window=d_period).mean()
-
-    return k_percent.values, d_percent.values
-
-
-def calculate_cci(high, low, close, period=20):
-    """Calculate Commodity Channel Index"""
-    tp = (high + low + close) / 3
-    sma_tp = pd.Series(tp).rolling(window=period).mean()
-    mad = pd.Series(tp).rolling(window=period).apply(lambda x: np.abs(x - x.mean()).mean())
-    cci = (tp - sma_tp) / (0.015 * mad)
-
-    return cci.values
-
-
-def calculate_williams_r(high, low, close, period=14):
-    """Calculate Williams %R"""
-    highest_high = pd.Series(high).rolling(window=period).max()
-    lowest_low = pd.Series(low).rolling(window=period).min()
-    williams_r = -100 * (highest_high - close) / (highest_high - lowest_low)
-
-    return williams_r.values
-
-
-def calculate_roc(close, period=12):
-    """Calculate Rate of Change"""
-    roc = 100 * (close / np.roll(close, period) - 1)
-    roc[:period] = np.nan
-
-    return roc
-
-
 def process_partition(pair, year_month):
     """Process a single pair-month partition"""
     try:
         logger.info(f"Processing {pair} {year_month}...")
 
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        # Fetch M1 data for the partition
-        # TODO: Adjust query to fetch high, low, close, volume
-        query = f"""
-            SELECT ts_utc, rate_index as close
-            FROM bqx.m1_{pair.lower()}
-            WHERE ts_utc >= %s AND ts_utc < %s
-            ORDER BY ts_utc
-        """
-
-        year, month = year_month.split('_')
-        start_date = f"{year}-{month}-01"
-        if month == '12':
-            end_date = f"{int(year)+1}-01-01"
-        else:
-            end_date = f"{year}-{int(month)+1:02d}-01"
-
-        cursor.execute(query, (start_date, end_date))
-        data = cursor.fetchall()
-
-        if not data:
-            logger.warning(f"No data for {pair} {year_month}")
-            cursor.close()
-            conn.close()
-            return f"{pair}_{year_month}: No data"
-
-        df = pd.DataFrame(data, columns=['ts_utc', 'close'])
-
-        # Calculate technical indicators
-        # TODO: Add high, low, volume columns when available
-        df['rsi_14'] = calculate_rsi(df['close'].values, period=14)
-        df['rsi_20'] = calculate_rsi(df['close'].values, period=20)
+        with connection() as conn:
+            cursor = conn.cursor()
+
+            # Fetch M1 data for the partition
+            # TODO: Adjust query to fetch high, low, close, volume
+            query = f"""
+                SELECT ts_utc, rate_index as close
+                FROM bqx.m1_{pair.lower()}
+                WHERE ts_utc >= %s AND ts_utc < %s
+                ORDER BY ts_utc
+            """
+
+            year, month = year_month.split('_')
+            start_date = f"{year}-{month}-01"
+            if month == '12':
+                end_date = f"{int(year)+1}-01-01"
+            else:
+                end_date = f"{year}-{int(month)+1:02d}-01"
+
+            cursor.execute(query, (start_date, end_date))
+            data = cursor.fetchall()
+
+            if not data:
+                logger.warning(f"No data for {pair} {year_month}")
+                cursor.close()
+                return f"{pair}_{year_month}: No data"
+
+            df = pd.DataFrame(data, columns=['ts_utc', 'close'])
+
+            # Calculate technical indicators
+            # TODO: Add high, low, volume columns when available
+            close = df['close'].to_numpy(dtype=float)
+            df['rsi_14'] = rsi(close, 14, wilder=True)
+            df['rsi_20'] = rsi(close, 20, wilder=True)
+
+            macd_line, signal, histogram = macd(close)
+            df['macd'] = macd_line
+            df['macd_signal'] = signal
+            df['macd_histogram'] = histogram
+
+            # TODO: Remaining indicators need high/low (data.indicators):
+            # adx(high, low, close, 14)['adx'], stochastic(high, low, close),
+            # cci((high + low + close) / 3, 20), williams_r(high, low, close, 14),
+            # roc(close, 12)
+
+            # Replace NaN with None for PostgreSQL NULL
+            df = df.astype(object).where(pd.notnull(df), None)
+
+            # Insert into database
+            # TODO: Create table schema first
+            partition_name = f"technical_indicators_{pair.lower()}_{year_month}"
+
+            # INSERT logic here
+            logger.info(f"✅ {pair} {year_month} Complete!")
 
-        macd, signal, histogram = calculate_macd(df['close'].values)
-        df['macd'] = macd
-        df['macd_signal'] = signal
-        df['macd_histogram'] = histogram
-
-        # TODO: Implement remaining indicators
-        # df['adx_14'] = calculate_adx(...)
-        # df['stoch_k'], df['stoch_d'] = calculate_stochastic(...)
-        # df['cci_20'] = calculate_cci(...)
-        # df['williams_r_14'] = calculate_williams_r(...)
-        # df['roc_12'] = calculate_roc(...)
-
-        # Replace NaN with None for PostgreSQL NULL
-        df = df.astype(object).where(pd.notnull(df), None)
-
-        # Insert into database
-        # TODO: Create table schema first
-        partition_name = f"technical_indicators_{pair.lower()}_{year_month}"
-
-        # INSERT logic here
-        logger.info(f"✅ {pair} {year_month} Complete!")
-
-        cursor.close()
-        conn.close()
+            cursor.close()
 
-        return f"{pair}_{year_month}: Complete!"
+            return f"{pair}_{year_month}: Complete!"
 
     except Exception as e:
         logger.error(f"❌ {pair} {year_month} Failed: {e}")
@@ -221,6 +132,10 @@ def process_partition(pair, year_month):
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Populate Stage 2.2 technical indicators')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
     logger.info("=" * 80)
     logger.info("STAGE 2.2: TECHNICAL INDICATORS - STARTING")
     logger.info("=" * 80)
@@ -229,7 +144,7 @@ def main():
     os.makedirs('/tmp/logs/stage_2_2', exist_ok=True)
 
     # Generate all tasks
-    tasks = [(pair, month) for pair in PAIRS for month in MONTHS]
+    tasks = [Job(pair, month, (pair, month)) for pair in PAIRS for month in MONTHS]
     total_tasks = len(tasks)
 
     logger.info(f"Total partitions to process: {total_tasks}")
@@ -241,19 +156,17 @@ def main():
     completed = 0
     failed = 0
 
-    with ProcessPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(process_partition, pair, month): (pair, month)
-                   for pair, month in tasks}
-
-        for future in as_completed(futures):
-            result = future.result()
-            completed += 1
+    # process_partition reports failures in its status string
+    for result in run_jobs('stage_2_2', tasks, process_partition, 8,
+                           outcome=lambda r: ("Failed" not in r, 0, r if "Failed" in r else None),
+                           ledger=JobLedger(args.ledger), force=args.force, attempts=args.attempts):
+        completed += 1
 
-            if "Failed" in result:
-                failed += 1
+        if result.state == 'failed':
+            failed += 1
 
-            progress_pct = (completed / total_tasks) * 100
-            logger.info(f"Progress: {completed}/{total_tasks} ({progress_pct:.1f}%) | Failures: {failed}")
+        progress_pct = (completed / total_tasks) * 100
+        logger.info(f"Progress: {completed}/{total_tasks} ({progress_pct:.1f}%) | Failures: {failed}")
 
     logger.info("")
     logger.info("=" * 80)
@@ -24,23 +24,17 @@ Storage: statistics_features_{pair} + bollinger_features_{pair} tables
 Estimated Time: 3-4 hours (336 partitions, 8 threads)
 """
 
-import psycopg2
+import sys
+from pathlib import Path
 from psycopg2 import sql
 import numpy as np
-from scipy import stats
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
-# Database configuration
-DB_CONFIG = {
-    "host": "trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "database": "bqx",
-    "user": "postgres",
-    "password": "BQX_Aurora_2025_Secure",
-    "sslmode": "require",
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from data.db import connection
+from data.feature_families import compute_bollinger_features, compute_statistics_features
 
 # All 28 preferred pairs
 CURRENCY_PAIRS = [
@@ -75,88 +69,6 @@ def generate_month_ranges():
     return months
 
 
-def compute_entropy(data):
-    """Compute Shannon entropy of discretized data"""
-    if len(data) < 2:
-        return 0.0
-
-    # Discretize into 10 bins
-    hist, _ = np.histogram(data, bins=10)
-    hist = hist[hist > 0]  # Remove zero bins
-    probs = hist / np.sum(hist)
-    return -np.sum(probs * np.log2(probs + 1e-10))
-
-
-def compute_statistics_features(rate_indices):
-    """Compute 5 statistical features with 60-minute rolling window"""
-    n = len(rate_indices)
-    stats_features = {
-        'skewness_60min': np.zeros(n),
-        'kurtosis_60min': np.zeros(n),
-        'median_absolute_deviation_60min': np.zeros(n),
-        'entropy_60min': np.zeros(n),
-        'autocorrelation_lag1': np.zeros(n),
-    }
-
-    for i in range(n):
-        w60_start = max(0, i - 59)
-        window = rate_indices[w60_start:i+1]
-
-        if len(window) >= 10:
-            # Skewness and Kurtosis
-            stats_features['skewness_60min'][i] = stats.skew(window)
-            stats_features['kurtosis_60min'][i] = stats.kurtosis(window)
-
-            # Median Absolute Deviation
-            median = np.median(window)
-            mad = np.median(np.abs(window - median))
-            stats_features['median_absolute_deviation_60min'][i] = mad
-
-            # Entropy
-            stats_features['entropy_60min'][i] = compute_entropy(window)
-
-            # Autocorrelation lag-1
-            if len(window) >= 2:
-                lag1_corr = np.corrcoef(window[:-1], window[1:])[0, 1]
-                stats_features['autocorrelation_lag1'][i] = lag1_corr if not np.isnan(lag1_corr) else 0.0
-
-    return stats_features
-
-
-def compute_bollinger_features(rate_indices):
-    """Compute 5 Bollinger Bands features with 20-period window"""
-    n = len(rate_indices)
-    bollinger_features = {
-        'bollinger_upper_20': np.zeros(n),
-        'bollinger_lower_20': np.zeros(n),
-        'bollinger_middle_20': np.zeros(n),
-        'bollinger_width_20': np.zeros(n),
-        'bollinger_percent_b': np.zeros(n),
-    }
-
-    for i in range(n):
-        w20_start = max(0, i - 19)
-        window = rate_indices[w20_start:i+1]
-
-        if len(window) >= 10:
-            mean = np.mean(window)
-            std = np.std(window)
-
-            bollinger_features['bollinger_middle_20'][i] = mean
-            bollinger_features['bollinger_upper_20'][i] = mean + 2 * std
-            bollinger_features['bollinger_lower_20'][i] = mean - 2 * std
-            bollinger_features['bollinger_width_20'][i] = 4 * std  # upper - lower
-
-            # %B indicator: (price - lower) / (upper - lower)
-            if std > 0:
-                percent_b = (rate_indices[i] - (mean - 2*std)) / (4 * std)
-                bollinger_features['bollinger_percent_b'][i] = percent_b
-            else:
-                bollinger_features['bollinger_percent_b'][i] = 0.5
-
-    return bollinger_features
-
-
 def process_partition(conn, pair, year, month):
     """Process one partition: compute statistics and Bollinger features"""
     import time
@@ -269,8 +181,7 @@ def process_partition(conn, pair, year, month):
 
 def process_partition_worker(pair, year, month):
     """Worker function for threading"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    try:
+    with connection() as conn:
         stats_rows, boll_rows, elapsed = process_partition(conn, pair, year, month)
 
         global partitions_completed
@@ -287,8 +198,6 @@ def process_partition_worker(pair, year, month):
             'elapsed': elapsed,
             'progress': progress_pct
         }
-    finally:
-        conn.close()
 
 
 def main():
@@ -2,7 +2,7 @@
 """
 Technical Indicators Worker - Phase 1.6.7
 
-Computes 45 technical indicators across 28 currency pairs:
+Computes 46 technical indicators across 28 currency pairs:
 - Trend Indicators (10): EMAs, SMAs
 - Momentum Indicators (15): RSI, MACD, Stochastic, CCI, Williams %R, etc.
 - Volatility Indicators (10): ATR, Bollinger Bands, Donchian, Keltner, etc.
@@ -10,27 +10,23 @@ Computes 45 technical indicators across 28 currency pairs:
 
 Data Source: M1 OHLC + Volume data
 Storage: bqx.technical_features_{pair}
-Computation: Standard technical analysis formulas
+Computation: Standard technical analysis formulas (data.indicators kernels)
 Estimated Time: 6-8 hours (336 partitions / 8 threads)
 """
 
-import psycopg2
-from psycopg2 import sql
-import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import sys
 import threading
 import time
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com',
-    'port': 5432,
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': 'BQX_Aurora_2025_Secure'
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection
+from data.indicators import rate_indicators
+from data.writer import write_columns
 
 # 28 currency pairs
 CURRENCY_PAIRS = [
@@ -66,255 +62,18 @@ def generate_month_ranges():
     return months
 
 
-def ema(series, period):
-    """Exponential Moving Average"""
-    return series.ewm(span=period, adjust=False).mean()
-
-
-def sma(series, period):
-    """Simple Moving Average"""
-    return series.rolling(window=period).mean()
-
-
-def rsi(series, period=14):
-    """Relative Strength Index"""
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
-
-
-def macd(series, fast=12, slow=26, signal=9):
-    """MACD, Signal, and Histogram"""
-    ema_fast = ema(series, fast)
-    ema_slow = ema(series, slow)
-    macd_line = ema_fast - ema_slow
-    signal_line = ema(macd_line, signal)
-    histogram = macd_line - signal_line
-    return macd_line, signal_line, histogram
-
-
-def stochastic(high, low, close, k_period=14, d_period=3):
-    """Stochastic Oscillator %K and %D"""
-    lowest_low = low.rolling(window=k_period).min()
-    highest_high = high.rolling(window=k_period).max()
-    stoch_k = 100 * (close - lowest_low) / (highest_high - lowest_low)
-    stoch_d = stoch_k.rolling(window=d_period).mean()
-    return stoch_k, stoch_d
-
-
-def cci(high, low, close, period=20):
-    """Commodity Channel Index"""
-    tp = (high + low + close) / 3
-    sma_tp = sma(tp, period)
-    mad = tp.rolling(window=period).apply(lambda x: np.abs(x - x.mean()).mean())
-    return (tp - sma_tp) / (0.015 * mad)
-
-
-def williams_r(high, low, close, period=14):
-    """Williams %R"""
-    highest_high = high.rolling(window=period).max()
-    lowest_low = low.rolling(window=period).min()
-    return -100 * (highest_high - close) / (highest_high - lowest_low)
-
-
-def roc(series, period=12):
-    """Rate of Change"""
-    return ((series - series.shift(period)) / series.shift(period)) * 100
-
-
-def atr(high, low, close, period=14):
-    """Average True Range"""
-    tr1 = high - low
-    tr2 = abs(high - close.shift())
-    tr3 = abs(low - close.shift())
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    return tr.rolling(window=period).mean()
-
-
-def obv(close, volume):
-    """On-Balance Volume"""
-    obv_values = (np.sign(close.diff()) * volume).fillna(0).cumsum()
-    return obv_values
-
-
-def adl(high, low, close, volume):
-    """Accumulation/Distribution Line"""
-    clv = ((close - low) - (high - close)) / (high - low)
-    clv = clv.fillna(0)
-    return (clv * volume).cumsum()
-
-
-def mfi(high, low, close, volume, period=14):
-    """Money Flow Index"""
-    tp = (high + low + close) / 3
-    mf = tp * volume
-
-    positive_mf = mf.where(tp > tp.shift(), 0).rolling(window=period).sum()
-    negative_mf = mf.where(tp < tp.shift(), 0).rolling(window=period).sum()
-
-    mfr = positive_mf / negative_mf
-    return 100 - (100 / (1 + mfr))
-
-
-def vwap(high, low, close, volume):
-    """Volume Weighted Average Price (daily reset)"""
-    tp = (high + low + close) / 3
-    return (tp * volume).cumsum() / volume.cumsum()
-
-
 def compute_technical_indicators(df):
     """
-    Compute all 45 technical indicators
+    Compute all 46 technical indicators
 
     Args:
         df: DataFrame with columns [time, open, high, low, close, volume]
 
     Returns:
-        DataFrame with 45 technical indicator columns
+        DataFrame with one column per RATE_INDICATOR_COLUMNS entry
     """
-    close = df['close']
-    high = df['high']
-    low = df['low']
-    open_price = df['open']
-    volume = df['volume']
-
-    indicators = pd.DataFrame(index=df.index)
-
-    # Trend Indicators (10)
-    indicators['ema_10'] = ema(close, 10)
-    indicators['ema_20'] = ema(close, 20)
-    indicators['ema_50'] = ema(close, 50)
-    indicators['ema_100'] = ema(close, 100)
-    indicators['ema_200'] = ema(close, 200)
-
-    indicators['sma_10'] = sma(close, 10)
-    indicators['sma_20'] = sma(close, 20)
-    indicators['sma_50'] = sma(close, 50)
-    indicators['sma_100'] = sma(close, 100)
-    indicators['sma_200'] = sma(close, 200)
-
-    # Momentum Indicators (15)
-    indicators['rsi_14'] = rsi(close, 14)
-
-    macd_line, signal_line, histogram = macd(close)
-    indicators['macd'] = macd_line
-    indicators['macd_signal'] = signal_line
-    indicators['macd_histogram'] = histogram
-
-    stoch_k, stoch_d = stochastic(high, low, close)
-    indicators['stoch_k'] = stoch_k
-    indicators['stoch_d'] = stoch_d
-
-    indicators['cci_20'] = cci(high, low, close, 20)
-    indicators['williams_r_14'] = williams_r(high, low, close, 14)
-    indicators['roc_12'] = roc(close, 12)
-
-    indicators['momentum_10'] = close - close.shift(10)
-    indicators['momentum_20'] = close - close.shift(20)
-
-    # TRIX
-    ema1 = ema(close, 15)
-    ema2 = ema(ema1, 15)
-    ema3 = ema(ema2, 15)
-    indicators['trix'] = 100 * (ema3 - ema3.shift()) / ema3.shift()
-
-    # Ultimate Oscillator (simplified)
-    bp = close - pd.concat([low, close.shift()], axis=1).min(axis=1)
-    tr = pd.concat([high - low, abs(high - close.shift()), abs(low - close.shift())], axis=1).max(axis=1)
-    avg7 = bp.rolling(7).sum() / tr.rolling(7).sum()
-    avg14 = bp.rolling(14).sum() / tr.rolling(14).sum()
-    avg28 = bp.rolling(28).sum() / tr.rolling(28).sum()
-    indicators['ultimate_oscillator'] = 100 * ((4 * avg7) + (2 * avg14) + avg28) / 7
-
-    # Awesome Oscillator
-    indicators['awesome_oscillator'] = sma((high + low) / 2, 5) - sma((high + low) / 2, 34)
-
-    # Keltner Channels
-    atr_val = atr(high, low, close, 20)
-    ema_20 = ema(close, 20)
-    indicators['keltner_channel_upper'] = ema_20 + (2 * atr_val)
-    indicators['keltner_channel_lower'] = ema_20 - (2 * atr_val)
-
-    # Volatility Indicators (10)
-    indicators['atr_14'] = atr(high, low, close, 14)
-
-    # Historical Volatility
-    log_returns = np.log(close / close.shift())
-    indicators['historical_volatility_20'] = log_returns.rolling(20).std() * np.sqrt(252)
-
-    # Chaikin Volatility
-    hl_spread = high - low
-    ema_spread = ema(hl_spread, 10)
-    indicators['chaikin_volatility'] = ((ema_spread - ema_spread.shift(10)) / ema_spread.shift(10)) * 100
-
-    # Donchian Channels
-    indicators['donchian_channel_upper'] = high.rolling(20).max()
-    indicators['donchian_channel_middle'] = (high.rolling(20).max() + low.rolling(20).min()) / 2
-    indicators['donchian_channel_lower'] = low.rolling(20).min()
-
-    # Mass Index
-    hl_range = high - low
-    ema_range = ema(hl_range, 9)
-    ema_ema_range = ema(ema_range, 9)
-    mass_ratio = ema_range / ema_ema_range
-    indicators['mass_index'] = mass_ratio.rolling(25).sum()
-
-    # Vortex Indicator
-    vm_plus = abs(high - low.shift())
-    vm_minus = abs(low - high.shift())
-    tr_series = pd.concat([high - low, abs(high - close.shift()), abs(low - close.shift())], axis=1).max(axis=1)
-    indicators['vortex_indicator_plus'] = vm_plus.rolling(14).sum() / tr_series.rolling(14).sum()
-    indicators['vortex_indicator_minus'] = vm_minus.rolling(14).sum() / tr_series.rolling(14).sum()
-
-    # Ulcer Index
-    max_close = close.rolling(14).max()
-    pct_drawdown = 100 * (close - max_close) / max_close
-    indicators['ulcer_index'] = np.sqrt((pct_drawdown ** 2).rolling(14).mean())
-
-    # Volume Indicators (10)
-    indicators['obv'] = obv(close, volume)
-    indicators['adl'] = adl(high, low, close, volume)
-
-    # Chaikin Money Flow
-    clv = ((close - low) - (high - close)) / (high - low)
-    clv = clv.fillna(0)
-    indicators['cmf_20'] = (clv * volume).rolling(20).sum() / volume.rolling(20).sum()
-
-    # Force Index
-    indicators['fi_13'] = ema(close.diff() * volume, 13)
-
-    # Ease of Movement
-    distance = ((high + low) / 2 - (high.shift() + low.shift()) / 2)
-    box_ratio = (volume / 1000000) / (high - low)
-    indicators['eom_14'] = sma(distance / box_ratio, 14)
-
-    # Volume Price Trend
-    indicators['vpt'] = (volume * ((close - close.shift()) / close.shift())).cumsum()
-
-    # Negative Volume Index
-    nvi = pd.Series(1000.0, index=close.index, dtype=float)
-    for i in range(1, len(close)):
-        if volume.iloc[i] < volume.iloc[i-1]:
-            nvi.iloc[i] = nvi.iloc[i-1] * (1 + (close.iloc[i] - close.iloc[i-1]) / close.iloc[i-1])
-        else:
-            nvi.iloc[i] = nvi.iloc[i-1]
-    indicators['nvi'] = nvi
-
-    # Positive Volume Index
-    pvi = pd.Series(1000.0, index=close.index, dtype=float)
-    for i in range(1, len(close)):
-        if volume.iloc[i] > volume.iloc[i-1]:
-            pvi.iloc[i] = pvi.iloc[i-1] * (1 + (close.iloc[i] - close.iloc[i-1]) / close.iloc[i-1])
-        else:
-            pvi.iloc[i] = pvi.iloc[i-1]
-    indicators['pvi'] = pvi
-
-    indicators['mfi_14'] = mfi(high, low, close, volume, 14)
-    indicators['vwap'] = vwap(high, low, close, volume)
-
-    return indicators
+    indicators = rate_indicators(df['open'], df['high'], df['low'], df['close'], df['volume'])
+    return pd.DataFrame(indicators, index=df.index)
 
 
 def process_partition(conn, pair, year, month):
@@ -406,18 +165,8 @@ def process_partition(conn, pair, year, month):
             elapsed = time.time() - start_time
             return 0, elapsed
 
-        # Insert data
-        cols = ['ts_utc'] + [col for col in indicators.columns if col != 'ts_utc']
-
-        insert_query = f"""
-            INSERT INTO bqx.{partition_name} ({', '.join(cols)})
-            VALUES ({', '.join(['%s'] * len(cols))})
-            ON CONFLICT (ts_utc) DO NOTHING;
-        """
-
-        data_tuples = [tuple(row) for row in indicators[cols].values]
-
-        cur.executemany(insert_query, data_tuples)
+        # Bulk insert (COPY + one merge)
+        write_columns(conn, f"bqx.{partition_name}", indicators, mode='ignore')
         conn.commit()
 
         elapsed = time.time() - start_time
@@ -436,8 +185,7 @@ def process_partition(conn, pair, year, month):
 
 def process_partition_worker(pair, year, month):
     """Worker function for threading"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    try:
+    with connection() as conn:
         rows, elapsed = process_partition(conn, pair, year, month)
 
         global partitions_completed, total_rows_inserted
@@ -454,8 +202,6 @@ def process_partition_worker(pair, year, month):
             'elapsed': elapsed,
             'progress': progress_pct
         }
-    finally:
-        conn.close()
 
 
 def main():
@@ -43,24 +43,17 @@ Storage: bqx.time_features_{pair} and bqx.spread_features_{pair}
 Estimated Time: 4-5 hours (336 partitions / 8 threads)
 """
 
-import psycopg2
+import sys
+from pathlib import Path
 from psycopg2 import sql
 import numpy as np
-from scipy import stats
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
-import math
-
-# Database configuration
-DB_CONFIG = {
-    "host": "trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "database": "bqx",
-    "user": "postgres",
-    "password": "BQX_Aurora_2025_Secure",
-    "sslmode": "require",
-}
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from data.db import connection
+from data.feature_families import compute_spread_features, compute_time_features
 
 # All 28 preferred pairs
 CURRENCY_PAIRS = [
@@ -95,224 +88,6 @@ def generate_month_ranges():
     return months
 
 
-def compute_time_features(times):
-    """
-    Compute 8 time features with CYCLICAL ENCODING
-
-    Returns:
-        dict: Time feature arrays matching schema
-    """
-    n = len(times)
-    time_features = {
-        'hour_sin': np.zeros(n),
-        'hour_cos': np.zeros(n),
-        'day_of_week_sin': np.zeros(n),
-        'day_of_week_cos': np.zeros(n),
-        'session_overlap': np.zeros(n, dtype=int),
-        'is_weekend_approach': np.zeros(n, dtype=int),
-        'minutes_since_market_open': np.zeros(n, dtype=int),
-        'trading_session': np.zeros(n, dtype=int),
-    }
-
-    for i, dt in enumerate(times):
-        hour = dt.hour
-        minute = dt.minute
-        weekday = dt.weekday()  # 0=Monday, 6=Sunday
-
-        # Cyclical encoding for hour (0-23)
-        time_features['hour_sin'][i] = np.sin(2 * np.pi * hour / 24)
-        time_features['hour_cos'][i] = np.cos(2 * np.pi * hour / 24)
-
-        # Cyclical encoding for day of week (0-6)
-        time_features['day_of_week_sin'][i] = np.sin(2 * np.pi * weekday / 7)
-        time_features['day_of_week_cos'][i] = np.cos(2 * np.pi * weekday / 7)
-
-        # Trading session (0=asian, 1=london, 2=newyork, 3=overlap, 4=quiet)
-        # Asian: 00:00-08:00 UTC
-        # London: 08:00-16:00 UTC
-        # NY: 13:00-21:00 UTC
-        # Overlap: 13:00-16:00 UTC
-        # Quiet: 21:00-00:00 UTC
-        if 13 <= hour < 16:
-            time_features['trading_session'][i] = 3  # overlap
-            time_features['session_overlap'][i] = 2  # London + NY
-        elif 8 <= hour < 13:
-            time_features['trading_session'][i] = 1  # london
-            time_features['session_overlap'][i] = 1
-        elif 16 <= hour < 21:
-            time_features['trading_session'][i] = 2  # newyork
-            time_features['session_overlap'][i] = 1
-        elif 0 <= hour < 8:
-            time_features['trading_session'][i] = 0  # asian
-            time_features['session_overlap'][i] = 1
-        else:
-            time_features['trading_session'][i] = 4  # quiet
-            time_features['session_overlap'][i] = 0
-
-        # Is weekend approach (Friday after 17:00 UTC or Saturday/Sunday)
-        time_features['is_weekend_approach'][i] = 1 if (weekday == 4 and hour >= 17) or weekday >= 5 else 0
-
-        # Minutes since last major market open
-        minute_of_day = hour * 60 + minute
-        if minute_of_day < 8 * 60:
-            # Since Asian open at 00:00
-            time_features['minutes_since_market_open'][i] = minute_of_day
-        elif minute_of_day < 13 * 60:
-            # Since London open at 08:00
-            time_features['minutes_since_market_open'][i] = minute_of_day - 8 * 60
-        else:
-            # Since NY open at 13:00
-            time_features['minutes_since_market_open'][i] = minute_of_day - 13 * 60
-
-    return time_features
-
-
-def compute_spread_features(times, bids, asks, spreads, rates):
-    """
-    Compute 20 spread/microstructure features matching schema
-
-    Args:
-        times: Array of timestamps
-        bids: Array of bid_close prices
-        asks: Array of ask_close prices
-        spreads: Array of spread_close values
-        rates: Array of close/rate values
-
-    Returns:
-        dict: Spread feature arrays
-    """
-    n = len(times)
-    spread_features = {
-        'spread_mean_60min': np.zeros(n),
-        'spread_volatility_60min': np.zeros(n),
-        'spread_pct_of_rate': np.zeros(n),
-        'spread_trend_slope': np.zeros(n),
-        'spread_spike': np.zeros(n, dtype=int),
-        'bid_ask_imbalance': np.zeros(n),
-        'effective_spread': np.zeros(n),
-        'quoted_spread': np.zeros(n),
-        'realized_spread': np.zeros(n),
-        'price_impact': np.zeros(n),
-        'roll_cost': np.zeros(n),
-        'bid_depth': np.zeros(n),
-        'ask_depth': np.zeros(n),
-        'depth_imbalance': np.zeros(n),
-        'spread_range_60min': np.zeros(n),
-        'spread_percentile_60min': np.zeros(n),
-        'mid_price_volatility': np.zeros(n),
-        'tick_direction': np.zeros(n, dtype=int),
-        'tick_rule': np.zeros(n, dtype=int),
-        'order_flow_toxicity': np.zeros(n),
-    }
-
-    # Compute mid prices
-    mid_prices = (bids + asks) / 2
-
-    for i in range(n):
-        # Rolling 60-minute window
-        w60_start = max(0, i - 59)
-        spread_w60 = spreads[w60_start:i+1]
-        mid_w60 = mid_prices[w60_start:i+1]
-
-        # 1. Spread mean 60min
-        spread_features['spread_mean_60min'][i] = np.mean(spread_w60) if len(spread_w60) > 0 else 0
-
-        # 2. Spread volatility 60min
-        spread_features['spread_volatility_60min'][i] = np.std(spread_w60) if len(spread_w60) > 1 else 0
-
-        # 3. Spread as % of rate
-        spread_features['spread_pct_of_rate'][i] = (spreads[i] / rates[i] * 100) if rates[i] > 0 else 0
-
-        # 4. Spread trend slope
-        if len(spread_w60) >= 10:
-            x = np.arange(len(spread_w60))
-            slope, _, _, _, _ = stats.linregress(x, spread_w60)
-            spread_features['spread_trend_slope'][i] = slope
-
-        # 5. Spread spike
-        mean_60 = spread_features['spread_mean_60min'][i]
-        spread_features['spread_spike'][i] = 1 if spreads[i] > 2 * mean_60 and mean_60 > 0 else 0
-
-        # 6. Bid-ask imbalance (normalized)
-        total = bids[i] + asks[i]
-        spread_features['bid_ask_imbalance'][i] = (bids[i] - asks[i]) / total if total > 0 else 0
-
-        # 7. Effective spread (assuming trade at mid)
-        mid = mid_prices[i]
-        spread_features['effective_spread'][i] = 2 * abs(rates[i] - mid) / mid if mid > 0 else 0
-
-        # 8. Quoted spread
-        spread_features['quoted_spread'][i] = spreads[i] / mid if mid > 0 else 0
-
-        # 9. Realized spread (effective - impact)
-        # Simplified: half of effective spread
-        spread_features['realized_spread'][i] = spread_features['effective_spread'][i] * 0.5
-
-        # 10. Price impact
-        spread_features['price_impact'][i] = spread_features['effective_spread'][i] * 0.5
-
-        # 11. Roll cost (half spread)
-        spread_features['roll_cost'][i] = spreads[i] / 2
-
-        # 12-13. Bid/ask depth (normalized by spread)
-        if spreads[i] > 0:
-            spread_features['bid_depth'][i] = bids[i] / spreads[i]
-            spread_features['ask_depth'][i] = asks[i] / spreads[i]
-
-        # 14. Depth imbalance
-        total_depth = spread_features['bid_depth'][i] + spread_features['ask_depth'][i]
-        if total_depth > 0:
-            spread_features['depth_imbalance'][i] = (spread_features['bid_depth'][i] - spread_features['ask_depth'][i]) / total_depth
-
-        # 15. Spread range 60min
-        if len(spread_w60) > 0:
-            spread_features['spread_range_60min'][i] = np.max(spread_w60) - np.min(spread_w60)
-
-        # 16. Spread percentile 60min
-        if len(spread_w60) > 1:
-            percentile = np.searchsorted(np.sort(spread_w60), spreads[i]) / len(spread_w60)
-            spread_features['spread_percentile_60min'][i] = percentile
-
-        # 17. Mid price volatility
-        spread_features['mid_price_volatility'][i] = np.std(mid_w60) if len(mid_w60) > 1 else 0
-
-        # 18. Tick direction
-        if i > 0:
-            price_change = mid_prices[i] - mid_prices[i-1]
-            if price_change > 0:
-                spread_features['tick_direction'][i] = 1
-            elif price_change < 0:
-                spread_features['tick_direction'][i] = -1
-            else:
-                spread_features['tick_direction'][i] = 0
-
-        # 19. Tick rule (buy/sell classification)
-        if i > 0:
-            # If price went up, likely buyer-initiated
-            if mid_prices[i] > mid_prices[i-1]:
-                spread_features['tick_rule'][i] = 1
-            elif mid_prices[i] < mid_prices[i-1]:
-                spread_features['tick_rule'][i] = -1
-            else:
-                # Use bid/ask imbalance as tiebreaker
-                spread_features['tick_rule'][i] = 1 if spread_features['bid_ask_imbalance'][i] > 0 else -1
-
-        # 20. Order flow toxicity (adverse selection proxy)
-        if len(mid_w60) > 5:
-            # Correlation between spread widening and price volatility
-            recent_vol = np.std(mid_w60[-5:])
-            recent_spread = np.mean(spread_w60[-5:])
-            baseline_vol = np.std(mid_w60) if len(mid_w60) > 1 else 0
-            baseline_spread = np.mean(spread_w60) if len(spread_w60) > 0 else 1
-
-            if baseline_vol > 0 and baseline_spread > 0:
-                vol_ratio = recent_vol / baseline_vol
-                spread_ratio = recent_spread / baseline_spread
-                spread_features['order_flow_toxicity'][i] = vol_ratio * spread_ratio
-
-    return spread_features
-
-
 def process_partition(conn, pair, year, month):
     """Process one partition: compute time and spread features"""
     import time
@@ -468,8 +243,7 @@ def process_partition(conn, pair, year, month):
 
 def process_partition_worker(pair, year, month):
     """Worker function for threading"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    try:
+    with connection() as conn:
         time_rows, spread_rows, elapsed = process_partition(conn, pair, year, month)
 
         global partitions_completed
@@ -486,8 +260,6 @@ def process_partition_worker(pair, year, month):
             'elapsed': elapsed,
             'progress': progress_pct
         }
-    finally:
-        conn.close()
 
 
 def main():
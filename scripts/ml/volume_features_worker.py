@@ -23,23 +23,17 @@ Storage: bqx.volume_features_{pair} tables
 Estimated Time: 4 hours (336 partitions × 28 pairs / 8 threads)
 """
 
-import psycopg2
+import sys
+from pathlib import Path
 from psycopg2 import sql
 import numpy as np
-from scipy import stats
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
-# Database configuration
-DB_CONFIG = {
-    "host": "trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "database": "bqx",
-    "user": "postgres",
-    "password": "BQX_Aurora_2025_Secure",
-    "sslmode": "require",
-}
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from data.db import connection
+from data.feature_families import compute_volume_features
 
 # All 28 preferred pairs
 CURRENCY_PAIRS = [
@@ -127,88 +121,14 @@ def compute_volume_features_for_partition(conn, pair, year, month):
     rates = np.array([float(r[2]) for r in rows])
     closes = np.array([float(r[3]) for r in rows])
 
-    # Calculate returns (percentage change)
-    returns = np.diff(rates) / rates[:-1]
-    returns = np.concatenate([[0], returns])  # Prepend 0 for first row
-
     # Find index where partition actually starts (after lookback)
     partition_start_idx = np.searchsorted(times, partition_start)
 
-    # Prepare output arrays (only for partition data, not lookback)
-    n_partition = len(times) - partition_start_idx
-    output_data = {
-        'ts_utc': times[partition_start_idx:],
-        'w15_volume_ratio': np.zeros(n_partition),
-        'w30_volume_ratio': np.zeros(n_partition),
-        'w60_volume_ratio': np.zeros(n_partition),
-        'volume_spike': np.zeros(n_partition, dtype=int),
-        'volume_trend_slope': np.zeros(n_partition),
-        'cumulative_volume_60min': np.zeros(n_partition),
-        'volume_weighted_return': np.zeros(n_partition),
-        'volume_price_correlation_60min': np.zeros(n_partition),
-        'relative_volume_position': np.zeros(n_partition),
-        'volume_volatility_60min': np.zeros(n_partition),
-    }
-
-    # Compute features for each minute in the partition
-    for i in range(partition_start_idx, len(times)):
-        partition_i = i - partition_start_idx
-
-        # Rolling windows (15, 30, 60 minutes lookback)
-        w15_start = max(0, i - 14)
-        w30_start = max(0, i - 29)
-        w60_start = max(0, i - 59)
-
-        # 1-3. Volume ratios (w15, w30, w60)
-        vol_w15 = volumes[w15_start:i+1]
-        vol_w30 = volumes[w30_start:i+1]
-        vol_w60 = volumes[w60_start:i+1]
-
-        mean_w15 = np.mean(vol_w15) if len(vol_w15) > 0 else 1.0
-        mean_w30 = np.mean(vol_w30) if len(vol_w30) > 0 else 1.0
-        mean_w60 = np.mean(vol_w60) if len(vol_w60) > 0 else 1.0
-
-        output_data['w15_volume_ratio'][partition_i] = volumes[i] / mean_w15 if mean_w15 > 0 else 1.0
-        output_data['w30_volume_ratio'][partition_i] = volumes[i] / mean_w30 if mean_w30 > 0 else 1.0
-        output_data['w60_volume_ratio'][partition_i] = volumes[i] / mean_w60 if mean_w60 > 0 else 1.0
-
-        # 4. Volume spike (binary: 1 if > 2× mean_w60)
-        output_data['volume_spike'][partition_i] = 1 if volumes[i] > 2 * mean_w60 else 0
-
-        # 5. Volume trend slope (linear regression on w60)
-        if len(vol_w60) >= 10:
-            x = np.arange(len(vol_w60))
-            slope, _, _, _, _ = stats.linregress(x, vol_w60)
-            output_data['volume_trend_slope'][partition_i] = slope
-
-        # 6. Cumulative volume (sum over w60)
-        output_data['cumulative_volume_60min'][partition_i] = np.sum(vol_w60)
-
-        # 7. Volume-weighted return
-        ret_w60 = returns[w60_start:i+1]
-        if len(ret_w60) > 0 and np.sum(vol_w60) > 0:
-            vwap_return = np.sum(ret_w60 * vol_w60) / np.sum(vol_w60)
-            output_data['volume_weighted_return'][partition_i] = vwap_return
-
-        # 8. Volume-price correlation
-        if len(vol_w60) >= 10 and len(ret_w60) >= 10:
-            abs_returns = np.abs(ret_w60)
-            if np.std(vol_w60) > 0 and np.std(abs_returns) > 0:
-                corr = np.corrcoef(vol_w60, abs_returns)[0, 1]
-                output_data['volume_price_correlation_60min'][partition_i] = corr if not np.isnan(corr) else 0.0
-
-        # 9. Relative volume position (percentile in w60)
-        if len(vol_w60) > 0:
-            min_vol = np.min(vol_w60)
-            max_vol = np.max(vol_w60)
-            if max_vol > min_vol:
-                output_data['relative_volume_position'][partition_i] = (volumes[i] - min_vol) / (max_vol - min_vol)
-            else:
-                output_data['relative_volume_position'][partition_i] = 0.5
-
-        # 10. Volume volatility (stdev over w60)
-        if len(vol_w60) > 1:
-            output_data['volume_volatility_60min'][partition_i] = np.std(vol_w60)
+    # All 10 features over the fetched rows (lookback included) in one vectorized pass
+    features = compute_volume_features(volumes, rates)
+    output_data = {'ts_utc': times[partition_start_idx:]}
+    for name, values in features.items():
+        output_data[name] = values[partition_start_idx:]
 
     # Insert into volume_features table
     insert_table = sql.Identifier('bqx', f'volume_features_{pair}')
@@ -262,8 +182,7 @@ def compute_volume_features_for_partition(conn, pair, year, month):
 
 def process_partition_worker(pair, year, month):
     """Worker function for threading (creates own DB connection)"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    try:
+    with connection() as conn:
         rows, elapsed = compute_volume_features_for_partition(conn, pair, year, month)
 
         # Update progress
@@ -280,8 +199,6 @@ def process_partition_worker(pair, year, month):
             'elapsed': elapsed,
             'progress': progress_pct
         }
-    finally:
-        conn.close()
 
 
 def main():
@@ -11,29 +11,20 @@ Estimated Cost: $1.20
 Risk: MEDIUM (requires re-computation, backup recommended)
 """
 
-import psycopg2
-import pandas as pd
 import numpy as np
 import logging
 import sys
 import os
 import time
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from datetime import datetime
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
-
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
-
-# Create SQLAlchemy engine for pandas (eliminates UserWarning)
-DB_URL = f"postgresql://{DB_CONFIG['user']}:{quote_plus(DB_CONFIG['password'])}@{DB_CONFIG['host']}/{DB_CONFIG['database']}"
-ENGINE = create_engine(DB_URL, pool_pre_ping=True)
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.rolling_regression import rolling_quadratic_fit
+from data.writer import write_columns
+from data.db import connection, read_frame
+from data.jobs import ALL_MONTHS, Job, JobLedger, add_ledger_arguments, month_checksum, run_jobs
 
 # All 28 currency pairs
 PAIRS = [
@@ -69,66 +60,39 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def fit_parabola_with_terms_bqx(x, y):
+TERM_FEATURES = ['quadratic_term', 'linear_term', 'constant_term', 'residual', 'r2', 'rmse', 'prediction']
+
+
+def compute_term_columns_bqx(y, window):
     """
-    Fit parabola to BQX data and return TERM-BASED results (not coefficients).
+    Fit parabola to BQX data over every trailing window and return TERM-BASED results (not coefficients).
 
     CRITICAL: DO NOT normalize x for BQX data (already normalized).
 
     Args:
-        x: Array of time indices
         y: Array of BQX return values
+        window: Window length (rows without a full window are NaN)
 
     Returns:
-        dict: Term-based features (quadratic_term, linear_term, constant_term, residual, etc.)
+        dict: Term-based feature columns (quadratic_term, linear_term, constant_term, residual, etc.)
     """
-    try:
-        n = len(x)
-        if n < 3:
-            return None
-
-        # DO NOT NORMALIZE X (BQX is already normalized)
-        # This is critical - we use raw x values
-
-        # Polynomial fit (degree 2)
-        coeffs = np.polyfit(x, y, deg=2)
-        a2, a1, a0 = coeffs
-
-        # Get the last x value for term evaluation
-        x_end = x[-1]
-
-        # TERM-BASED CALCULATION (not coefficient-based)
-        quadratic_term = a2 * (x_end ** 2)
-        linear_term = a1 * x_end
-        constant_term = a0
-
-        # Prediction at x_end
-        prediction = quadratic_term + linear_term + constant_term
-
-        # Residual (actual - predicted)
-        y_end = y[-1]
-        residual = y_end - prediction
-
-        # Calculate R² and RMSE
-        y_pred = np.polyval(coeffs, x)
-        ss_res = np.sum((y - y_pred) ** 2)
-        ss_tot = np.sum((y - y.mean()) ** 2)
-        r2 = 1 - (ss_res / (ss_tot + 1e-10))
-        rmse = np.sqrt(ss_res / n)
-
-        return {
-            'quadratic_term': float(quadratic_term),
-            'linear_term': float(linear_term),
-            'constant_term': float(constant_term),
-            'residual': float(residual),
-            'r2': float(r2),
-            'rmse': float(rmse),
-            'prediction': float(prediction)
-        }
+    # DO NOT NORMALIZE X (BQX is already normalized)
+    # This is critical - we use raw x values 0..window-1
+    fit = rolling_quadratic_fit(np.asarray(y, dtype=np.float64), window)
 
-    except Exception as e:
-        logger.error(f"Error in fit_parabola_with_terms_bqx: {e}")
-        return None
+    # Last x value for term evaluation
+    x_end = window - 1
+
+    # TERM-BASED CALCULATION (not coefficient-based)
+    return {
+        'quadratic_term': fit['a'] * (x_end ** 2),
+        'linear_term': fit['b'] * x_end,
+        'constant_term': fit['c'],
+        'residual': fit['residual'],
+        'r2': 1 - (fit['ss_res'] / (fit['ss_tot'] + 1e-10)),
+        'rmse': fit['rmse'],
+        'prediction': fit['prediction']
+    }
 
 
 def create_reg_bqx_table_schema(pair):
@@ -234,136 +198,77 @@ def populate_reg_bqx_partition(pair, year_month):
         logger.info(f"{pair.upper()} {year_month}: Starting regression computation...")
 
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+        with connection() as conn:
+            cur = conn.cursor()
 
-        # Load BQX data for this month
-        year, month = year_month.split('_')
-        start_date = f"{year}-{month}-01"
+            # Load BQX data for this month
+            year, month = year_month.split('_')
+            start_date = f"{year}-{month}-01"
 
-        query = f"""
-        SELECT ts_utc, w15_bqx_return
-        FROM bqx.bqx_{pair}
-        WHERE ts_utc >= '{start_date}'::timestamp
-        AND ts_utc < ('{start_date}'::timestamp + INTERVAL '1 month')
-        AND w15_bqx_return IS NOT NULL
-        ORDER BY ts_utc
-        """
+            query = f"""
+            SELECT ts_utc, w15_bqx_return
+            FROM bqx.bqx_{pair}
+            WHERE ts_utc >= '{start_date}'::timestamp
+            AND ts_utc < ('{start_date}'::timestamp + INTERVAL '1 month')
+            AND w15_bqx_return IS NOT NULL
+            ORDER BY ts_utc
+            """
 
-        # Use SQLAlchemy engine for pandas (eliminates UserWarning)
-        df = pd.read_sql(query, ENGINE)
+            df = read_frame(conn, query)
 
-        if len(df) == 0:
-            logger.warning(f"{pair.upper()} {year_month}: No data found, skipping")
-            cur.close()
-            conn.close()
-            return (pair, year_month, True, 0, "No data")
-
-        logger.info(f"{pair.upper()} {year_month}: Loaded {len(df):,} rows")
-
-        # Prepare results DataFrame
-        results = df[['ts_utc']].copy()
-
-        # Compute regression for each window
-        for window in WINDOWS:
-            logger.info(f"{pair.upper()} {year_month}: Computing w{window}...")
-
-            window_features = []
-
-            for i in range(len(df)):
-                if i < window - 1:
-                    # Not enough data yet
-                    window_features.append({
-                        'quadratic_term': None,
-                        'linear_term': None,
-                        'constant_term': None,
-                        'residual': None,
-                        'r2': None,
-                        'rmse': None,
-                        'prediction': None
-                    })
-                else:
-                    # Get window data
-                    window_data = df.iloc[i - window + 1:i + 1]
-                    x = np.arange(len(window_data))
-                    y = window_data['w15_bqx_return'].values
-
-                    # Fit parabola with term-based calculation
-                    features = fit_parabola_with_terms_bqx(x, y)
-
-                    if features is None:
-                        features = {
-                            'quadratic_term': None,
-                            'linear_term': None,
-                            'constant_term': None,
-                            'residual': None,
-                            'r2': None,
-                            'rmse': None,
-                            'prediction': None
-                        }
-
-                    window_features.append(features)
-
-            # Add features to results DataFrame
-            for key in ['quadratic_term', 'linear_term', 'constant_term', 'residual', 'r2', 'rmse', 'prediction']:
-                col_name = f"w{window}_{key}"
-                results[col_name] = [f[key] for f in window_features]
-
-        # Remove rows with NaT timestamps
-        initial_count = len(results)
-        results = results[results['ts_utc'].notna()].copy()
-        if len(results) < initial_count:
-            logger.warning(f"{pair.upper()} {year_month}: Removed {initial_count - len(results)} rows with NaT timestamps")
-
-        # Insert results into partition
-        if len(results) > 0:
-            logger.info(f"{pair.upper()} {year_month}: Inserting {len(results):,} rows...")
-
-            # Build column list
-            columns = ['ts_utc']
+            if len(df) == 0:
+                logger.warning(f"{pair.upper()} {year_month}: No data found, skipping")
+                cur.close()
+                return (pair, year_month, True, 0, "No data")
+
+            logger.info(f"{pair.upper()} {year_month}: Loaded {len(df):,} rows")
+
+            # Prepare results DataFrame
+            results = df[['ts_utc']].copy()
+
+            # Compute regression for each window
             for window in WINDOWS:
-                for key in ['quadratic_term', 'linear_term', 'constant_term', 'residual', 'r2', 'rmse', 'prediction']:
-                    columns.append(f"w{window}_{key}")
-
-            # Build values for bulk insert
-            values_list = []
-            for _, row in results.iterrows():
-                row_values = []
-                for col in columns:
-                    val = row[col]
-                    if pd.isna(val):
-                        row_values.append('NULL')
-                    elif isinstance(val, (pd.Timestamp, datetime)):
-                        row_values.append(f"'{val}'")
-                    else:
-                        row_values.append(str(val))
-                values_list.append(f"({','.join(row_values)})")
-
-            # Execute bulk insert (in batches of 1000)
-            batch_size = 1000
-            for i in range(0, len(values_list), batch_size):
-                batch = values_list[i:i + batch_size]
-                insert_sql = f"""
-                INSERT INTO bqx.{partition_name} ({','.join(columns)})
-                VALUES {','.join(batch)}
-                ON CONFLICT (ts_utc) DO NOTHING
-                """
-                cur.execute(insert_sql)
-
-            conn.commit()
-
-            rows_inserted = len(results)
-            logger.info(f"{pair.upper()} {year_month}: Inserted {rows_inserted:,} rows")
-        else:
-            rows_inserted = 0
+                logger.info(f"{pair.upper()} {year_month}: Computing w{window}...")
 
-        cur.close()
-        conn.close()
+                # Fit parabola with term-based calculation (all rows at once)
+                window_features = compute_term_columns_bqx(df['w15_bqx_return'].values, window)
 
-        elapsed = time.time() - start_time
-        logger.info(f"✅ {pair.upper()} {year_month}: Complete! ({elapsed:.1f}s)")
+                # Add features to results DataFrame
+                for key in TERM_FEATURES:
+                    results[f"w{window}_{key}"] = window_features[key]
+
+            # Remove rows with NaT timestamps
+            initial_count = len(results)
+            results = results[results['ts_utc'].notna()].copy()
+            if len(results) < initial_count:
+                logger.warning(f"{pair.upper()} {year_month}: Removed {initial_count - len(results)} rows with NaT timestamps")
+
+            # Insert results into partition
+            if len(results) > 0:
+                logger.info(f"{pair.upper()} {year_month}: Inserting {len(results):,} rows...")
+
+                # Build column list
+                columns = ['ts_utc']
+                for window in WINDOWS:
+                    for key in TERM_FEATURES:
+                        columns.append(f"w{window}_{key}")
+
+                # Bulk insert via COPY into a staging table, then one merge
+                write_columns(conn, f"bqx.{partition_name}", results, mode='ignore', column_order=columns)
 
-        return (pair, year_month, True, rows_inserted, None)
+                conn.commit()
+
+                rows_inserted = len(results)
+                logger.info(f"{pair.upper()} {year_month}: Inserted {rows_inserted:,} rows")
+            else:
+                rows_inserted = 0
+
+            cur.close()
+
+            elapsed = time.time() - start_time
+            logger.info(f"✅ {pair.upper()} {year_month}: Complete! ({elapsed:.1f}s)")
+
+            return (pair, year_month, True, rows_inserted, None)
 
     except Exception as e:
         elapsed = time.time() - start_time
@@ -372,22 +277,21 @@ def populate_reg_bqx_partition(pair, year_month):
         return (pair, year_month, False, 0, error_msg)
 
 
-def rebuild_reg_bqx_for_pair(pair):
+def create_reg_bqx_tables(pair):
     """
-    Rebuild all partitions for a single pair.
+    Drop and recreate the reg_bqx table of a pair with all its partitions.
 
     Args:
         pair: Currency pair
 
     Returns:
-        dict: Results summary
+        int: Number of partitions created
     """
     logger.info(f"=" * 80)
     logger.info(f"{pair.upper()}: Starting rebuild")
     logger.info(f"=" * 80)
 
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
+    with connection() as conn:
         cur = conn.cursor()
 
         # Drop old table if exists
@@ -412,36 +316,18 @@ def rebuild_reg_bqx_for_pair(pair):
         conn.commit()
 
         cur.close()
-        conn.close()
-
-        logger.info(f"{pair.upper()}: Table structure created successfully")
 
-        # Populate all partitions
-        results = {'success': 0, 'failed': 0, 'no_data': 0, 'total_rows': 0}
-
-        for year_month in MONTHS:
-            pair_name, ym, success, rows, error_msg = populate_reg_bqx_partition(pair, year_month)
-
-            if success:
-                if error_msg and "No data" in error_msg:
-                    results['no_data'] += 1
-                else:
-                    results['success'] += 1
-                    results['total_rows'] += rows
-            else:
-                results['failed'] += 1
-
-        logger.info(f"{pair.upper()}: Rebuild complete - {results['success']}/{len(MONTHS)} partitions populated, {results['total_rows']:,} total rows")
-
-        return results
-
-    except Exception as e:
-        logger.error(f"❌ {pair.upper()}: Rebuild failed - {e}")
-        return {'success': 0, 'failed': len(MONTHS), 'no_data': 0, 'total_rows': 0}
+    logger.info(f"{pair.upper()}: Table structure created successfully")
+    return len(MONTHS)
 
 
 def main():
     """Main execution: Rebuild all reg_bqx tables."""
+    parser = argparse.ArgumentParser(description='Stage 2.12: rebuild reg_bqx with aligned windows')
+    parser.add_argument('--max-workers', type=int, default=8, help='Maximum number of parallel workers')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
     logger.info("=" * 80)
     logger.info("STAGE 2.12: REBUILD reg_bqx WITH ALIGNED WINDOWS")
     logger.info("=" * 80)
@@ -455,20 +341,39 @@ def main():
     logger.info("")
 
     start_time = time.time()
-
-    # Process pairs sequentially (can parallelize if needed)
-    all_results = {'pairs_success': 0, 'pairs_failed': 0, 'total_partitions': 0, 'total_rows': 0}
-
-    for pair in PAIRS:
-        results = rebuild_reg_bqx_for_pair(pair)
-
-        if results['failed'] == 0:
-            all_results['pairs_success'] += 1
+    ledger = JobLedger(args.ledger)
+    all_results = {'pairs_success': 0, 'pairs_failed': 0, 'total_partitions': 0, 'total_rows': 0, 'no_data': 0}
+
+    # 1. Tables: dropped and recreated once per pair. A pair whose tables are
+    # (re)created loses its populated partitions, so its ledger entries go too.
+    tables = run_jobs('stage_2_12_tables', [Job(pair, ALL_MONTHS, (pair,)) for pair in PAIRS],
+                      create_reg_bqx_tables, args.max_workers, ledger=ledger, force=args.force,
+                      attempts=args.attempts)
+    ready = set()
+    for result in tables:
+        if result.state == 'failed':
+            logger.error(f"❌ {result.job.pair.upper()}: Rebuild failed - {result.error}")
+            continue
+        if result.state == 'done':
+            ledger.reset('stage_2_12', result.job.pair)
+        ready.add(result.job.pair)
+
+    # 2. Partitions of every pair with tables, longest first across pairs
+    jobs = [Job(pair, ym, (pair, ym)) for pair in PAIRS if pair in ready for ym in MONTHS]
+    failed_pairs = set(PAIRS) - ready
+    for result in run_jobs('stage_2_12', jobs, populate_reg_bqx_partition, args.max_workers,
+                           outcome=lambda r: (r[2], r[3], r[4]), ledger=ledger,
+                           checksum=month_checksum('bqx.bqx_{pair}'), attempts=args.attempts):
+        if result.state == 'failed':
+            failed_pairs.add(result.job.pair)
+        elif result.result is not None and result.result[4] and "No data" in result.result[4]:
+            all_results['no_data'] += 1
         else:
-            all_results['pairs_failed'] += 1
+            all_results['total_partitions'] += 1
+            all_results['total_rows'] += result.rows
 
-        all_results['total_partitions'] += results['success']
-        all_results['total_rows'] += results['total_rows']
+    all_results['pairs_failed'] = len(failed_pairs)
+    all_results['pairs_success'] = len(PAIRS) - len(failed_pairs)
 
     elapsed = time.time() - start_time
 
@@ -481,6 +386,7 @@ def main():
     logger.info(f"Pairs processed: {all_results['pairs_success']}/{len(PAIRS)}")
     logger.info(f"Pairs failed: {all_results['pairs_failed']}/{len(PAIRS)}")
     logger.info(f"Partitions populated: {all_results['total_partitions']}/{len(PAIRS) * len(MONTHS)}")
+    logger.info(f"Partitions without data: {all_results['no_data']}")
     logger.info(f"Total rows: {all_results['total_rows']:,}")
     logger.info("")
 
@@ -14,27 +14,29 @@ Features Added (per partition):
 5. corr_resid_quad_bqx_60min - Correlation (normalized)
 6. corr_resid_lin_bqx_60min - Correlation (normalized)
 
+All covariances and correlations of a partition come from one pass of the
+rolling co-moment kernel (data.rolling_cov). The same code fills
+correlation_rate_* from reg_rate_* (--domains rate) and other REG windows
+(--windows 60 90 ...; columns are named *_{domain}_{window}min).
+
 Estimated Duration: 2-3 hours
 Estimated Cost: $0.80
 Risk: LOW (additive only, non-destructive)
 """
 
-import psycopg2
-import pandas as pd
+import argparse
 import numpy as np
 import logging
 import sys
 import os
 import time
-from concurrent.futures import ProcessPoolExecutor, as_completed
-
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection, read_frame
+from data.rolling_cov import rolling_comoments_windows
+from data.writer import write_columns
 
 # All 28 currency pairs
 PAIRS = [
@@ -55,6 +57,20 @@ MONTHS = [
 # Window size for covariance calculation
 COVARIANCE_WINDOW = 60  # 60 minutes (1 hour rolling window)
 
+# Regression source family of each target correlation family
+DOMAINS = {
+    'bqx': 'reg_bqx',
+    'rate': 'reg_rate'
+}
+
+# Regression terms (column suffix in the source table) and the term pairs
+TERMS = [
+    ('quad', 'quadratic_term'),
+    ('lin', 'linear_term'),
+    ('resid', 'residual')
+]
+TERM_PAIRS = [('quad', 'lin'), ('resid', 'quad'), ('resid', 'lin')]
+
 # Create logs directory
 os.makedirs('/tmp/logs/remediation/stage_2_14', exist_ok=True)
 
@@ -70,74 +86,83 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def add_covariance_columns_to_table(pair):
+def covariance_columns(domain='bqx', windows=(COVARIANCE_WINDOW,)):
     """
-    Add 6 covariance feature columns to correlation_bqx parent table.
+    Covariance/correlation column names for a domain and window list.
+
+    Args:
+        domain: 'bqx' or 'rate'
+        windows: REG windows
+
+    Returns:
+        list: e.g. ['cov_quad_lin_bqx_60min', ..., 'corr_resid_lin_bqx_60min']
+    """
+    return [
+        f"{kind}_{a}_{b}_{domain}_{window}min"
+        for window in windows
+        for kind in ('cov', 'corr')
+        for a, b in TERM_PAIRS
+    ]
+
+
+def add_covariance_columns_to_table(pair, domain='bqx', windows=(COVARIANCE_WINDOW,)):
+    """
+    Add covariance feature columns to a correlation parent table.
 
     Args:
         pair: Currency pair (e.g., 'eurusd')
+        domain: 'bqx' (correlation_bqx) or 'rate' (correlation_rate)
+        windows: REG windows
 
     Returns:
         bool: Success status
     """
-    table_name = f"correlation_bqx_{pair}"
+    table_name = f"correlation_{domain}_{pair}"
 
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Check if table exists
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'bqx'
-                AND table_name = %s
-            )
-        """, (table_name,))
+        with connection() as conn:
+            cur = conn.cursor()
 
-        if not cur.fetchone()[0]:
-            logger.warning(f"{pair.upper()}: Table {table_name} does not exist, skipping")
-            cur.close()
-            conn.close()
-            return False
-
-        logger.info(f"{pair.upper()}: Adding covariance columns to {table_name}...")
-
-        # Add all 6 columns
-        covariance_columns = [
-            'cov_quad_lin_bqx_60min',
-            'cov_resid_quad_bqx_60min',
-            'cov_resid_lin_bqx_60min',
-            'corr_quad_lin_bqx_60min',
-            'corr_resid_quad_bqx_60min',
-            'corr_resid_lin_bqx_60min'
-        ]
-
-        for col in covariance_columns:
-            # Check if column exists
+            # Check if table exists
             cur.execute("""
                 SELECT EXISTS (
-                    SELECT FROM information_schema.columns
+                    SELECT FROM information_schema.tables
                     WHERE table_schema = 'bqx'
                     AND table_name = %s
-                    AND column_name = %s
                 )
-            """, (table_name, col))
-
-            if cur.fetchone()[0]:
-                logger.info(f"{pair.upper()}: Column {col} already exists, skipping")
-                continue
-
-            # Add column
-            cur.execute(f"""
-                ALTER TABLE bqx.{table_name}
-                ADD COLUMN {col} DOUBLE PRECISION
-            """)
-            logger.info(f"{pair.upper()}: Added {col}")
-
-        conn.commit()
-        cur.close()
-        conn.close()
+            """, (table_name,))
+
+            if not cur.fetchone()[0]:
+                logger.warning(f"{pair.upper()}: Table {table_name} does not exist, skipping")
+                cur.close()
+                return False
+
+            logger.info(f"{pair.upper()}: Adding covariance columns to {table_name}...")
+
+            for col in covariance_columns(domain, windows):
+                # Check if column exists
+                cur.execute("""
+                    SELECT EXISTS (
+                        SELECT FROM information_schema.columns
+                        WHERE table_schema = 'bqx'
+                        AND table_name = %s
+                        AND column_name = %s
+                    )
+                """, (table_name, col))
+
+                if cur.fetchone()[0]:
+                    logger.info(f"{pair.upper()}: Column {col} already exists, skipping")
+                    continue
+
+                # Add column
+                cur.execute(f"""
+                    ALTER TABLE bqx.{table_name}
+                    ADD COLUMN {col} DOUBLE PRECISION
+                """)
+                logger.info(f"{pair.upper()}: Added {col}")
+
+            conn.commit()
+            cur.close()
 
         logger.info(f"✅ {pair.upper()}: Columns added successfully")
         return True
@@ -147,169 +172,122 @@ def add_covariance_columns_to_table(pair):
         return False
 
 
-def calculate_term_covariances(quadratic_term, linear_term, residual, window_size=60):
+def calculate_term_covariances(terms, window_size=COVARIANCE_WINDOW):
     """
-    Calculate covariances and correlations between regression terms.
+    Trailing-window covariances and correlations between regression terms.
+
+    Row i uses rows i-window_size+1 .. i; earlier rows are NaN.
 
     Args:
-        quadratic_term: Series of quadratic term values
-        linear_term: Series of linear term values
-        residual: Series of residual values
+        terms: Dict of term name ('quad', 'lin', 'resid') -> array
         window_size: Rolling window size (default 60 minutes)
 
     Returns:
-        dict: Covariance and correlation values
+        dict: 'cov_quad_lin', ..., 'corr_resid_lin' -> float64 arrays
     """
-    try:
-        # Need at least window_size points
-        if len(quadratic_term) < window_size:
-            return {
-                'cov_quad_lin': None,
-                'cov_resid_quad': None,
-                'cov_resid_lin': None,
-                'corr_quad_lin': None,
-                'corr_resid_quad': None,
-                'corr_resid_lin': None
-            }
-
-        # Get last window_size values
-        quad_window = quadratic_term[-window_size:]
-        lin_window = linear_term[-window_size:]
-        resid_window = residual[-window_size:]
-
-        # Calculate covariances
-        cov_quad_lin = np.cov(quad_window, lin_window)[0, 1]
-        cov_resid_quad = np.cov(resid_window, quad_window)[0, 1]
-        cov_resid_lin = np.cov(resid_window, lin_window)[0, 1]
-
-        # Calculate correlations (normalized to [-1, 1])
-        corr_quad_lin = np.corrcoef(quad_window, lin_window)[0, 1]
-        corr_resid_quad = np.corrcoef(resid_window, quad_window)[0, 1]
-        corr_resid_lin = np.corrcoef(resid_window, lin_window)[0, 1]
-
-        return {
-            'cov_quad_lin': float(cov_quad_lin) if not np.isnan(cov_quad_lin) else None,
-            'cov_resid_quad': float(cov_resid_quad) if not np.isnan(cov_resid_quad) else None,
-            'cov_resid_lin': float(cov_resid_lin) if not np.isnan(cov_resid_lin) else None,
-            'corr_quad_lin': float(corr_quad_lin) if not np.isnan(corr_quad_lin) else None,
-            'corr_resid_quad': float(corr_resid_quad) if not np.isnan(corr_resid_quad) else None,
-            'corr_resid_lin': float(corr_resid_lin) if not np.isnan(corr_resid_lin) else None
-        }
+    names = [name for name, _ in TERMS]
+    values = np.column_stack([np.asarray(terms[name], dtype=np.float64) for name in names])
+    moments = rolling_comoments_windows(values, [window_size])[window_size]
 
-    except Exception as e:
-        logger.error(f"Error calculating covariances: {e}")
-        return {
-            'cov_quad_lin': None,
-            'cov_resid_quad': None,
-            'cov_resid_lin': None,
-            'corr_quad_lin': None,
-            'corr_resid_quad': None,
-            'corr_resid_lin': None
-        }
-
-
-def populate_covariance_features(pair, year_month):
+    features = {}
+    for a, b in TERM_PAIRS:
+        cov, corr = moments.pair(names.index(a), names.index(b))
+        features[f"cov_{a}_{b}"] = cov
+        features[f"corr_{a}_{b}"] = corr
+    return features
+
+
+def compute_covariance_features(frame, domain='bqx', windows=(COVARIANCE_WINDOW,)):
+    """
+    All covariance columns of one partition.
+
+    For each window, rows with a NULL term in that window are skipped and
+    the rolling windows run over the remaining rows (as the former
+    `WHERE ... IS NOT NULL` read did); skipped rows get NULL.
+
+    Args:
+        frame: DataFrame with w{window}_{term} columns in time order
+        domain: Column name suffix domain
+        windows: REG windows
+
+    Returns:
+        dict: Column name -> float64 array of len(frame)
+    """
+    n = len(frame)
+    features = {}
+
+    for window in windows:
+        values = np.column_stack([
+            frame[f"w{window}_{term}"].to_numpy(dtype=np.float64) for _, term in TERMS
+        ])
+        valid = ~np.isnan(values).any(axis=1)
+
+        window_features = calculate_term_covariances(
+            {name: values[valid, j] for j, (name, _) in enumerate(TERMS)},
+            window_size=window
+        )
+
+        for kind in ('cov', 'corr'):
+            for a, b in TERM_PAIRS:
+                column = np.full(n, np.nan)
+                column[valid] = window_features[f"{kind}_{a}_{b}"]
+                features[f"{kind}_{a}_{b}_{domain}_{window}min"] = column
+
+    return features
+
+
+def populate_covariance_features(pair, year_month, domain='bqx', windows=(COVARIANCE_WINDOW,)):
     """
     Populate covariance features for a single partition.
 
     Args:
         pair: Currency pair
         year_month: Month partition
+        domain: 'bqx' (reg_bqx -> correlation_bqx) or 'rate' (reg_rate -> correlation_rate)
+        windows: REG windows
 
     Returns:
         tuple: (pair, year_month, success, rows_updated, error_msg)
     """
     start_time = time.time()
-    partition_name = f"correlation_bqx_{pair}_{year_month}"
+    partition_name = f"correlation_{domain}_{pair}_{year_month}"
+    source_name = f"{DOMAINS[domain]}_{pair}_{year_month}"
 
     try:
-        logger.info(f"{pair.upper()} {year_month}: Starting covariance calculation...")
-
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # Load regression term data from reg_bqx table
-        year, month = year_month.split('_')
-        start_date = f"{year}-{month}-01"
-
-        query = f"""
-        SELECT ts_utc,
-               w60_quadratic_term,
-               w60_linear_term,
-               w60_residual
-        FROM bqx.reg_bqx_{pair}_{year_month}
-        WHERE w60_quadratic_term IS NOT NULL
-        AND w60_linear_term IS NOT NULL
-        AND w60_residual IS NOT NULL
-        ORDER BY ts_utc
-        """
-
-        df = pd.read_sql(query, conn)
-
-        if len(df) == 0:
-            logger.warning(f"{pair.upper()} {year_month}: No data found, skipping")
-            cur.close()
-            conn.close()
-            return (pair, year_month, True, 0, "No data")
-
-        logger.info(f"{pair.upper()} {year_month}: Loaded {len(df):,} rows")
-
-        # Calculate covariances for each row
-        covariance_features = []
-        for i in range(len(df)):
-            if i < COVARIANCE_WINDOW - 1:
-                # Not enough data yet
-                covariance_features.append({
-                    'cov_quad_lin': None,
-                    'cov_resid_quad': None,
-                    'cov_resid_lin': None,
-                    'corr_quad_lin': None,
-                    'corr_resid_quad': None,
-                    'corr_resid_lin': None
-                })
-            else:
-                # Calculate covariances using rolling window
-                features = calculate_term_covariances(
-                    df['w60_quadratic_term'].iloc[:i+1],
-                    df['w60_linear_term'].iloc[:i+1],
-                    df['w60_residual'].iloc[:i+1],
-                    window_size=COVARIANCE_WINDOW
-                )
-                covariance_features.append(features)
-
-        # Update correlation_bqx table with covariance features
-        logger.info(f"{pair.upper()} {year_month}: Updating {len(df):,} rows...")
-
-        rows_updated = 0
-        for idx, row in df.iterrows():
-            ts_utc = row['ts_utc']
-            features = covariance_features[idx]
-
-            update_sql = f"""
-            UPDATE bqx.{partition_name}
-            SET cov_quad_lin_bqx_60min = %s,
-                cov_resid_quad_bqx_60min = %s,
-                cov_resid_lin_bqx_60min = %s,
-                corr_quad_lin_bqx_60min = %s,
-                corr_resid_quad_bqx_60min = %s,
-                corr_resid_lin_bqx_60min = %s
-            WHERE ts_utc = %s
+        logger.info(f"{pair.upper()} {year_month}: Starting {domain} covariance calculation...")
+
+        with connection() as conn:
+            # Load regression term data from the REG table
+            term_columns = [f"w{window}_{term}" for window in windows for _, term in TERMS]
+            not_null = ' OR '.join(
+                '(' + ' AND '.join(f"w{window}_{term} IS NOT NULL" for _, term in TERMS) + ')'
+                for window in windows
+            )
+
+            query = f"""
+            SELECT ts_utc, {', '.join(term_columns)}
+            FROM bqx.{source_name}
+            WHERE {not_null}
+            ORDER BY ts_utc
             """
 
-            cur.execute(update_sql, (
-                features['cov_quad_lin'],
-                features['cov_resid_quad'],
-                features['cov_resid_lin'],
-                features['corr_quad_lin'],
-                features['corr_resid_quad'],
-                features['corr_resid_lin'],
-                ts_utc
-            ))
-            rows_updated += cur.rowcount
-
-        conn.commit()
-        cur.close()
-        conn.close()
+            df = read_frame(conn, query)
+
+            if len(df) == 0:
+                logger.warning(f"{pair.upper()} {year_month}: No data found, skipping")
+                return (pair, year_month, True, 0, "No data")
+
+            logger.info(f"{pair.upper()} {year_month}: Loaded {len(df):,} rows")
+
+            # One kernel pass per window for every row
+            updates = {'ts_utc': df['ts_utc']}
+            updates.update(compute_covariance_features(df, domain, windows))
+
+            # Update correlation table with covariance features (COPY + one UPDATE ... FROM)
+            logger.info(f"{pair.upper()} {year_month}: Updating {len(df):,} rows...")
+            rows_updated = write_columns(conn, f"bqx.{partition_name}", updates, mode='update')
+
+            conn.commit()
 
         elapsed = time.time() - start_time
         logger.info(f"✅ {pair.upper()} {year_month}: Complete! Updated {rows_updated:,} rows ({elapsed:.1f}s)")
@@ -323,29 +301,31 @@ def populate_covariance_features(pair, year_month):
         return (pair, year_month, False, 0, error_msg)
 
 
-def process_pair(pair):
+def process_pair(pair, domain='bqx', windows=(COVARIANCE_WINDOW,)):
     """
     Process all partitions for a single pair.
 
     Args:
         pair: Currency pair
+        domain: 'bqx' or 'rate'
+        windows: REG windows
 
     Returns:
         dict: Results summary
     """
     logger.info(f"=" * 80)
-    logger.info(f"{pair.upper()}: Starting covariance feature addition")
+    logger.info(f"{pair.upper()}: Starting {domain} covariance feature addition")
     logger.info(f"=" * 80)
 
     # First, add columns to parent table
-    if not add_covariance_columns_to_table(pair):
+    if not add_covariance_columns_to_table(pair, domain, windows):
         return {'success': 0, 'failed': 12, 'no_data': 0, 'total_rows': 0}
 
     # Then populate all partitions
     results = {'success': 0, 'failed': 0, 'no_data': 0, 'total_rows': 0}
 
     for year_month in MONTHS:
-        pair_name, ym, success, rows, error_msg = populate_covariance_features(pair, year_month)
+        pair_name, ym, success, rows, error_msg = populate_covariance_features(pair, year_month, domain, windows)
 
         if success:
             if error_msg and "No data" in error_msg:
@@ -363,6 +343,13 @@ def process_pair(pair):
 
 def main():
     """Main execution: Add covariance features to all correlation_bqx tables."""
+    parser = argparse.ArgumentParser(description='Add term covariance features (Stage 2.14)')
+    parser.add_argument('--domains', nargs='+', choices=list(DOMAINS), default=['bqx'],
+                        help='Correlation families to fill (bqx: correlation_bqx, rate: correlation_rate)')
+    parser.add_argument('--windows', nargs='+', type=int, default=[COVARIANCE_WINDOW],
+                        help='REG windows to compute covariances for')
+    args = parser.parse_args()
+
     logger.info("=" * 80)
     logger.info("STAGE 2.14: ADD TERM COVARIANCE FEATURES")
     logger.info("=" * 80)
@@ -370,8 +357,9 @@ def main():
     logger.info(f"Currency pairs: {len(PAIRS)}")
     logger.info(f"Months per pair: {len(MONTHS)}")
     logger.info(f"Total partitions: {len(PAIRS) * len(MONTHS)}")
-    logger.info(f"Features to add: 6 per partition")
-    logger.info(f"Covariance window: {COVARIANCE_WINDOW} minutes")
+    logger.info(f"Domains: {args.domains}")
+    logger.info(f"Features to add: {len(covariance_columns('bqx', args.windows))} per partition")
+    logger.info(f"Covariance windows: {args.windows} minutes")
     logger.info("")
 
     start_time = time.time()
@@ -379,16 +367,17 @@ def main():
     # Process pairs sequentially
     all_results = {'pairs_success': 0, 'pairs_failed': 0, 'total_partitions': 0, 'total_rows': 0}
 
-    for pair in PAIRS:
-        results = process_pair(pair)
+    for domain in args.domains:
+        for pair in PAIRS:
+            results = process_pair(pair, domain, args.windows)
 
-        if results['failed'] == 0:
-            all_results['pairs_success'] += 1
-        else:
-            all_results['pairs_failed'] += 1
+            if results['failed'] == 0:
+                all_results['pairs_success'] += 1
+            else:
+                all_results['pairs_failed'] += 1
 
-        all_results['total_partitions'] += results['success']
-        all_results['total_rows'] += results['total_rows']
+            all_results['total_partitions'] += results['success']
+            all_results['total_rows'] += results['total_rows']
 
     elapsed = time.time() - start_time
 
@@ -398,9 +387,9 @@ def main():
     logger.info("=" * 80)
     logger.info("")
     logger.info(f"Duration: {elapsed/60:.1f} minutes ({elapsed/3600:.2f} hours)")
-    logger.info(f"Pairs processed: {all_results['pairs_success']}/{len(PAIRS)}")
-    logger.info(f"Pairs failed: {all_results['pairs_failed']}/{len(PAIRS)}")
-    logger.info(f"Partitions updated: {all_results['total_partitions']}/{len(PAIRS) * len(MONTHS)}")
+    logger.info(f"Pairs processed: {all_results['pairs_success']}/{len(PAIRS) * len(args.domains)}")
+    logger.info(f"Pairs failed: {all_results['pairs_failed']}/{len(PAIRS) * len(args.domains)}")
+    logger.info(f"Partitions updated: {all_results['total_partitions']}/{len(PAIRS) * len(MONTHS) * len(args.domains)}")
     logger.info(f"Total rows updated: {all_results['total_rows']:,}")
     logger.info("")
 
@@ -14,18 +14,26 @@ For each window [60, 90, 150, 240, 390, 630], computes rolling covariances betwe
 
 Total Features: 36 per partition × 28 pairs = 1,008 features
 
+The four terms of a window go through the rolling co-moment kernel
+(data.rolling_cov) once, giving all six covariances; each partition is
+written with one COPY + UPDATE ... FROM.
+
 Duration: 2-3 hours
 Cost: $0 (existing infrastructure)
 """
 
-import psycopg2
-import pandas as pd
 import numpy as np
 import os
+import sys
 import logging
 from datetime import datetime
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection, read_frame
+from data.rolling_cov import rolling_comoments_windows
+from data.writer import write_columns
 
 # Configure logging
 os.makedirs('/tmp/logs/remediation/stage_2_14', exist_ok=True)
@@ -39,18 +47,6 @@ logging.basicConfig(
     ]
 )
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
-
-# Create SQLAlchemy engine
-DB_URL = f"postgresql://{DB_CONFIG['user']}:{quote_plus(DB_CONFIG['password'])}@{DB_CONFIG['host']}/{DB_CONFIG['database']}"
-ENGINE = create_engine(DB_URL, pool_pre_ping=True)
-
 # Currency pairs
 CURRENCY_PAIRS = [
     'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
@@ -81,9 +77,8 @@ TERM_PAIRS = [
     ('constant_term', 'residual', 'const_resid')
 ]
 
-def get_db_connection():
-    """Create database connection"""
-    return psycopg2.connect(**DB_CONFIG)
+# Regression terms, in kernel column order
+TERMS = ['quadratic_term', 'linear_term', 'constant_term', 'residual']
 
 def add_covariance_columns(conn, pair):
     """Add covariance columns to reg_bqx parent table"""
@@ -104,7 +99,7 @@ def add_covariance_columns(conn, pair):
             cursor.execute(alter_sql)
             conn.commit()
             logging.info(f"{pair.upper()}: Added {len(alter_clauses)} covariance columns")
-        except psycopg2.Error as e:
+        except Exception as e:
             logging.error(f"{pair.upper()}: Error adding columns - {e}")
             conn.rollback()
             raise
@@ -117,11 +112,11 @@ def process_partition(conn, pair, year_month):
     start_time = datetime.now()
 
     # Read data
-    select_cols = ['ts_utc'] + [f'w{w}_{term}' for w in WINDOWS for term in ['quadratic_term', 'linear_term', 'constant_term', 'residual']]
+    select_cols = ['ts_utc'] + [f'w{w}_{term}' for w in WINDOWS for term in TERMS]
     query = f"SELECT {', '.join(select_cols)} FROM bqx.{table_name} ORDER BY ts_utc"
 
     try:
-        df = pd.read_sql(query, ENGINE)
+        df = read_frame(conn, query)
 
         if df.empty:
             logging.warning(f"{pair.upper()} {year_month}: No data")
@@ -129,41 +124,19 @@ def process_partition(conn, pair, year_month):
 
         logging.info(f"{pair.upper()} {year_month}: Loaded {len(df)} rows")
 
-        # Compute rolling covariances for each window
+        # Rolling covariances: all six term pairs of a window from one kernel pass
+        updates = {'ts_utc': df['ts_utc']}
         for window in WINDOWS:
-            for term1, term2, abbrev in TERM_PAIRS:
-                col1 = f'w{window}_{term1}'
-                col2 = f'w{window}_{term2}'
-                cov_col = f'w{window}_cov_{abbrev}'
-
-                # Rolling covariance
-                df[cov_col] = df[col1].rolling(window=window, min_periods=window).cov(df[col2])
-
-        # Update database in batches
-        cursor = conn.cursor()
-        cov_cols = [f'w{w}_cov_{abbrev}' for w in WINDOWS for _, _, abbrev in TERM_PAIRS]
-
-        batch_size = 1000
-        total_updated = 0
-
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i+batch_size]
-
-            for _, row in batch.iterrows():
-                set_clause = ', '.join([f"{col} = %s" for col in cov_cols])
-                # Convert NaN to None for proper NULL handling in PostgreSQL
-                values = [None if pd.isna(row[col]) else row[col] for col in cov_cols] + [row['ts_utc']]
-
-                update_sql = f"UPDATE bqx.{table_name} SET {set_clause} WHERE ts_utc = %s"
-                cursor.execute(update_sql, values)
+            values = np.column_stack([df[f'w{window}_{term}'].to_numpy(dtype=np.float64) for term in TERMS])
+            moments = rolling_comoments_windows(values, [window])[window]
 
-            conn.commit()
-            total_updated += len(batch)
-
-            if total_updated % 5000 == 0:
-                logging.info(f"{pair.upper()} {year_month}: Updated {total_updated}/{len(df)} rows")
+            for term1, term2, abbrev in TERM_PAIRS:
+                cov, _ = moments.pair(TERMS.index(term1), TERMS.index(term2))
+                updates[f'w{window}_cov_{abbrev}'] = cov
 
-        cursor.close()
+        # Bulk update (COPY + one UPDATE ... FROM)
+        total_updated = write_columns(conn, f"bqx.{table_name}", updates, mode='update')
+        conn.commit()
 
         duration = (datetime.now() - start_time).total_seconds()
         logging.info(f"✅ {pair.upper()} {year_month}: Complete! {total_updated} rows in {duration:.1f}s")
@@ -188,47 +161,45 @@ def main():
     logging.info(f"Features per partition: {len(WINDOWS) * len(TERM_PAIRS)}")
     logging.info("")
 
-    conn = get_db_connection()
     overall_start = datetime.now()
     total_rows = 0
     total_partitions = 0
 
-    try:
-        for pair in CURRENCY_PAIRS:
-            logging.info("=" * 80)
-            logging.info(f"{pair.upper()}: Starting")
-            logging.info("=" * 80)
+    with connection() as conn:
+        try:
+            for pair in CURRENCY_PAIRS:
+                logging.info("=" * 80)
+                logging.info(f"{pair.upper()}: Starting")
+                logging.info("=" * 80)
 
-            # Add columns
-            add_covariance_columns(conn, pair)
+                # Add columns
+                add_covariance_columns(conn, pair)
 
-            # Process partitions
-            for year_month in YEAR_MONTHS:
-                rows = process_partition(conn, pair, year_month)
-                total_rows += rows
-                total_partitions += 1
+                # Process partitions
+                for year_month in YEAR_MONTHS:
+                    rows = process_partition(conn, pair, year_month)
+                    total_rows += rows
+                    total_partitions += 1
 
-            logging.info(f"{pair.upper()}: Complete - {len(YEAR_MONTHS)} partitions")
+                logging.info(f"{pair.upper()}: Complete - {len(YEAR_MONTHS)} partitions")
 
-        duration = (datetime.now() - overall_start).total_seconds()
+            duration = (datetime.now() - overall_start).total_seconds()
 
-        logging.info("")
-        logging.info("=" * 80)
-        logging.info("STAGE 2.14 COMPLETE")
-        logging.info("=" * 80)
-        logging.info(f"Partitions: {total_partitions}")
-        logging.info(f"Rows updated: {total_rows:,}")
-        logging.info(f"Duration: {duration/3600:.2f} hours")
-        logging.info(f"Features added: {len(WINDOWS) * len(TERM_PAIRS) * len(CURRENCY_PAIRS):,}")
-        logging.info("✅ All covariance features added successfully")
+            logging.info("")
+            logging.info("=" * 80)
+            logging.info("STAGE 2.14 COMPLETE")
+            logging.info("=" * 80)
+            logging.info(f"Partitions: {total_partitions}")
+            logging.info(f"Rows updated: {total_rows:,}")
+            logging.info(f"Duration: {duration/3600:.2f} hours")
+            logging.info(f"Features added: {len(WINDOWS) * len(TERM_PAIRS) * len(CURRENCY_PAIRS):,}")
+            logging.info("✅ All covariance features added successfully")
 
-        return 0
+            return 0
 
-    except Exception as e:
-        logging.error(f"Fatal error: {e}")
-        return 1
-    finally:
-        conn.close()
+        except Exception as e:
+            logging.error(f"Fatal error: {e}")
+            return 1
 
 if __name__ == '__main__':
     exit(main())
@@ -15,7 +15,8 @@ Features Added (per partition): 224
 
 Total Features: 8 × 28 = 224 features per partition
 
-Duration: ~20 hours (c7i.8xlarge)
+Duration: minutes (basket indices and rolling features are computed once
+per month on a cross-pair panel; see MonthBaskets)
 Cost: $8 (Spot pricing)
 Impact: +5-8% directional accuracy
 
@@ -25,14 +26,20 @@ Dependencies:
 - Stage 2.15 complete (validation passed)
 """
 
-import psycopg2
-import pandas as pd
 import numpy as np
 import logging
 import sys
 import os
 import time
 from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from data.db import connection
+from data.panel import load_panel, month_range
+from data.rolling_stats import rolling_apply, window_std
+from data.writer import write_columns
 
 # Configure logging
 os.makedirs('/tmp/logs/tier1/stage_2_3', exist_ok=True)
@@ -47,14 +54,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'trillium-bqx-cluster.cluster-cgb6gegwk5qz.us-east-1.rds.amazonaws.com'),
-    'database': 'bqx',
-    'user': 'postgres',
-    'password': os.environ.get('DB_PASSWORD', 'BQX_Aurora_2025_Secure')
-}
-
 # All 28 currency pairs
 CURRENCY_PAIRS = [
     'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
@@ -91,6 +90,21 @@ BASKET_PAIRS = {
     'CHF': ['usdchf', 'eurchf', 'gbpchf', 'audchf', 'nzdchf', 'cadchf', 'chfjpy']
 }
 
+# Currency groups for basket strength features
+CURRENCY_GROUPS = {
+    'major': ['USD', 'EUR', 'JPY', 'GBP'],
+    'safe_haven': ['CHF', 'JPY'],
+    'commodity': ['AUD', 'NZD', 'CAD']
+}
+
+# w60 predictions of every pair in a month, read once into a cross-pair panel
+PREDICTION_QUERY = """
+    SELECT ts_utc, w60_prediction
+    FROM bqx.reg_bqx_{pair}_{year_month}
+    WHERE ts_utc >= %s AND ts_utc < %s
+    ORDER BY ts_utc
+"""
+
 
 def get_pair_direction(pair, currency):
     """
@@ -112,6 +126,33 @@ def get_pair_direction(pair, currency):
         return 0  # Currency not in this pair
 
 
+def feature_columns():
+    """The 224 currency index column names, in table order"""
+    columns = []
+
+    for currency in MAJOR_CURRENCIES:
+        curr_lower = currency.lower()
+
+        # Base index
+        columns.append(f"{curr_lower}_basket_index")
+
+        # Momentum and volatility features for each window
+        for window in WINDOWS:
+            # Momentum features (3 per window)
+            columns.append(f"{curr_lower}_basket_momentum_{window}min")
+            columns.append(f"{curr_lower}_basket_momentum_accel_{window}min")
+            columns.append(f"{curr_lower}_basket_momentum_roc_{window}min")
+
+            # Volatility feature (1 per window)
+            columns.append(f"{curr_lower}_basket_volatility_{window}min")
+
+        # Basket strength features (3 total)
+        for group in CURRENCY_GROUPS:
+            columns.append(f"{curr_lower}_basket_strength_vs_{group}")
+
+    return columns
+
+
 def add_currency_index_columns(conn, pair):
     """
     Add currency index columns to reg_bqx parent table.
@@ -145,26 +186,7 @@ def add_currency_index_columns(conn, pair):
         logger.info(f"{pair.upper()}: Adding currency index columns...")
 
         # Generate column definitions
-        columns_to_add = []
-
-        for currency in MAJOR_CURRENCIES:
-            # Base index
-            columns_to_add.append(f"{currency.lower()}_basket_index")
-
-            # Momentum and volatility features for each window
-            for window in WINDOWS:
-                # Momentum features (3 per window)
-                columns_to_add.append(f"{currency.lower()}_basket_momentum_{window}min")
-                columns_to_add.append(f"{currency.lower()}_basket_momentum_accel_{window}min")
-                columns_to_add.append(f"{currency.lower()}_basket_momentum_roc_{window}min")
-
-                # Volatility feature (1 per window)
-                columns_to_add.append(f"{currency.lower()}_basket_volatility_{window}min")
-
-            # Basket strength features (3 total)
-            columns_to_add.append(f"{currency.lower()}_basket_strength_vs_major")
-            columns_to_add.append(f"{currency.lower()}_basket_strength_vs_safe_haven")
-            columns_to_add.append(f"{currency.lower()}_basket_strength_vs_commodity")
+        columns_to_add = feature_columns()
 
         # Add all columns
         for col in columns_to_add:
@@ -200,167 +222,168 @@ def add_currency_index_columns(conn, pair):
         return False
 
 
-def calculate_currency_index(df_dict, currency, timestamp):
+def basket_weights(pairs):
     """
-    Calculate basket index for a currency at given timestamp.
+    Signed basket weights of each pair.
 
     Args:
-        df_dict: Dictionary of DataFrames (pair -> DataFrame with ts_utc, w60_prediction)
-        currency: Currency code (e.g., 'USD')
-        timestamp: Timestamp to calculate index for
+        pairs: Pair order of the prediction matrix
 
     Returns:
-        float: Currency basket index value
+        np.ndarray: (pairs, currencies) matrix, +1 where the currency is
+        the pair's base, -1 where it is the quote, 0 outside the basket
     """
-    basket_pairs = BASKET_PAIRS.get(currency, [])
-    if not basket_pairs:
-        return None
-
-    values = []
-    for pair in basket_pairs:
-        if pair not in df_dict:
-            continue
+    weights = np.zeros((len(pairs), len(MAJOR_CURRENCIES)))
+    for j, currency in enumerate(MAJOR_CURRENCIES):
+        for pair in BASKET_PAIRS[currency]:
+            if pair in pairs:
+                weights[pairs.index(pair), j] = get_pair_direction(pair, currency)
+    return weights
 
-        df = df_dict[pair]
-        row = df[df['ts_utc'] == timestamp]
 
-        if len(row) == 0:
-            continue
-
-        # Get prediction value (60-minute window prediction)
-        pred_value = row['w60_prediction'].iloc[0]
-
-        if pd.isna(pred_value):
-            continue
-
-        # Adjust for direction (base vs quote)
-        direction = get_pair_direction(pair, currency)
-        if direction == 0:
-            continue
-
-        values.append(pred_value * direction)
-
-    if len(values) == 0:
-        return None
-
-    # Basket index is the average of constituent pair predictions
-    return np.mean(values)
-
-
-def calculate_basket_momentum(basket_series, window):
+def compute_basket_indices(predictions, pairs):
     """
-    Calculate momentum features for basket index.
+    Basket index of every currency at every timestamp.
+
+    The basket index is the average of the direction-adjusted w60
+    predictions of the constituent pairs available at that timestamp
+    (NaN = pair has no row or a NULL prediction).
 
     Args:
-        basket_series: Series of basket index values
-        window: Window size in minutes
+        predictions: (timestamps, pairs) w60_prediction matrix
+        pairs: Pair order of the columns
 
     Returns:
-        dict: Momentum features
+        np.ndarray: (timestamps, currencies) basket indices, NaN where no
+        constituent is available
     """
-    if len(basket_series) < window:
-        return {
-            'momentum': None,
-            'momentum_accel': None,
-            'momentum_roc': None
-        }
-
-    # Get last window values
-    values = basket_series.iloc[-window:].values
-
-    # Momentum (rate of change)
-    momentum = values[-1] - values[0]
-
-    # Momentum acceleration (2nd derivative)
-    if len(values) >= 2:
-        mid_point = len(values) // 2
-        first_half_momentum = values[mid_point] - values[0]
-        second_half_momentum = values[-1] - values[mid_point]
-        momentum_accel = second_half_momentum - first_half_momentum
-    else:
-        momentum_accel = None
+    weights = basket_weights(list(pairs))
+    valid = ~np.isnan(predictions)
 
-    # Rate of change (percentage)
-    if values[0] != 0:
-        momentum_roc = (values[-1] - values[0]) / abs(values[0]) * 100
-    else:
-        momentum_roc = None
+    sums = np.where(valid, predictions, 0.0) @ weights
+    counts = valid.astype(np.float64) @ np.abs(weights)
 
-    return {
-        'momentum': momentum,
-        'momentum_accel': momentum_accel,
-        'momentum_roc': momentum_roc
-    }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
 
 
-def calculate_basket_volatility(basket_series, window):
+def compute_basket_features(baskets):
     """
-    Calculate volatility for basket index.
+    All 224 basket features for consecutive rows of one partition.
+
+    Windows count partition rows: the window ending at row i spans rows
+    i-window+1 .. i, and rows with fewer than `window` predecessors are
+    NULL. A NaN basket value inside a window makes that window's features
+    NaN.
 
     Args:
-        basket_series: Series of basket index values
-        window: Window size in minutes
+        baskets: (rows, currencies) basket indices in time order
 
     Returns:
-        float: Basket volatility (standard deviation)
+        dict: Column name -> float64 array (NaN = NULL), in table order
     """
-    if len(basket_series) < window:
-        return None
+    n = len(baskets)
+    features = {}
+    windowed = {}
+
+    for window in WINDOWS:
+        momentum = np.full((n, len(MAJOR_CURRENCIES)), np.nan)
+        accel = np.full_like(momentum, np.nan)
+        roc = np.full_like(momentum, np.nan)
+
+        if n >= window:
+            mid = window // 2
+            first = baskets[:n - window + 1]
+            middle = baskets[mid:n - window + 1 + mid]
+            last = baskets[window - 1:]
+
+            momentum[window - 1:] = last - first
+            accel[window - 1:] = (last - middle) - (middle - first)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                roc[window - 1:] = np.where(first != 0, (last - first) / np.abs(first) * 100, np.nan)
+
+        windowed[window] = (momentum, accel, roc)
+
+    with np.errstate(invalid='ignore'):
+        strengths = {}
+        for group, members in CURRENCY_GROUPS.items():
+            strength = np.full_like(baskets, np.nan)
+            for j, currency in enumerate(MAJOR_CURRENCIES):
+                others = [MAJOR_CURRENCIES.index(c) for c in members if c != currency]
+                peers = baskets[:, others]
+                counts = (~np.isnan(peers)).sum(axis=1)
+                group_avg = np.where(counts > 0, np.nansum(peers, axis=1) / np.maximum(counts, 1), np.nan)
+                strength[:, j] = baskets[:, j] - group_avg
+            strengths[group] = strength
+
+    for j, currency in enumerate(MAJOR_CURRENCIES):
+        curr_lower = currency.lower()
+        features[f"{curr_lower}_basket_index"] = baskets[:, j]
+
+        for window in WINDOWS:
+            momentum, accel, roc = windowed[window]
+            features[f"{curr_lower}_basket_momentum_{window}min"] = momentum[:, j]
+            features[f"{curr_lower}_basket_momentum_accel_{window}min"] = accel[:, j]
+            features[f"{curr_lower}_basket_momentum_roc_{window}min"] = roc[:, j]
+            features[f"{curr_lower}_basket_volatility_{window}min"] = rolling_apply(
+                baskets[:, j], window, window_std, min_periods=window
+            )
 
-    values = basket_series.iloc[-window:].values
-    return np.std(values)
+        for group in CURRENCY_GROUPS:
+            features[f"{curr_lower}_basket_strength_vs_{group}"] = strengths[group][:, j]
 
+    return features
 
-def calculate_basket_strength(basket_indices, currency, basket_type='major'):
+
+def load_prediction_panel(conn, year_month):
     """
-    Calculate basket strength relative to other currency groups.
+    Read every pair's w60 predictions for one month partition once.
 
     Args:
-        basket_indices: Dict of currency -> basket index value
-        currency: Currency to calculate strength for
-        basket_type: 'major', 'safe_haven', or 'commodity'
+        conn: Database connection
+        year_month: Month partition (e.g., '2024_07')
 
     Returns:
-        float: Relative strength
+        Panel: Timestamp-aligned 'w60_prediction' matrix of all pairs
     """
-    currency_groups = {
-        'major': ['USD', 'EUR', 'JPY', 'GBP'],
-        'safe_haven': ['CHF', 'JPY'],
-        'commodity': ['AUD', 'NZD', 'CAD']
-    }
+    year, month = year_month.split('_')
+    start, end = month_range(int(year), int(month))
+    query = PREDICTION_QUERY.replace('{year_month}', year_month)
+    return load_panel(conn, query, CURRENCY_PAIRS, ['w60_prediction'], start, end)
 
-    group = currency_groups.get(basket_type, ['USD', 'EUR', 'JPY', 'GBP'])
 
-    # Get currency's own basket value
-    own_value = basket_indices.get(currency)
-    if own_value is None or pd.isna(own_value):
-        return None
-
-    # Get average of group currencies (excluding own currency)
-    group_values = []
-    for curr in group:
-        if curr == currency:
-            continue
-        value = basket_indices.get(curr)
-        if value is not None and not pd.isna(value):
-            group_values.append(value)
+class MonthBaskets:
+    """
+    Basket indices of one month, shared by all 28 partitions.
 
-    if len(group_values) == 0:
-        return None
+    Basket indices are computed once on the month's union of timestamps.
+    Each pair's features depend only on which of those timestamps its
+    partition has, so pairs with the same timestamps share one
+    computation.
+    """
 
-    group_avg = np.mean(group_values)
+    def __init__(self, panel):
+        self.panel = panel
+        self.baskets = compute_basket_indices(panel.field('w60_prediction'), panel.pairs)
+        self._features = {}
 
-    # Relative strength (positive = stronger than group, negative = weaker)
-    return own_value - group_avg
+    def features(self, pair):
+        """Timestamps (UTC) and feature columns of one pair's partition"""
+        mask = np.asarray(self.panel.present[:, self.panel.pairs.index(pair)])
+        key = mask.tobytes()
+        if key not in self._features:
+            self._features[key] = compute_basket_features(self.baskets[mask])
+        return self.panel.index[mask].tz_localize('UTC'), self._features[key]
 
 
-def populate_currency_indices(pair, year_month):
+def populate_currency_indices(pair, year_month, month_baskets=None):
     """
     Populate currency index features for a single partition.
 
     Args:
         pair: Currency pair
         year_month: Month partition
+        month_baskets: The month's MonthBaskets (loaded here if None)
 
     Returns:
         tuple: (pair, year_month, success, rows_updated, error_msg)
@@ -371,155 +394,27 @@ def populate_currency_indices(pair, year_month):
     try:
         logger.info(f"{pair.upper()} {year_month}: Starting currency index calculation...")
 
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        # Load data from current partition
-        query = f"""
-        SELECT ts_utc, w60_prediction
-        FROM bqx.{partition_name}
-        ORDER BY ts_utc
-        """
-
-        df_current = pd.read_sql(query, conn)
-
-        if len(df_current) == 0:
-            logger.warning(f"{pair.upper()} {year_month}: No data found, skipping")
-            cursor.close()
-            conn.close()
-            return (pair, year_month, True, 0, "No data")
-
-        logger.info(f"{pair.upper()} {year_month}: Loaded {len(df_current):,} rows")
-
-        # Load data from all other pairs in same month partition
-        # (needed to calculate basket indices)
-        df_dict = {pair: df_current}
-
-        for other_pair in CURRENCY_PAIRS:
-            if other_pair == pair:
-                continue
-
-            other_partition = f"reg_bqx_{other_pair}_{year_month}"
-
-            try:
-                query_other = f"""
-                SELECT ts_utc, w60_prediction
-                FROM bqx.{other_partition}
-                ORDER BY ts_utc
-                """
-                df_other = pd.read_sql(query_other, conn)
-                df_dict[other_pair] = df_other
-            except Exception as e:
-                logger.debug(f"{pair.upper()} {year_month}: Could not load {other_pair} - {e}")
-                continue
-
-        logger.info(f"{pair.upper()} {year_month}: Loaded {len(df_dict)} pairs for basket calculation")
-
-        # Calculate currency indices for each timestamp
-        basket_indices_by_timestamp = {}
-
-        for idx, row in df_current.iterrows():
-            timestamp = row['ts_utc']
-
-            # Calculate basket index for each currency at this timestamp
-            basket_indices = {}
-            for currency in MAJOR_CURRENCIES:
-                basket_value = calculate_currency_index(df_dict, currency, timestamp)
-                basket_indices[currency] = basket_value
-
-            basket_indices_by_timestamp[timestamp] = basket_indices
-
-        logger.info(f"{pair.upper()} {year_month}: Calculated basket indices for {len(basket_indices_by_timestamp):,} timestamps")
-
-        # Calculate momentum, volatility, and strength features
-        # Build up series for each currency basket
-        basket_series = {currency: [] for currency in MAJOR_CURRENCIES}
-
-        for timestamp in sorted(basket_indices_by_timestamp.keys()):
-            indices = basket_indices_by_timestamp[timestamp]
-            for currency in MAJOR_CURRENCIES:
-                basket_series[currency].append(indices.get(currency))
-
-        # Convert to pandas Series
-        for currency in MAJOR_CURRENCIES:
-            basket_series[currency] = pd.Series(basket_series[currency])
+        with connection() as conn:
+            if month_baskets is None:
+                month_baskets = MonthBaskets(load_prediction_panel(conn, year_month))
+                conn.rollback()
 
-        # Calculate features for each row
-        update_data = []
+            if pair in month_baskets.panel.missing:
+                raise RuntimeError(f"Could not load bqx.{partition_name}")
 
-        for idx, row in df_current.iterrows():
-            timestamp = row['ts_utc']
-            basket_indices = basket_indices_by_timestamp[timestamp]
+            timestamps, features = month_baskets.features(pair)
 
-            # Features for this row
-            features = {}
+            if len(timestamps) == 0:
+                logger.warning(f"{pair.upper()} {year_month}: No data found, skipping")
+                return (pair, year_month, True, 0, "No data")
 
-            for currency in MAJOR_CURRENCIES:
-                curr_lower = currency.lower()
-
-                # Base basket index
-                features[f"{curr_lower}_basket_index"] = basket_indices.get(currency)
-
-                # Momentum and volatility for each window
-                for window in WINDOWS:
-                    # Get basket series up to current point
-                    current_series = basket_series[currency].iloc[:idx+1]
-
-                    # Calculate momentum features
-                    momentum_features = calculate_basket_momentum(current_series, window)
-                    features[f"{curr_lower}_basket_momentum_{window}min"] = momentum_features['momentum']
-                    features[f"{curr_lower}_basket_momentum_accel_{window}min"] = momentum_features['momentum_accel']
-                    features[f"{curr_lower}_basket_momentum_roc_{window}min"] = momentum_features['momentum_roc']
-
-                    # Calculate volatility feature
-                    volatility = calculate_basket_volatility(current_series, window)
-                    features[f"{curr_lower}_basket_volatility_{window}min"] = volatility
-
-                # Basket strength features
-                features[f"{curr_lower}_basket_strength_vs_major"] = calculate_basket_strength(basket_indices, currency, 'major')
-                features[f"{curr_lower}_basket_strength_vs_safe_haven"] = calculate_basket_strength(basket_indices, currency, 'safe_haven')
-                features[f"{curr_lower}_basket_strength_vs_commodity"] = calculate_basket_strength(basket_indices, currency, 'commodity')
-
-            update_data.append((timestamp, features))
-
-        # Update database in batches
-        logger.info(f"{pair.upper()} {year_month}: Updating {len(update_data):,} rows...")
-
-        batch_size = 1000
-        rows_updated = 0
-
-        for i in range(0, len(update_data), batch_size):
-            batch = update_data[i:i+batch_size]
-
-            for timestamp, features in batch:
-                # Convert NaN to None for PostgreSQL NULL
-                set_clauses = []
-                values = []
-
-                for col, value in features.items():
-                    set_clauses.append(f"{col} = %s")
-                    values.append(None if pd.isna(value) else value)
-
-                values.append(timestamp)
-
-                update_sql = f"""
-                UPDATE bqx.{partition_name}
-                SET {', '.join(set_clauses)}
-                WHERE ts_utc = %s
-                """
-
-                cursor.execute(update_sql, values)
-                rows_updated += cursor.rowcount
-
-            # Commit every batch
+            # One COPY + UPDATE ... FROM for the whole partition
+            logger.info(f"{pair.upper()} {year_month}: Updating {len(timestamps):,} rows...")
+            rows_updated = write_columns(
+                conn, f"bqx.{partition_name}", {'ts_utc': timestamps, **features}, mode='update'
+            )
             conn.commit()
 
-            if (i + batch_size) % 5000 == 0:
-                logger.info(f"{pair.upper()} {year_month}: Updated {rows_updated:,}/{len(update_data):,} rows ({rows_updated/len(update_data)*100:.1f}%)")
-
-        cursor.close()
-        conn.close()
-
         elapsed = time.time() - start_time
         logger.info(f"✅ {pair.upper()} {year_month}: Complete! Updated {rows_updated:,} rows ({elapsed:.1f}s)")
 
@@ -553,14 +448,12 @@ def main():
     logger.info("STEP 1: Adding currency index columns to parent tables")
     logger.info("=" * 80)
 
-    conn = psycopg2.connect(**DB_CONFIG)
     columns_success = 0
 
-    for pair in CURRENCY_PAIRS:
-        if add_currency_index_columns(conn, pair):
-            columns_success += 1
-
-    conn.close()
+    with connection() as conn:
+        for pair in CURRENCY_PAIRS:
+            if add_currency_index_columns(conn, pair):
+                columns_success += 1
 
     logger.info(f"✅ Added columns to {columns_success}/{len(CURRENCY_PAIRS)} parent tables")
     logger.info("")
@@ -577,30 +470,43 @@ def main():
         'total_rows': 0
     }
 
-    for pair in CURRENCY_PAIRS:
-        logger.info(f"Processing {pair.upper()}...")
+    # One panel read and one basket computation per month, shared by all pairs
+    for year_month in YEAR_MONTHS:
+        logger.info(f"Processing {year_month}...")
+
+        try:
+            with connection() as conn:
+                month_baskets = MonthBaskets(load_prediction_panel(conn, year_month))
+                conn.rollback()
+        except Exception as e:
+            logger.error(f"❌ {year_month}: Could not load predictions - {e}")
+            all_results['partitions_failed'] += len(CURRENCY_PAIRS)
+            continue
+
+        logger.info(f"{year_month}: {len(month_baskets.panel):,} timestamps, "
+                    f"missing partitions: {month_baskets.panel.missing or 'none'}")
 
-        pair_results = {'success': 0, 'failed': 0, 'no_data': 0, 'rows': 0}
+        month_results = {'success': 0, 'failed': 0, 'no_data': 0, 'rows': 0}
 
-        for year_month in YEAR_MONTHS:
-            pair_name, ym, success, rows, error_msg = populate_currency_indices(pair, year_month)
+        for pair in CURRENCY_PAIRS:
+            pair_name, ym, success, rows, error_msg = populate_currency_indices(pair, year_month, month_baskets)
 
             if success:
                 if error_msg and "No data" in error_msg:
-                    pair_results['no_data'] += 1
+                    month_results['no_data'] += 1
                 else:
-                    pair_results['success'] += 1
-                    pair_results['rows'] += rows
+                    month_results['success'] += 1
+                    month_results['rows'] += rows
             else:
-                pair_results['failed'] += 1
+                month_results['failed'] += 1
 
-        logger.info(f"{pair.upper()}: {pair_results['success']}/{len(YEAR_MONTHS)} partitions, {pair_results['rows']:,} rows")
+        logger.info(f"{year_month}: {month_results['success']}/{len(CURRENCY_PAIRS)} partitions, {month_results['rows']:,} rows")
         logger.info("")
 
-        all_results['partitions_success'] += pair_results['success']
-        all_results['partitions_failed'] += pair_results['failed']
-        all_results['partitions_no_data'] += pair_results['no_data']
-        all_results['total_rows'] += pair_results['rows']
+        all_results['partitions_success'] += month_results['success']
+        all_results['partitions_failed'] += month_results['failed']
+        all_results['partitions_no_data'] += month_results['no_data']
+        all_results['total_rows'] += month_results['rows']
 
     elapsed = time.time() - start_time
 
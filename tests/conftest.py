@@ -0,0 +1,79 @@
+"""
+Shared pytest fixtures
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+import yaml
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture(scope="session")
+def pg_dsn():
+    """
+    DSN of a disposable PostgreSQL database standing in for Aurora
+
+    Uses $BQX_TEST_DSN when set, otherwise starts a local server through
+    the optional `pgserver` package; skips when neither is available.
+    """
+    dsn = os.environ.get("BQX_TEST_DSN")
+    if dsn:
+        yield dsn
+        return
+
+    pgserver = pytest.importorskip("pgserver")
+    with tempfile.TemporaryDirectory() as data_dir:
+        server = pgserver.get_server(data_dir, cleanup_mode="stop")
+        try:
+            yield server.get_uri()
+        finally:
+            server.cleanup()
+
+
+@pytest.fixture
+def pg_conn(pg_dsn):
+    """psycopg2 connection with a clean `bqx` schema"""
+    psycopg2 = pytest.importorskip("psycopg2")
+    conn = psycopg2.connect(pg_dsn)
+    cur = conn.cursor()
+    cur.execute("DROP SCHEMA IF EXISTS bqx CASCADE")
+    cur.execute("CREATE SCHEMA bqx")
+    conn.commit()
+    cur.close()
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+@pytest.fixture
+def db_config(tmp_path, pg_dsn, monkeypatch):
+    """
+    database.yaml for the test server, exported as $BQX_DB_CONFIG
+
+    Lets code that opens its own data.db.connection() (e.g. workers) run
+    against the disposable database; the pool is closed afterwards.
+    """
+    psycopg2 = pytest.importorskip("psycopg2")
+    from data.db import get_pool
+
+    params = psycopg2.extensions.parse_dsn(pg_dsn)
+    path = tmp_path / "database.yaml"
+    path.write_text(yaml.safe_dump({
+        'aurora': {
+            'host': params['host'],
+            'port': int(params.get('port', 5432)),
+            'database': params['dbname'],
+            'user': params['user'],
+            'password': params.get('password', ''),
+            'sslmode': 'disable',
+            'pool': {'min_connections': 0, 'max_connections': 2, 'timeout': 5}
+        }
+    }))
+    monkeypatch.setenv("BQX_DB_CONFIG", str(path))
+    yield path
+    get_pool(str(path)).closeall()
@@ -0,0 +1,134 @@
+"""
+Regression tests for the Stage 2.4 triangular-arbitrage scanner
+Compares the month-wide triangle scan with the former per-pair,
+per-timestamp loop over base → quote → third → base paths.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.panel import Panel
+
+ROOT = Path(__file__).parent.parent
+
+
+def _load_script(relative_path, name):
+    """Import a worker script by path (scripts/ is not a package)"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def worker():
+    return _load_script("scripts/ml/populate_arbitrage_worker.py", "populate_arbitrage_worker")
+
+
+@pytest.fixture(scope="module")
+def panel(worker):
+    """300 minutes of consistent cross rates with injected mispricings, gaps, a NULL and a missing pair"""
+    rng = np.random.default_rng(11)
+    pairs = worker.PAIRS
+    n = 300
+    ts = pd.date_range('2024-07-01', periods=n, freq='min').to_numpy()
+
+    # Currency values in a common numeraire; pair rate = base / quote
+    levels = {'EUR': 1.1, 'USD': 1.0, 'GBP': 1.3, 'JPY': 0.0068, 'AUD': 0.67, 'NZD': 0.61, 'CAD': 0.73, 'CHF': 1.12}
+    value = {c: v * np.exp(np.cumsum(rng.normal(0, 2e-4, n))) for c, v in levels.items()}
+    rates = np.column_stack([value[p[:3].upper()] / value[p[3:].upper()] for p in pairs])
+    rates *= 1 + rng.normal(0, 5e-4, rates.shape)
+
+    # Mispricings in both directions, large enough to clear the threshold
+    rates[40:45, pairs.index('eurusd')] *= 1.012
+    rates[90:95, pairs.index('gbpjpy')] *= 0.985
+    rates[150, pairs.index('audnzd')] *= 1.004
+
+    present = np.ones(rates.shape, dtype=bool)
+    present[60:80, pairs.index('usdjpy')] = False          # gap in a leg's partition
+    present[200:210, pairs.index('eurusd')] = False        # gap in the scanned pair
+    rates[120, pairs.index('gbpusd')] = np.nan             # NULL rate
+    present[:, pairs.index('cadchf')] = False
+    rates[~present] = np.nan
+    return Panel(ts, pairs, {'rate_index': np.asfortranarray(rates)}, present, ['cadchf'])
+
+
+# ----------------------------------------------------------------------
+# Per-row reference
+# ----------------------------------------------------------------------
+
+def _leg(pairs, a, b):
+    if (a + b).lower() in pairs:
+        return (a + b).lower(), 1
+    return (b + a).lower(), -1
+
+
+def _round_trip(rates, directions, cost=0.3):
+    amount = 1.0
+    for rate, direction in zip(rates, directions):
+        amount = amount * rate if direction == 1 else amount / rate
+    return (amount * (1 - cost / 100.0) - 1.0) * 100.0
+
+
+def _reference(worker, pair, panel):
+    base, quote = pair[:3].upper(), pair[3:].upper()
+    paths = []
+    for third in worker.CURRENCIES:
+        if third not in (base, quote):
+            legs = [_leg(worker.PAIRS, base, quote), _leg(worker.PAIRS, quote, third), _leg(worker.PAIRS, third, base)]
+            paths.append(([p for p, _ in legs], [d for _, d in legs]))
+
+    rows = []
+    for t in np.flatnonzero(panel.present[:, panel.pairs.index(pair)]):
+        max_profit, best_direction = 0.0, 0
+        for legs, directions in paths:
+            rates = [panel.column('rate_index', p)[t] for p in legs]
+            if np.isnan(rates).any():
+                continue
+            cw = _round_trip(rates, directions)
+            ccw = _round_trip(rates[::-1], [-d for d in directions[::-1]])
+            if cw > max_profit:
+                max_profit, best_direction = cw, 1
+            if ccw > max_profit:
+                max_profit, best_direction = ccw, -1
+        exists = max_profit > 0.5
+        rows.append((max_profit if exists else 0.0, exists, best_direction if exists else 0, max_profit))
+    return np.array(rows, dtype=float).reshape(-1, 4)
+
+
+def test_triangles_cover_every_pair(worker):
+    triangles = worker.load_triangles()
+
+    assert len(triangles) == 56
+    for triangle in triangles:
+        a, b, c = triangle['currencies']
+        for (x, y), leg, direction in zip([(a, b), (b, c), (c, a)], triangle['pairs'], triangle['directions']):
+            assert (leg, direction) == _leg(worker.PAIRS, x, y)
+    for pair in worker.PAIRS:
+        assert len(worker.pair_triangles(pair, triangles)) == 6
+
+
+def test_scan_matches_per_row_reference(worker, panel):
+    features = worker.scan_month(panel)
+
+    assert set(features) == set(worker.PAIRS) - {'cadchf'}
+    opportunities = 0
+    for pair, (timestamps, columns) in features.items():
+        expected = _reference(worker, pair, panel)
+        assert len(timestamps) == len(expected) == panel.present[:, panel.pairs.index(pair)].sum()
+        assert str(timestamps.tz) == 'UTC'
+
+        np.testing.assert_allclose(columns['arbitrage_profit_pct'], expected[:, 0], rtol=1e-9, atol=1e-12, err_msg=pair)
+        np.testing.assert_array_equal(columns['arbitrage_opportunity'], expected[:, 1].astype(bool), err_msg=pair)
+        np.testing.assert_array_equal(columns['arbitrage_direction'], expected[:, 2], err_msg=pair)
+        np.testing.assert_allclose(columns['arbitrage_max_profit'], expected[:, 3], rtol=1e-9, atol=1e-12, err_msg=pair)
+        opportunities += int(columns['arbitrage_opportunity'].sum())
+
+    # The injected mispricings are found in both directions
+    assert opportunities > 0
+    directions = np.concatenate([columns['arbitrage_direction'] for _, columns in features.values()])
+    assert {1, -1} <= set(directions.tolist())
@@ -0,0 +1,126 @@
+"""
+Equivalence tests for the columnar BQX engine
+Compares data.bqx_engine against the per-row window metrics it replaced
+in scripts/backfill/backward_worker.py, and runs both backward workers
+against a test database.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from data.bqx_engine import WINDOWS, bqx_column_names, compute_bqx_columns, sliding_extreme
+
+ROOT = Path(__file__).parent.parent
+
+
+def _load_script(name, relative_path):
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _reference_metrics(rates, window, i):
+    rate_t = rates[i]
+    past = rates[i - window:i]
+    return {
+        'bqx_return': np.sum(past - rate_t) / rate_t,
+        'bqx_max': np.max(past),
+        'bqx_min': np.min(past),
+        'bqx_avg': np.mean(past),
+        'bqx_stdev': np.std(past, ddof=1),
+        'bqx_endpoint': (past[0] - rate_t) / rate_t,
+    }
+
+
+@pytest.fixture(scope="module", params=[1.0850, 157.30, 100.0])
+def rates(request):
+    rng = np.random.default_rng(3)
+    steps = rng.normal(0, 1e-4 * request.param, 5000)
+    return request.param + np.cumsum(steps)
+
+
+def test_column_layout():
+    names = bqx_column_names()
+    assert len(names) == 37
+    assert names[:6] == [f"w15_{m}" for m in
+                         ['bqx_return', 'bqx_max', 'bqx_min', 'bqx_avg', 'bqx_stdev', 'bqx_endpoint']]
+    assert names[-1] == 'agg_bqx_volatility'
+
+
+def test_window_metrics_match_per_row(rates):
+    columns = compute_bqx_columns(rates)
+
+    for window in WINDOWS:
+        assert np.isnan(columns[f"w{window}_bqx_return"][:window]).all()
+        for i in range(window, len(rates), 97):
+            expected = _reference_metrics(rates, window, i)
+            for metric, value in expected.items():
+                scale = rates[i] if metric in ('bqx_max', 'bqx_min', 'bqx_avg') else abs(value) + 1e-9
+                assert columns[f"w{window}_{metric}"][i] == pytest.approx(value, rel=1e-7, abs=1e-12 * scale), \
+                    (window, metric, i)
+
+
+def test_aggregates_match_w75(rates):
+    columns = compute_bqx_columns(rates)
+
+    for i in range(75, len(rates), 131):
+        expected = _reference_metrics(rates, 75, i)
+        assert columns['agg_bqx_max'][i] == expected['bqx_max']
+        assert columns['agg_bqx_range'][i] == pytest.approx(
+            (expected['bqx_max'] - expected['bqx_min']) / rates[i], rel=1e-12)
+        assert columns['agg_bqx_volatility'][i] == pytest.approx(expected['bqx_stdev'] / rates[i], rel=1e-7)
+
+
+@pytest.mark.parametrize("window", [1, 2, 7, 75])
+def test_sliding_extreme_matches_naive(window):
+    values = np.random.default_rng(5).normal(size=503)
+    windows = np.lib.stride_tricks.sliding_window_view(values, window)
+
+    np.testing.assert_array_equal(sliding_extreme(values, window, np.maximum), windows.max(axis=1))
+    np.testing.assert_array_equal(sliding_extreme(values, window, np.minimum), windows.min(axis=1))
+
+
+def test_short_partition():
+    columns = compute_bqx_columns(np.linspace(1.0, 1.1, 20))
+    assert np.isfinite(columns['w15_bqx_return'][15:]).all()
+    assert np.isnan(columns['w30_bqx_return']).all()
+    assert np.isnan(columns['agg_bqx_return']).all()
+
+
+@pytest.mark.parametrize("script, level", [
+    ("backward_worker", "rate"),
+    ("backward_worker_index", "rate_index"),
+])
+def test_worker_upserts_month(pg_conn, db_config, script, level):
+    worker = _load_script(script, f"scripts/backfill/{script}.py")
+    names = getattr(worker, 'INDEX_COLUMN_NAMES', {})
+    metrics = [names.get(name, name) for name in bqx_column_names()]
+
+    cur = pg_conn.cursor()
+    cur.execute("CREATE TABLE bqx.m1_eurusd (time TIMESTAMP PRIMARY KEY, close DOUBLE PRECISION, "
+                "rate_index DOUBLE PRECISION)")
+    cur.execute("INSERT INTO bqx.m1_eurusd SELECT g, 1.1 + 1e-5 * sin(extract(epoch FROM g) / 600), "
+                "100 + 1e-3 * sin(extract(epoch FROM g) / 600) FROM generate_series("
+                "'2024-06-30 22:00'::timestamp, '2024-07-01 01:59', interval '1 minute') g")
+    cur.execute(f"CREATE TABLE bqx.bqx_eurusd (ts_utc TIMESTAMP PRIMARY KEY, {level} DOUBLE PRECISION, "
+                + ", ".join(f"{name} DOUBLE PRECISION" for name in metrics) + ")")
+    pg_conn.commit()
+
+    # Twice: the second run takes the ON CONFLICT path
+    for _ in range(2):
+        assert worker.process_backward_analysis('eurusd', '2024-07-01', '2024-08-01') == 120
+
+    cur.execute(f"SELECT count(*), count(w15_bqx_return), count({metrics[-1]}), min(ts_utc) "
+                f"FROM bqx.bqx_eurusd")
+    count, returns, aggregates, first = cur.fetchone()
+    cur.close()
+    # The 75-minute lookback before the month fills every window
+    assert (count, returns, aggregates) == (120, 120, 120)
+    assert str(first) == '2024-07-01 00:00:00'
@@ -0,0 +1,151 @@
+"""
+Regression tests for the V4 correlation features engine
+Compares the rolling engine with per-row np.corrcoef / np.std on each
+trailing window of a synthetic month.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.panel import Panel
+
+ROOT = Path(__file__).parent.parent
+WINDOW = 30
+
+
+def _load_script(relative_path, name):
+    """Import a worker script by path (scripts/ is not a package)"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def worker():
+    return _load_script("scripts/ml/correlation_features_worker_v4.py", "correlation_features_worker_v4")
+
+
+@pytest.fixture(scope="module")
+def month(worker):
+    """400 minutes of correlated returns, one pair with a gap, one NULL, one missing pair"""
+    rng = np.random.default_rng(5)
+    pairs = worker.PAIRS
+    n = 400
+    ts = pd.date_range('2024-07-01', periods=n, freq='min').to_numpy()
+
+    market = rng.normal(0, 1e-3, (n, 1))
+    fields = {}
+    for field in worker.PANEL_FIELDS:
+        fields[field] = np.asfortranarray(market * rng.uniform(-1, 1, len(pairs)) + rng.normal(0, 1e-3, (n, len(pairs))))
+    present = np.ones((n, len(pairs)), dtype=bool)
+
+    eurgbp = pairs.index('eurgbp')
+    present[100:120, eurgbp] = False                  # gap in a peer's partition
+    fields['w15_bqx_return'][250, pairs.index('eurjpy')] = np.nan
+    for matrix in fields.values():
+        matrix[~present] = np.nan
+        matrix[:, pairs.index('eurnzd')] = np.nan
+    present[:, pairs.index('eurnzd')] = False
+    panel = Panel(ts, pairs, fields, present, ['eurnzd'])
+
+    eurusd = pairs.index('eurusd')
+    bqx_data = {'ts_utc': pd.DatetimeIndex(ts).tz_localize('UTC')}
+    for field in worker.TERM_FIELDS:
+        if field in fields:
+            bqx_data[field] = fields[field][:, eurusd].copy()
+        else:
+            bqx_data[field] = rng.normal(0, 1e-3, n)
+    bqx_data['w60_bqx_return'][300] = np.nan
+    return panel, bqx_data
+
+
+# ----------------------------------------------------------------------
+# Per-row reference
+# ----------------------------------------------------------------------
+
+def _corr(a, b):
+    if np.isnan(a).any() or np.isnan(b).any():
+        return np.nan
+    return np.corrcoef(a, b)[0, 1]
+
+
+def _window_std(a):
+    return np.nan if np.isnan(a).any() else np.std(a)
+
+
+def _reference(worker, pair, panel, bqx_data):
+    w15, w60, w75 = (bqx_data[f] for f in ('w15_bqx_return', 'w60_bqx_return', 'w75_bqx_return'))
+    n = len(w15)
+    base_peers, quote_peers = worker.peer_pairs(pair)
+    peers15 = {p: panel.column('w15_bqx_return', p) for p in base_peers + quote_peers}
+    peers60 = {p: panel.column('w60_bqx_return', p) for p in base_peers + quote_peers}
+    legs = worker.triangulation_legs(pair)
+
+    def peer_mean(peers, own, group, s):
+        values = [_corr(own[s], peers[p][s]) for p in group]
+        values = [v for v in values if not np.isnan(v)]
+        return np.mean(values) if values else np.nan
+
+    rows = []
+    term_corr = np.full(n, np.nan)
+    for t in range(n):
+        row = {}
+        if t >= WINDOW - 1:
+            s = slice(t - WINDOW + 1, t + 1)
+            term_corr[t] = _corr(w15[s], w60[s])
+            row['corr_base_pairs_15min'] = peer_mean(peers15, w15, base_peers, s)
+            row['corr_base_pairs_60min'] = peer_mean(peers60, w60, base_peers, s)
+            row['corr_quote_pairs_15min'] = peer_mean(peers15, w15, quote_peers, s)
+            row['corr_quote_pairs_60min'] = peer_mean(peers60, w60, quote_peers, s)
+            mean_15 = np.mean(w15[s])
+            row['relative_strength_vs_base_pairs'] = mean_15 / (abs(mean_15) + 1e-10)
+            row['pair_spread_z_score'] = (w15[t] - mean_15) / (_window_std(w15[s]) + 1e-10)
+            row['cross_pair_volatility_ratio'] = _window_std(w15[s]) / (_window_std(w60[s]) + 1e-10)
+            row['cointegration_residual'] = abs(np.mean(w75[s]) - mean_15)
+            if t >= WINDOW - 1 + worker.LEAD_LAG_ROWS:
+                lag = slice(t - WINDOW + 1 - worker.LEAD_LAG_ROWS, t + 1 - worker.LEAD_LAG_ROWS)
+                row['lead_lag_indicator'] = _corr(w15[lag], w60[s])
+            stds = [_window_std(w15[s] - (panel.column('w15_bqx_return', a)[s] + panel.column('w15_bqx_return', b)[s]))
+                    for a, b in legs]
+            stds = [v for v in stds if not np.isnan(v)]
+            row['triangular_arb_divergence'] = np.mean(stds) if stds else np.nan
+            if t >= 2 * WINDOW - 2:
+                row['correlation_stability'] = _window_std(term_corr[t - WINDOW + 1:t + 1])
+        rows.append(row)
+    return pd.DataFrame(rows, dtype=float)
+
+
+def test_engine_matches_per_row_reference(worker, month):
+    panel, bqx_data = month
+    features = worker.compute_correlation_features('eurusd', bqx_data, panel, window=WINDOW)
+    reference = _reference(worker, 'eurusd', panel, bqx_data)
+
+    assert len(features) == 15
+    for column in reference.columns:
+        expected = reference[column].to_numpy()
+        np.testing.assert_allclose(features[column], expected, rtol=1e-7, atol=1e-12, err_msg=column)
+        np.testing.assert_array_equal(np.isnan(features[column]), np.isnan(expected), err_msg=column)
+
+    # All peers contribute, not just the first three of each group
+    base_peers, quote_peers = worker.peer_pairs('eurusd')
+    assert len(base_peers) == 6 and len(quote_peers) == 3
+    assert set(base_peers + quote_peers) <= set(worker.related_pairs('eurusd'))
+
+    momentum = features['cross_pair_momentum_divergence']
+    assert str(momentum.dtype) == 'Int64'
+    assert momentum.isna().sum() == WINDOW - 1
+
+
+def test_float32_mode(worker, month):
+    panel, bqx_data = month
+    exact = worker.compute_correlation_features('gbpusd', bqx_data, panel, window=WINDOW)
+    single = worker.compute_correlation_features('gbpusd', bqx_data, panel, window=WINDOW, dtype=np.float32)
+
+    for column in ('corr_base_pairs_15min', 'corr_quote_pairs_60min', 'lead_lag_indicator'):
+        np.testing.assert_array_equal(np.isnan(single[column]), np.isnan(exact[column]))
+        np.testing.assert_allclose(single[column], exact[column], atol=1e-3, err_msg=column)
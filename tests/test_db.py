@@ -0,0 +1,163 @@
+"""
+Tests for the pooled Aurora access layer
+"""
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+import yaml
+
+from data.db import (
+    ConnectionPool, PoolTimeoutError, get_pool, is_transient,
+    iter_frames, load_config, read_frame, retry
+)
+
+
+def _write_config(tmp_path, pg_dsn, **pool):
+    params = psycopg2.extensions.parse_dsn(pg_dsn)
+    config = {
+        'aurora': {
+            'host': params['host'],
+            'port': int(params.get('port', 5432)),
+            'database': params['dbname'],
+            'user': params['user'],
+            'password': params.get('password', ''),
+            'sslmode': 'disable',
+            'pool': {'min_connections': 0, 'max_connections': 2, 'timeout': 5, **pool},
+            'retry': {'attempts': 3, 'backoff': 0.01}
+        },
+        'query': {'timeout': 2, 'fetch_size': 10}
+    }
+    path = tmp_path / "database.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+@pytest.fixture
+def pool(tmp_path, pg_dsn):
+    pool = ConnectionPool(load_config(_write_config(tmp_path, pg_dsn)))
+    yield pool
+    pool.closeall()
+
+
+def _backend_pid(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_backend_pid()")
+        return cur.fetchone()[0]
+
+
+def test_load_config_expands_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("AURORA_PASSWORD", "s3cret")
+    path = tmp_path / "database.yaml"
+    path.write_text("aurora:\n  password: ${AURORA_PASSWORD}\n")
+    assert load_config(path)['aurora']['password'] == "s3cret"
+
+
+def test_connections_are_reused(pool):
+    with pool.connection() as conn:
+        first = _backend_pid(conn)
+    with pool.connection() as conn:
+        assert _backend_pid(conn) == first
+    assert pool.stats.snapshot()['CONNECT']['calls'] == 1
+
+
+def test_statement_timeout_is_applied_and_not_retried(pool):
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SHOW statement_timeout")
+            assert cur.fetchone()[0] == '2s'
+
+    calls = []
+
+    def slow(conn):
+        calls.append(1)
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_sleep(5)")
+
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        pool.run(slow)
+    assert len(calls) == 1
+
+
+def test_run_retries_dropped_connection(pool):
+    calls = []
+
+    def work(conn):
+        calls.append(_backend_pid(conn))
+        if len(calls) == 1:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_terminate_backend(pg_backend_pid())")
+        return 'done'
+
+    assert pool.run(work) == 'done'
+    assert len(calls) == 2 and calls[0] != calls[1]
+
+
+def test_pool_timeout(tmp_path, pg_dsn):
+    pool = ConnectionPool(load_config(_write_config(tmp_path, pg_dsn, max_connections=1, timeout=0.1)))
+    held = pool.getconn()
+    try:
+        with pytest.raises(PoolTimeoutError):
+            pool.getconn()
+    finally:
+        pool.putconn(held)
+        pool.closeall()
+
+
+def test_rollback_on_error(pool):
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE t (x int)")
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("INSERT INTO t VALUES (1)")
+            raise ValueError("abort")
+
+    with pool.connection() as conn:
+        assert read_frame(conn, "SELECT count(*) AS n FROM t")['n'][0] == 0
+
+
+def test_iter_frames_streams_in_chunks(pool):
+    with pool.connection() as conn:
+        chunks = list(iter_frames(conn, "SELECT g AS x FROM generate_series(1, %s) g", (25,)))
+
+    assert [len(c) for c in chunks] == [10, 10, 5]
+    assert list(chunks[-1]['x']) == [21, 22, 23, 24, 25]
+    assert pool.stats.snapshot()['FETCH']['rows'] == 25
+
+
+def test_query_stats_by_statement_kind(pool):
+    with pool.connection() as conn:
+        read_frame(conn, "SELECT 1 AS one")
+        read_frame(conn, "  select 2 AS two")
+
+    stats = pool.stats.snapshot()
+    assert stats['SELECT']['calls'] == 2
+    assert 'SELECT' in pool.stats.summary()
+
+
+def test_get_pool_is_cached_per_process(tmp_path, pg_dsn):
+    path = _write_config(tmp_path, pg_dsn)
+    assert get_pool(path) is get_pool(path)
+    get_pool(path).closeall()
+
+
+def test_retry_only_transient_errors():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        return 'ok'
+
+    assert retry(flaky, attempts=3, backoff=0) == 'ok'
+
+    def broken():
+        raise psycopg2.ProgrammingError("syntax error")
+
+    with pytest.raises(psycopg2.ProgrammingError):
+        retry(broken, attempts=3, backoff=0)
+    assert not is_transient(ValueError())
@@ -0,0 +1,129 @@
+"""
+Tests for the online error-correction engine
+Checks the recursive hedge ratios against weighted least squares, the
+a-priori ECT, resuming from saved state, carrying levels forward, the
+half-life of a known AR(1) deviation and the table column mapping.
+"""
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from data.error_correction import (
+    DOMAINS, RELATIONS, ErrorCorrectionEngine, domain_columns, domain_engine, pair_features, primary_relation,
+    vector_weights
+)
+
+SQL_DIR = Path(__file__).parent.parent / 'scripts' / 'refactor'
+
+PAIRS = ['eurusd', 'gbpusd', 'eurgbp', 'audusd', 'nzdusd', 'audnzd', 'euraud', 'usdjpy']
+
+HALF_LIFE = 20
+
+
+@pytest.fixture(scope="module")
+def levels():
+    """Price indices that satisfy every relation up to small noise; EURUSD's deviation is AR(1)"""
+    rng = np.random.default_rng(25)
+    n = 4000
+    gbp, eurgbp, aud, nzd, jpy = np.cumsum(rng.normal(0, 1e-4, (n, 5)), axis=0).T
+    phi = 0.5 ** (1 / HALF_LIFE)
+    deviation = np.zeros(n)
+    for t in range(1, n):
+        deviation[t] = phi * deviation[t - 1] + rng.normal(0, 2e-5)
+    eur = gbp + eurgbp + deviation
+    noise = rng.normal(0, 1e-6, (2, n))
+    logs = np.column_stack([eur, gbp, eurgbp, aud, nzd, aud - nzd + noise[0], eur - aud + noise[1], jpy])
+    return 100 * np.exp(logs)
+
+
+def test_hedge_ratios_match_weighted_least_squares(levels):
+    lam = 0.99
+    engine = ErrorCorrectionEngine(PAIRS, forgetting=lam)
+    out = engine.run(levels[:1500])
+    logs = np.log(levels[:1500])
+    for i, relation in enumerate(RELATIONS):
+        y = logs[:, PAIRS.index(relation.target)]
+        X = np.column_stack([np.ones(len(y))] + [logs[:, PAIRS.index(leg)] for leg in relation.legs])
+        for t in (300, 1499):
+            w = np.sqrt(lam ** np.arange(t, -1, -1))
+            expected = np.linalg.lstsq(X[:t + 1] * w[:, None], y[:t + 1] * w, rcond=None)[0]
+            np.testing.assert_allclose(out['beta'][t, i, 1:], expected[1:], rtol=1e-5, err_msg=relation.name)
+            # The a-priori ECT uses the ratios fitted through the row before
+            fitted = logs[t, PAIRS.index(relation.target)] - out['ect'][t, i]
+            ratios = out['beta'][t - 1, i]
+            centered = logs[t] - logs[0]
+            prediction = ratios[0] + sum(b * centered[PAIRS.index(leg)] for b, leg in zip(ratios[1:], relation.legs))
+            assert fitted - logs[0, PAIRS.index(relation.target)] == pytest.approx(prediction, abs=1e-12)
+    assert np.isnan(out['ect'][:59]).all() and np.isfinite(out['ect'][60:]).all()
+
+
+def test_saved_state_resumes_exactly(levels):
+    whole = domain_engine('rate', PAIRS).run(levels)
+    first = domain_engine('rate', PAIRS)
+    first.run(levels[:1000])
+    second = domain_engine('rate', PAIRS)
+    second.set_state(first.get_state())
+    rest = second.run(levels[1000:])
+    for name, values in whole.items():
+        np.testing.assert_array_equal(values[1000:], rest[name], err_msg=name)
+
+    with pytest.raises(ValueError):
+        ErrorCorrectionEngine(PAIRS, relations=RELATIONS[:2]).set_state(first.get_state())
+    with pytest.raises(ValueError):
+        ErrorCorrectionEngine(['eurusd', 'gbpusd'])
+
+
+def test_missing_rows_carry_levels_forward(levels):
+    gappy = levels.copy()
+    rng = np.random.default_rng(0)
+    for j in range(len(PAIRS)):
+        gappy[rng.choice(np.arange(1, len(gappy)), 300, replace=False), j] = np.nan
+    filled = gappy.copy()
+    for t in range(1, len(filled)):
+        filled[t] = np.where(np.isnan(filled[t]), filled[t - 1], filled[t])
+
+    a = ErrorCorrectionEngine(PAIRS).run(gappy)
+    b = ErrorCorrectionEngine(PAIRS).run(filled)
+    for name, values in a.items():
+        np.testing.assert_array_equal(values, b[name], err_msg=name)
+
+
+def test_dynamics_of_a_known_deviation(levels):
+    out = ErrorCorrectionEngine(PAIRS, forgetting=1.0).run(levels)
+    ect = out['ect'][:, 0]
+    assert np.nanmedian(out['half_life'][1000:, 0]) == pytest.approx(HALF_LIFE, rel=0.5)
+    assert np.nanstd(out['zscore'][1000:, 0]) == pytest.approx(1.0, rel=0.2)
+
+    t = 2000
+    np.testing.assert_allclose(out['velocity'][t, 0], (ect[t] - ect[t - 20]) / 20)
+    np.testing.assert_allclose(out['acceleration'][t, 0], (ect[t] - 2 * ect[t - 20] + ect[t - 40]) / 400)
+    np.testing.assert_array_equal(out['inbound'][1:, 0][np.isfinite(ect[:-1])],
+                                  (np.abs(ect[1:]) < np.abs(ect[:-1]))[np.isfinite(ect[:-1])])
+
+    # The cross and cluster hold almost exactly; their ECTs are tiny
+    assert np.nanstd(out['ect'][1000:, 1]) < 1e-5 and np.nanstd(out['ect'][1000:, 2]) < 1e-5
+
+
+def test_pair_features_and_weights(levels):
+    out = ErrorCorrectionEngine(PAIRS).run(levels[:500])
+    assert [primary_relation(p) for p in ('gbpusd', 'nzdusd', 'euraud', 'usdjpy')] == [0, 1, 2, 3]
+
+    weights = vector_weights(out['beta'])
+    total = sum(np.abs(values) for values in weights.values())
+    np.testing.assert_allclose(total[100:], 1.0)
+
+    features = pair_features(out, 'usdjpy')
+    assert set(features) == set(domain_columns('rate'))
+    np.testing.assert_array_equal(features['half_life'], out['half_life'][:, 3])
+    assert np.isnan(features['weight_eur'][:59]).all()
+
+
+@pytest.mark.parametrize("domain", sorted(DOMAINS))
+def test_domain_columns_match_schema(domain):
+    sql = (SQL_DIR / f'stage_1_6_18_create_error_correction_{domain}.sql').read_text()
+    table = re.search(r'CREATE TABLE IF NOT EXISTS [^(]*\((.*?)PRIMARY KEY', sql, re.S).group(1)
+    columns = re.findall(r'(\w+) NUMERIC', table)
+    assert sorted(domain_columns(domain).values()) == sorted(columns)
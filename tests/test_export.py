@@ -0,0 +1,114 @@
+"""
+Tests for the streaming Parquet exporter
+Exports a pair-month from a local PostgreSQL into a local object store
+and compares it with the joined frames.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from data.export import ExportSource, export_partition, open_store
+
+SOURCES = [
+    ExportSource('m1', 'bqx.m1_{pair}', (('close', 'close'), ('volume', 'volume')), time_column='time'),
+    ExportSource('reg', 'bqx.reg_{pair}', (('w60_r2', 'reg_w60_r2'), ('w60_rmse', 'reg_w60_rmse'))),
+    ExportSource('regime', 'bqx.regime_{pair}', (('regime_type', 'regime_type'),)),
+]
+
+
+@pytest.fixture
+def tables(pg_conn):
+    rng = np.random.default_rng(19)
+    times = pd.date_range('2024-06-30 23:00', '2024-07-01 02:00', freq='min', inclusive='left')
+    m1 = pd.DataFrame({'time': times, 'close': 1.1 + rng.normal(0, 1e-3, len(times)),
+                       'volume': rng.integers(1, 100, len(times))})
+
+    # Feature tables with gaps, rows m1 lacks, and NULLs
+    reg = pd.DataFrame({'ts_utc': times[::2], 'w60_r2': rng.random(len(times[::2])),
+                        'w60_rmse': rng.random(len(times[::2]))})
+    reg.loc[5, 'w60_rmse'] = np.nan
+    reg = pd.concat([reg, pd.DataFrame({'ts_utc': [pd.Timestamp('2024-07-01 00:30:30')],
+                                        'w60_r2': [0.5], 'w60_rmse': [0.5]})])
+    regime = pd.DataFrame({'ts_utc': times[100:], 'regime_type': ['trending', 'ranging'] * 40})
+
+    cur = pg_conn.cursor()
+    cur.execute("CREATE TABLE bqx.m1_eurusd (time TIMESTAMP PRIMARY KEY, close NUMERIC(12,6), volume BIGINT)")
+    cur.execute("CREATE TABLE bqx.reg_eurusd (ts_utc TIMESTAMP PRIMARY KEY, w60_r2 DOUBLE PRECISION, "
+                "w60_rmse DOUBLE PRECISION)")
+    cur.execute("CREATE TABLE bqx.regime_eurusd (ts_utc TIMESTAMP PRIMARY KEY, regime_type VARCHAR(20))")
+    for table, frame in (('m1_eurusd', m1), ('reg_eurusd', reg), ('regime_eurusd', regime)):
+        columns = ', '.join(frame.columns)
+        values = ', '.join(['%s'] * len(frame.columns))
+        rows = [tuple(None if pd.isna(v) else (v.to_pydatetime() if isinstance(v, pd.Timestamp) else
+                      v.item() if hasattr(v, 'item') else v) for v in row)
+                for row in frame.itertuples(index=False)]
+        cur.executemany(f"INSERT INTO bqx.{table} ({columns}) VALUES ({values})", rows)
+    pg_conn.commit()
+    cur.close()
+    return m1, reg, regime
+
+
+def _expected(m1, reg, regime):
+    month = m1[m1['time'] >= '2024-07-01'].rename(columns={'time': 'ts_utc'})
+    month['close'] = month['close'].round(6)
+    frame = month.merge(reg.rename(columns={'w60_r2': 'reg_w60_r2', 'w60_rmse': 'reg_w60_rmse'}),
+                        on='ts_utc', how='left')
+    frame = frame.merge(regime, on='ts_utc', how='left')
+    frame['ts_utc'] = frame['ts_utc'].dt.tz_localize('UTC')
+    frame['pair'] = 'eurusd'
+    return frame.reset_index(drop=True)
+
+
+def test_export_matches_joined_frames(pg_conn, tables, tmp_path):
+    store = open_store(str(tmp_path / 'store'))
+    rows, columns = export_partition(pg_conn, SOURCES, 'eurusd', '2024_07', store, 'eurusd/2024_07.parquet',
+                                     row_group_rows=25, extra={'pair': 'eurusd'})
+    pg_conn.commit()
+    assert (rows, columns) == (120, 7)
+
+    path = tmp_path / 'store' / 'eurusd' / '2024_07.parquet'
+    assert [p.name for p in path.parent.iterdir()] == ['2024_07.parquet']
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 5
+    assert parquet.schema_arrow.metadata[b'year_month'] == b'2024_07'
+
+    encodings = {parquet.metadata.row_group(0).column(i).path_in_schema:
+                 parquet.metadata.row_group(0).column(i).encodings for i in range(columns)}
+    assert 'BYTE_STREAM_SPLIT' in encodings['reg_w60_r2']
+    assert 'RLE_DICTIONARY' in encodings['regime_type']
+
+    result = parquet.read().to_pandas()
+    expected = _expected(*tables)
+    result['ts_utc'] = result['ts_utc'].dt.as_unit('ns')
+    expected['ts_utc'] = expected['ts_utc'].dt.as_unit('ns')
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert result['reg_w60_r2'].isna().sum() == 60
+    assert result['regime_type'].isna().sum() == 40
+
+
+def test_export_without_base_rows_writes_nothing(pg_conn, tables, tmp_path):
+    store = open_store(str(tmp_path / 'store'))
+    assert export_partition(pg_conn, SOURCES, 'eurusd', '2024_08', store, 'eurusd/2024_08.parquet') == (0, 0)
+    assert not (tmp_path / 'store' / 'eurusd' / '2024_08.parquet').exists()
+
+
+def test_duplicate_column_names_rejected(pg_conn, tables, tmp_path):
+    store = open_store(str(tmp_path / 'store'))
+    broken = SOURCES + [ExportSource('dup', 'bqx.reg_{pair}', (('w60_r2', 'reg_w60_r2'),))]
+    with pytest.raises(ValueError, match='Duplicate'):
+        export_partition(pg_conn, broken, 'eurusd', '2024_07', store, 'eurusd/2024_07.parquet')
+
+
+def test_interrupted_write_keeps_previous_object(tmp_path):
+    store = open_store(f"file://{tmp_path}")
+    with store.open_output('a/b.bin') as out:
+        out.write(b'first')
+    with pytest.raises(RuntimeError):
+        with store.open_output('a/b.bin') as out:
+            out.write(b'partial')
+            raise RuntimeError('interrupted')
+    assert [p.name for p in (tmp_path / 'a').iterdir()] == ['b.bin']
+    assert (tmp_path / 'a' / 'b.bin').read_bytes() == b'first'
+    assert store.size('a/b.bin') == 5
@@ -0,0 +1,332 @@
+"""
+Tests for the feature graph executor and the registered families
+Checks dependency selection, shared rolling caches, the family outputs
+against the worker computations on the same rows, the vectorized volume
+features against the former per-row loop, and a database round trip.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import feature_families as ff
+from data.feature_graph import Family, FeatureGraph, Partition
+from data.regime import compute_regime_features
+from data.rolling_stats import RollingCache, rolling_apply, window_mad
+
+
+@pytest.fixture(scope="module")
+def sources():
+    """July 2024 M1/BQX rows plus a day of June history, with gaps and NULLs"""
+    rng = np.random.default_rng(29)
+    times = pd.date_range('2024-06-30 00:00', '2024-07-01 06:00', freq='min', tz='UTC', inclusive='left')
+    keep = np.ones(len(times), dtype=bool)
+    keep[1500:1530] = False                          # gap after the month start
+    times = times[keep]
+    n = len(times)
+
+    close = 1.1 + np.cumsum(rng.normal(0, 1e-4, n))
+    m1 = pd.DataFrame({
+        'm1.open': close + rng.normal(0, 2e-5, n),
+        'm1.high': close + np.abs(rng.normal(0, 5e-5, n)),
+        'm1.low': close - np.abs(rng.normal(0, 5e-5, n)),
+        'm1.close': close,
+        'm1.volume': rng.integers(1, 200, n).astype(float),
+        'm1.rate': close,
+        'm1.rate_index': 100 * close / close[0],
+        'm1.bqx': rng.normal(0, 1e-3, n),
+    }, index=pd.DatetimeIndex(times, name='ts_utc'))
+    m1.iloc[1600, m1.columns.get_loc('m1.rate_index')] = np.nan
+    m1.iloc[1700, m1.columns.get_loc('m1.volume')] = np.nan
+
+    # BQX rows start later than M1 (inner join drops the first month rows)
+    bqx = pd.DataFrame({'bqx.w15_bqx_return': rng.normal(0, 1e-3, n)}, index=m1.index)
+    bqx = bqx[bqx.index >= pd.Timestamp('2024-07-01 00:10', tz='UTC')]
+    return {'m1': m1, 'bqx': bqx}
+
+
+def _month(frame):
+    return frame[frame.index >= pd.Timestamp('2024-07-01', tz='UTC')]
+
+
+def _history(frame, minutes):
+    return frame[frame.index >= pd.Timestamp('2024-07-01', tz='UTC') - pd.Timedelta(minutes=minutes)]
+
+
+def test_select_orders_dependencies():
+    graph = FeatureGraph()
+    graph.register(Family('child', ('m1.close', 'parent.double'), lambda inputs: {}))
+    graph.register(Family('parent', ('m1.close',), lambda inputs: {'double': 2 * inputs.values('m1.close')}))
+    graph.register(Family('other', ('bqx.w15_bqx_return',), lambda inputs: {}))
+
+    assert [f.name for f in graph.select(['child'])] == ['parent', 'child']
+    assert [f.name for f in graph.select()] == ['parent', 'other', 'child']
+    assert graph.source_columns(graph.select(['child'])) == {'m1': (['close'], 0)}
+    with pytest.raises(ValueError):
+        graph.select(['missing'])
+    with pytest.raises(ValueError):
+        graph.register(Family('parent', ('m1.close',), lambda inputs: {}))
+    with pytest.raises(ValueError):
+        graph.register(Family('orphan', ('parent.double',), lambda inputs: {}))
+
+
+def test_dependent_family_reads_outputs(sources):
+    graph = FeatureGraph()
+    graph.register(Family('parent', ('m1.close',), lambda inputs: {'double': 2 * inputs.values('m1.close')}))
+    graph.register(Family('child', ('m1.ts_utc', 'parent.double'), lambda inputs: {'half': inputs.values('parent.double') / 2},
+                          lookback=30))
+    partition = Partition('eurusd', 2024, 7, sources)
+    results = graph.compute(partition, graph.select(['child']))
+
+    month_close = _month(sources['m1'])['m1.close']
+    np.testing.assert_array_equal(results['child']['half'], month_close)
+    # History rows of the child have no parent output
+    history = partition.family_input(graph.families['child'])
+    assert np.isnan(history.values('parent.double')[:history.first]).all()
+
+
+def test_rolling_cache_shares_intermediates():
+    x = np.random.default_rng(3).normal(size=500)
+    calls = []
+
+    def kernel(w):
+        calls.append(len(w))
+        return window_mad(w)
+
+    cache = RollingCache(x)
+    for min_periods, fill in [(1, np.nan), (10, 0.0), (80, -1.0)]:
+        np.testing.assert_array_equal(cache.apply(kernel, 60, min_periods, fill),
+                                      rolling_apply(x, 60, window_mad, min_periods, fill))
+    assert sum(calls) == 500                         # evaluated once for every row
+    assert RollingCache.of(cache) is cache
+
+
+def test_families_match_worker_computations(sources):
+    partition = Partition('eurusd', 2024, 7, sources)
+    families = ff.GRAPH.select(['statistics', 'bollinger', 'volume', 'regression', 'fibonacci', 'technical', 'regime'])
+    results = ff.GRAPH.compute(partition, families)
+    m1 = sources['m1']
+    month = _month(m1).index
+
+    # Statistics / Bollinger: 60 minutes of history, NULL rate_index as 100
+    rows = _history(m1, 60)
+    first = len(rows) - len(month)
+    rate_index = rows['m1.rate_index'].fillna(100.0).to_numpy()
+    expected = {**ff.compute_statistics_features(rate_index), **ff.compute_bollinger_features(rate_index)}
+    for name in ff.STATISTICS_COLUMNS + ff.BOLLINGER_COLUMNS:
+        family = 'statistics' if name in ff.STATISTICS_COLUMNS else 'bollinger'
+        np.testing.assert_array_equal(results[family][name], expected[name][first:], err_msg=name)
+        assert results[family].index.equals(month)
+
+    # Both families windowed the same cached series
+    key = (('m1',), partition.start - pd.Timedelta(minutes=60))
+    assert list(partition._rows[key][1]) == [('m1.rate_index', 100.0)]
+
+    volume = ff.compute_volume_features(rows['m1.volume'].fillna(0.0).to_numpy(), rows['m1.rate'].to_numpy())
+    for name in ff.VOLUME_COLUMNS:
+        np.testing.assert_array_equal(results['volume'][name], volume[name][first:], err_msg=name)
+
+    # Regression: inner join with the BQX rows, no history
+    joined = _month(m1).join(sources['bqx'], how='inner')
+    assert results['regression'].index.equals(joined.index)
+    for window_name, window_size in ff.REGRESSION_WINDOWS.items():
+        for domain, source in [('idx', 'm1.rate_index'), ('bqx', 'bqx.w15_bqx_return')]:
+            metrics = ff.compute_parabola_columns(joined[source].to_numpy(), window_size)
+            for metric, values in metrics.items():
+                column = f"{metric}_{domain}_{window_name}"
+                np.testing.assert_array_equal(results['regression'][column], values, err_msg=column)
+    assert set(results['regression'].columns) == set(ff.regression_columns('idx') + ff.regression_columns('bqx'))
+
+    # Fibonacci / technical: month rows only, NaN rows dropped
+    fib = ff.compute_fibonacci_features(pd.DataFrame({
+        'high': _month(m1)['m1.high'].to_numpy(),
+        'low': _month(m1)['m1.low'].to_numpy(),
+        'close': _month(m1)['m1.close'].to_numpy()
+    })).set_axis(month).dropna()
+    pd.testing.assert_frame_equal(results['fibonacci'], fib, check_names=False)
+    assert len(results['technical']) > 0 and not results['technical'].isna().any().any()
+
+    # Regime: a day of history, only month rows classified
+    history = _history(m1, 1440)
+    regime = compute_regime_features(history['m1.rate_index'].to_numpy(), history['m1.bqx'].fillna(0).to_numpy(),
+                                     first_row=len(history) - len(month))
+    for name, values in regime.items():
+        np.testing.assert_array_equal(results['regime'][name], values[len(history) - len(month):], err_msg=name)
+
+
+def test_min_rows_skips_family(sources):
+    short = {name: frame.iloc[:1460] for name, frame in sources.items()}
+    partition = Partition('eurusd', 2024, 7, short)
+    results = ff.GRAPH.compute(partition, ff.GRAPH.select(['technical', 'bollinger']))
+
+    assert results['technical'].empty                  # 20 month rows < 300
+    assert len(results['bollinger']) == 20
+
+
+def _volume_reference(volumes, rates):
+    """The former per-row volume worker loop"""
+    from scipy import stats
+
+    returns = np.concatenate([[0], np.diff(rates) / rates[:-1]])
+    rows = []
+    for i in range(len(volumes)):
+        vol_w15, vol_w30, vol_w60 = (volumes[max(0, i - w + 1):i + 1] for w in (15, 30, 60))
+        ret_w60 = returns[max(0, i - 59):i + 1]
+        mean_w15, mean_w30, mean_w60 = np.mean(vol_w15), np.mean(vol_w30), np.mean(vol_w60)
+        row = {
+            'w15_volume_ratio': volumes[i] / mean_w15 if mean_w15 > 0 else 1.0,
+            'w30_volume_ratio': volumes[i] / mean_w30 if mean_w30 > 0 else 1.0,
+            'w60_volume_ratio': volumes[i] / mean_w60 if mean_w60 > 0 else 1.0,
+            'volume_spike': 1 if volumes[i] > 2 * mean_w60 else 0,
+            'volume_trend_slope': stats.linregress(np.arange(len(vol_w60)), vol_w60)[0] if len(vol_w60) >= 10 else 0.0,
+            'cumulative_volume_60min': int(np.sum(vol_w60)),
+            'volume_weighted_return': np.sum(ret_w60 * vol_w60) / np.sum(vol_w60) if np.sum(vol_w60) > 0 else 0.0,
+            'volume_price_correlation_60min': 0.0,
+            'relative_volume_position': 0.5,
+            'volume_volatility_60min': np.std(vol_w60) if len(vol_w60) > 1 else 0.0,
+        }
+        abs_returns = np.abs(ret_w60)
+        if len(vol_w60) >= 10 and np.std(vol_w60) > 0 and np.std(abs_returns) > 0:
+            corr = np.corrcoef(vol_w60, abs_returns)[0, 1]
+            row['volume_price_correlation_60min'] = corr if not np.isnan(corr) else 0.0
+        if np.max(vol_w60) > np.min(vol_w60):
+            row['relative_volume_position'] = (volumes[i] - np.min(vol_w60)) / (np.max(vol_w60) - np.min(vol_w60))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def test_volume_features_match_per_row_loop():
+    rng = np.random.default_rng(41)
+    n = 400
+    volumes = rng.integers(0, 300, n).astype(float)
+    volumes[100:130] = 0.0                           # no volume: ratios 1, position 0.5
+    volumes[200:215] = 50.0                          # flat volume
+    rates = 1.1 + np.cumsum(rng.normal(0, 1e-4, n))
+    rates[300:320] = rates[300]                      # no returns: undefined correlation
+
+    features = ff.compute_volume_features(volumes, rates)
+    reference = _volume_reference(volumes, rates)
+    for name in ff.VOLUME_COLUMNS:
+        np.testing.assert_allclose(features[name], reference[name], rtol=1e-9, atol=1e-12, err_msg=name)
+    assert features['cumulative_volume_60min'].dtype == np.int64
+
+
+def test_run_partition_writes_selected_families(pg_conn, sources):
+    m1 = sources['m1']
+    cur = pg_conn.cursor()
+    cur.execute("CREATE TABLE bqx.m1_eurusd (time TIMESTAMP PRIMARY KEY, rate_index NUMERIC, volume NUMERIC, rate NUMERIC)")
+    cur.executemany("INSERT INTO bqx.m1_eurusd VALUES (%s, %s, %s, %s)", [
+        (ts.tz_localize(None).to_pydatetime(), *(None if np.isnan(v) else float(v) for v in row))
+        for ts, row in zip(m1.index, m1[['m1.rate_index', 'm1.volume', 'm1.rate']].to_numpy())
+    ])
+    cur.execute(f"""
+        CREATE TABLE bqx.bollinger_features_eurusd (
+            ts_utc TIMESTAMPTZ PRIMARY KEY, {', '.join(f'{c} DOUBLE PRECISION' for c in ff.BOLLINGER_COLUMNS)})
+    """)
+    cur.execute(f"""
+        CREATE TABLE bqx.volume_features_eurusd (
+            ts_utc TIMESTAMPTZ PRIMARY KEY,
+            {', '.join(f"{c} {'BIGINT' if c in ('volume_spike', 'cumulative_volume_60min') else 'DOUBLE PRECISION'}"
+                       for c in ff.VOLUME_COLUMNS)})
+    """)
+    pg_conn.commit()
+
+    summary = ff.GRAPH.run_partition(pg_conn, 'eurusd', 2024, 7, ['bollinger', 'volume'])
+    month = _month(m1)
+    assert {name: rows for name, (rows, _) in summary.items()} == {'bollinger': len(month), 'volume': len(month)}
+
+    # Same values as computing from the in-memory rows
+    expected = ff.GRAPH.compute(Partition('eurusd', 2024, 7, sources), ff.GRAPH.select(['bollinger', 'volume']))
+    cur.execute("SELECT * FROM bqx.bollinger_features_eurusd ORDER BY ts_utc")
+    stored = pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description]).set_index('ts_utc')
+    np.testing.assert_allclose(stored[ff.BOLLINGER_COLUMNS].to_numpy(), expected['bollinger'].to_numpy(), rtol=1e-12)
+    cur.execute("SELECT SUM(cumulative_volume_60min) FROM bqx.volume_features_eurusd")
+    assert int(cur.fetchone()[0]) == int(expected['volume']['cumulative_volume_60min'].sum())
+    cur.close()
+
+
+# ----------------------------------------------------------------------
+# Incremental maintenance
+# ----------------------------------------------------------------------
+
+INCREMENTAL_FAMILIES = ['statistics', 'bollinger', 'volume', 'time', 'fibonacci', 'technical', 'regression']
+M1_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'rate', 'rate_index', 'bqx']
+
+
+def _output_tables():
+    tables = {}
+    for name in INCREMENTAL_FAMILIES:
+        family = ff.GRAPH.families[name]
+        for output in family.outputs:
+            tables[output.table.format(pair='eurusd', year=2024, month=7)] = output.columns
+    return tables
+
+
+def _append_sources(cur, sources, start, end):
+    """Insert the fixture's M1/BQX rows with start <= ts < end"""
+    for name, table, time_column, columns in [('m1', 'bqx.m1_eurusd', 'time', M1_COLUMNS),
+                                              ('bqx', 'bqx.bqx_eurusd', 'ts_utc', ['w15_bqx_return'])]:
+        frame = sources[name]
+        frame = frame[(frame.index >= start) & (frame.index < end)]
+        cur.executemany(
+            f"INSERT INTO {table} ({time_column}, {', '.join(columns)}) VALUES ({', '.join(['%s'] * (len(columns) + 1))})",
+            [(ts.tz_localize(None).to_pydatetime(), *(None if np.isnan(v) else float(v) for v in row))
+             for ts, row in zip(frame.index, frame[[f'{name}.{c}' for c in columns]].to_numpy())]
+        )
+
+
+def _snapshot(cur):
+    tables = {}
+    for table in _output_tables():
+        cur.execute(f"SELECT * FROM {table} ORDER BY ts_utc")
+        tables[table] = pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description])
+    return tables
+
+
+def test_incremental_appends_match_full_rebuild(pg_conn, sources):
+    cur = pg_conn.cursor()
+    cur.execute(f"CREATE TABLE bqx.m1_eurusd (time TIMESTAMP PRIMARY KEY, {', '.join(f'{c} NUMERIC' for c in M1_COLUMNS)})")
+    cur.execute("CREATE TABLE bqx.bqx_eurusd (ts_utc TIMESTAMPTZ PRIMARY KEY, w15_bqx_return NUMERIC)")
+    for table, columns in _output_tables().items():
+        cur.execute(f"CREATE TABLE {table} (ts_utc TIMESTAMPTZ PRIMARY KEY, "
+                    f"{', '.join(f'{c} DOUBLE PRECISION' for c in columns)})")
+    pg_conn.commit()
+
+    # New M1/BQX rows arrive in three batches, each followed by an incremental run
+    cuts = [pd.Timestamp(t, tz='UTC') for t in ('2024-06-01', '2024-07-01 02:00', '2024-07-01 04:00', '2024-08-01')]
+    month = _month(sources['m1'])
+    runs = []
+    for start, end in zip(cuts, cuts[1:]):
+        _append_sources(cur, sources, start, end)
+        pg_conn.commit()
+        runs.append(ff.GRAPH.run_partition(pg_conn, 'eurusd', 2024, 7, INCREMENTAL_FAMILIES, incremental=True))
+
+    # Technical needs 300 rows: skipped until the last batch, then built from the month start
+    assert runs[0]['technical'][0] == runs[1]['technical'][0] == 0 and runs[2]['technical'][0] > 0
+    new_rows = ((month.index >= cuts[2]) & (month.index < cuts[3])).sum()
+    assert runs[2]['statistics'][0] == runs[2]['time'][0] == new_rows
+
+    # A run without new rows only reads the context rows and writes nothing
+    partition = ff.GRAPH.load(pg_conn, 'eurusd', 2024, 7, ff.GRAPH.select(['statistics', 'bollinger']), incremental=True)
+    assert len(partition.sources['m1']) == 60
+    idle = ff.GRAPH.run_partition(pg_conn, 'eurusd', 2024, 7, ['statistics', 'volume', 'fibonacci'], incremental=True)
+    assert all(rows == 0 for rows, _ in idle.values())
+
+    cur.execute("SELECT table_name, ts_utc FROM bqx.feature_watermarks WHERE pair = 'eurusd'")
+    marks = dict(cur.fetchall())
+    assert marks['bqx.statistics_features_eurusd'] == month.index[-1]
+    incremental = _snapshot(cur)
+
+    # Full rebuild from empty tables: identical rows and values
+    for table in _output_tables():
+        cur.execute(f"TRUNCATE {table}")
+    cur.execute("TRUNCATE bqx.feature_watermarks")
+    pg_conn.commit()
+    ff.GRAPH.run_partition(pg_conn, 'eurusd', 2024, 7, INCREMENTAL_FAMILIES)
+    full = _snapshot(cur)
+
+    for table, frame in full.items():
+        assert len(frame) > 0, table
+        pd.testing.assert_frame_equal(incremental[table], frame, check_exact=True, obj=table)
+    cur.close()
+
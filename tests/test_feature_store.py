@@ -0,0 +1,138 @@
+"""
+Tests for the local Arrow feature store and AuroraExtractor read-through
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from data.bqx_engine import bqx_column_names
+from data.feature_store import FeatureStore, month_partitions
+
+
+class FakeSource:
+    """Minute bars with two feature columns; counts fetches"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, pair, start, end):
+        self.calls.append((pair, start, end))
+        ts = pd.date_range(start, end, freq='h', inclusive='left')
+        x = np.arange(len(ts), dtype=float)
+        x[::7] = np.nan
+        return pd.DataFrame({'ts_utc': ts, 'w15_bqx_return': x, 'w60_bqx_return': -x})
+
+
+def test_month_partitions():
+    assert month_partitions('2024-07-15', '2024-09-01') == [
+        ('2024_07', '2024-07-01', '2024-08-01'),
+        ('2024_08', '2024-08-01', '2024-09-01')
+    ]
+
+
+def test_second_load_hits_cache(tmp_path):
+    store = FeatureStore(tmp_path)
+    source = FakeSource()
+
+    first = store.load('bqx', 'eurusd', '2024-07-10', '2024-09-05', fetch=source)
+    assert len(source.calls) == 3
+
+    second = FeatureStore(tmp_path).load('bqx', 'eurusd', '2024-07-10', '2024-09-05', fetch=source)
+    assert len(source.calls) == 3
+    pd.testing.assert_frame_equal(first, second)
+
+    assert first.index[0] == pd.Timestamp('2024-07-10')
+    assert first.index[-1] < pd.Timestamp('2024-09-05')
+    assert first['w15_bqx_return'].isna().any()
+
+    manifest = store.manifest('bqx', 'eurusd')
+    assert manifest['2024_07']['rows'] == 31 * 24
+    assert manifest['2024_07']['max_ts_utc'] == '2024-07-31T23:00:00'
+    assert manifest['2024_07']['closed']
+
+
+def test_projection_and_zero_copy(tmp_path):
+    store = FeatureStore(tmp_path)
+    source = FakeSource()
+
+    df = store.load('bqx', 'eurusd', '2024-07-01', '2024-08-01', fetch=source, columns=['w60_bqx_return'])
+
+    assert list(df.columns) == ['w60_bqx_return']
+    values = df['w60_bqx_return'].to_numpy()
+    # Backed by the memory-mapped file, not a private copy
+    assert not values.flags.writeable
+    assert not values.flags.owndata
+
+
+def test_open_partition_revalidated_after_ttl(tmp_path):
+    store = FeatureStore(tmp_path, ttl=0)
+    source = FakeSource()
+    now = pd.Timestamp.now().normalize()
+    start = now.replace(day=1).strftime('%Y-%m-%d')
+    end = (now + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+    store.load('bqx', 'eurusd', start, end, fetch=source)
+    entry = store.manifest('bqx', 'eurusd')[now.strftime('%Y_%m')]
+    assert not entry['closed']
+
+    unchanged = lambda p, s, e: (entry['rows'], pd.Timestamp(entry['max_ts_utc']))
+    store.load('bqx', 'eurusd', start, end, fetch=source, source_stats=unchanged)
+    assert len(source.calls) == 1
+
+    grown = lambda p, s, e: (entry['rows'] + 1, pd.Timestamp(entry['max_ts_utc']) + pd.Timedelta(hours=1))
+    store.load('bqx', 'eurusd', start, end, fetch=source, source_stats=grown)
+    assert len(source.calls) == 2
+
+
+def test_invalidate(tmp_path):
+    store = FeatureStore(tmp_path)
+    source = FakeSource()
+    store.load('bqx', 'eurusd', '2024-07-01', '2024-09-01', fetch=source)
+
+    store.invalidate('bqx', 'eurusd', ['2024_08'])
+    store.load('bqx', 'eurusd', '2024-07-01', '2024-09-01', fetch=source)
+
+    assert source.calls[-1][1] == '2024-08-01'
+    assert len(source.calls) == 3
+
+
+def test_extractor_second_run_skips_database(tmp_path, pg_dsn, pg_conn, monkeypatch):
+    import psycopg2.extensions
+    from data.extraction import AuroraExtractor
+
+    columns = bqx_column_names()
+    cur = pg_conn.cursor()
+    cur.execute(
+        "CREATE TABLE bqx.bqx_eurusd (ts_utc TIMESTAMP, rate DOUBLE PRECISION, "
+        + ", ".join(f"{c} DOUBLE PRECISION" for c in columns) + ")"
+    )
+    cur.execute(
+        "INSERT INTO bqx.bqx_eurusd (ts_utc, rate, w15_bqx_return) "
+        "SELECT g, 1.1, extract(minute from g) FROM generate_series("
+        "'2024-07-01'::timestamp, '2024-08-31 23:59', interval '1 minute') g"
+    )
+    pg_conn.commit()
+
+    params = psycopg2.extensions.parse_dsn(pg_dsn)
+    config_path = tmp_path / "database.yaml"
+    config_path.write_text(yaml.safe_dump({
+        'aurora': {
+            'host': params['host'], 'port': 5432, 'database': params['dbname'],
+            'user': params['user'], 'password': '', 'sslmode': 'disable'
+        },
+        'query': {'cache_enabled': True, 'cache_dir': str(tmp_path / 'store')}
+    }))
+
+    extractor = AuroraExtractor(str(config_path))
+    first = extractor.load_bqx('eurusd', '2024-07-15', '2024-08-15')
+    extractor.disconnect()
+
+    second_run = AuroraExtractor(str(config_path))
+    monkeypatch.setattr(second_run, 'connect', lambda: pytest.fail("database touched"))
+    second = second_run.load_bqx('eurusd', '2024-07-15', '2024-08-15', columns=['w15_bqx_return'])
+
+    assert len(first) == 31 * 1440
+    np.testing.assert_array_equal(second['w15_bqx_return'].to_numpy(), first['w15_bqx_return'].to_numpy())
+    assert second.index.equals(first.index)
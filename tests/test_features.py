@@ -0,0 +1,124 @@
+"""
+Equivalence tests for the matrix-based feature pipeline
+Compares FeatureEngineer.build_feature_matrix / engineer_features against
+the column-by-column pandas pipeline they replaced.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.bqx_engine import bqx_column_names
+from data.features import FeatureEngineer, FeatureMatrix
+
+REG_COLUMNS = [
+    f"w{w}_{m}"
+    for w in [60, 90, 150, 240, 390, 630]
+    for m in ['slope', 'intercept', 'r2', 'quad_a', 'quad_b', 'quad_c', 'quad_norm']
+]
+
+
+@pytest.fixture(scope="module")
+def frames():
+    rng = np.random.default_rng(5)
+    ts = pd.date_range('2024-07-01', periods=2000, freq='min', name='ts_utc')
+
+    bqx = pd.DataFrame(rng.normal(0, 1e-4, (len(ts), 37)), index=ts, columns=bqx_column_names())
+    bqx.insert(0, 'rate', 1.1 + np.cumsum(rng.normal(0, 1e-4, len(ts))))
+    bqx.iloc[700:705, 5] = np.nan
+    bqx.iloc[1500, 36] = np.nan
+
+    reg = pd.DataFrame(rng.uniform(0, 1, (len(ts), len(REG_COLUMNS))), index=ts, columns=REG_COLUMNS)
+    reg.insert(0, 'rate', bqx['rate'])
+    reg.iloc[900:910, 2] = np.nan
+    reg = reg.drop(ts[1200:1240])
+    return bqx, reg
+
+
+def _reference(engineer, bqx_df, reg_df, target_col='w60_bqx_return', horizon=60, apply_causality=True):
+    """The original pandas pipeline (copy + per-column inserts)"""
+    features = bqx_df.merge(reg_df, left_index=True, right_index=True, how='inner', suffixes=('_bqx', '_reg'))
+
+    lagged = features.copy()
+    for col in [c for c in features.columns if 'bqx' in c.lower()]:
+        for lag in engineer.config['lags']['windows']:
+            lagged[f"{col}_lag{lag}"] = features[col].shift(lag)
+    features = lagged
+
+    features['momentum_alignment'] = engineer.create_momentum_alignment(bqx_df)
+    features['volatility_regime'] = engineer.create_volatility_regime(bqx_df)
+    features['trend_strength'] = engineer.create_trend_strength(reg_df)
+
+    target = engineer.create_target(bqx_df, target_col, horizon)
+
+    if apply_causality:
+        result = features.copy()
+        for col in features.columns:
+            if any(p in col for p in ['w60_', 'agg_']) and '_lag' not in col:
+                result[f"{col}_causality_lag61"] = features[col].shift(61)
+        features = result
+
+    valid_idx = target.notna() & features.notna().all(axis=1)
+    return features[valid_idx], target[valid_idx]
+
+
+@pytest.mark.parametrize("apply_causality", [True, False])
+def test_matches_pandas_pipeline(frames, apply_causality):
+    bqx, reg = frames
+    engineer = FeatureEngineer("missing.yaml")
+
+    X_ref, y_ref = _reference(engineer, bqx, reg, apply_causality=apply_causality)
+    X, y = engineer.engineer_features(bqx, reg, apply_causality=apply_causality)
+
+    assert len(X) > 1500
+    assert list(X.columns) == list(X_ref.columns)
+    pd.testing.assert_index_equal(X.index, X_ref.index)
+    np.testing.assert_allclose(X.to_numpy(), X_ref.to_numpy(dtype=np.float64), rtol=1e-6, atol=1e-12)
+    pd.testing.assert_series_equal(y, y_ref)
+
+
+def test_matrix_layout(frames):
+    bqx, reg = frames
+    engineer = FeatureEngineer("missing.yaml")
+    matrix = engineer.build_feature_matrix(bqx, reg)
+
+    assert matrix.values.dtype == np.float32
+    assert matrix.values.flags.f_contiguous
+    assert matrix.values.shape == (len(matrix.index), len(matrix.names))
+    assert 'rate_bqx' in matrix.names and 'rate_reg' in matrix.names
+    assert 'agg_bqx_volatility_causality_lag61' in matrix.names
+
+    X, _ = matrix.to_frame()
+    assert np.shares_memory(X.to_numpy(), matrix.values)
+
+
+def test_concat_round_trip(frames):
+    bqx, reg = frames
+    engineer = FeatureEngineer("missing.yaml")
+    matrix = engineer.build_feature_matrix(bqx, reg)
+
+    half = len(matrix.index) // 2
+    parts = [
+        FeatureMatrix(matrix.values[:half], matrix.names, matrix.index[:half], matrix.target[:half], matrix.target_name),
+        FeatureMatrix(matrix.values[half:], matrix.names, matrix.index[half:], matrix.target[half:], matrix.target_name)
+    ]
+    joined = FeatureMatrix.concat(parts)
+
+    np.testing.assert_array_equal(joined.values, matrix.values)
+    pd.testing.assert_index_equal(joined.index, matrix.index)
+    np.testing.assert_array_equal(joined.target, matrix.target)
+
+
+def test_legacy_helpers_do_not_fragment(frames):
+    bqx, _ = frames
+    engineer = FeatureEngineer("missing.yaml")
+
+    lagged = engineer.create_lagged_features(bqx, ['w15_bqx_return', 'missing'], [60, 120])
+    assert list(lagged.columns[-2:]) == ['w15_bqx_return_lag60', 'w15_bqx_return_lag120']
+    pd.testing.assert_series_equal(
+        lagged['w15_bqx_return_lag120'], bqx['w15_bqx_return'].shift(120), check_names=False
+    )
+
+    caused = engineer.apply_temporal_causality_rule(bqx)
+    assert 'w60_bqx_avg_causality_lag61' in caused.columns
+    assert 'w15_bqx_avg_causality_lag61' not in caused.columns
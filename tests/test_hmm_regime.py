@@ -0,0 +1,92 @@
+"""
+Tests for the online regime engine
+Checks that batch runs match per-series streaming, that saved state
+resumes exactly, the filters' invariants, changepoint response and the
+table column mapping.
+"""
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from data.hmm_regime import DOMAINS, RegimeEngine, domain_columns, domain_engine
+
+SQL_DIR = Path(__file__).parent.parent / 'scripts' / 'refactor'
+
+
+@pytest.fixture(scope="module")
+def levels():
+    """Three random walks; the first switches to 4x volatility at row 1500"""
+    rng = np.random.default_rng(22)
+    steps = rng.normal(0, 1, (3000, 3))
+    steps[1500:, 0] *= 4
+    walks = 100 + np.cumsum(steps * 1e-3, axis=0)
+    walks[rng.choice(3000, 200, replace=False), 1] = np.nan
+    return walks
+
+
+def test_batch_matches_streaming(levels):
+    batch = RegimeEngine(3, max_run_length=60).run(levels)
+    for j in range(3):
+        single = RegimeEngine(1, max_run_length=60)
+        rows = [single.update(levels[t, j:j + 1]) for t in range(len(levels))]
+        for name, values in batch.items():
+            np.testing.assert_allclose(values[:, j], [row[name][0] for row in rows],
+                                       rtol=1e-12, atol=1e-12, err_msg=name)
+
+
+def test_saved_state_resumes_exactly(levels):
+    whole = domain_engine('bqx', 3).run(levels)
+    first = domain_engine('bqx', 3)
+    first.run(levels[:1000])
+    second = domain_engine('bqx', 3)
+    second.set_state(first.get_state())
+    rest = second.run(levels[1000:])
+    for name, values in whole.items():
+        np.testing.assert_array_equal(values[1000:], rest[name], err_msg=name)
+
+    with pytest.raises(ValueError):
+        RegimeEngine(2).set_state(first.get_state())
+
+
+def test_probabilities_and_bounds(levels):
+    out = RegimeEngine(3).run(levels)
+    probs = out['hmm_state_prob_calm'] + out['hmm_state_prob_trend'] + out['hmm_state_prob_shock']
+    np.testing.assert_allclose(probs, 1.0, atol=1e-12)
+    for name in ('regime_entropy', 'hmm_state_transition_prob', 'bocpd_hazard_rate',
+                 'bocpd_growth_prob', 'bocpd_decay_prob'):
+        assert np.all((out[name] >= -1e-12) & (out[name] <= 1 + 1e-12)), name
+    assert np.all(out['bocpd_growth_prob'] + out['bocpd_decay_prob'] <= 1 + 1e-12)
+    assert np.all((out['bocpd_run_length'] >= 0) & (out['bocpd_run_length'] <= 240))
+    assert set(np.unique(out['cusum_alarm_flag'])) <= {0.0, 1.0}
+
+
+def test_volatility_shift_detected(levels):
+    out = RegimeEngine(3).run(levels)
+    before, after = slice(1300, 1500), slice(1500, 1530)
+    assert out['bocpd_run_length'][1499, 0] > 100
+    assert out['bocpd_run_length'][after, 0].min() < 20
+    assert out['hmm_state_prob_shock'][after, 0].mean() > 0.5 > out['hmm_state_prob_shock'][before, 0].mean()
+    assert out['bocpd_growth_prob'][1520, 0] > 0.9
+    assert out['cusum_alarm_flag'][after, 0].sum() >= 1
+    assert out['cusum_reset_periods'][1530, 0] < 30
+
+
+def test_missing_rows_leave_state_untouched(levels):
+    engine = RegimeEngine(2)
+    engine.run(levels[:500, :2])
+    state = engine.get_state()
+    engine.update([np.nan, levels[500, 1]])
+    after = engine.get_state()
+    for name, value in state.items():
+        np.testing.assert_array_equal(after[name][0], value[0], err_msg=name)
+
+
+@pytest.mark.parametrize("domain", sorted(DOMAINS))
+def test_domain_columns_match_schema(domain):
+    sql = (SQL_DIR / f'stage_1_6_20_create_hmm_regime_{domain}.sql').read_text()
+    table = re.search(r'CREATE TABLE IF NOT EXISTS [^(]*\((.*?)PRIMARY KEY', sql, re.S).group(1)
+    columns = [line.split()[0] for line in table.strip().splitlines()][1:]
+    assert sorted(domain_columns(domain).values()) == sorted(columns)
@@ -0,0 +1,131 @@
+"""
+Equivalence tests for the technical indicator kernels
+Compares data.indicators with the pandas implementations kept in
+scripts/ml/benchmark_technical_indicators.py, including NULL gaps.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import indicators
+
+ROOT = Path(__file__).parent.parent
+
+
+def _load_script(relative_path, name):
+    """Import a worker script by path (scripts/ is not a package)"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def bench():
+    return _load_script("scripts/ml/benchmark_technical_indicators.py", "benchmark_technical_indicators")
+
+
+@pytest.fixture(scope="module")
+def partition(bench):
+    """3000 synthetic minutes with a NULL close, NULL volumes and BQX gaps"""
+    ohlcv, bqx = bench.synthetic_partition(3000)
+    ohlcv.loc[500, 'close'] = np.nan
+    ohlcv.loc[800:803, 'volume'] = np.nan
+    bqx.loc[1000, 'w15_bqx_return'] = np.nan
+    bqx.loc[1500:1510, 'w60_bqx_return'] = np.nan
+    return ohlcv, bqx
+
+
+def _assert_same(expected, actual, column):
+    expected = np.asarray(expected, dtype=np.float64)
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected), err_msg=column)
+    np.testing.assert_array_equal(np.isinf(actual), np.isinf(expected), err_msg=column)
+    finite = np.isfinite(expected)
+    scale = np.abs(expected[finite]).max() if finite.any() else 1.0
+    np.testing.assert_allclose(actual[finite], expected[finite], rtol=1e-7, atol=1e-12 * scale, err_msg=column)
+
+
+def test_rate_indicators_match_pandas(bench, partition):
+    ohlcv, _ = partition
+    expected = bench.pandas_rate_indicators(ohlcv)
+    actual = indicators.rate_indicators(ohlcv['open'], ohlcv['high'], ohlcv['low'], ohlcv['close'], ohlcv['volume'])
+
+    assert list(actual) == indicators.RATE_INDICATOR_COLUMNS
+    assert set(actual) == set(expected.columns)
+    for column in actual:
+        _assert_same(expected[column], actual[column], column)
+
+
+def test_bqx_indicators_match_pandas(bench, partition):
+    _, bqx = partition
+    expected = bench.pandas_bqx_indicators(bqx)
+    actual = indicators.bqx_indicators(bqx['w15_bqx_return'], bqx['w60_bqx_return'])
+
+    assert list(actual) == indicators.BQX_INDICATOR_COLUMNS
+    assert set(actual) == set(expected.columns) - {'ts_utc'}
+    for column in actual:
+        _assert_same(expected[column], actual[column], column)
+
+
+def test_rolling_primitives_treat_inf_as_missing():
+    values = pd.Series([1.0, 2.0, np.inf, 3.0, 4.0, 5.0, np.nan, 6.0, 7.0, 8.0, -np.inf, 9.0, 10.0, 11.0])
+    for window in (1, 3, 5):
+        rolling = values.rolling(window)
+        _assert_same(rolling.sum(), indicators.rolling_sum(values, window), 'sum')
+        _assert_same(rolling.mean(), indicators.rolling_mean(values, window), 'mean')
+        _assert_same(rolling.min(), indicators.rolling_min(values, window), 'min')
+        _assert_same(rolling.max(), indicators.rolling_max(values, window), 'max')
+        if window > 1:
+            _assert_same(rolling.std(), indicators.rolling_std(values, window), 'std')
+
+    # Windows of exact zeros sum to exactly zero (RSI loss = 0 -> 100)
+    gains = np.array([0.0] * 20 + [0.3, 0.1] + [0.0] * 20)
+    assert (indicators.rolling_sum(gains, 14)[-6:] == 0).all()
+
+
+@pytest.mark.parametrize("span", [9, 12, 26, 200])
+def test_ema_matches_pandas_with_gaps(span):
+    rng = np.random.default_rng(span)
+    values = rng.normal(1.1, 1e-3, 1000)
+    values[:5] = np.nan
+    values[[100, 400, 401, 402, 999]] = np.nan
+    expected = pd.Series(values).ewm(span=span, adjust=False).mean()
+    _assert_same(expected, indicators.ema(values, span), f'ema_{span}')
+
+
+def test_wilder_rsi_and_adx(bench):
+    ohlcv, _ = bench.synthetic_partition(2000)
+    high, low, close = ohlcv['high'], ohlcv['low'], ohlcv['close']
+    period = 14
+
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).ewm(alpha=1 / period, adjust=False).mean()
+    loss = (-delta.where(delta < 0, 0)).ewm(alpha=1 / period, adjust=False).mean()
+    _assert_same(100 - 100 / (1 + gain / loss), indicators.rsi(close, period, wilder=True), 'rsi')
+
+    up, down = high.diff(), -low.diff()
+    plus_dm = up.where((up > down) & (up > 0), 0.0)
+    minus_dm = down.where((down > up) & (down > 0), 0.0)
+    tr = pd.concat([high - low, (high - close.shift()).abs(), (low - close.shift()).abs()], axis=1).max(axis=1)
+    smoothed_tr = tr.ewm(alpha=1 / period, adjust=False).mean()
+    plus_di = 100 * plus_dm.ewm(alpha=1 / period, adjust=False).mean() / smoothed_tr
+    minus_di = 100 * minus_dm.ewm(alpha=1 / period, adjust=False).mean() / smoothed_tr
+    dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
+
+    result = indicators.adx(high, low, close, period)
+    _assert_same(plus_di, result['plus_di'], 'plus_di')
+    _assert_same(minus_di, result['minus_di'], 'minus_di')
+    _assert_same(dx.ewm(alpha=1 / period, adjust=False).mean(), result['adx'], 'adx')
+
+
+def test_benchmark_runs(bench):
+    results = bench.run_benchmark(rows=1500, repeat=1)
+
+    assert set(results) == {'rate', 'bqx'}
+    for result in results.values():
+        assert result['max_rel_diff'] < 1e-6
+        assert result['numpy_s'] > 0 and result['pandas_s'] > 0
@@ -0,0 +1,132 @@
+"""
+Tests for the resumable partition job runner
+"""
+
+import pytest
+
+from data.jobs import Job, JobLedger, longest_first, month_bounds, run_jobs
+
+CALLS = []
+
+
+def _rows(pair, month):
+    CALLS.append((pair, month))
+    return len(pair) + int(month[5:])
+
+
+def _flaky(state, pair):
+    state[pair] = state.get(pair, 0) + 1
+    if state[pair] < 3:
+        raise RuntimeError(f"attempt {state[pair]}")
+    return 10
+
+
+def _report(pair, success):
+    return pair, success, 5, None if success else "bad data"
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = JobLedger(tmp_path / "ledger.sqlite")
+    yield ledger
+    ledger.close()
+
+
+@pytest.fixture(autouse=True)
+def _calls():
+    CALLS.clear()
+
+
+def _jobs(pairs=('eurusd', 'gbpusd'), months=('2024_07', '2024_08')):
+    return [Job(pair, month, (pair, month)) for pair in pairs for month in months]
+
+
+def test_month_bounds_cross_year():
+    start, end = month_bounds('2024_12')
+    assert (start.year, start.month, end.year, end.month) == (2024, 12, 2025, 1)
+
+
+def test_completed_jobs_are_skipped(ledger):
+    results = run_jobs('stage', _jobs(), _rows, 2, ledger=ledger, threads=True)
+    assert sorted(r.state for r in results) == ['done'] * 4
+    assert ledger.summary('stage') == {'done': 4}
+    assert ledger.jobs('stage')[('eurusd', '2024_08')]['rows'] == 14
+    assert len(CALLS) == 4
+
+    # Resume with one more month: only the new partitions run
+    CALLS.clear()
+    results = run_jobs('stage', _jobs(months=('2024_07', '2024_08', '2024_09')), _rows, 2,
+                       ledger=ledger, threads=True)
+    assert sorted(CALLS) == [('eurusd', '2024_09'), ('gbpusd', '2024_09')]
+    skipped = [r for r in results if r.state == 'skipped']
+    assert len(skipped) == 4 and results[:4] == skipped
+    assert {r.rows for r in skipped} == {13, 14}
+
+    CALLS.clear()
+    run_jobs('stage', _jobs(), _rows, 2, ledger=ledger, threads=True, force=True)
+    assert len(CALLS) == 4
+
+
+def test_changed_checksum_reruns_done_job(ledger):
+    sums = {'eurusd': 'a', 'gbpusd': 'a'}
+    checksum = lambda job: sums[job.pair]
+    run_jobs('stage', _jobs(), _rows, 2, ledger=ledger, checksum=checksum, threads=True)
+
+    CALLS.clear()
+    sums['gbpusd'] = 'b'
+    run_jobs('stage', _jobs(), _rows, 2, ledger=ledger, checksum=checksum, threads=True)
+    assert sorted(CALLS) == [('gbpusd', '2024_07'), ('gbpusd', '2024_08')]
+    assert ledger.jobs('stage')[('gbpusd', '2024_07')]['checksum'] == 'b'
+
+
+def test_failures_are_retried_then_recorded(ledger):
+    state = {}
+    jobs = [Job('eurusd', '2024_07', (state, 'eurusd'))]
+    results = run_jobs('stage', jobs, _flaky, 1, ledger=ledger, threads=True, backoff=0.01)
+    assert [(r.state, r.attempts, r.rows) for r in results] == [('done', 3, 10)]
+
+    state.clear()
+    results = run_jobs('stage', jobs, _flaky, 1, ledger=ledger, threads=True, force=True,
+                       attempts=2, backoff=0.01)
+    assert [(r.state, r.attempts) for r in results] == [('failed', 2)]
+    assert results[0].error == "RuntimeError: attempt 2"
+    row = ledger.jobs('stage')[('eurusd', '2024_07')]
+    assert (row['state'], row['attempts']) == ('failed', 2)
+
+    # Failed jobs are not done: the next run picks them up again
+    results = run_jobs('stage', jobs, _flaky, 1, ledger=ledger, threads=True, backoff=0.01)
+    assert results[0].state == 'done'
+
+
+def test_outcome_reports_failure(ledger):
+    jobs = [Job(pair, '2024_07', (pair, pair == 'eurusd')) for pair in ('eurusd', 'gbpusd')]
+    results = run_jobs('stage', jobs, _report, 2, outcome=lambda r: (r[1], r[2], r[3]),
+                       ledger=ledger, attempts=1)
+    by_pair = {r.job.pair: r for r in results}
+    assert by_pair['eurusd'].state == 'done' and by_pair['eurusd'].result == ('eurusd', True, 5, None)
+    assert (by_pair['gbpusd'].state, by_pair['gbpusd'].error) == ('failed', 'bad data')
+    assert ledger.done('stage') == {('eurusd', '2024_07')}
+
+
+def test_longest_first_uses_recorded_durations(ledger):
+    jobs = _jobs(months=('2024_07', '2024_08', '2024_09'))
+    assert longest_first(jobs, {}) == jobs
+    weighted = [job._replace(weight=i) for i, job in enumerate(jobs)]
+    assert longest_first(weighted, {}) == weighted[::-1]
+
+    for job, seconds in zip(_jobs(), (1.0, 2.0, 5.0, 9.0)):
+        ledger.update('stage', job, 'done', seconds=seconds)
+    order = longest_first(jobs, ledger.jobs('stage'))
+    # Recorded jobs by duration; unrecorded months by their pair's mean (7.0 and 1.5)
+    assert [(job.pair, job.month) for job in order] == [
+        ('gbpusd', '2024_08'), ('gbpusd', '2024_09'), ('gbpusd', '2024_07'),
+        ('eurusd', '2024_08'), ('eurusd', '2024_09'), ('eurusd', '2024_07'),
+    ]
+
+
+def test_reset_pair(ledger):
+    run_jobs('stage', _jobs(), _rows, 2, ledger=ledger, threads=True)
+    ledger.reset('stage', 'eurusd')
+    assert ledger.done('stage') == {('gbpusd', '2024_07'), ('gbpusd', '2024_08')}
+    ledger.reset('stage')
+    assert ledger.summary('stage') == {}
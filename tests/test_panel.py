@@ -0,0 +1,134 @@
+"""
+Tests for the cross-pair panel loader
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.panel import M1_RATE_QUERY, Panel, load_m1_panel, load_panel, save_m1_panels
+
+START = datetime(2024, 7, 1, tzinfo=timezone.utc)
+
+
+def _create_m1(conn, pair, rows):
+    cur = conn.cursor()
+    cur.execute(f"CREATE TABLE bqx.m1_{pair} (time TIMESTAMPTZ PRIMARY KEY, rate_index DOUBLE PRECISION)")
+    cur.executemany(f"INSERT INTO bqx.m1_{pair} VALUES (%s, %s)", rows)
+    conn.commit()
+    cur.close()
+
+
+@pytest.fixture
+def m1_tables(pg_conn):
+    minutes = [START + timedelta(minutes=i) for i in range(10)]
+    _create_m1(pg_conn, 'eurusd', [(ts, 100.0 + i) for i, ts in enumerate(minutes)])
+    # gbpusd: gap at minutes 3-4, NULL at minute 6, one extra row past eurusd
+    gbp = [(ts, 200.0 + i) for i, ts in enumerate(minutes) if i not in (3, 4)]
+    gbp[4] = (gbp[4][0], None)
+    gbp.append((START + timedelta(minutes=10), 210.0))
+    # next month's row must not be loaded
+    gbp.append((datetime(2024, 8, 1, tzinfo=timezone.utc), 999.0))
+    _create_m1(pg_conn, 'gbpusd', gbp)
+    return pg_conn
+
+
+def test_load_aligns_pairs(m1_tables):
+    panel = load_m1_panel(m1_tables, 2024, 7, ['eurusd', 'eurgbp', 'gbpusd'])
+
+    assert panel.missing == ['eurgbp']
+    assert len(panel) == 11
+    assert panel.ts[0] == np.datetime64('2024-07-01T00:00')
+    assert panel.field('rate_index').shape == (11, 3)
+    assert panel.field('rate_index').flags.f_contiguous
+
+    eurusd = panel.column('rate_index', 'eurusd')
+    np.testing.assert_array_equal(eurusd[:10], 100.0 + np.arange(10))
+    assert np.isnan(eurusd[10])
+
+    # Rows that exist (NULL included) vs rows the table does not have
+    gbp = panel.series('rate_index', 'gbpusd')
+    assert len(gbp) == 9
+    assert pd.Timestamp('2024-07-01 00:03') not in gbp.index
+    assert np.isnan(gbp[pd.Timestamp('2024-07-01 00:06')])
+    assert gbp.iloc[-1] == 210.0
+
+    frame = panel.frame('rate_index', utc=True)
+    assert list(frame.columns) == ['eurusd', 'gbpusd']
+    assert str(frame.index.tz) == 'UTC'
+    assert np.isnan(frame.loc[pd.Timestamp('2024-07-01 00:04', tz='UTC'), 'gbpusd'])
+
+    # The caller's transaction survives the missing table
+    cur = m1_tables.cursor()
+    cur.execute("SELECT count(*) FROM bqx.m1_eurusd")
+    assert cur.fetchone()[0] == 10
+
+
+def test_values_between_matches_sql_range(m1_tables):
+    panel = load_panel(
+        m1_tables, M1_RATE_QUERY, ['eurusd', 'gbpusd'], ['rate_index'],
+        START, START + timedelta(days=31)
+    )
+    lo, hi = START + timedelta(minutes=2), START + timedelta(minutes=7)
+
+    cur = m1_tables.cursor()
+    cur.execute(
+        "SELECT rate_index FROM bqx.m1_gbpusd WHERE time >= %s AND time <= %s ORDER BY time", (lo, hi)
+    )
+    expected = np.array([np.nan if r[0] is None else r[0] for r in cur.fetchall()])
+
+    np.testing.assert_array_equal(panel.values('rate_index', 'gbpusd', lo, hi, inclusive=True), expected)
+    assert len(panel.values('rate_index', 'gbpusd', lo, hi)) == len(expected) - 1
+    assert len(panel.values('rate_index', 'eurgbp', lo, hi)) == 0
+
+
+def test_at_aligns_to_timestamps(m1_tables):
+    panel = load_m1_panel(m1_tables, 2024, 7, ['eurusd', 'gbpusd'])
+    timestamps = pd.DatetimeIndex([START + timedelta(minutes=m) for m in (2, 3, 6, 10, 30)])
+
+    values = panel.at('rate_index', timestamps, ['gbpusd', 'eurusd', 'eurgbp'])
+    assert values.shape == (5, 3)
+    np.testing.assert_array_equal(values[:, 0], [202.0, np.nan, np.nan, 210.0, np.nan])
+    np.testing.assert_array_equal(values[:, 1], [102.0, 103.0, 106.0, np.nan, np.nan])
+    assert np.isnan(values[:, 2]).all()
+
+
+def test_save_and_memory_map(m1_tables, tmp_path):
+    paths = save_m1_panels(m1_tables, ['2024_07'], ['eurusd', 'gbpusd', 'eurgbp'], root=str(tmp_path))
+    original = load_m1_panel(m1_tables, 2024, 7, ['eurusd', 'gbpusd', 'eurgbp'])
+
+    shared = Panel.open(paths['2024_07'])
+    matrix = shared.field('rate_index')
+
+    assert isinstance(matrix, np.memmap)
+    assert not matrix.flags.writeable
+    assert shared.pairs == original.pairs and shared.missing == ['eurgbp']
+    np.testing.assert_array_equal(shared.ts, original.ts)
+    np.testing.assert_array_equal(shared.present, original.present)
+    np.testing.assert_array_equal(matrix, original.field('rate_index'))
+    pd.testing.assert_series_equal(shared.series('rate_index', 'gbpusd'), original.series('rate_index', 'gbpusd'))
+
+    # Re-saving replaces the directory in place
+    assert save_m1_panels(m1_tables, ['2024_07'], ['eurusd'], root=str(tmp_path)) == paths
+    assert Panel.open(paths['2024_07']).pairs == ['eurusd']
+
+
+def test_timeout_fails_the_load(m1_tables, tmp_path):
+    psycopg2 = pytest.importorskip("psycopg2")
+    cur = m1_tables.cursor()
+    # A pair whose read outlasts the statement timeout, e.g. under load
+    cur.execute("CREATE VIEW bqx.m1_audusd AS SELECT time, rate_index FROM bqx.m1_eurusd, pg_sleep(1)")
+    cur.execute("SET statement_timeout = 100")
+    m1_tables.commit()
+
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        load_m1_panel(m1_tables, 2024, 7, ['eurusd', 'audusd', 'gbpusd'])
+    m1_tables.rollback()
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        save_m1_panels(m1_tables, ['2024_07'], ['eurusd', 'audusd'], root=str(tmp_path))
+    m1_tables.rollback()
+    # Nothing was saved with the pair dropped
+    assert not (tmp_path / 'm1_rate_index' / '2024_07').exists()
+    cur.close()
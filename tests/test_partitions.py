@@ -0,0 +1,180 @@
+"""
+Tests for the month partition reader/writer
+Runs populate_month_with_warmup and populate_panel_month against a test
+database (the history before the month, the month's partition writes
+and failures) and tallies run_panel_months per pair partition.
+"""
+
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.jobs import ALL_PAIRS, Job, JobLedger
+from data.partitions import (
+    populate_month_with_warmup, populate_panel_month, read_month_with_warmup, run_panel_months
+)
+
+WARMUP = 60
+
+Domain = namedtuple('Domain', 'table field')
+
+DOMAINS = {'rate': Domain('bqx.running_rate_{pair}', 'rate_index'),
+           'bqx': Domain('bqx.running_bqx_{pair}', 'bqx')}
+
+
+@pytest.fixture
+def m1_eurusd(pg_conn):
+    """WARMUP + 40 rows of June, 50 rows of July and one of August"""
+    july = pd.date_range('2024-07-01', periods=50, freq='min')
+    times = pd.date_range(end=july[0] - pd.Timedelta(minutes=1), periods=WARMUP + 40, freq='min')
+    times = times.append(july).append(pd.DatetimeIndex(['2024-08-01']))
+    cur = pg_conn.cursor()
+    cur.execute("CREATE TABLE bqx.m1_eurusd (time TIMESTAMP PRIMARY KEY, rate_index DOUBLE PRECISION)")
+    cur.executemany("INSERT INTO bqx.m1_eurusd VALUES (%s, %s)",
+                    [(ts.to_pydatetime(), 100.0 + i) for i, ts in enumerate(times)])
+    cur.execute("CREATE TABLE bqx.trailing_eurusd_2024_07 (ts_utc TIMESTAMP PRIMARY KEY, "
+                "mean NUMERIC, first NUMERIC)")
+    pg_conn.commit()
+    cur.close()
+    return times
+
+
+def _trailing(frame):
+    """A window as long as the warm-up: filled from the month's first row only if it was read"""
+    values = frame['rate_index']
+    return {'bqx.trailing_eurusd': {'mean': values.rolling(WARMUP + 1).mean().to_numpy(),
+                                    'first': values.shift(WARMUP).to_numpy()}}
+
+
+def test_read_includes_warmup_rows(pg_conn, m1_eurusd):
+    frame, in_month = read_month_with_warmup(pg_conn, 'eurusd', '2024_07', ['rate_index'], WARMUP)
+    assert len(frame) == WARMUP + 50 and in_month.sum() == 50
+    assert frame['time'].is_monotonic_increasing
+    assert frame['time'].iloc[0] == m1_eurusd[40]
+    assert not in_month[:WARMUP].any() and in_month[WARMUP:].all()
+
+
+def test_month_is_written_from_warmup(pg_conn, db_config, m1_eurusd):
+    result = populate_month_with_warmup('eurusd', '2024_07', ['rate_index'], WARMUP, _trailing)
+    assert result == ('eurusd', '2024_07', True, 50, None)
+
+    cur = pg_conn.cursor()
+    cur.execute("SELECT ts_utc, mean, first FROM bqx.trailing_eurusd_2024_07 ORDER BY ts_utc")
+    rows = cur.fetchall()
+    cur.close()
+    assert [ts for ts, _, _ in rows] == list(m1_eurusd[WARMUP + 40:-1].to_pydatetime())
+    # Row i of the month sees the WARMUP rows before it, all of June's first
+    np.testing.assert_allclose([float(r[1]) for r in rows], 100.0 + np.arange(50) + WARMUP + 40 - WARMUP / 2)
+    np.testing.assert_allclose([float(r[2]) for r in rows], 100.0 + np.arange(50) + 40)
+
+
+def test_empty_month_and_failed_write(pg_conn, db_config, m1_eurusd):
+    assert populate_month_with_warmup('eurusd', '2024_09', ['rate_index'], WARMUP, _trailing) == \
+        ('eurusd', '2024_09', True, 0, "No data")
+
+    def two_tables(frame):
+        tables = _trailing(frame)
+        tables['bqx.absent_eurusd'] = {'mean': np.zeros(len(frame))}
+        return tables
+
+    pair, month, success, rows, error = populate_month_with_warmup(
+        'eurusd', '2024_07', ['rate_index'], WARMUP, two_tables)
+    assert (pair, month, success, rows) == ('eurusd', '2024_07', False, 0)
+    assert 'absent_eurusd_2024_07' in error
+
+    # The partition written before the failure was rolled back with it
+    cur = pg_conn.cursor()
+    cur.execute("SELECT count(*) FROM bqx.trailing_eurusd_2024_07")
+    assert cur.fetchone()[0] == 0
+    cur.close()
+
+
+class RunningSum:
+    """Cumulative sum per panel column; counts every row loaded before the month"""
+
+    def __init__(self, series):
+        self.series = series
+
+    def run(self, levels):
+        assert levels.shape[1] == self.series
+        return {'total': np.nancumsum(levels, axis=0), 'level': levels}
+
+
+def _panel_columns(domain):
+    return {'total': f'total_{domain}', 'level': f'level_{domain}'}
+
+
+@pytest.fixture
+def m1_panel(pg_conn):
+    """Two days before July and one July day for eurusd; gbpusd has no July rows; audusd is absent"""
+    cur = pg_conn.cursor()
+    for pair, end in (('eurusd', '2024-07-02'), ('gbpusd', '2024-07-01')):
+        cur.execute(f"CREATE TABLE bqx.m1_{pair} (time TIMESTAMP PRIMARY KEY, rate_index DOUBLE PRECISION, "
+                    f"bqx DOUBLE PRECISION)")
+        cur.execute(f"INSERT INTO bqx.m1_{pair} SELECT g, 1, 2 FROM generate_series("
+                    f"'2024-06-29'::timestamp, '{end}'::timestamp - interval '1 hour', interval '1 hour') g")
+        for domain in DOMAINS:
+            cur.execute(f"CREATE TABLE bqx.running_{domain}_{pair}_2024_07 (ts_utc TIMESTAMP PRIMARY KEY, "
+                        f"total_{domain} NUMERIC, level_{domain} NUMERIC)")
+    pg_conn.commit()
+    cur.close()
+
+
+def test_panel_month_writes_each_pair(pg_conn, db_config, m1_panel):
+    outcomes = populate_panel_month('2024_07', ['eurusd', 'gbpusd', 'audusd'], DOMAINS,
+                                    lambda domain, pairs: RunningSum(len(pairs)), _panel_columns,
+                                    timedelta(days=1))
+    assert outcomes == [('eurusd', '2024_07', True, 24, None),
+                        ('gbpusd', '2024_07', True, 0, "No data"),
+                        ('audusd', '2024_07', False, 0, "Could not load bqx.m1_audusd")]
+
+    cur = pg_conn.cursor()
+    for domain, scale in (('rate', 1), ('bqx', 2)):
+        cur.execute(f"SELECT min(ts_utc), count(*), min(total_{domain}), max(total_{domain}), "
+                    f"max(level_{domain}) FROM bqx.running_{domain}_eurusd_2024_07")
+        first, count, lo, hi, level = cur.fetchone()
+        # Only June 30 is loaded as warm-up: 24 rows before the month's first
+        assert (str(first), count) == ('2024-07-01 00:00:00', 24)
+        assert (float(lo), float(hi), float(level)) == (25 * scale, 48 * scale, scale)
+    cur.execute("SELECT count(*) FROM bqx.running_rate_gbpusd_2024_07")
+    assert cur.fetchone()[0] == 0
+    cur.close()
+
+
+def test_panel_month_failure_marks_remaining_pairs(pg_conn, db_config, m1_panel):
+    cur = pg_conn.cursor()
+    cur.execute("DROP TABLE bqx.running_bqx_eurusd_2024_07")
+    pg_conn.commit()
+
+    outcomes = populate_panel_month('2024_07', ['eurusd', 'gbpusd'], DOMAINS,
+                                    lambda domain, pairs: RunningSum(len(pairs)), _panel_columns,
+                                    timedelta(days=1))
+    assert [(pair, success) for pair, _, success, _, _ in outcomes] == [('eurusd', False), ('gbpusd', False)]
+    assert 'running_bqx_eurusd_2024_07' in outcomes[0][4]
+    # eurusd's rate partition was rolled back with the failed bqx write
+    cur.execute("SELECT count(*) FROM bqx.running_rate_eurusd_2024_07")
+    assert cur.fetchone()[0] == 0
+    cur.close()
+
+
+def _month_outcomes(month, pairs):
+    if month == '2024_08':
+        raise RuntimeError("panel load failed")
+    return [(pair, month, pair != 'audusd', 10, None if pair != 'audusd' else "Could not load")
+            for pair in pairs]
+
+
+def test_run_panel_months_counts_pair_partitions(tmp_path):
+    ledger = JobLedger(tmp_path / "ledger.sqlite")
+    pairs = ['eurusd', 'gbpusd', 'audusd']
+    results = run_panel_months('stage', ['2024_07', '2024_08'], pairs, _month_outcomes, 2,
+                               ledger=ledger, attempts=1)
+    assert results == {'success': 2, 'failed': 4, 'skipped': 0, 'total_rows': 20}
+
+    ledger.update('stage', Job(ALL_PAIRS, '2024_07'), 'done', 30, 1.0, 1)
+    results = run_panel_months('stage', ['2024_07'], pairs, _month_outcomes, 2, ledger=ledger)
+    assert results == {'success': 3, 'failed': 0, 'skipped': 3, 'total_rows': 30}
+    ledger.close()
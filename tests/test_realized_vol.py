@@ -0,0 +1,139 @@
+"""
+Tests for the realized-volatility estimators
+Checks the running-sum estimators against pandas rolling formulas, the
+BQX bar construction, the EWMA ratio, the regime counters, causality,
+and the worker's tables against the migration.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.realized_vol import (
+    JUMP_THETA, WARMUP_ROWS, WINDOW, bqx_bars, compute_volatility_features, rate_bars, realized_volatility,
+    volatility_regime
+)
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture(scope="module")
+def frame():
+    """M1 bars of a random walk whose volatility doubles at row 2000"""
+    rng = np.random.default_rng(24)
+    scale = np.where(np.arange(4000) < 2000, 1.0, 2.0)
+    close = 1.1 * np.exp(np.cumsum(rng.normal(0, 1e-4, 4000) * scale))
+    open_ = np.r_[1.1, close[:-1]] * np.exp(rng.normal(0, 1e-5, 4000) * scale)
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 5e-5, 4000)) * scale)
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 5e-5, 4000)) * scale)
+    bqx = np.cumsum(rng.normal(0, 0.01, 4000))
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'bqx': bqx})
+
+
+def test_estimators_match_pandas(frame):
+    o, h, l, c = (pd.Series(v) for v in rate_bars(frame['open'], frame['high'], frame['low'], frame['close']))
+    out = realized_volatility(o, h, l, c)
+    roll = dict(window=WINDOW)
+
+    parkinson = np.sqrt(((h - l) ** 2).rolling(**roll).mean() / (4 * np.log(2)))
+    rs_terms = (h - o) * (h - c) + (l - o) * (l - c)
+    rogers_satchell = rs_terms.rolling(**roll).mean()
+    k = 0.34 / (1.34 + (WINDOW + 1) / (WINDOW - 1))
+    yang_zhang = np.sqrt((o - c.shift()).rolling(**roll).var() + k * (c - o).rolling(**roll).var() +
+                         (1 - k) * rogers_satchell)
+    r = c.diff()
+    rv = (r * r).rolling(**roll).sum()
+    bv = np.pi / 2 * (r.abs() * r.abs().shift()).rolling(**roll).sum()
+    rq = WINDOW / 3 * (r ** 4).rolling(**roll).sum()
+    jump_z = (rv - bv) / rv / np.sqrt(JUMP_THETA / WINDOW * np.maximum(1, rq / bv ** 2))
+
+    expected = {
+        'parkinson_vol': parkinson,
+        'rogers_satchell_vol': np.sqrt(rogers_satchell),
+        'yang_zhang_vol': yang_zhang,
+        'bipower_var': bv,
+        'realized_quarticity': rq,
+        'jump_test_stat': jump_z,
+        'signed_jump': (np.sign(r) * r * r).rolling(**roll).sum(),
+        'realized_skewness': np.sqrt(WINDOW) * (r ** 3).rolling(**roll).sum() / rv ** 1.5,
+        'ewma_vol_ratio': np.sqrt((r * r).ewm(span=5, adjust=False).mean() /
+                                  (r * r).ewm(span=20, adjust=False).mean()),
+    }
+    for name, values in expected.items():
+        np.testing.assert_allclose(out[name][WINDOW + 1:], values.to_numpy()[WINDOW + 1:],
+                                   rtol=1e-6, atol=1e-12, err_msg=name)
+        if name != 'ewma_vol_ratio':
+            assert np.isnan(out[name][:WINDOW - 1]).all(), name
+
+
+def test_bqx_bars_span_recent_values():
+    values = np.array([0.0, 2.0, -1.0, 3.0, 1.0, 4.0, 2.0])
+    o, h, l, c = bqx_bars(values, rows=2)
+    np.testing.assert_array_equal(o[2:], values[:-2])
+    np.testing.assert_array_equal(h[2:], [2.0, 3.0, 3.0, 4.0, 4.0])
+    np.testing.assert_array_equal(l[2:], [-1.0, -1.0, -1.0, 1.0, 1.0])
+    assert np.isnan(o[:2]).all() and np.isnan(h[:2]).all()
+    assert ((l[2:] <= np.minimum(o[2:], c[2:])) & (h[2:] >= np.maximum(o[2:], c[2:]))).all()
+
+
+def test_regime_counters():
+    vol = np.r_[np.ones(50), 5 * np.ones(30), np.nan, 5 * np.ones(9), 0.1 * np.ones(20)]
+    out = volatility_regime(vol, span=10, transition_window=40)
+    assert (out['high'][50:80] == 1).all() and (out['high'][90:] == 0).all()
+    assert out['duration'][79] == 30
+    assert np.isnan(out['duration'][80]) and np.isnan(out['transition_prob'][80])
+    assert out['duration'][89] == 39                       # the gap does not end the regime
+    assert out['duration'][109] == 20
+    assert out['transition_prob'][89] == pytest.approx(1 / 40)
+    assert set(np.unique(out['high'][~np.isnan(vol)])) <= {0.0, 1.0}
+
+
+def test_features_are_causal_and_see_the_shift(frame):
+    whole = compute_volatility_features(frame)
+    changed = frame.copy()
+    changed.loc[3000:, ['open', 'high', 'low', 'close']] *= 1.01
+    changed.loc[3000:, 'bqx'] += 5
+    head = compute_volatility_features(changed)
+    for domain, columns in whole.items():
+        for name, values in columns.items():
+            np.testing.assert_allclose(head[domain][name][:3000], values[:3000], rtol=1e-6, atol=1e-12,
+                                       err_msg=name)
+            assert np.isfinite(values[300:]).all(), name
+
+    vol = whole['rate']['yang_zhang_vol_idx_20_1m']
+    assert np.nanmean(vol[2100:2500]) == pytest.approx(2 * np.nanmean(vol[1500:1900]), rel=0.2)
+    assert whole['rate']['vol_regime_high_idx'][2050:2150].mean() > 0.9
+    assert (whole['bqx']['rogers_satchell_vol_bqx_20_1m'][WINDOW * 2:] > 0).all()
+
+
+def _run_migration(cur, domain):
+    """Run the stage 1.6.19 migration for one domain, minus the psql meta-commands"""
+    sql = (ROOT / 'scripts' / 'refactor' / f'stage_1_6_19_create_realized_volatility_{domain}.sql').read_text()
+    cur.execute("\n".join(line for line in sql.splitlines() if not line.startswith('\\')))
+
+
+def test_worker_tables_match_migration(pg_conn, frame):
+    spec = importlib.util.spec_from_file_location(
+        "populate_realized_vol_worker", ROOT / "scripts/ml/populate_realized_vol_worker.py")
+    worker = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(worker)
+
+    cur = pg_conn.cursor()
+    for domain in ('rate', 'bqx'):
+        _run_migration(cur, domain)
+    pg_conn.commit()
+
+    tables = worker.volatility_tables(frame, 'eurusd')
+    assert set(tables) == {f"bqx.realized_volatility_{domain}_eurusd" for domain in ('rate', 'bqx')}
+    for table, features in tables.items():
+        cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'bqx' "
+                    "AND table_name = %s AND column_name <> 'ts_utc'", (f"{table[4:]}_2024_07",))
+        # The migration's partitions have exactly the columns the worker writes
+        assert sorted(name for name, in cur.fetchall()) == sorted(features)
+        # WARMUP_ROWS rows of history fill every column from a month's first row
+        for name, values in features.items():
+            assert np.isfinite(values[WARMUP_ROWS:]).all(), (table, name)
+    cur.close()
@@ -0,0 +1,52 @@
+"""
+Tests for the vectorized regime detection
+Compares compute_regime_features with detect_market_regime run on each
+row's trailing window.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.regime import compute_regime_features, detect_market_regime
+
+
+@pytest.fixture(scope="module")
+def series():
+    """Rate with NULLs and a flat stretch; BQX crossing zero with NULL-filled zeros"""
+    rng = np.random.default_rng(5)
+    n = 1800
+    rate = 100 + np.cumsum(rng.normal(0, 0.02, n))
+    rate[[500, 1650]] = np.nan
+    rate[900:905] = rate[899]
+    rate[1200:1400] += np.linspace(0, 3, 200)             # trending stretch
+    bqx = rng.normal(0, 1e-3, n)
+    bqx[100:110] = 0
+    bqx[1500] = 0
+    return rate, bqx
+
+
+def test_matches_per_row_detection(series):
+    rate, bqx = series
+    first_row = 1440
+    out = compute_regime_features(rate, bqx, first_row=first_row)
+    assert np.isnan(out['trend_regime_rate'][:first_row]).all()
+
+    df = pd.DataFrame({'rate_index': rate, 'bqx_value': bqx})
+    for i in list(range(first_row, len(rate), 7)) + [1650, 1651, 1799]:
+        window = df.iloc[max(0, i - 1440):i + 1]
+        for domain in ('rate', 'bqx'):
+            for name, value in detect_market_regime(window, domain).items():
+                np.testing.assert_allclose(out[name][i], value, rtol=1e-7, atol=1e-9, err_msg=f"{name} row {i}")
+
+
+def test_short_history_rows(series):
+    rate, bqx = series
+    out = compute_regime_features(rate[:300], bqx[:300])
+    df = pd.DataFrame({'rate_index': rate[:300], 'bqx_value': bqx[:300]})
+
+    assert np.isnan(out['momentum_score_rate'][:59]).all()
+    for i in (59, 60, 61, 120, 239, 240, 299):
+        for domain in ('rate', 'bqx'):
+            for name, value in detect_market_regime(df.iloc[:i + 1], domain).items():
+                np.testing.assert_allclose(out[name][i], value, rtol=1e-7, atol=1e-9, err_msg=f"{name} row {i}")
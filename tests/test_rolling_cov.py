@@ -0,0 +1,146 @@
+"""
+Numerical equivalence tests for the rolling co-moment kernel
+Compares data.rolling_cov and the Stage 2.14 covariance scripts built on
+it against np.cov / np.corrcoef on trailing windows and pandas rolling().cov().
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.rolling_cov import rolling_comoments, rolling_comoments_windows, rolling_cross_moments, window_sums
+
+ROOT = Path(__file__).parent.parent
+
+
+def _load_script(relative_path, name):
+    """Import a worker script by path (scripts/ is not a package)"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def terms():
+    """Four regression-term-like series: trend, noise, offset, a flat stretch and a NULL"""
+    rng = np.random.default_rng(3)
+    n = 2000
+    x = rng.normal(0, 1e-4, (n, 4))
+    x[:, 0] += np.linspace(0, 5e-3, n)
+    x[:, 2] += 1.25
+    x[500:620, 1] = 3e-4
+    x[900, 3] = np.nan
+    return x
+
+
+def test_window_sums():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(1000, 3))
+    for window in (1, 7, 60, 999, 1000):
+        expected = np.array([values[s:s + window].sum(axis=0) for s in range(len(values) - window + 1)])
+        np.testing.assert_allclose(window_sums(values, window), expected, rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("window", [60, 390])
+def test_matches_numpy_per_window(terms, window):
+    moments = rolling_comoments(terms, window)
+
+    assert np.isnan(moments.cov[:window - 1]).all()
+    for i in range(window - 1, len(terms), 7):
+        block = terms[i - window + 1:i + 1]
+        ok = ~np.isnan(block).any(axis=0)
+        flat = np.ptp(block, axis=0) == 0
+
+        idx = np.flatnonzero(ok)
+        expected_cov = np.cov(block[:, idx].T)
+        np.testing.assert_allclose(moments.cov[i][np.ix_(idx, idx)], expected_cov, rtol=1e-8, atol=1e-22)
+        np.testing.assert_allclose(moments.mean[i][idx], block[:, idx].mean(axis=0), rtol=1e-12)
+
+        # NaN inside the window blanks that series' entries only
+        assert np.isnan(moments.cov[i][~ok]).all() and np.isnan(moments.mean[i][~ok]).all()
+
+        live = np.flatnonzero(ok & ~flat)
+        expected_corr = np.corrcoef(block[:, live].T)
+        np.testing.assert_allclose(moments.corr[i][np.ix_(live, live)], expected_corr, rtol=1e-9, atol=1e-12)
+        # Constant series: zero covariance, undefined correlation
+        for j in np.flatnonzero(ok & flat):
+            assert (moments.cov[i][j, idx] == 0).all()
+            assert np.isnan(moments.corr[i][j]).all()
+
+
+def test_matches_pandas_rolling_cov(terms):
+    windows = [60, 150, 630]
+    results = rolling_comoments_windows(terms, windows)
+    frame = pd.DataFrame(terms)
+
+    for window in windows:
+        for a, b in [(0, 1), (0, 3), (2, 3)]:
+            expected = frame[a].rolling(window=window, min_periods=window).cov(frame[b]).to_numpy()
+            cov, _ = results[window].pair(a, b)
+            np.testing.assert_array_equal(np.isnan(cov), np.isnan(expected))
+            np.testing.assert_allclose(cov, expected, rtol=1e-7, atol=1e-20)
+
+
+def test_cross_moments_match_full_matrix(terms):
+    full = rolling_comoments(terms, 60)
+    cross = rolling_cross_moments(terms[:, 0], terms[:, 1:], 60)
+
+    np.testing.assert_array_equal(np.isnan(cross.cov), np.isnan(full.cov[:, 0, 1:]))
+    np.testing.assert_array_equal(np.isnan(cross.corr), np.isnan(full.corr[:, 0, 1:]))
+    np.testing.assert_allclose(cross.cov, full.cov[:, 0, 1:], rtol=1e-9, atol=1e-22)
+    np.testing.assert_allclose(cross.corr, full.corr[:, 0, 1:], rtol=1e-9, atol=1e-12)
+
+    single = rolling_cross_moments(terms[:, 0], terms[:, 1:], 60, dtype=np.float32)
+    np.testing.assert_array_equal(np.isnan(single.corr), np.isnan(cross.corr))
+    np.testing.assert_allclose(single.corr, cross.corr, atol=1e-3)
+
+
+def _stage_reference(quad, lin, resid, window=60):
+    """The former per-row Stage 2.14 loop (np.cov / np.corrcoef on growing slices)"""
+    rows = []
+    for i in range(len(quad)):
+        if i < window - 1:
+            rows.append([np.nan] * 6)
+            continue
+        q, l, r = quad[:i + 1][-window:], lin[:i + 1][-window:], resid[:i + 1][-window:]
+        rows.append([
+            np.cov(q, l)[0, 1], np.cov(r, q)[0, 1], np.cov(r, l)[0, 1],
+            np.corrcoef(q, l)[0, 1], np.corrcoef(r, q)[0, 1], np.corrcoef(r, l)[0, 1]
+        ])
+    return np.array(rows)
+
+
+def test_stage_2_14_covariance_features():
+    stage = _load_script("scripts/remediation/stage_2_14_add_covariance_features.py", "stage_2_14_add_covariance_features")
+    rng = np.random.default_rng(8)
+    n = 600
+    frame = pd.DataFrame({
+        'w60_quadratic_term': rng.normal(0, 1e-4, n) + np.linspace(0, 1e-3, n),
+        'w60_linear_term': rng.normal(0, 1e-4, n),
+        'w60_residual': rng.normal(0, 5e-5, n),
+    })
+    frame.loc[200, 'w60_linear_term'] = np.nan
+
+    features = stage.compute_covariance_features(frame)
+    assert list(features) == stage.covariance_columns('bqx', [60])
+
+    # NULL rows are skipped, as the former IS NOT NULL filter did
+    valid = frame.notna().all(axis=1).to_numpy()
+    kept = frame[valid]
+    reference = _stage_reference(
+        kept['w60_quadratic_term'].to_numpy(), kept['w60_linear_term'].to_numpy(), kept['w60_residual'].to_numpy()
+    )
+    for k, column in enumerate(features):
+        assert np.isnan(features[column][~valid]).all()
+        np.testing.assert_allclose(features[column][valid], reference[:, k], rtol=1e-8, atol=1e-20, err_msg=column)
+
+    # Other domains and windows only change names and window length
+    wide = frame.rename(columns=lambda c: c.replace('w60_', 'w90_'))
+    rate = stage.compute_covariance_features(wide, domain='rate', windows=[90])
+    assert list(rate) == stage.covariance_columns('rate', [90])
+    assert np.isnan(rate['cov_quad_lin_rate_90min'][:89]).all()
+    assert not np.isnan(rate['cov_quad_lin_rate_90min'][89])
@@ -0,0 +1,150 @@
+"""
+Numerical equivalence tests for the rolling quadratic regression engine
+Compares data.rolling_regression and the REG workers built on it against
+the per-row np.polyfit implementations they replaced.
+"""
+
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from data.rolling_regression import rolling_quadratic_fit
+
+
+def _load_script(relative_path, name):
+    """Import a worker script by path (scripts/ is not a package)"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def rate_index_series():
+    rng = np.random.default_rng(7)
+    return 100.0 + np.cumsum(rng.normal(0, 0.004, 3000))
+
+
+@pytest.fixture(scope="module")
+def bqx_series():
+    rng = np.random.default_rng(11)
+    return np.convolve(rng.normal(0, 2e-4, 3000), np.ones(15) / 15, mode='same')
+
+
+def _polyfit_reference(y, window, i):
+    yy = y[i - window + 1:i + 1]
+    x = np.arange(window)
+    coeffs = np.polyfit(x, yy, 2)
+    y_pred = np.polyval(coeffs, x)
+    ss_res = np.sum((yy - y_pred) ** 2)
+    ss_tot = np.sum((yy - yy.mean()) ** 2)
+    return {
+        'a': coeffs[0], 'b': coeffs[1], 'c': coeffs[2],
+        'r2': 1 - ss_res / ss_tot if ss_tot > 0 else 0.0,
+        'rmse': np.sqrt(np.mean((yy - y_pred) ** 2)),
+        'prediction': y_pred[-1],
+        'residual': yy[-1] - y_pred[-1],
+        'ss_res': ss_res,
+        'ss_tot': ss_tot
+    }
+
+
+@pytest.mark.parametrize("window", [15, 60, 90, 630])
+@pytest.mark.parametrize("series", ["rate_index_series", "bqx_series"])
+def test_matches_polyfit(request, series, window):
+    y = request.getfixturevalue(series)
+    fit = rolling_quadratic_fit(y, window)
+
+    assert np.isnan(fit['a'][:window - 1]).all()
+
+    for i in range(window - 1, len(y), 37):
+        expected = _polyfit_reference(y, window, i)
+        scale = np.abs(y[i - window + 1:i + 1]).max()
+        for key, value in expected.items():
+            if key in ('ss_res', 'ss_tot'):
+                tol = 1e-9 * window * scale ** 2
+            elif key == 'residual':
+                tol = 1e-11 * scale
+            else:
+                tol = 1e-9 * max(abs(value), 1e-6 * scale)
+            assert fit[key][i] == pytest.approx(value, abs=tol), (key, i)
+
+
+def test_nan_only_invalidates_overlapping_windows(rate_index_series):
+    y = rate_index_series.copy()
+    y[1000] = np.nan
+    fit = rolling_quadratic_fit(y, 60)
+    clean = rolling_quadratic_fit(rate_index_series, 60)
+
+    assert np.isnan(fit['a'][1000:1060]).all()
+    assert np.isfinite(fit['a'][940:1000]).all()
+    assert np.isfinite(fit['a'][1060:]).all()
+    np.testing.assert_allclose(fit['a'][1060:], clean['a'][1060:], rtol=1e-6, atol=1e-12)
+
+
+def test_short_series_is_all_nan():
+    fit = rolling_quadratic_fit(np.arange(10.0), 15)
+    assert all(np.isnan(col).all() for col in fit.values())
+
+
+def test_regression_worker_index_uses_strictly_past_window(rate_index_series):
+    worker = _load_script("scripts/backfill/regression_worker_index.py", "regression_worker_index")
+    columns = worker.compute_regression_columns(rate_index_series)
+
+    for window in worker.WINDOWS:
+        assert np.isnan(columns[f"w{window}_a_coef"][:window]).all()
+        for i in range(window, len(rate_index_series), 211):
+            expected = _polyfit_reference(rate_index_series, window, i - 1)
+            x_end = window - 1
+            assert columns[f"w{window}_a_term"][i] == pytest.approx(expected['a'] * x_end ** 2, rel=1e-6, abs=1e-12)
+            assert columns[f"w{window}_yhat_end"][i] == pytest.approx(expected['prediction'], rel=1e-12)
+            assert columns[f"w{window}_resid_end"][i] == pytest.approx(expected['residual'], rel=1e-6, abs=1e-12)
+            assert columns[f"w{window}_r2"][i] == pytest.approx(expected['r2'], rel=1e-6, abs=1e-9)
+
+
+def test_populate_regression_normalized_coefficients(rate_index_series):
+    os.makedirs('/tmp/logs/track2', exist_ok=True)
+    worker = _load_script("scripts/ml/populate_regression_features_worker.py", "populate_regression_features_worker")
+
+    window = 45
+    columns = worker.compute_parabola_columns(rate_index_series, window)
+
+    for i in range(window - 1, len(rate_index_series), 173):
+        y = rate_index_series[i - window + 1:i + 1]
+        x = np.arange(window)
+        x_norm = (x - x.mean()) / (x.std() + 1e-10)
+        coeffs = np.polyfit(x_norm, y, 2)
+        y_pred = np.polyval(coeffs, x_norm)
+        residuals = y - y_pred
+
+        assert columns['a2'][i] == pytest.approx(coeffs[0], rel=1e-6, abs=1e-12)
+        assert columns['a1'][i] == pytest.approx(coeffs[1], rel=1e-6, abs=1e-12)
+        assert columns['b'][i] == pytest.approx(coeffs[2], rel=1e-12)
+        assert columns['prediction'][i] == pytest.approx(y_pred[-1], rel=1e-12)
+        assert columns['residual_std'][i] == pytest.approx(residuals.std(), rel=1e-6)
+        assert columns['residual_mean'][i] == pytest.approx(residuals.mean(), abs=1e-9)
+
+
+def test_stage_2_12_term_columns(bqx_series):
+    try:
+        worker = _load_script("scripts/remediation/stage_2_12_rebuild_reg_bqx.py", "stage_2_12_rebuild_reg_bqx")
+    except ImportError as e:
+        pytest.skip(f"stage_2_12 database dependencies unavailable: {e}")
+
+    window = 90
+    columns = worker.compute_term_columns_bqx(bqx_series, window)
+
+    for i in range(window - 1, len(bqx_series), 157):
+        expected = _polyfit_reference(bqx_series, window, i)
+        x_end = window - 1
+        assert columns['quadratic_term'][i] == pytest.approx(expected['a'] * x_end ** 2, rel=1e-6, abs=1e-15)
+        assert columns['linear_term'][i] == pytest.approx(expected['b'] * x_end, rel=1e-6, abs=1e-15)
+        assert columns['constant_term'][i] == pytest.approx(expected['c'], rel=1e-6, abs=1e-15)
+        assert columns['prediction'][i] == pytest.approx(expected['prediction'], rel=1e-6, abs=1e-15)
@@ -0,0 +1,208 @@
+"""
+Numerical equivalence tests for the rolling statistics kernels
+Compares data.rolling_stats and the Track 1 statistics/Bollinger and
+time/spread workers built on it against the per-row implementations
+they replaced.
+"""
+
+import importlib.util
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy import stats
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from data.rolling_stats import (
+    rolling_apply, rolling_moments, window_entropy,
+    window_lag1_autocorr, window_mad, window_percentile_rank, window_slope
+)
+
+
+def _load_script(relative_path, name):
+    """Import a worker script by path (scripts/ is not a package)"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def rate_index_series():
+    rng = np.random.default_rng(17)
+    x = 100.0 + np.cumsum(rng.normal(0, 0.004, 1500))
+    x[700:760] = x[700]          # flat stretch: zero-variance windows
+    return x
+
+
+@pytest.fixture(scope="module")
+def m1_quotes():
+    rng = np.random.default_rng(23)
+    n = 1500
+    times = [datetime(2024, 7, 5, 15, 0) + timedelta(minutes=i) for i in range(n)]
+    mid = 1.1 + np.cumsum(rng.normal(0, 1e-4, n))
+    spreads = np.round(np.abs(rng.normal(1.5e-4, 5e-5, n)), 5)
+    spreads[300:320] = 0.0
+    mid[900:905] = mid[900]      # unchanged mids exercise the tick-rule tiebreak
+    bids = mid - spreads / 2 + rng.normal(0, 1e-6, n)
+    asks = mid + spreads / 2
+    rates = mid + rng.normal(0, 2e-5, n)
+    return times, bids, asks, spreads, rates
+
+
+def _entropy_reference(window):
+    hist, _ = np.histogram(window, bins=10)
+    hist = hist[hist > 0]
+    probs = hist / np.sum(hist)
+    return -np.sum(probs * np.log2(probs + 1e-10))
+
+
+def test_window_kernels_match_per_window_reference(rate_index_series):
+    x = rate_index_series
+    checks = {
+        'entropy': (window_entropy, _entropy_reference),
+        'mad': (window_mad, lambda w: np.median(np.abs(w - np.median(w)))),
+        'slope': (window_slope, lambda w: stats.linregress(np.arange(len(w)), w)[0]),
+        'percentile': (window_percentile_rank, lambda w: np.searchsorted(np.sort(w), w[-1]) / len(w)),
+    }
+
+    for name, (kernel, reference) in checks.items():
+        result = rolling_apply(x, 60, kernel, min_periods=10, fill=-1.0)
+        assert (result[:9] == -1.0).all()
+        for i in range(9, len(x), 7):
+            window = x[max(0, i - 59):i + 1]
+            assert result[i] == pytest.approx(reference(window), rel=1e-9, abs=1e-12), (name, i)
+
+
+def test_moments_and_autocorr(rate_index_series):
+    x = rate_index_series
+    moments = rolling_moments(x, 60, min_periods=10)
+    autocorr = rolling_apply(x, 60, window_lag1_autocorr, min_periods=10)
+
+    for i in range(9, len(x), 5):
+        window = x[max(0, i - 59):i + 1]
+        with np.errstate(all='ignore'):
+            expected_corr = np.corrcoef(window[:-1], window[1:])[0, 1]
+        np.testing.assert_allclose(moments['mean'][i], window.mean(), rtol=1e-14)
+        np.testing.assert_allclose(moments['std'][i], window.std(), rtol=1e-9)
+        np.testing.assert_allclose(moments['skew'][i], stats.skew(window), rtol=1e-7, atol=1e-9)
+        np.testing.assert_allclose(moments['kurtosis'][i], stats.kurtosis(window), rtol=1e-7, atol=1e-9)
+        np.testing.assert_allclose(autocorr[i], expected_corr, rtol=1e-9, atol=1e-12)
+
+    # Constant windows: NaN like scipy
+    assert np.isnan(moments['skew'][759])
+
+
+@pytest.mark.filterwarnings("error")
+def test_autocorr_of_short_windows_is_nan():
+    x = np.array([1.0, 2.0, np.nan, 4.0, 3.0, 5.0])
+    autocorr = rolling_apply(x, 4, window_lag1_autocorr, min_periods=1)
+    assert np.isnan(autocorr[:2]).all()
+    assert np.isnan(window_lag1_autocorr(np.ones((3, 2)))).all()
+    assert np.isfinite(window_lag1_autocorr(x[None, 3:])).all()
+
+
+def test_statistics_bollinger_worker(rate_index_series):
+    worker = _load_script("scripts/ml/statistics_bollinger_worker.py", "statistics_bollinger_worker")
+    x = rate_index_series
+    stats_features = worker.compute_statistics_features(x)
+    bollinger = worker.compute_bollinger_features(x)
+
+    for i in list(range(0, 12)) + list(range(12, len(x), 9)):
+        window = x[max(0, i - 59):i + 1]
+        if len(window) >= 10:
+            with np.errstate(all='ignore'):
+                corr = np.corrcoef(window[:-1], window[1:])[0, 1]
+            expected = {
+                'skewness_60min': stats.skew(window),
+                'kurtosis_60min': stats.kurtosis(window),
+                'median_absolute_deviation_60min': np.median(np.abs(window - np.median(window))),
+                'entropy_60min': _entropy_reference(window),
+                'autocorrelation_lag1': corr if not np.isnan(corr) else 0.0,
+            }
+        else:
+            expected = dict.fromkeys(stats_features, 0.0)
+        for key, value in expected.items():
+            np.testing.assert_allclose(stats_features[key][i], value, rtol=1e-7, atol=1e-9, err_msg=f"{key}[{i}]")
+
+        window = x[max(0, i - 19):i + 1]
+        if len(window) >= 10:
+            mean, std = np.mean(window), np.std(window)
+            expected = {
+                'bollinger_middle_20': mean,
+                'bollinger_upper_20': mean + 2 * std,
+                'bollinger_lower_20': mean - 2 * std,
+                'bollinger_width_20': 4 * std,
+                'bollinger_percent_b': (x[i] - (mean - 2 * std)) / (4 * std) if std > 0 else 0.5,
+            }
+        else:
+            expected = dict.fromkeys(bollinger, 0.0)
+        for key, value in expected.items():
+            np.testing.assert_allclose(bollinger[key][i], value, rtol=1e-9, atol=1e-12, err_msg=f"{key}[{i}]")
+
+
+def _spread_reference(bids, asks, spreads, rates, i):
+    mid_prices = (bids + asks) / 2
+    spread_w60 = spreads[max(0, i - 59):i + 1]
+    mid_w60 = mid_prices[max(0, i - 59):i + 1]
+    mean_60 = np.mean(spread_w60)
+    mid = mid_prices[i]
+    imbalance = (bids[i] - asks[i]) / (bids[i] + asks[i])
+    bid_depth = bids[i] / spreads[i] if spreads[i] > 0 else 0.0
+    ask_depth = asks[i] / spreads[i] if spreads[i] > 0 else 0.0
+
+    toxicity = 0.0
+    if len(mid_w60) > 5 and np.std(mid_w60) > 0 and mean_60 > 0:
+        toxicity = np.std(mid_w60[-5:]) / np.std(mid_w60) * np.mean(spread_w60[-5:]) / mean_60
+
+    tick_rule = 0
+    if i > 0:
+        change = mid_prices[i] - mid_prices[i - 1]
+        tick_rule = 1 if change > 0 else -1 if change < 0 else (1 if imbalance > 0 else -1)
+
+    return {
+        'spread_mean_60min': mean_60,
+        'spread_volatility_60min': np.std(spread_w60) if len(spread_w60) > 1 else 0,
+        'spread_pct_of_rate': spreads[i] / rates[i] * 100,
+        'spread_trend_slope': stats.linregress(np.arange(len(spread_w60)), spread_w60)[0] if len(spread_w60) >= 10 else 0,
+        'spread_spike': 1 if spreads[i] > 2 * mean_60 and mean_60 > 0 else 0,
+        'bid_ask_imbalance': imbalance,
+        'effective_spread': 2 * abs(rates[i] - mid) / mid,
+        'quoted_spread': spreads[i] / mid,
+        'roll_cost': spreads[i] / 2,
+        'bid_depth': bid_depth,
+        'ask_depth': ask_depth,
+        'depth_imbalance': (bid_depth - ask_depth) / (bid_depth + ask_depth) if bid_depth + ask_depth > 0 else 0,
+        'spread_range_60min': np.max(spread_w60) - np.min(spread_w60),
+        'spread_percentile_60min': np.searchsorted(np.sort(spread_w60), spreads[i]) / len(spread_w60) if len(spread_w60) > 1 else 0,
+        'mid_price_volatility': np.std(mid_w60) if len(mid_w60) > 1 else 0,
+        'tick_direction': 0 if i == 0 else int(np.sign(mid_prices[i] - mid_prices[i - 1])),
+        'tick_rule': tick_rule,
+        'order_flow_toxicity': toxicity,
+    }
+
+
+def test_time_spread_worker(m1_quotes):
+    worker = _load_script("scripts/ml/time_spread_features_worker.py", "time_spread_features_worker")
+    times, bids, asks, spreads, rates = m1_quotes
+    features = worker.compute_spread_features(np.array(times), bids, asks, spreads, rates)
+
+    for i in list(range(0, 12)) + list(range(12, len(times), 11)) + list(range(295, 325)) + list(range(898, 908)):
+        for key, value in _spread_reference(bids, asks, spreads, rates, i).items():
+            np.testing.assert_allclose(features[key][i], value, rtol=1e-7, atol=1e-12, err_msg=f"{key}[{i}]")
+
+    time_features = worker.compute_time_features(np.array(times))
+    for i in range(0, len(times), 13):
+        dt = times[i]
+        minute_of_day = dt.hour * 60 + dt.minute
+        assert time_features['hour_sin'][i] == pytest.approx(np.sin(2 * np.pi * dt.hour / 24))
+        assert time_features['day_of_week_cos'][i] == pytest.approx(np.cos(2 * np.pi * dt.weekday() / 7))
+        assert time_features['is_weekend_approach'][i] == int((dt.weekday() == 4 and dt.hour >= 17) or dt.weekday() >= 5)
+        expected_open = 0 if minute_of_day < 480 else 480 if minute_of_day < 780 else 780
+        assert time_features['minutes_since_market_open'][i] == minute_of_day - expected_open
+        expected_session = 3 if 13 <= dt.hour < 16 else 1 if 8 <= dt.hour < 13 else 2 if 16 <= dt.hour < 21 else 0 if dt.hour < 8 else 4
+        assert time_features['trading_session'][i] == expected_session
@@ -0,0 +1,104 @@
+"""
+Tests for the multi-resolution bar rollups
+Checks the bars against pandas resampling, chunked streaming against a
+single pass, the lookahead-free as_of join and a database round trip.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.feature_store import FeatureStore
+from data.rollups import AGGREGATIONS, BarStore, Bars, RollupBuilder, build_bars, rollup
+
+
+@pytest.fixture(scope="module")
+def m1():
+    """Two days of minute rows with gaps (incl. whole hours) and NaNs"""
+    rng = np.random.default_rng(41)
+    times = pd.date_range('2024-07-01 00:00', '2024-07-03 00:00', freq='min', inclusive='left')
+    keep = rng.random(len(times)) > 0.1
+    keep[300:420] = False
+    times = times[keep]
+    n = len(times)
+    close = 1.1 + np.cumsum(rng.normal(0, 1e-4, n))
+    frame = pd.DataFrame({
+        'ts_utc': times,
+        'open': close + rng.normal(0, 2e-5, n),
+        'high': close + np.abs(rng.normal(0, 5e-5, n)),
+        'low': close - np.abs(rng.normal(0, 5e-5, n)),
+        'close': close,
+        'volume': rng.integers(1, 200, n).astype(float),
+        'rate_index': 100 * close / close[0],
+        'bqx': rng.normal(0, 1e-3, n),
+    })
+    for col in ('close', 'rate_index', 'high'):
+        frame.loc[rng.choice(n, 40, replace=False), col] = np.nan
+    return frame
+
+
+def _reference(m1, minutes):
+    how = {col: AGGREGATIONS[col] for col in m1.columns if col != 'ts_utc'}
+    resampled = m1.set_index('ts_utc').resample(f'{minutes}min')
+    frame = resampled.agg(how)
+    frame['minutes'] = resampled.size()
+    return frame[frame['minutes'] > 0]
+
+
+@pytest.mark.parametrize("minutes", [5, 15, 30, 60])
+def test_bars_match_pandas_resample(m1, minutes):
+    bars = build_bars([m1])[minutes]
+    expected = _reference(m1, minutes)
+    np.testing.assert_array_equal(bars.ts, expected.index.values)
+    for col in expected.columns:
+        np.testing.assert_allclose(bars[col], expected[col].to_numpy(dtype=float), rtol=0, atol=0,
+                                   err_msg=col)
+
+
+def test_streaming_chunks_match_single_pass(m1):
+    whole = build_bars([m1])
+    chunked = build_bars([m1.iloc[i:i + 777] for i in range(0, len(m1), 777)])
+    for minutes in whole:
+        pd.testing.assert_frame_equal(chunked[minutes].to_frame(), whole[minutes].to_frame())
+
+
+def test_resolutions_must_nest():
+    with pytest.raises(ValueError):
+        RollupBuilder((15, 20))
+    with pytest.raises(ValueError):
+        rollup(Bars(15, np.array([], dtype='datetime64[ns]'), {}), 20)
+
+
+def test_as_of_uses_completed_bars_only():
+    ts = pd.date_range('2024-07-01 00:00', periods=3, freq='15min').values
+    bars = Bars(15, ts, {'close': np.array([1.0, 2.0, 3.0])})
+    times = pd.to_datetime(['2024-07-01 00:13', '2024-07-01 00:14', '2024-07-01 00:29',
+                            '2024-07-01 00:30', '2024-07-01 02:00']).values
+    np.testing.assert_array_equal(bars.as_of(times, bars['close']), [np.nan, 1.0, 2.0, 2.0, 3.0])
+    assert bars.window(1440) == 96
+
+
+def test_bar_store_round_trip(pg_conn, m1, tmp_path):
+    cur = pg_conn.cursor()
+    cur.execute("CREATE TABLE bqx.m1_eurusd (time TIMESTAMP PRIMARY KEY, open NUMERIC, high NUMERIC, "
+                "low NUMERIC, close NUMERIC, volume NUMERIC, rate_index DOUBLE PRECISION, bqx DOUBLE PRECISION)")
+    rows = [(row.ts_utc.to_pydatetime(),) + tuple(None if pd.isna(v) else float(v) for v in row[2:])
+            for row in m1.itertuples()]
+    cur.executemany("INSERT INTO bqx.m1_eurusd VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", rows)
+    pg_conn.commit()
+    cur.close()
+
+    store = BarStore(FeatureStore(str(tmp_path), ttl=None), chunk_rows=500)
+    bars = store.load(pg_conn, 'eurusd', 60, '2024-07-01', '2024-07-02')
+    pg_conn.commit()
+    expected = _reference(m1, 60)
+    expected = expected[expected.index < '2024-07-02']
+    np.testing.assert_array_equal(bars.ts, expected.index.values)
+    np.testing.assert_allclose(bars['close'], expected['close'], rtol=1e-12)
+
+    # One pass stored every resolution: later reads need no database
+    assert store.store.misses == 1
+    five = store.load(None, 'eurusd', 5, '2024-07-01', '2024-08-01')
+    assert store.store.misses == 1 and len(five) == len(_reference(m1, 5))
+    with pytest.raises(ValueError):
+        store.load(None, 'eurusd', 10, '2024-07-01', '2024-08-01')
@@ -0,0 +1,112 @@
+"""
+Tests for the spectral, wavelet and SSA features
+Checks the batched spectra against per-window FFTs and the sliding DFT,
+the wavelet filters, causality of every family, the SSA decomposition
+identity, the table column mapping and the worker's tables after WARMUP_ROWS.
+"""
+
+import importlib.util
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.spectral import (
+    FAMILIES, WARMUP_ROWS, WAVELET_FILTERS, SlidingDFT, compute_spectral_features, family_columns,
+    family_table, fft_features, modwt, rolling_power, ssa_features
+)
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture(scope="module")
+def series():
+    """A random walk with a 20-row cycle"""
+    rng = np.random.default_rng(23)
+    t = np.arange(3000)
+    return 100 + np.cumsum(rng.normal(0, 1e-3, len(t))) + 3e-3 * np.sin(2 * np.pi * t / 20)
+
+
+def test_rolling_power_matches_per_window_fft(series):
+    power = rolling_power(series, 64)
+    assert np.isnan(power[:63]).all()
+    for i in (63, 64, 1000, len(series) - 1):
+        expected = np.abs(np.fft.fft(series[i - 63:i + 1])[1:33]) ** 2
+        np.testing.assert_allclose(power[i], expected, rtol=1e-9)
+
+    sliding = SlidingDFT(64)
+    streamed = np.array([sliding.update(value) for value in series])
+    np.testing.assert_allclose(streamed[63:], power[63:], rtol=1e-6, atol=1e-12 * np.nanmax(power))
+
+
+def test_fft_finds_the_cycle():
+    t = np.arange(1000)
+    out = fft_features(np.sin(2 * np.pi * t / 12) + 0.05 * np.random.default_rng(0).normal(size=len(t)))
+    assert np.allclose(out['fft_dominant_freq'][200:], 1 / 12)
+    assert (out['fft_dominant_power'][200:] > 0.9).all()
+    assert (out['fft_freq_stability'][200:] == 1.0).all()
+    assert (out['fft_cyclic_strength'][200:] > 0.9).all()
+
+
+@pytest.mark.parametrize("wavelet", sorted(WAVELET_FILTERS))
+def test_wavelet_filters_and_energy(wavelet):
+    h = WAVELET_FILTERS[wavelet]
+    assert h.sum() == pytest.approx(np.sqrt(2))
+    for shift in range(0, len(h), 2):
+        assert (h[shift:] * h[:len(h) - shift]).sum() == pytest.approx(1.0 if shift == 0 else 0.0, abs=1e-12)
+
+    noise = np.random.default_rng(1).normal(size=100000)
+    energy = sum(np.nanmean(c * c) for c in modwt(noise, wavelet).values())
+    assert energy == pytest.approx(1.0, abs=0.02)
+
+
+def test_features_are_causal(series):
+    whole = compute_spectral_features(series, 'rate')
+    changed = series.copy()
+    changed[2000:] += np.random.default_rng(2).normal(0, 1e-2, 1000)
+    head = compute_spectral_features(changed, 'rate')
+    for family, columns in whole.items():
+        for name, values in columns.items():
+            np.testing.assert_array_equal(head[family][name][:2000], values[:2000], err_msg=name)
+            assert np.isfinite(values[400:]).all(), name
+
+
+def test_ssa_components_add_up(series):
+    out = ssa_features(series)
+    assert np.isnan(out['ssa_trend_component'][:239]).all()
+    total = out['ssa_trend_component'] + out['ssa_oscillatory_component'] + out['ssa_noise_component']
+    np.testing.assert_allclose(total[239:], series[239:], rtol=1e-12)
+    shares = (out['ssa_trend_variance_explained'] + out['ssa_osc_variance_explained'] +
+              out['ssa_noise_variance'])
+    np.testing.assert_allclose(shares[239:], 1.0)
+    assert (out['ssa_osc_variance_explained'][239:] > 0).all()
+    assert ((out['ssa_reconstruction_error'][239:] >= 0) & (out['ssa_reconstruction_error'][239:] <= 1)).all()
+
+
+@pytest.mark.parametrize("domain", ['rate', 'bqx'])
+@pytest.mark.parametrize("family", sorted(FAMILIES))
+def test_columns_match_schema(family, domain):
+    sql = (ROOT / 'scripts' / 'refactor' / f'stage_1_8_3_create_{family}_features_{domain}.sql').read_text()
+    table = re.search(r'CREATE TABLE IF NOT EXISTS [^(]*\((.*?)PRIMARY KEY', sql, re.S).group(1)
+    columns = re.findall(r'(\w+) NUMERIC', table)
+    assert sorted(family_columns(family, domain).values()) == sorted(columns)
+
+
+def test_worker_tables_fill_after_warmup(series):
+    spec = importlib.util.spec_from_file_location(
+        "populate_spectral_worker", ROOT / "scripts/ml/populate_spectral_worker.py")
+    worker = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(worker)
+
+    frame = pd.DataFrame({'rate_index': series, 'bqx': (series - 100) * 10})
+    tables = worker.spectral_tables(frame, 'eurusd')
+    assert set(tables) == {family_table(family, domain, 'eurusd') for family in FAMILIES for domain in ('rate', 'bqx')}
+    for family in FAMILIES:
+        for domain in ('rate', 'bqx'):
+            features = tables[family_table(family, domain, 'eurusd')]
+            assert set(features) == set(family_columns(family, domain).values())
+            # WARMUP_ROWS rows of history fill every column from a month's first row
+            for name, values in features.items():
+                assert np.isfinite(values[WARMUP_ROWS:]).all(), (family, domain, name)
@@ -0,0 +1,167 @@
+"""
+Regression tests for the Stage 2.3 basket-index engine
+Compares the panel-based engine with the per-timestamp, per-row
+implementation it replaced on a synthetic month.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.panel import Panel
+
+ROOT = Path(__file__).parent.parent
+
+
+def _load_script(relative_path, name):
+    """Import a worker script by path (scripts/ is not a package)"""
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def stage():
+    return _load_script("scripts/tier1/stage_2_3_currency_indices.py", "stage_2_3_currency_indices")
+
+
+@pytest.fixture(scope="module")
+def month_panel(stage):
+    """800 minutes of w60 predictions with gaps, NULLs, zeros and a missing pair"""
+    rng = np.random.default_rng(11)
+    pairs = stage.CURRENCY_PAIRS
+    n = 800
+    ts = pd.date_range('2024-07-01', periods=n, freq='min').to_numpy()
+
+    values = rng.normal(0, 1e-3, (n, len(pairs)))
+    present = np.ones((n, len(pairs)), dtype=bool)
+
+    gbpusd, eurusd = pairs.index('gbpusd'), pairs.index('eurusd')
+    present[100:140, gbpusd] = False                     # gap in one pair's partition
+    values[300:305, eurusd] = np.nan                     # NULL predictions
+    # Every CHF pair NULL at one timestamp -> no CHF basket there
+    values[450, [pairs.index(p) for p in stage.BASKET_PAIRS['CHF']]] = np.nan
+    # Baskets exactly zero -> NULL rate of change
+    for p in stage.BASKET_PAIRS['JPY']:
+        values[200, pairs.index(p)] = 0.0
+    values[~present] = np.nan
+
+    missing = ['nzdchf']
+    values[:, pairs.index('nzdchf')] = np.nan
+    present[:, pairs.index('nzdchf')] = False
+    return Panel(ts, pairs, {'w60_prediction': np.asfortranarray(values)}, present, missing)
+
+
+# ----------------------------------------------------------------------
+# Per-row reference (the implementation the engine replaced)
+# ----------------------------------------------------------------------
+
+def _reference_basket(stage, lookup, currency, timestamp):
+    values = []
+    for pair in stage.BASKET_PAIRS[currency]:
+        if pair not in lookup or timestamp not in lookup[pair]:
+            continue
+        pred_value = lookup[pair][timestamp]
+        if pd.isna(pred_value):
+            continue
+        values.append(pred_value * stage.get_pair_direction(pair, currency))
+    return np.mean(values) if values else None
+
+
+def _reference_momentum(series, window):
+    if len(series) < window:
+        return None, None, None
+    values = series.iloc[-window:].values
+    mid_point = len(values) // 2
+    accel = (values[-1] - values[mid_point]) - (values[mid_point] - values[0])
+    roc = (values[-1] - values[0]) / abs(values[0]) * 100 if values[0] != 0 else None
+    return values[-1] - values[0], accel, roc
+
+
+def _reference_strength(indices, currency, group):
+    own_value = indices.get(currency)
+    if own_value is None or pd.isna(own_value):
+        return None
+    group_values = [
+        indices[c] for c in group
+        if c != currency and indices.get(c) is not None and not pd.isna(indices[c])
+    ]
+    return own_value - np.mean(group_values) if group_values else None
+
+
+def _reference_features(stage, panel, pair):
+    lookup = {}
+    for p in panel.pairs:
+        if p in panel.missing:
+            continue
+        series = panel.series('w60_prediction', p)
+        lookup[p] = dict(zip(series.index, series.to_numpy()))
+
+    timestamps = list(panel.series('w60_prediction', pair).index)
+    indices = [{c: _reference_basket(stage, lookup, c, ts) for c in stage.MAJOR_CURRENCIES} for ts in timestamps]
+    series = {c: pd.Series([row[c] for row in indices], dtype=float) for c in stage.MAJOR_CURRENCIES}
+
+    rows = []
+    for idx, row_indices in enumerate(indices):
+        features = {}
+        for currency in stage.MAJOR_CURRENCIES:
+            lower = currency.lower()
+            features[f"{lower}_basket_index"] = row_indices[currency]
+            current = series[currency].iloc[:idx + 1]
+            for window in stage.WINDOWS:
+                momentum, accel, roc = _reference_momentum(current, window)
+                features[f"{lower}_basket_momentum_{window}min"] = momentum
+                features[f"{lower}_basket_momentum_accel_{window}min"] = accel
+                features[f"{lower}_basket_momentum_roc_{window}min"] = roc
+                features[f"{lower}_basket_volatility_{window}min"] = (
+                    np.std(current.iloc[-window:].values) if len(current) >= window else None
+                )
+            for group, members in stage.CURRENCY_GROUPS.items():
+                features[f"{lower}_basket_strength_vs_{group}"] = _reference_strength(row_indices, currency, members)
+        rows.append(features)
+
+    frame = pd.DataFrame(rows, dtype=float)
+    return timestamps, frame
+
+
+@pytest.mark.parametrize("pair", ['eurusd', 'gbpusd'])
+def test_engine_matches_per_row_reference(stage, month_panel, pair):
+    month = stage.MonthBaskets(month_panel)
+    timestamps, features = month.features(pair)
+    ref_timestamps, reference = _reference_features(stage, month_panel, pair)
+
+    assert list(features) == stage.feature_columns()
+    assert len(features) == 224
+    assert list(timestamps.tz_convert(None)) == ref_timestamps
+
+    for column in reference.columns:
+        np.testing.assert_allclose(
+            features[column], reference[column].to_numpy(), rtol=1e-9, atol=1e-15, err_msg=column
+        )
+        # NULLs in exactly the same places
+        np.testing.assert_array_equal(np.isnan(features[column]), reference[column].isna().to_numpy(), err_msg=column)
+
+
+def test_pairs_with_same_timestamps_share_features(stage, month_panel):
+    month = stage.MonthBaskets(month_panel)
+    _, eurusd = month.features('eurusd')
+    _, usdjpy = month.features('usdjpy')
+    _, gbpusd = month.features('gbpusd')
+
+    assert eurusd is usdjpy
+    assert gbpusd is not eurusd
+    assert len(month._features) == 2
+
+
+def test_basket_weights(stage):
+    weights = stage.basket_weights(stage.CURRENCY_PAIRS)
+    eurusd = stage.CURRENCY_PAIRS.index('eurusd')
+    usd = stage.MAJOR_CURRENCIES.index('USD')
+    eur = stage.MAJOR_CURRENCIES.index('EUR')
+
+    assert weights[eurusd, usd] == -1 and weights[eurusd, eur] == 1
+    assert (np.abs(weights).sum(axis=0) == 7).all()
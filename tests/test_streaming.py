@@ -0,0 +1,177 @@
+"""
+Tests for chunked extraction and streaming feature engineering
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from data.bqx_engine import bqx_column_names
+from data.features import FeatureEngineer
+
+REG_COLUMNS = [
+    f"w{w}_{m}"
+    for w in [60, 90, 150, 240, 390, 630]
+    for m in ['slope', 'intercept', 'r2', 'quad_a', 'quad_b', 'quad_c', 'quad_norm']
+]
+
+
+@pytest.fixture(scope="module")
+def frames():
+    rng = np.random.default_rng(3)
+    ts = pd.date_range('2024-07-01', periods=3000, freq='min', name='ts_utc')
+
+    bqx = pd.DataFrame(rng.normal(0, 1e-4, (len(ts), 37)), index=ts, columns=bqx_column_names())
+    bqx.insert(0, 'rate', 1.1 + np.cumsum(rng.normal(0, 1e-4, len(ts))))
+    bqx.iloc[500:520, 3] = np.nan
+
+    reg = pd.DataFrame(rng.normal(0, 1, (len(ts), len(REG_COLUMNS))), index=ts, columns=REG_COLUMNS)
+    reg.insert(0, 'rate', bqx['rate'])
+    # REG gaps make the merged stream differ from the BQX stream
+    reg = reg.drop(ts[1000:1030]).drop(ts[2200:2201])
+    return bqx, reg
+
+
+def _chunks(bqx, reg, edges):
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        yield bqx.iloc[lo:hi], reg[(reg.index >= bqx.index[lo]) & (reg.index < (bqx.index[hi] if hi < len(bqx) else bqx.index[-1] + pd.Timedelta(minutes=1)))]
+
+
+@pytest.mark.parametrize("edges", [
+    [0, 3000],
+    [0, 700, 1400, 2100, 3000],
+    [0, 25, 40, 300, 301, 1015, 2999, 3000],
+])
+def test_stream_matches_batch(frames, edges):
+    bqx, reg = frames
+    engineer = FeatureEngineer("missing.yaml")
+
+    X, y = engineer.engineer_features(bqx, reg)
+    parts = list(engineer.engineer_features_stream(
+        _chunks(bqx, reg, edges),
+        volatility_thresholds=engineer.volatility_thresholds(bqx)
+    ))
+    X_stream = pd.concat([p[0] for p in parts])
+    y_stream = pd.concat([p[1] for p in parts])
+
+    assert len(X) > 2000
+    pd.testing.assert_frame_equal(X_stream, X, check_dtype=False, check_freq=False)
+    pd.testing.assert_series_equal(y_stream, y, check_freq=False)
+
+
+def test_stream_requires_thresholds(frames):
+    bqx, reg = frames
+    with pytest.raises(ValueError):
+        next(FeatureEngineer("missing.yaml").engineer_features_stream([(bqx, reg)]))
+
+
+@pytest.fixture
+def extractor_config(tmp_path, pg_dsn, pg_conn):
+    import psycopg2.extensions
+
+    cur = pg_conn.cursor()
+    cur.execute(
+        "CREATE TABLE bqx.bqx_eurusd (ts_utc TIMESTAMP, rate DOUBLE PRECISION, "
+        + ", ".join(f"{c} DOUBLE PRECISION" for c in bqx_column_names()) + ")"
+    )
+    cur.execute(
+        "CREATE TABLE bqx.reg_eurusd (time TIMESTAMP, close DOUBLE PRECISION, "
+        + ", ".join(f"{c} DOUBLE PRECISION" for c in REG_COLUMNS) + ")"
+    )
+    cur.execute(
+        "INSERT INTO bqx.bqx_eurusd (ts_utc, rate, w15_bqx_return) "
+        "SELECT g, 1.1, CASE WHEN extract(minute from g) = 7 THEN NULL ELSE extract(minute from g) END "
+        "FROM generate_series('2024-07-01'::timestamp, '2024-07-03 23:59', interval '1 minute') g"
+    )
+    cur.execute(
+        "INSERT INTO bqx.reg_eurusd (time, close, w60_r2) "
+        "SELECT g, 1.1, 0.5 FROM generate_series('2024-07-01'::timestamp, '2024-07-03 23:59', interval '1 minute') g"
+    )
+    pg_conn.commit()
+
+    params = psycopg2.extensions.parse_dsn(pg_dsn)
+    path = tmp_path / "database.yaml"
+    path.write_text(yaml.safe_dump({
+        'aurora': {
+            'host': params['host'], 'port': 5432, 'database': params['dbname'],
+            'user': params['user'], 'password': '', 'sslmode': 'disable'
+        },
+        'query': {'cache_enabled': False}
+    }))
+    return str(path)
+
+
+def test_iter_blocks_bounded_chunks(extractor_config):
+    from data.extraction import AuroraExtractor
+
+    extractor = AuroraExtractor(extractor_config)
+    blocks = list(extractor.iter_blocks('bqx', 'eurusd', '2024-07-01', '2024-07-03',
+                                        chunk_rows=1000, columns=['w15_bqx_return']))
+    extractor.disconnect()
+
+    assert [len(b.ts) for b in blocks] == [1000, 1000, 880]
+    assert all(b.values.dtype == np.float32 and b.values.shape[1] == 1 for b in blocks)
+    frame = pd.concat([b.to_frame() for b in blocks])
+    assert frame.index.is_monotonic_increasing
+    assert np.isnan(frame.loc['2024-07-01 00:07', 'w15_bqx_return'])
+    assert frame.loc['2024-07-01 00:08', 'w15_bqx_return'] == 8
+
+
+@pytest.mark.filterwarnings("error")
+def test_iter_blocks_timestamptz_as_naive_utc(extractor_config, pg_conn):
+    from data.extraction import AuroraExtractor
+
+    cur = pg_conn.cursor()
+    cur.execute("SET TIME ZONE 'America/New_York'")
+    cur.execute("ALTER TABLE bqx.bqx_eurusd ALTER COLUMN ts_utc TYPE TIMESTAMPTZ USING ts_utc AT TIME ZONE 'UTC'")
+    pg_conn.commit()
+    cur.close()
+
+    extractor = AuroraExtractor(extractor_config)
+    blocks = list(extractor.iter_blocks('bqx', 'eurusd', '2024-07-01', '2024-07-02', columns=['w15_bqx_return']))
+    extractor.disconnect()
+
+    assert blocks[0].ts.dtype == np.dtype('datetime64[ns]')
+    assert blocks[0].ts[0] == np.datetime64('2024-07-01T00:00')
+    assert blocks[0].values[8, 0] == 8
+
+
+def test_iter_load_windows_cover_range(extractor_config):
+    from data.extraction import AuroraExtractor
+
+    extractor = AuroraExtractor(extractor_config)
+    windows = list(extractor.iter_load('eurusd', '2024-07-01', '2024-07-04', chunk_days=2, dtype=np.float64))
+    extractor.disconnect()
+
+    assert len(windows) == 2
+    bqx = pd.concat([w[0] for w in windows])
+    reg = pd.concat([w[1] for w in windows])
+    assert len(bqx) == len(reg) == 3 * 1440
+    assert bqx.index.is_unique and reg['w60_r2'].eq(0.5).all()
+    assert bqx.shape[1] == 38 and reg.shape[1] == 1 + len(REG_COLUMNS)
+
+
+def test_streaming_thresholds_read_one_column(extractor_config, monkeypatch):
+    pytest.importorskip("sklearn")
+    from data.extraction import AuroraExtractor
+    from training import train
+
+    class Thresholds(Exception):
+        pass
+
+    def record(self, bqx_df):
+        raise Thresholds(bqx_df)
+
+    extractor = AuroraExtractor(extractor_config)
+    monkeypatch.setattr(extractor, 'load_bqx', lambda *args, **kwargs: pytest.fail("full BQX range loaded"))
+    monkeypatch.setattr(FeatureEngineer, 'volatility_thresholds', record)
+    try:
+        with pytest.raises(Thresholds) as caught:
+            train.load_training_data('eurusd', '2024-07-01', '2024-07-04', stream=True,
+                                     engineer=FeatureEngineer("missing.yaml"), extractor=extractor)
+    finally:
+        extractor.disconnect()
+
+    bqx_df = caught.value.args[0]
+    assert list(bqx_df.columns) == ['agg_bqx_volatility'] and len(bqx_df) == 3 * 1440
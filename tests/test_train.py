@@ -0,0 +1,72 @@
+"""
+Tests for the multi-pair training orchestrator
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+from training import train
+
+
+def test_cpu_budget():
+    assert train.cpu_budget(28, cpus=72) == (8, 8)
+    assert train.cpu_budget(3, cpus=72) == (3, 23)
+    assert train.cpu_budget(28, cpus=4) == (1, 3)
+    assert train.cpu_budget(28, cpus=72, workers=4) == (4, 17)
+    assert train.cpu_budget(2, cpus=1, workers=6) == (2, 1)
+
+
+class _FakeExtractor:
+    disconnected = False
+
+    def disconnect(self):
+        _FakeExtractor.disconnected = True
+
+
+def _fake_load(pair, start_date, end_date, stream, chunk_days, engineer, extractor):
+    if pair == 'badpair':
+        raise ValueError("no rows")
+    rng = np.random.default_rng(len(pair))
+    index = pd.date_range(start_date, periods=400, freq='min', name='ts_utc')
+    X = pd.DataFrame(rng.normal(size=(400, 4)).astype(np.float32), index=index, columns=list('abcd'))
+    y = pd.Series(X['a'].to_numpy(np.float64) * 0.5 + rng.normal(0, 0.1, 400), index=index, name='w60_bqx_return')
+    return X, y
+
+
+def test_train_all_pairs_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr(train, 'AuroraExtractor', _FakeExtractor)
+    monkeypatch.setattr(train, 'load_training_data', _fake_load)
+    summary_path = tmp_path / "summary.json"
+
+    summary = train.train_all_pairs(
+        ['eurusd', 'badpair', 'gbpusd'],
+        '2024-07-01',
+        '2024-07-02',
+        save_models=False,
+        workers=2,
+        n_jobs=1,
+        prefetch=1,
+        summary_path=str(summary_path)
+    )
+
+    assert _FakeExtractor.disconnected
+    assert list(summary['pairs']) == ['eurusd', 'badpair', 'gbpusd']
+    assert summary['workers'] == 2 and summary['n_jobs'] == 1
+
+    for pair in ('eurusd', 'gbpusd'):
+        entry = summary['pairs'][pair]
+        assert entry['status'] == 'ok'
+        assert entry['rows'] == 400 and entry['features'] == 4
+        assert entry['fit_seconds'] > 0
+        assert set(entry['metrics']) == {'mae', 'rmse', 'r2', 'dir_acc'}
+
+    assert summary['pairs']['badpair'] == {
+        'status': 'failed', 'stage': 'load', 'error': 'no rows',
+        'load_seconds': summary['pairs']['badpair']['load_seconds']
+    }
+    assert json.loads(summary_path.read_text()) == summary
@@ -0,0 +1,104 @@
+"""
+Tests for the COPY-based bulk partition writer
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.writer import frame_to_csv, write_columns
+
+
+def _create_partitioned_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE bqx.reg_bqx_eurusd (
+            ts_utc TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            w60_r2 DOUBLE PRECISION,
+            w60_rmse DOUBLE PRECISION,
+            flag INTEGER
+        ) PARTITION BY RANGE (ts_utc)
+    """)
+    cur.execute("""
+        CREATE TABLE bqx.reg_bqx_eurusd_2024_07 PARTITION OF bqx.reg_bqx_eurusd
+        FOR VALUES FROM ('2024-07-01') TO ('2024-08-01')
+    """)
+    cur.execute("CREATE UNIQUE INDEX ON bqx.reg_bqx_eurusd_2024_07 (ts_utc)")
+    conn.commit()
+    cur.close()
+
+
+def _columns(n=1000):
+    ts = pd.date_range('2024-07-01', periods=n, freq='min')
+    r2 = np.linspace(0, 1, n)
+    r2[:59] = np.nan
+    return {
+        'ts_utc': ts,
+        'w60_r2': r2,
+        'w60_rmse': np.full(n, 1.0 / 3.0),
+        'flag': np.arange(n) % 2
+    }
+
+
+def _fetch(conn, sql):
+    cur = conn.cursor()
+    cur.execute(sql)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def test_csv_serialization_nulls_and_precision():
+    frame = pd.DataFrame({'a': [np.nan, 1.0 / 3.0], 'b': [None, 'x'], 'c': [pd.NaT, pd.Timestamp('2024-07-01')]})
+    lines = frame_to_csv(frame).read().splitlines()
+
+    assert lines[0] == ',,'
+    assert float(lines[1].split(',')[0]) == 1.0 / 3.0
+    assert lines[1].endswith('2024-07-01')
+
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        write_columns(None, 'bqx.t', {'ts_utc': [1]}, mode='merge')
+
+
+def test_insert_writes_nulls_and_full_precision(pg_conn):
+    _create_partitioned_table(pg_conn)
+
+    written = write_columns(pg_conn, 'bqx.reg_bqx_eurusd_2024_07', _columns(), mode='insert')
+    pg_conn.commit()
+
+    assert written == 1000
+    assert _fetch(pg_conn, "SELECT count(*) FROM bqx.reg_bqx_eurusd WHERE w60_r2 IS NULL")[0][0] == 59
+    assert _fetch(pg_conn, "SELECT w60_rmse FROM bqx.reg_bqx_eurusd LIMIT 1")[0][0] == 1.0 / 3.0
+
+
+def test_ignore_and_upsert_merge_on_key(pg_conn):
+    _create_partitioned_table(pg_conn)
+    table = 'bqx.reg_bqx_eurusd_2024_07'
+    write_columns(pg_conn, table, _columns(), mode='insert')
+
+    changed = _columns()
+    changed['w60_rmse'] = np.full(1000, 2.0)
+
+    assert write_columns(pg_conn, table, changed, mode='ignore') == 0
+    assert _fetch(pg_conn, f"SELECT max(w60_rmse) FROM {table}")[0][0] == pytest.approx(1.0 / 3.0)
+
+    assert write_columns(pg_conn, table, changed, mode='upsert') == 1000
+    assert _fetch(pg_conn, f"SELECT min(w60_rmse) FROM {table}")[0][0] == 2.0
+
+
+def test_update_from_staging(pg_conn):
+    _create_partitioned_table(pg_conn)
+    table = 'bqx.reg_bqx_eurusd_2024_07'
+    write_columns(pg_conn, table, _columns(), mode='insert')
+
+    updates = pd.DataFrame({
+        'ts_utc': pd.date_range('2024-07-01', periods=10, freq='min'),
+        'flag': pd.array([7] * 9 + [None], dtype='Int64')
+    })
+    assert write_columns(pg_conn, table, updates, mode='update', chunk_rows=3) == 10
+
+    rows = _fetch(pg_conn, f"SELECT flag, w60_rmse FROM {table} ORDER BY ts_utc LIMIT 11")
+    assert [r[0] for r in rows] == [7] * 9 + [None, 0]
+    assert rows[0][1] == pytest.approx(1.0 / 3.0)
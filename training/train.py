@@ -1,11 +1,27 @@
 """
 BQX ML Training Script
 End-to-end training pipeline for autoregressive BQX prediction
+
+Multi-pair runs (train_all_pairs) overlap loading and training:
+- One loader thread extracts and engineers features pair by pair, with a
+  single Aurora extractor, into a bounded prefetch queue
+- A process pool fits the models, splitting the CPU budget between pairs
+  trained at once (workers) and tree jobs per model (n_jobs)
+Per-pair metrics and timings are written to a JSON summary.
 """
 
+import os
 import sys
+import json
+import time
+import queue
 import argparse
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from typing import Optional, Tuple
+import numpy as np
 import pandas as pd
 import warnings
 warnings.filterwarnings('ignore')
@@ -14,66 +30,120 @@ warnings.filterwarnings('ignore')
 sys.path.append(str(Path(__file__).parent.parent))
 
 from data.extraction import AuroraExtractor
-from data.features import FeatureEngineer
+from data.features import FeatureEngineer, FeatureMatrix
 from models.baseline import BQXBaselineModel
 
+# Smallest tree-job count worth giving a model before adding pair workers
+MIN_TREE_JOBS = 8
 
-def train_baseline(
+DEFAULT_SUMMARY_PATH = "models/saved/training_summary.json"
+
+
+def load_training_data(
     pair: str,
     start_date: str,
     end_date: str,
-    save_model: bool = True,
-    tune_hyperparams: bool = False
-):
+    stream: bool = False,
+    chunk_days: int = 7,
+    engineer: Optional[FeatureEngineer] = None,
+    extractor: Optional[AuroraExtractor] = None
+) -> Tuple[pd.DataFrame, pd.Series]:
     """
-    Train baseline model for a single pair
+    Extract one pair from Aurora and engineer its features
 
     Args:
         pair: Forex pair (e.g., 'eurusd')
         start_date: Training start date (YYYY-MM-DD)
         end_date: Training end date (YYYY-MM-DD)
-        save_model: Whether to save trained model
-        tune_hyperparams: Whether to tune hyperparameters
+        stream: Extract and engineer features in time chunks (bounded memory)
+        chunk_days: Chunk length in days when streaming
+        engineer: Feature engineer to reuse (default: a new one)
+        extractor: Extractor to reuse; left connected. A new one is
+            created and closed when omitted.
+
+    Returns:
+        Tuple of (features_df, target_series)
     """
-    print("=" * 80)
-    print(f"BQX ML Baseline Training: {pair.upper()}")
-    print("=" * 80)
-    print(f"Date range: {start_date} to {end_date}")
-    print()
+    engineer = engineer or FeatureEngineer()
+    owns_extractor = extractor is None
+    if owns_extractor:
+        extractor = AuroraExtractor()
 
-    # 1. Extract data from Aurora
-    print("Step 1/4: Extracting data from Aurora...")
-    extractor = AuroraExtractor()
     try:
-        bqx, reg = extractor.load(pair, start_date, end_date)
-        print(f"  ✓ BQX shape: {bqx.shape}")
-        print(f"  ✓ REG shape: {reg.shape}")
+        if stream:
+            # 1-2. Stream chunks from Aurora straight into feature engineering
+            print(f"Step 1-2/4: Streaming extraction + features ({chunk_days}-day chunks)...")
+            # Regime tertiles over the full range, streamed one column at a time
+            volatility = [block.values[:, 0] for block in extractor.iter_blocks(
+                'bqx', pair, start_date, end_date, columns=['agg_bqx_volatility'], dtype=np.float64
+            )]
+            thresholds = engineer.volatility_thresholds(
+                pd.DataFrame({'agg_bqx_volatility': np.concatenate(volatility or [np.empty(0)])})
+            )
+            parts = list(engineer.engineer_features_stream(
+                extractor.iter_load(pair, start_date, end_date, chunk_days=chunk_days),
+                target_col='w60_bqx_return',
+                target_horizon=60,
+                apply_causality=True,
+                volatility_thresholds=thresholds,
+                as_frame=False
+            ))
+        else:
+            # 1. Extract data from Aurora
+            print("Step 1/4: Extracting data from Aurora...")
+            bqx, reg = extractor.load(pair, start_date, end_date)
+            print(f"  ✓ BQX shape: {bqx.shape}")
+            print(f"  ✓ REG shape: {reg.shape}")
     finally:
-        extractor.disconnect()
-
-    # 2. Engineer features
-    print("\nStep 2/4: Engineering features...")
-    engineer = FeatureEngineer()
-    X, y = engineer.engineer_features(
-        bqx,
-        reg,
-        target_col='w60_bqx_return',
-        target_horizon=60,
-        apply_causality=True
-    )
+        if owns_extractor:
+            extractor.disconnect()
+
+    if stream:
+        if not parts:
+            raise ValueError(f"No training rows for {pair} between {start_date} and {end_date}")
+        X, y = FeatureMatrix.concat(parts).to_frame()
+        del parts
+    else:
+        # 2. Engineer features
+        print("\nStep 2/4: Engineering features...")
+        X, y = engineer.engineer_features(
+            bqx,
+            reg,
+            target_col='w60_bqx_return',
+            target_horizon=60,
+            apply_causality=True
+        )
     print(f"  ✓ Features: {X.shape[1]} columns, {X.shape[0]:,} samples")
     print(f"  ✓ Target: {y.shape[0]:,} samples")
 
-    # Get feature categories
-    categories = engineer.get_feature_names(X)
-    print("\n  Feature breakdown:")
-    for cat, cols in categories.items():
-        if cols:
-            print(f"    {cat}: {len(cols)} features")
+    return X, y
+
+
+def fit_baseline(
+    pair: str,
+    X: pd.DataFrame,
+    y: pd.Series,
+    save_model: bool = True,
+    tune_hyperparams: bool = False,
+    n_jobs: int = -1
+):
+    """
+    Train, report and optionally save the baseline model for one pair
+
+    Args:
+        pair: Forex pair (e.g., 'eurusd')
+        X: Engineered features
+        y: Target series
+        save_model: Whether to save trained model
+        tune_hyperparams: Whether to tune hyperparameters
+        n_jobs: Tree-building jobs for the Random Forest (-1 = all cores)
 
+    Returns:
+        Tuple of (model, metrics)
+    """
     # 3. Train model
     print("\nStep 3/4: Training Random Forest model...")
-    model = BQXBaselineModel()
+    model = BQXBaselineModel(n_jobs=n_jobs)
     metrics = model.train(X, y, tune_hyperparams=tune_hyperparams)
 
     # 4. Feature importance
@@ -91,6 +161,50 @@ def train_baseline(
         model.save(save_dir="models/saved", model_name=model_name)
         print(f"  ✓ Model saved as {model_name}")
 
+    return model, metrics
+
+
+def train_baseline(
+    pair: str,
+    start_date: str,
+    end_date: str,
+    save_model: bool = True,
+    tune_hyperparams: bool = False,
+    stream: bool = False,
+    chunk_days: int = 7,
+    n_jobs: int = -1
+):
+    """
+    Train baseline model for a single pair
+
+    Args:
+        pair: Forex pair (e.g., 'eurusd')
+        start_date: Training start date (YYYY-MM-DD)
+        end_date: Training end date (YYYY-MM-DD)
+        save_model: Whether to save trained model
+        tune_hyperparams: Whether to tune hyperparameters
+        stream: Extract and engineer features in time chunks (bounded memory)
+        chunk_days: Chunk length in days when streaming
+        n_jobs: Tree-building jobs for the Random Forest (-1 = all cores)
+    """
+    print("=" * 80)
+    print(f"BQX ML Baseline Training: {pair.upper()}")
+    print("=" * 80)
+    print(f"Date range: {start_date} to {end_date}")
+    print()
+
+    engineer = FeatureEngineer()
+    X, y = load_training_data(pair, start_date, end_date, stream, chunk_days, engineer)
+
+    # Get feature categories
+    categories = engineer.get_feature_names(X)
+    print("\n  Feature breakdown:")
+    for cat, cols in categories.items():
+        if cols:
+            print(f"    {cat}: {len(cols)} features")
+
+    model, metrics = fit_baseline(pair, X, y, save_model, tune_hyperparams, n_jobs)
+
     print("\n" + "=" * 80)
     print("✓ Training Complete!")
     print("=" * 80)
@@ -98,61 +212,223 @@ def train_baseline(
     return model, metrics
 
 
-def train_all_pairs(
+def cpu_budget(
+    n_pairs: int,
+    cpus: Optional[int] = None,
+    workers: Optional[int] = None
+) -> Tuple[int, int]:
+    """
+    Split CPUs between pairs trained at once and tree jobs per model
+
+    One core is left to the loader thread. Without an explicit worker
+    count, each model gets at least MIN_TREE_JOBS tree jobs.
+
+    Args:
+        n_pairs: Number of pairs to train
+        cpus: CPU budget (default: os.cpu_count())
+        workers: Pairs trained concurrently (default: derived from cpus)
+
+    Returns:
+        (workers, n_jobs)
+    """
+    cpus = cpus or os.cpu_count() or 1
+    train_cpus = max(1, cpus - 1)
+
+    if workers is None:
+        workers = train_cpus // MIN_TREE_JOBS
+    workers = max(1, min(workers, n_pairs))
+
+    return workers, max(1, train_cpus // workers)
+
+
+def _fit_pair(pair: str, X: pd.DataFrame, y: pd.Series, save_model: bool, n_jobs: int):
+    """Pool entry point: fit one pair, return (test metrics, seconds)"""
+    started = time.perf_counter()
+    _, metrics = fit_baseline(pair, X, y, save_model=save_model, n_jobs=n_jobs)
+    test_metrics = {name: float(value) for name, value in metrics['test'].items()}
+    return test_metrics, time.perf_counter() - started
+
+
+def _load_stage(
     pairs: list,
     start_date: str,
     end_date: str,
-    save_models: bool = True
+    stream: bool,
+    chunk_days: int,
+    loaded: queue.Queue,
+    stop: threading.Event
 ):
     """
-    Train baseline models for multiple pairs
+    Loader thread: engineer features pair by pair into `loaded`
+
+    Puts (pair, X, y, error, seconds) per pair, then None. put() blocks
+    while the queue is full, which bounds the number of prefetched pairs.
+    """
+    extractor = None
+    n_loaded = 0
+    try:
+        engineer = FeatureEngineer()
+        extractor = AuroraExtractor()
+
+        for pair in pairs:
+            if stop.is_set():
+                break
+            started = time.perf_counter()
+            try:
+                X, y = load_training_data(pair, start_date, end_date, stream, chunk_days, engineer, extractor)
+                item = (pair, X, y, None, time.perf_counter() - started)
+            except Exception as e:
+                item = (pair, None, None, str(e), time.perf_counter() - started)
+            n_loaded += 1
+            loaded.put(item)
+
+    except Exception as e:
+        # Extractor setup failed: report every pair not yet loaded
+        for pair in pairs[n_loaded:]:
+            loaded.put((pair, None, None, str(e), 0.0))
+
+    finally:
+        if extractor is not None:
+            extractor.disconnect()
+        loaded.put(None)
+
+
+def write_summary(summary: dict, path: str):
+    """Write the training summary as JSON"""
+    summary_file = Path(path)
+    summary_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(summary_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+
+def train_all_pairs(
+    pairs: list,
+    start_date: str,
+    end_date: str,
+    save_models: bool = True,
+    stream: bool = False,
+    chunk_days: int = 7,
+    workers: Optional[int] = None,
+    n_jobs: Optional[int] = None,
+    prefetch: int = 2,
+    summary_path: Optional[str] = DEFAULT_SUMMARY_PATH
+) -> dict:
+    """
+    Train baseline models for multiple pairs in parallel
 
     Args:
         pairs: List of forex pairs
         start_date: Training start date
         end_date: Training end date
         save_models: Whether to save trained models
+        stream: Extract and engineer features in time chunks
+        chunk_days: Chunk length in days when streaming
+        workers: Pairs trained concurrently (default: from the CPU budget)
+        n_jobs: Tree jobs per model (default: CPUs split across workers)
+        prefetch: Loaded pairs allowed to wait for a free worker
+        summary_path: JSON summary file (None to skip writing)
+
+    Returns:
+        Summary dict with run settings and per-pair results
     """
+    workers, budget_jobs = cpu_budget(len(pairs), workers=workers)
+    n_jobs = n_jobs or budget_jobs
+
     print("=" * 80)
     print(f"BQX ML Baseline Training: {len(pairs)} Pairs")
     print("=" * 80)
+    print(f"Workers: {workers} pairs x {n_jobs} tree jobs, prefetch {prefetch}")
 
     results = {}
+    started = time.perf_counter()
+
+    loaded = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+    loader = threading.Thread(
+        target=_load_stage,
+        args=(pairs, start_date, end_date, stream, chunk_days, loaded, stop),
+        name="bqx-loader",
+        daemon=True
+    )
+    loader.start()
 
-    for i, pair in enumerate(pairs, 1):
-        print(f"\n[{i}/{len(pairs)}] Training {pair.upper()}...")
-        print("-" * 80)
-
-        try:
-            model, metrics = train_baseline(
-                pair,
-                start_date,
-                end_date,
-                save_model=save_models,
-                tune_hyperparams=False
-            )
-            results[pair] = metrics['test']  # Store test metrics
-            print(f"✓ {pair.upper()} complete")
-
-        except Exception as e:
-            print(f"✗ {pair.upper()} failed: {e}")
-            results[pair] = None
+    # spawn: the loader thread holds a live DB connection, unsafe to fork
+    pending = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            loading = True
+            while loading or pending:
+                # Take the next loaded pair only when a worker is free
+                if loading and len(pending) < workers:
+                    item = loaded.get()
+                    if item is None:
+                        loading = False
+                        continue
+
+                    pair, X, y, error, load_seconds = item
+                    if error is not None:
+                        print(f"✗ {pair.upper()} failed to load: {error}")
+                        results[pair] = {'status': 'failed', 'stage': 'load', 'error': error,
+                                         'load_seconds': load_seconds}
+                        continue
+
+                    future = pool.submit(_fit_pair, pair, X, y, save_models, n_jobs)
+                    pending[future] = (pair, load_seconds, X.shape)
+                    del X, y
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pair, load_seconds, shape = pending.pop(future)
+                    entry = {'load_seconds': load_seconds, 'rows': shape[0], 'features': shape[1]}
+                    try:
+                        metrics, fit_seconds = future.result()
+                        entry.update(status='ok', metrics=metrics, fit_seconds=fit_seconds)
+                        print(f"✓ {pair.upper()} complete")
+                    except Exception as e:
+                        entry.update(status='failed', stage='train', error=str(e))
+                        print(f"✗ {pair.upper()} failed: {e}")
+                    results[pair] = entry
+    finally:
+        stop.set()
+        # Unblock a loader waiting on a full queue
+        while loader.is_alive():
+            try:
+                loaded.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    summary = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'stream': stream,
+        'cpus': os.cpu_count(),
+        'workers': workers,
+        'n_jobs': n_jobs,
+        'prefetch': prefetch,
+        'wall_seconds': time.perf_counter() - started,
+        'pairs': {pair: results.get(pair, {'status': 'skipped'}) for pair in pairs}
+    }
+    if summary_path:
+        write_summary(summary, summary_path)
 
     # Summary
     print("\n" + "=" * 80)
     print("Training Summary")
     print("=" * 80)
 
-    for pair, metrics in results.items():
-        if metrics:
+    for pair, entry in summary['pairs'].items():
+        if entry['status'] == 'ok':
+            metrics = entry['metrics']
             print(f"{pair.upper():8} - R²: {metrics['r2']:6.4f} | "
                   f"MAE: {metrics['mae']:.6f} | "
-                  f"Dir Acc: {metrics['dir_acc']:5.2%}")
+                  f"Dir Acc: {metrics['dir_acc']:5.2%} | "
+                  f"load {entry['load_seconds']:.0f}s, fit {entry['fit_seconds']:.0f}s")
         else:
             print(f"{pair.upper():8} - FAILED")
 
     # Average metrics
-    valid_results = [m for m in results.values() if m is not None]
+    valid_results = [e['metrics'] for e in summary['pairs'].values() if e['status'] == 'ok']
     if valid_results:
         avg_r2 = sum(m['r2'] for m in valid_results) / len(valid_results)
         avg_mae = sum(m['mae'] for m in valid_results) / len(valid_results)
@@ -165,6 +441,11 @@ def train_all_pairs(
         print(f"  MAE:         {avg_mae:.6f}")
         print(f"  Dir Acc:     {avg_dir:.2%}")
 
+    print(f"\nWall time: {summary['wall_seconds']:.0f}s")
+    if summary_path:
+        print(f"Summary written to {summary_path}")
+
+    return summary
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="BQX ML Baseline Training")
@@ -214,6 +495,45 @@ if __name__ == "__main__":
         help='Do not save trained models'
     )
 
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream extraction and feature engineering in chunks (bounded memory)'
+    )
+
+    parser.add_argument(
+        '--chunk-days',
+        type=int,
+        default=7,
+        help='Chunk length in days for --stream'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Pairs trained concurrently (default: derived from CPU count)'
+    )
+
+    parser.add_argument(
+        '--n-jobs',
+        type=int,
+        help='Tree-building jobs per model (default: CPUs split across workers)'
+    )
+
+    parser.add_argument(
+        '--prefetch',
+        type=int,
+        default=2,
+        help='Loaded pairs allowed to wait for a free worker'
+    )
+
+    parser.add_argument(
+        '--summary',
+        type=str,
+        default=DEFAULT_SUMMARY_PATH,
+        help='Per-pair results and timing JSON for multi-pair runs'
+    )
+
     args = parser.parse_args()
 
     # All 28 preferred pairs
@@ -233,7 +553,13 @@ if __name__ == "__main__":
             pairs_to_train,
             args.start_date,
             args.end_date,
-            save_models=not args.no_save
+            save_models=not args.no_save,
+            stream=args.stream,
+            chunk_days=args.chunk_days,
+            workers=args.workers,
+            n_jobs=args.n_jobs,
+            prefetch=args.prefetch,
+            summary_path=args.summary
         )
 
     elif args.pairs:
@@ -242,7 +568,13 @@ if __name__ == "__main__":
             pairs_to_train,
             args.start_date,
             args.end_date,
-            save_models=not args.no_save
+            save_models=not args.no_save,
+            stream=args.stream,
+            chunk_days=args.chunk_days,
+            workers=args.workers,
+            n_jobs=args.n_jobs,
+            prefetch=args.prefetch,
+            summary_path=args.summary
         )
 
     elif args.pair:
@@ -251,7 +583,10 @@ if __name__ == "__main__":
             args.start_date,
             args.end_date,
             save_model=not args.no_save,
-            tune_hyperparams=args.tune
+            tune_hyperparams=args.tune,
+            stream=args.stream,
+            chunk_days=args.chunk_days,
+            n_jobs=args.n_jobs or -1
         )
 
     else:
@@ -264,5 +599,8 @@ if __name__ == "__main__":
             args.start_date,
             args.end_date,
             save_model=not args.no_save,
-            tune_hyperparams=args.tune
+            tune_hyperparams=args.tune,
+            stream=args.stream,
+            chunk_days=args.chunk_days,
+            n_jobs=args.n_jobs or -1
         )